@@ -5,3 +5,8 @@ class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'Mobile API'
+
+    def ready(self):
+        # Invalidate cached catalog responses when their models change
+        from .caching import connect_invalidation_signals
+        connect_invalidation_signals()
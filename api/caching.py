@@ -0,0 +1,231 @@
+"""
+Response caching for read-only catalog endpoints
+
+Countries, categories, FAQs, safety tips, sliders and packages change rarely
+but are fetched by every mobile client on launch. Their rendered JSON is
+cached per (resource version, URL, language) and served with a
+strong ETag, so a client that sends the ETag back in If-None-Match gets an
+empty 304 without the queryset or serializer running at all.
+
+Each resource has a version stamp in the shared cache, bumped (after commit)
+by post_save / post_delete of the models its payload is built from; see
+RESOURCE_MODELS. Writes made with QuerySet.update() send no signals, so the
+server-side entries also expire after TIMEOUT seconds.
+
+Responses are sent as public (only per-user payloads are private) and vary
+on Accept-Language alone, so a cached payload may depend on the URL - the
+``country`` query parameter included - and the language, but never on the
+session (such as its selected country): a shared cache could hand it to
+another visitor.
+
+Settings (all optional):
+
+    API_RESPONSE_CACHE = {
+        "TIMEOUT": 3600,  # seconds a rendered response stays cached
+        "MAX_AGE": 60,    # Cache-Control max-age sent to clients
+    }
+"""
+
+import hashlib
+import logging
+import time
+from functools import wraps
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.utils.translation import get_language
+
+logger = logging.getLogger(__name__)
+
+CACHE_DEFAULTS = {
+    "TIMEOUT": 60 * 60,
+    "MAX_AGE": 60,
+}
+
+VERSION_KEY = "api_response_version:{}"
+RESPONSE_KEY = "api_response:{}"
+
+# resource -> models whose changes make its cached responses stale
+RESOURCE_MODELS = {
+    "countries": ("content.Country",),
+    "categories": (
+        "main.Category",
+        "main.ClassifiedAd",  # ads_count
+        "main.CustomField",
+        "main.CustomFieldOption",
+        "main.CategoryCustomField",
+    ),
+    "category_ads": (
+        "main.ClassifiedAd",
+        "main.AdImage",
+        "main.Category",
+        "main.WishlistItem",  # is_favorited
+        "main.User",
+    ),
+    "faqs": ("main.FAQCategory", "main.FAQ"),
+    "safety_tips": ("main.SafetyTip",),
+    "home_sliders": ("content.HomeSlider",),
+    "ad_packages": ("main.AdPackage",),
+    "ad_features": ("main.AdFeature",),
+}
+
+# Saves touching only these fields do not change any cached payload
+IGNORED_UPDATE_FIELDS = frozenset({"last_login", "views_count"})
+
+
+def cache_settings():
+    options = dict(CACHE_DEFAULTS)
+    options.update(getattr(settings, "API_RESPONSE_CACHE", {}) or {})
+    return options
+
+
+# =======================
+# Version stamps
+# =======================
+
+
+def bump_resource_version(resource):
+    try:
+        cache.set(VERSION_KEY.format(resource), time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f"API cache version bump for {resource} failed: {e}")
+
+
+def invalidate_resources(resources):
+    """Mark *resources* stale once the current transaction commits."""
+    for resource in resources:
+        transaction.on_commit(lambda resource=resource: bump_resource_version(resource))
+
+
+def connect_invalidation_signals():
+    """Called from ApiConfig.ready()."""
+    resources_by_model = {}
+    for resource, labels in RESOURCE_MODELS.items():
+        for label in labels:
+            resources_by_model.setdefault(apps.get_model(label), []).append(resource)
+
+    for model, resources in resources_by_model.items():
+
+        def handler(sender, resources=tuple(resources), **kwargs):
+            update_fields = kwargs.get("update_fields")
+            if update_fields and IGNORED_UPDATE_FIELDS.issuperset(update_fields):
+                return
+            invalidate_resources(resources)
+
+        uid = f"api_response_cache:{model._meta.label}"
+        post_save.connect(handler, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(handler, sender=model, weak=False, dispatch_uid=uid)
+
+
+# =======================
+# Serving
+# =======================
+
+
+def response_cache_key(request, resource, per_user=False):
+    # The country filter is the explicit query parameter, part of the path
+    parts = [resource, request.get_full_path(), get_language() or ""]
+    if per_user:
+        parts.append(str(request.user.pk or ""))
+    digest = hashlib.md5("|".join(parts).encode(), usedforsecurity=False).hexdigest()
+    return RESPONSE_KEY.format(digest)
+
+
+def _finish(response, etag, private, max_age):
+    response["ETag"] = etag
+    if private:
+        patch_cache_control(response, private=True, max_age=max_age)
+    else:
+        patch_cache_control(response, public=True, max_age=max_age)
+    patch_vary_headers(response, ["Accept-Language"])
+    return response
+
+
+def serve_cached(view, request, resource, handler, per_user=False):
+    """
+    Return the cached rendering of handler() for *request*, a 304 when the
+    client already holds it, or run the handler and cache its 200 response.
+    """
+    if (
+        request.method not in ("GET", "HEAD")
+        or getattr(request.accepted_renderer, "format", None) != "json"
+    ):
+        return handler()
+
+    options = cache_settings()
+    private = per_user and request.user.is_authenticated
+    version_key = VERSION_KEY.format(resource)
+    key = response_cache_key(request, resource, per_user=private)
+    try:
+        found = cache.get_many([version_key, key])
+    except Exception as e:
+        logger.warning(f"API response cache lookup failed: {e}")
+        return handler()
+
+    version = found.get(version_key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(version_key, version, None)
+        version = cache.get(version_key, version)
+
+    entry = found.get(key)
+    if entry is None or entry[0] != version:
+        response = handler()
+        if response.status_code != 200:
+            return response
+        content = request.accepted_renderer.render(
+            response.data, request.accepted_media_type, view.get_renderer_context()
+        )
+        etag = quote_etag(hashlib.sha1(content, usedforsecurity=False).hexdigest())
+        entry = (version, etag, content, request.accepted_renderer.media_type)
+        cache.set(key, entry, options["TIMEOUT"])
+
+    _, etag, content, media_type = entry
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=media_type)
+    return _finish(response, etag, private, options["MAX_AGE"])
+
+
+def cache_response(resource=None, per_user=False):
+    """
+    Viewset method decorator: serve the endpoint through serve_cached().
+    *resource* defaults to the view's cache_resource; *per_user* keys the
+    cache by user for payloads that depend on who is asking.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            return serve_cached(
+                view,
+                request,
+                resource or view.cache_resource,
+                lambda: method(view, request, *args, **kwargs),
+                per_user=per_user,
+            )
+
+        return wrapper
+
+    return decorator
+
+
+class CachedCatalogMixin:
+    """Serves list and retrieve of a read-only viewset through the response cache."""
+
+    cache_resource = None
+
+    @cache_response()
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_response()
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -3,6 +3,8 @@ Serializers for API endpoints
 """
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from main.models import (
     Category, ClassifiedAd, AdImage, AdReview, AdFeature, AdPackage,
     Payment, UserPackage, SavedSearch, Notification, CustomField,
@@ -20,6 +22,21 @@ from content.models import (
 User = get_user_model()
 
 
+def count_subquery(queryset, field, outer='pk'):
+    """
+    Correlated COUNT of *queryset* rows whose *field* equals the outer row's
+    *outer* column (0 when there are none), for use in .annotate().
+    """
+    counts = (
+        queryset.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)  # one group per outer row
+        .annotate(c=Count('pk'))
+        .values('c')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
 # ==================== User Serializers ====================
 
 class UserListSerializer(serializers.ModelSerializer):
@@ -56,11 +73,28 @@ class UserDetailSerializer(serializers.ModelSerializer):
             'total_ads', 'active_ads', 'date_joined'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.annotate(
+            ads_total=count_subquery(ClassifiedAd.objects.all(), 'user'),
+            active_ads_total=count_subquery(ClassifiedAd.objects.filter(status='active'), 'user'),
+        )
+
+    def _ad_counts(self, obj):
+        if not hasattr(obj, 'ads_total'):
+            # Not loaded through setup_eager_loading (e.g. /users/me/): one query for both
+            counts = obj.classified_ads.aggregate(
+                total=Count('pk'), active=Count('pk', filter=Q(status='active'))
+            )
+            obj.ads_total = counts['total']
+            obj.active_ads_total = counts['active']
+        return obj.ads_total, obj.active_ads_total
+
     def get_total_ads(self, obj):
-        return obj.classified_ads.count()
+        return self._ad_counts(obj)[0]
 
     def get_active_ads(self, obj):
-        return obj.classified_ads.filter(status='active').count()
+        return self._ad_counts(obj)[1]
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -151,10 +185,21 @@ class CategoryListSerializer(serializers.ModelSerializer):
             'subcategories_count', 'ads_count', 'allow_cart'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.annotate(
+            subcategories_total=count_subquery(Category.objects.all(), 'parent'),
+            active_ads_total=count_subquery(ClassifiedAd.objects.filter(status='active'), 'category'),
+        )
+
     def get_subcategories_count(self, obj):
+        if hasattr(obj, 'subcategories_total'):
+            return obj.subcategories_total
         return obj.subcategories.count()
 
     def get_ads_count(self, obj):
+        if hasattr(obj, 'active_ads_total'):
+            return obj.active_ads_total
         return obj.classified_ads.filter(status='active').count()
 
 
@@ -174,9 +219,22 @@ class CategoryDetailSerializer(serializers.ModelSerializer):
             'subcategories', 'custom_fields'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related(
+            Prefetch(
+                'subcategories',
+                queryset=CategoryListSerializer.setup_eager_loading(Category.objects.all()),
+            )
+        )
+
     def get_custom_fields(self, obj):
         # Get custom fields for this category
-        category_fields = CategoryCustomField.objects.filter(category=obj)
+        category_fields = (
+            CategoryCustomField.objects.filter(category=obj)
+            .select_related('custom_field')
+            .prefetch_related('custom_field__field_options')
+        )
         return CustomFieldSerializer([cf.custom_field for cf in category_fields], many=True).data
 
 
@@ -219,8 +277,30 @@ class ClassifiedAdListSerializer(serializers.ModelSerializer):
             'is_favorited', 'views_count', 'created_at', 'expires_at'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset, request=None):
+        # A select_related('category') would win over the annotated prefetch below
+        queryset = queryset.select_related(None).select_related('user').prefetch_related(
+            Prefetch(
+                'category',
+                queryset=CategoryListSerializer.setup_eager_loading(Category.objects.all()),
+            ),
+            'images',  # AdImage is ordered by (order, id)
+        )
+        if request is not None and request.user.is_authenticated:
+            queryset = queryset.annotate(
+                favorited=Exists(
+                    WishlistItem.objects.filter(wishlist__user=request.user, ad=OuterRef('pk'))
+                )
+            )
+        return queryset
+
     def get_primary_image(self, obj):
-        image = obj.images.order_by('order').first()
+        if 'images' in getattr(obj, '_prefetched_objects_cache', {}):
+            images = obj.images.all()
+            image = images[0] if images else None
+        else:
+            image = obj.images.order_by('order').first()
         if image:
             request = self.context.get('request')
             if request:
@@ -228,6 +308,8 @@ class ClassifiedAdListSerializer(serializers.ModelSerializer):
         return None
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'favorited'):
+            return obj.favorited
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return WishlistItem.objects.filter(
@@ -330,7 +412,15 @@ class BlogCategorySerializer(serializers.ModelSerializer):
         model = BlogCategory
         fields = ['id', 'name', 'name_en', 'slug', 'description', 'icon', 'color', 'order', 'is_active', 'blogs_count']
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.annotate(
+            published_blogs_count=count_subquery(Blog.objects.filter(is_published=True), 'category')
+        )
+
     def get_blogs_count(self, obj):
+        if hasattr(obj, 'published_blogs_count'):
+            return obj.published_blogs_count
         return obj.get_blogs_count()
 
 
@@ -348,10 +438,29 @@ class BlogListSerializer(serializers.ModelSerializer):
             'published_date', 'views_count', 'likes_count', 'is_liked', 'is_published'
         ]
 
+    @staticmethod
+    def setup_eager_loading(queryset, request=None):
+        likes = Blog.likes.through.objects
+        queryset = queryset.select_related('author').prefetch_related(
+            Prefetch(
+                'category',
+                queryset=BlogCategorySerializer.setup_eager_loading(BlogCategory.objects.all()),
+            )
+        ).annotate(likes_total=count_subquery(likes.all(), 'blog'))
+        if request is not None and request.user.is_authenticated:
+            queryset = queryset.annotate(
+                liked=Exists(likes.filter(blog=OuterRef('pk'), user=request.user))
+            )
+        return queryset
+
     def get_likes_count(self, obj):
+        if hasattr(obj, 'likes_total'):
+            return obj.likes_total
         return obj.get_likes_count()
 
     def get_is_liked(self, obj):
+        if hasattr(obj, 'liked'):
+            return obj.liked
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.likes.filter(id=request.user.id).exists()
@@ -375,18 +484,17 @@ class BlogDetailSerializer(serializers.ModelSerializer):
             'likes_count', 'is_liked', 'is_published', 'comments', 'tags'
         ]
 
-    def get_comments(self, obj):
-        comments = obj.comments.filter(active=True, parent__isnull=True).select_related('author')
-        return CommentSerializer(comments, many=True, context=self.context).data
-
-    def get_likes_count(self, obj):
-        return obj.get_likes_count()
+    # Same annotations as the list (BlogViewSet loads both through it)
+    get_likes_count = BlogListSerializer.get_likes_count
+    get_is_liked = BlogListSerializer.get_is_liked
 
-    def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.id).exists()
-        return False
+    def get_comments(self, obj):
+        # Load the whole active thread at once; CommentSerializer nests replies from it
+        children = {}
+        for comment in obj.comments.filter(active=True).select_related('author').order_by('created_on', 'pk'):
+            children.setdefault(comment.parent_id, []).append(comment)
+        context = {**self.context, 'comment_children': children}
+        return CommentSerializer(children.get(None, []), many=True, context=context).data
 
     def get_tags(self, obj):
         return list(obj.tags.values_list('name', flat=True))
@@ -403,6 +511,9 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_on']
 
     def get_replies(self, obj):
+        children = self.context.get('comment_children')
+        if children is not None:
+            return CommentSerializer(children.get(obj.pk, []), many=True, context=self.context).data
         if obj.replies.exists():
             return CommentSerializer(obj.replies.filter(active=True).select_related('author'), many=True, context=self.context).data
         return []
@@ -436,12 +547,13 @@ class ChatRoomListSerializer(serializers.ModelSerializer):
         ]
 
     def get_last_message(self, obj):
-        last_msg = obj.messages.last()
-        if last_msg:
+        # Read from the room summary; the view selects last_message_sender
+        if obj.last_message_id:
+            sender = obj.last_message_sender
             return {
-                'message': last_msg.message,
-                'sender': last_msg.sender.username,
-                'created_at': last_msg.created_at
+                'message': obj.last_message_preview,
+                'sender': sender.username if sender else None,
+                'created_at': obj.last_activity_at
             }
         return None
 
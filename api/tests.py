@@ -1,9 +1,18 @@
 # API App Tests
+from unittest.mock import patch
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from content.models import Blog, BlogCategory, Comment, Country
+from main.models import AdImage, Category, ChatRoom, ClassifiedAd, Wishlist, WishlistItem
+from main.recommendations import refresh_recommendations
+from .views import CountryViewSet
+
 User = get_user_model()
 
 
@@ -48,3 +57,176 @@ class APITestCase(TestCase):
         response = self.client.get('/api/users/me/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['username'], 'testuser')
+
+
+class CatalogResponseCacheTests(TestCase):
+    """ETag / conditional GET on the cached catalog endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.country = Country.objects.create(name='مصر', name_en='Egypt', code='EG')
+
+    def test_repeat_request_is_served_from_cache_and_revalidates(self):
+        first = self.client.get('/api/countries/', HTTP_ACCEPT='application/json')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        etag = first['ETag']
+        self.assertIn('max-age=60', first['Cache-Control'])
+        self.assertIn('public', first['Cache-Control'])
+
+        with patch.object(CountryViewSet, 'get_queryset', side_effect=AssertionError('not cached')):
+            again = self.client.get('/api/countries/', HTTP_ACCEPT='application/json')
+            self.assertEqual(again.content, first.content)
+            not_modified = self.client.get(
+                '/api/countries/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], etag)
+        self.assertEqual(not_modified.content, b'')
+
+    def test_model_change_invalidates_cached_response(self):
+        etag = self.client.get('/api/countries/', HTTP_ACCEPT='application/json')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.country.name_en = 'Arab Republic of Egypt'
+            self.country.save()
+
+        response = self.client.get(
+            '/api/countries/', HTTP_ACCEPT='application/json', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Arab Republic of Egypt')
+
+    def test_category_ads_are_cached_per_user(self):
+        category = Category.objects.create(name='Cars', slug='cars', section_type=Category.SectionType.CLASSIFIED)
+        url = f'/api/categories/{category.pk}/ads/'
+
+        anonymous = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertIn('public', anonymous['Cache-Control'])
+
+        self.client.force_authenticate(user=User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345'))
+        signed_in = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(signed_in.status_code, status.HTTP_200_OK)
+        self.assertIn('private', signed_in['Cache-Control'])
+
+    def test_public_responses_do_not_depend_on_the_session_country(self):
+        first = self.client.get('/api/countries/', HTTP_ACCEPT='application/json')
+        session = self.client.session
+        session['selected_country'] = 'SA'
+        session.save()
+
+        # Same public entry whatever the session says
+        with patch.object(CountryViewSet, 'get_queryset', side_effect=AssertionError('not cached')):
+            again = self.client.get('/api/countries/', HTTP_ACCEPT='application/json')
+        self.assertEqual(again['ETag'], first['ETag'])
+        self.assertIn('public', again['Cache-Control'])
+
+
+class SerializerQueryCountTests(TestCase):
+    """List endpoints run a constant number of queries whatever the page size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='pass12345')
+        cls.seller = User.objects.create_user(username='seller', email='seller@example.com', password='pass12345')
+        cls.country = Country.objects.create(name='مصر', name_en='Egypt', code='EG')
+        parent = Category.objects.create(name='Vehicles', slug='vehicles', slug_ar='vehicles-ar', section_type=Category.SectionType.CLASSIFIED)
+        cls.categories = [
+            Category.objects.create(
+                name=f'Cars {i}', slug=f'cars-{i}', slug_ar=f'cars-ar-{i}', parent=parent, section_type=Category.SectionType.CLASSIFIED
+            )
+            for i in range(5)
+        ]
+        wishlist = Wishlist.objects.create(user=cls.user)
+        for i, category in enumerate(cls.categories):
+            ad = ClassifiedAd.objects.create(
+                user=cls.seller, category=category, title=f'Car {i}', price=1000 + i,
+                country=cls.country, city='Cairo', status=ClassifiedAd.AdStatus.ACTIVE,
+            )
+            AdImage.objects.create(ad=ad, image=f'ads/car-{i}.jpg')
+            if i % 2:
+                WishlistItem.objects.create(wishlist=wishlist, ad=ad)
+            ChatRoom.objects.create(publisher=cls.seller, client=cls.user, ad=ad)
+
+        cls.blog_categories = [BlogCategory.objects.create(name=f'Tips {i}', slug=f'tips-{i}') for i in range(5)]
+        cls.blogs = []
+        for i, blog_category in enumerate(cls.blog_categories):
+            blog = Blog.objects.create(
+                title=f'Buying guide {i}', slug=f'buying-guide-{i}', author=cls.seller,
+                content='...', category=blog_category,
+            )
+            blog.likes.add(cls.user)
+            cls.blogs.append(blog)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self.client.get(url, HTTP_ACCEPT='application/json')  # session / country set-up
+        separator = '&' if '?' in url else '?'
+        small = self.count_queries(f'{url}{separator}page_size=1')
+        large = self.count_queries(f'{url}{separator}page_size=5')
+        self.assertEqual(small, large, url)
+
+    def test_list_endpoints(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        for url in [
+            '/api/categories/',
+            '/api/ads/',
+            f'/api/categories/{self.categories[0].pk}/ads/',
+            '/api/blogs/',
+            '/api/blog-categories/',
+            '/api/chat-rooms/',
+        ]:
+            self.assertConstantQueries(url)
+
+        response = self.client.get('/api/ads/', HTTP_ACCEPT='application/json')
+        favorited = {ad['title']: ad['is_favorited'] for ad in response.data['results']}
+        self.assertEqual(favorited, {f'Car {i}': bool(i % 2) for i in range(5)})
+        self.assertEqual({ad['category']['ads_count'] for ad in response.data['results']}, {1})
+
+        response = self.client.get('/api/blogs/', HTTP_ACCEPT='application/json')
+        blog = response.data['results'][0]
+        self.assertEqual((blog['likes_count'], blog['is_liked'], blog['category']['blogs_count']), (1, True, 1))
+
+    def test_similar_ads(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        ad = ClassifiedAd.objects.get(title='Car 0')
+        # Normally computed by the ad_recommendations job
+        refresh_recommendations([ad.pk])
+        response = self.client.get(f'/api/ads/{ad.pk}/similar/', HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Sibling categories, nearest price first
+        self.assertEqual([item['title'] for item in response.data], [f'Car {i}' for i in range(1, 5)])
+        self.assertEqual([item['is_favorited'] for item in response.data], [True, False, True, False])
+
+        response = self.client.get(f'/api/ads/{ad.pk}/similar/?limit=2', HTTP_ACCEPT='application/json')
+        self.assertEqual(len(response.data), 2)
+
+    def test_user_detail_and_comment_tree(self):
+        self.client = APIClient()
+        response = self.client.get(f'/api/users/{self.seller.pk}/', HTTP_ACCEPT='application/json')
+        self.assertEqual((response.data['total_ads'], response.data['active_ads']), (5, 5))
+
+        shallow, deep = self.blogs[0], self.blogs[1]
+        Comment.objects.create(blog=shallow, author=self.user, body='First')
+        parent = None
+        for i in range(4):
+            parent = Comment.objects.create(blog=deep, author=self.user, body=f'Level {i}', parent=parent)
+        Comment.objects.create(blog=deep, author=self.user, body='Hidden', parent=parent, active=False)
+
+        self.assertEqual(
+            self.count_queries(f'/api/blogs/{shallow.pk}/'), self.count_queries(f'/api/blogs/{deep.pk}/')
+        )
+        comments = self.client.get(f'/api/blogs/{deep.pk}/', HTTP_ACCEPT='application/json').data['comments']
+        depth = 0
+        while comments:
+            self.assertEqual(len(comments), 1)
+            depth += 1
+            comments = comments[0]['replies']
+        self.assertEqual(depth, 4)
@@ -8,7 +8,7 @@ from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticate
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count, Avg, F
+from django.db.models import Q, Count, Avg
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.tokens import default_token_generator
@@ -23,6 +23,7 @@ from main.models import (
     ChatRoom, ChatMessage, FAQ, FAQCategory, SafetyTip, ContactMessage,
     AdTransaction, UserSubscription, PaidBanner
 )
+from main.recommendations import get_similar_ads
 from content.models import (
     Country, Blog, BlogCategory, Comment, HomeSlider,
     PaymentMethodConfig, SiteConfiguration, AboutPage, ContactPage,
@@ -69,6 +70,8 @@ from .serializers import (
     # Paid Banner serializers
     PaidBannerSerializer, PaidBannerCreateSerializer,
 )
+from .caching import CachedCatalogMixin, cache_response
+from .pagination import ChatInboxPagination
 from .permissions import IsOwnerOrReadOnly, IsAdOwnerOrReadOnly, IsPublisherOrClient
 from django.contrib.auth import get_user_model
 
@@ -100,6 +103,12 @@ class UserViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated()]
         return [IsAuthenticatedOrReadOnly()]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = UserDetailSerializer.setup_eager_loading(queryset)
+        return queryset
+
     def update(self, request, *args, **kwargs):
         if self.get_object().pk != request.user.pk and not request.user.is_staff:
             return Response({'detail': 'You can only update your own profile.'}, status=status.HTTP_403_FORBIDDEN)
@@ -128,7 +137,9 @@ class UserViewSet(viewsets.ModelViewSet):
     def ads(self, request, pk=None):
         """Get user's ads"""
         user = self.get_object()
-        ads = ClassifiedAd.objects.filter(user=user, status='active')
+        ads = ClassifiedAdListSerializer.setup_eager_loading(
+            ClassifiedAd.objects.filter(user=user, status='active'), request
+        )
         serializer = ClassifiedAdListSerializer(ads, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -143,10 +154,11 @@ class UserViewSet(viewsets.ModelViewSet):
 
 # ==================== Country ViewSets ====================
 
-class CountryViewSet(viewsets.ReadOnlyModelViewSet):
+class CountryViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     Country listing endpoint
     """
+    cache_resource = 'countries'
     queryset = Country.objects.filter(is_active=True)
     serializer_class = CountrySerializer
     permission_classes = [AllowAny]
@@ -158,10 +170,11 @@ class CountryViewSet(viewsets.ReadOnlyModelViewSet):
 
 # ==================== Category ViewSets ====================
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     Category listing endpoint
     """
+    cache_resource = 'categories'
     queryset = Category.objects.filter(is_active=True)
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -175,12 +188,16 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
             return CategoryDetailSerializer
         return CategoryListSerializer
 
+    def get_queryset(self):
+        return self.get_serializer_class().setup_eager_loading(super().get_queryset())
+
     @action(detail=True, methods=['get'])
+    @cache_response('category_ads', per_user=True)
     def ads(self, request, pk=None):
         """Get ads in this category"""
         category = self.get_object()
-        ads = ClassifiedAd.objects.filter(
-            category=category, status='active'
+        ads = ClassifiedAdListSerializer.setup_eager_loading(
+            ClassifiedAd.objects.filter(category=category, status='active'), request
         ).order_by('-created_at')
 
         # Apply filters
@@ -204,9 +221,12 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
+    @cache_response()
     def root_categories(self, request):
         """Get only root categories"""
-        categories = Category.objects.filter(parent__isnull=True, is_active=True).order_by('order')
+        categories = CategoryListSerializer.setup_eager_loading(
+            Category.objects.filter(parent__isnull=True, is_active=True)
+        ).order_by('order')
         section_type = request.query_params.get('section_type')
         if section_type:
             categories = categories.filter(section_type=section_type)
@@ -225,8 +245,9 @@ class ClassifiedAdViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'country', 'city', 'status', 'is_highlighted', 'is_urgent', 'is_pinned']
     search_fields = ['title', 'description']
-    ordering_fields = ['created_at', 'price', 'views_count']
-    ordering = ['-created_at']
+    ordering_fields = ['created_at', 'price', 'views_count', 'rank_score']
+    # Persisted listing rank: paid tier, then freshness and quality (main.ranking)
+    ordering = ['-rank_score']
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -244,6 +265,8 @@ class ClassifiedAdViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        if self.action not in ['create', 'update', 'partial_update', 'retrieve']:
+            queryset = ClassifiedAdListSerializer.setup_eager_loading(queryset, self.request)
 
         # Filter by price range
         min_price = self.request.query_params.get('min_price')
@@ -295,17 +318,30 @@ class ClassifiedAdViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Get similar ads (precomputed, see main.recommendations)"""
+        ad = self.get_object()
+        try:
+            limit = min(max(int(request.query_params.get('limit', 12)), 1), 50)
+        except ValueError:
+            limit = 12
+        queryset = ClassifiedAdListSerializer.setup_eager_loading(ClassifiedAd.objects.all(), request)
+        ads = get_similar_ads(ad, limit=limit, queryset=queryset)
+        serializer = ClassifiedAdListSerializer(ads, many=True, context={'request': request})
+        return Response(serializer.data)
+
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Get featured ads"""
-        ads = self.get_queryset().filter(is_highlighted=True)[:10]
+        ads = self.get_queryset().filter(is_highlighted=True).order_by('-rank_score')[:10]
         serializer = ClassifiedAdListSerializer(ads, many=True, context={'request': request})
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def urgent(self, request):
         """Get urgent ads"""
-        ads = self.get_queryset().filter(is_urgent=True)[:10]
+        ads = self.get_queryset().filter(is_urgent=True).order_by('-rank_score')[:10]
         serializer = ClassifiedAdListSerializer(ads, many=True, context={'request': request})
         return Response(serializer.data)
 
@@ -319,7 +355,9 @@ class ClassifiedAdViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_ads(self, request):
         """Get current user's ads"""
-        ads = ClassifiedAd.objects.filter(user=request.user).select_related('category', 'country').prefetch_related('images').order_by('-created_at')
+        ads = ClassifiedAdListSerializer.setup_eager_loading(
+            ClassifiedAd.objects.filter(user=request.user), request
+        ).order_by('-created_at')
 
         page = self.paginate_queryset(ads)
         if page is not None:
@@ -341,12 +379,15 @@ class BlogCategoryViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
     ordering = ['order']
 
+    def get_queryset(self):
+        return BlogCategorySerializer.setup_eager_loading(super().get_queryset())
+
 
 class BlogViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Blog listing endpoint
     """
-    queryset = Blog.objects.filter(is_published=True).select_related('author', 'category').prefetch_related('likes')
+    queryset = Blog.objects.filter(is_published=True)
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'author']
@@ -359,6 +400,10 @@ class BlogViewSet(viewsets.ReadOnlyModelViewSet):
             return BlogDetailSerializer
         return BlogListSerializer
 
+    def get_queryset(self):
+        # Both serializers read the likes / category annotations
+        return BlogListSerializer.setup_eager_loading(super().get_queryset(), self.request)
+
     def retrieve(self, request, *args, **kwargs):
         """Increment view count when retrieving blog"""
         instance = self.get_object()
@@ -395,6 +440,7 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
     """
     queryset = ChatRoom.objects.filter(is_active=True)
     permission_classes = [IsAuthenticated]
+    pagination_class = ChatInboxPagination
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -411,7 +457,9 @@ class ChatRoomViewSet(viewsets.ModelViewSet):
         return ChatRoom.objects.filter(
             Q(publisher=user) | Q(client=user),
             is_active=True
-        ).select_related('publisher', 'client', 'ad').order_by('-updated_at')
+        ).select_related(
+            'publisher', 'client', 'ad', 'last_message_sender'
+        ).order_by('-last_activity_at', '-id')
 
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
@@ -538,19 +586,21 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
 
 # ==================== Package & Payment ViewSets ====================
 
-class AdFeatureViewSet(viewsets.ReadOnlyModelViewSet):
+class AdFeatureViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     Ad features listing endpoint
     """
+    cache_resource = 'ad_features'
     queryset = AdFeature.objects.filter(is_active=True)
     serializer_class = AdFeatureSerializer
     permission_classes = [AllowAny]
 
 
-class AdPackageViewSet(viewsets.ReadOnlyModelViewSet):
+class AdPackageViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     Ad packages listing endpoint
     """
+    cache_resource = 'ad_packages'
     queryset = AdPackage.objects.filter(is_active=True)
     serializer_class = AdPackageSerializer
     permission_classes = [AllowAny]
@@ -912,20 +962,22 @@ class UserPackageViewSet(viewsets.ReadOnlyModelViewSet):
 
 # ==================== FAQ ViewSets ====================
 
-class FAQCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class FAQCategoryViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     FAQ categories endpoint
     """
+    cache_resource = 'faqs'
     queryset = FAQCategory.objects.filter(is_active=True)
     serializer_class = FAQCategorySerializer
     permission_classes = [AllowAny]
     ordering = ['order']
 
 
-class FAQViewSet(viewsets.ReadOnlyModelViewSet):
+class FAQViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     FAQ endpoint
     """
+    cache_resource = 'faqs'
     queryset = FAQ.objects.filter(is_active=True)
     serializer_class = FAQSerializer
     permission_classes = [AllowAny]
@@ -937,10 +989,11 @@ class FAQViewSet(viewsets.ReadOnlyModelViewSet):
 
 # ==================== Safety Tips ViewSets ====================
 
-class SafetyTipViewSet(viewsets.ReadOnlyModelViewSet):
+class SafetyTipViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     Safety tips endpoint
     """
+    cache_resource = 'safety_tips'
     queryset = SafetyTip.objects.filter(is_active=True)
     serializer_class = SafetyTipSerializer
     permission_classes = [AllowAny]
@@ -973,10 +1026,11 @@ class ContactMessageViewSet(viewsets.ModelViewSet):
 
 # ==================== Home Page ViewSets ====================
 
-class HomeSliderViewSet(viewsets.ReadOnlyModelViewSet):
+class HomeSliderViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """
     Home page slider endpoint
     """
+    cache_resource = 'home_sliders'
     queryset = HomeSlider.objects.filter(is_active=True)
     serializer_class = HomeSliderSerializer
     permission_classes = [AllowAny]
@@ -1150,19 +1204,23 @@ class HomeAPIView(APIView):
         ]
 
         # Latest ads
-        latest_ads_qs = ClassifiedAd.objects.active_for_country(country_code)[:latest_limit]
+        latest_ads_qs = ClassifiedAdListSerializer.setup_eager_loading(
+            ClassifiedAd.objects.active_for_country(country_code), request
+        )[:latest_limit]
 
         # Featured ads (fall back to latest if empty)
-        featured_ads_qs = ClassifiedAd.objects.featured_for_country(country_code)[:featured_limit]
+        featured_ads_qs = ClassifiedAdListSerializer.setup_eager_loading(
+            ClassifiedAd.objects.featured_for_country(country_code), request
+        )[:featured_limit]
         if not featured_ads_qs.exists():
-            featured_ads_qs = ClassifiedAd.objects.active_for_country(country_code)[:featured_limit]
+            featured_ads_qs = ClassifiedAdListSerializer.setup_eager_loading(
+                ClassifiedAd.objects.active_for_country(country_code), request
+            )[:featured_limit]
 
         # Latest blogs
-        latest_blogs_qs = (
-            Blog.objects.filter(is_published=True)
-            .order_by('-published_date')
-            .select_related('author', 'category')
-        )[:blogs_limit]
+        latest_blogs_qs = BlogListSerializer.setup_eager_loading(
+            Blog.objects.filter(is_published=True), request
+        ).order_by('-published_date')[:blogs_limit]
 
         return Response({
             'home_page': HomePageSerializer(home_page, context={'request': request}).data,
@@ -1328,13 +1386,17 @@ class PaidBannerViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'], permission_classes=[AllowAny])
     def track_click(self, request, pk=None):
         """Increment the click counter for an active paid ad."""
-        ad = get_object_or_404(
-            PaidBanner,
-            pk=pk,
-            status=PaidBanner.Status.ACTIVE,
-            is_active=True,
-        )
-        PaidBanner.objects.filter(pk=ad.pk).update(clicks_count=F('clicks_count') + 1)
+        from main.banner_index import get_banner_index, record_banner_click
+
+        ad_id = int(pk) if str(pk).isdigit() else None
+        if ad_id not in get_banner_index().banners_by_id:
+            ad_id = get_object_or_404(
+                PaidBanner,
+                pk=pk,
+                status=PaidBanner.Status.ACTIVE,
+                is_active=True,
+            ).pk
+        record_banner_click(ad_id)
         return Response({'status': 'tracked'})
 
 
@@ -14,6 +14,7 @@ from .models import (
     Country,
     HomeSlider,
     Newsletter,
+    NewsletterCampaign,
     SiteConfiguration,
     AboutPage,
     AboutPageSection,
@@ -980,6 +981,32 @@ class PaymentMethodConfigAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+@admin.register(NewsletterCampaign)
+class NewsletterCampaignAdmin(admin.ModelAdmin):
+    """Read-only delivery log for newsletter campaigns"""
+
+    list_display = [
+        "id",
+        "channel",
+        "subject",
+        "status",
+        "sent_count",
+        "failed_count",
+        "last_subscriber_id",
+        "created_at",
+        "finished_at",
+    ]
+    list_filter = ["channel", "status", "created_at"]
+    search_fields = ["subject"]
+    list_per_page = 50
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Newsletter)
 class NewsletterAdmin(admin.ModelAdmin):
     """Admin interface for Newsletter subscriptions"""
@@ -1,18 +1,17 @@
-from content.models import Country, HomeSlider
+from content.models import HomeSlider
 from main.models import Notification, CustomPage
 from constance import config
 from django.db import models
 from content.verification_utils import get_verification_requirements
 from content.site_config import SiteConfiguration
+from main.registries import get_active_countries, get_category_tree, get_country
 
 
 def countries(request):
     """
     Context processor to make countries available in all templates
     """
-    return {
-        "countries": Country.objects.filter(is_active=True).order_by("order", "name")
-    }
+    return {"countries": get_active_countries()}
 
 
 def home_sliders(request):
@@ -22,15 +21,15 @@ def home_sliders(request):
     """
     selected_country = request.session.get("selected_country", "EG")
 
-    try:
-        country = Country.objects.get(code=selected_country, is_active=True)
+    country = get_country(selected_country)
+    if country is not None:
         # Get sliders for selected country or sliders without country (legacy/global)
         sliders = (
             HomeSlider.objects.filter(is_active=True)
             .filter(models.Q(country=country) | models.Q(country__isnull=True))
             .order_by("order")
         )
-    except Country.DoesNotExist:
+    else:
         # Fallback to sliders without country assignment
         sliders = HomeSlider.objects.filter(
             is_active=True, country__isnull=True
@@ -46,11 +45,9 @@ def user_preferences(request):
     selected_country = request.session.get("selected_country", "EG")
 
     # Get currency for selected country
-    try:
-        country = Country.objects.get(code=selected_country, is_active=True)
-        currency = country.currency or "EGP"
-    except Country.DoesNotExist:
-        currency = "EGP"  # Default to EGP if country not found
+    country = get_country(selected_country)
+    # Default to EGP if country not found
+    currency = (country.currency if country is not None else None) or "EGP"
 
     return {
         "selected_country": selected_country,
@@ -62,29 +59,16 @@ def header_categories(request):
     """
     Context processor to make classified ad categories available in header
     """
-    from main.models import Category
-
     selected_country = request.session.get("selected_country", "EG")
 
-    # Get classified ad subcategories for the header
-    # First find the classified root category, then show its children
-    from django.db import models as db_models
-    from content.models import Country
-
-    try:
-        country = Country.objects.get(code=selected_country, is_active=True)
-        # Show main (root) categories in the header
-        categories = Category.objects.filter(
-            parent__isnull=True,
-            is_active=True,
-            section_type="classified",
-        ).filter(
-            db_models.Q(country=country)
-            | db_models.Q(countries=country)
-            | db_models.Q(country__isnull=True, countries__isnull=True)
-        ).order_by("order", "name")[:20]
-    except Country.DoesNotExist:
-        categories = Category.objects.none()
+    # Main (root) classified categories shown in the selected country, from
+    # the in-memory category tree
+    country = get_country(selected_country)
+    if country is not None:
+        roots = get_category_tree().roots_for(country.pk, section_type="classified")
+        categories = [node.category for node in roots[:20]]
+    else:
+        categories = []
 
     return {
         "header_categories": categories,
@@ -246,6 +230,7 @@ def paid_advertisements(request):
     Context processor to make paid banners and AdSense slots available in all templates.
     Banners are filtered by current page key so target_pages targeting is respected.
     """
+    from main.banner_index import get_banner_index
     from main.models import AdSenseSlot, PaidBanner
 
     selected_country = request.session.get("selected_country", "EG")
@@ -262,17 +247,20 @@ def paid_advertisements(request):
     # AdSense slots — keyed by slot_key, filtered by country
     context["adsense_slots"] = AdSenseSlot.get_active_slots(country_code=selected_country)
 
-    # All active ads for this page (respects target_pages targeting)
-    page_ads = PaidBanner.get_active_ads(
-        country_code=selected_country,
-        page_key=page_key,
-    )
+    # All active ads for this page (respects target_pages targeting),
+    # served from the in-memory banner index instead of a per-request query
+    index = get_banner_index()
+    banners = index.for_page(selected_country, page_key, PaidBanner.AdType.BANNER)
+    featured = index.for_page(selected_country, page_key, PaidBanner.AdType.FEATURED_BOX)
 
-    context["homepage_paid_ads"] = page_ads.filter(
-        ad_type__in=[PaidBanner.AdType.FEATURED_BOX, PaidBanner.AdType.BANNER]
+    context["homepage_paid_ads"] = sorted(
+        featured + banners,
+        key=lambda ad: (-ad.priority, ad.order, -ad.created_at.timestamp()),
     )
-    context["sidebar_paid_ads"] = page_ads.filter(ad_type=PaidBanner.AdType.SIDEBAR)[:3]
-    context["banner_paid_ads"] = page_ads.filter(ad_type=PaidBanner.AdType.BANNER)[:2]
+    context["sidebar_paid_ads"] = index.for_page(
+        selected_country, page_key, PaidBanner.AdType.SIDEBAR
+    )[:3]
+    context["banner_paid_ads"] = banners[:2]
 
     # Custom pages for navbar and footer
     active_pages = CustomPage.objects.filter(is_active=True)
@@ -129,6 +129,7 @@ class Command(BaseCommand):
                     content_subject=subject,
                     content_html=html_content,
                     content_plain=text_content,
+                    background=False,
                 )
 
                 if result["success"]:
@@ -167,7 +168,9 @@ class Command(BaseCommand):
                 self.style.SUCCESS("SMS send is available for live mode only.")
             )
         else:
-            result = send_sms_newsletter_to_all(content_message=sms_message)
+            result = send_sms_newsletter_to_all(
+                content_message=sms_message, background=False
+            )
 
             if result["success"]:
                 self.stdout.write(
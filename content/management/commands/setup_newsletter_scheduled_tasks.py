@@ -13,6 +13,7 @@ class Command(BaseCommand):
     TASK_NAMES = [
         "Weekly Newsletter Email",
         "Weekly Newsletter SMS",
+        "Resume Stalled Newsletter Campaigns",
     ]
 
     def add_arguments(self, parser):
@@ -54,7 +55,16 @@ class Command(BaseCommand):
                 "schedule_type": Schedule.WEEKLY,
                 "repeats": -1,
                 "next_run": next_run,
-            }
+            },
+            {
+                # Picks up campaigns whose batch task was killed mid-run
+                "func": "content.tasks.resume_stalled_newsletter_campaigns_task",
+                "name": "Resume Stalled Newsletter Campaigns",
+                "schedule_type": Schedule.MINUTES,
+                "minutes": 10,
+                "repeats": -1,
+                "next_run": now,
+            },
         ]
 
         if with_sms:
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0037_add_tube_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsletterCampaign',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(choices=[('email', 'بريد إلكتروني'), ('sms', 'رسالة نصية')], max_length=10, verbose_name='القناة')),
+                ('subject', models.CharField(blank=True, max_length=255, verbose_name='العنوان')),
+                ('html_body', models.TextField(blank=True, verbose_name='محتوى HTML')),
+                ('plain_body', models.TextField(blank=True, verbose_name='المحتوى النصي')),
+                ('status', models.CharField(choices=[('pending', 'قيد الانتظار'), ('running', 'جاري الإرسال'), ('completed', 'مكتملة'), ('failed', 'فشلت')], db_index=True, default='pending', max_length=10, verbose_name='الحالة')),
+                ('last_subscriber_id', models.PositiveBigIntegerField(default=0, verbose_name='آخر مشترك تمت معالجته')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='تم الإرسال')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='فشل الإرسال')),
+                ('failed_subscriber_ids', models.JSONField(blank=True, default=list, verbose_name='المشتركون الذين فشل الإرسال لهم')),
+                ('error', models.TextField(blank=True, verbose_name='الخطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='بدء الإرسال')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='انتهاء الإرسال')),
+            ],
+            options={
+                'verbose_name': 'حملة النشرة البريدية',
+                'verbose_name_plural': 'حملات النشرة البريدية',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0038_newsletter_campaigns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newslettercampaign',
+            name='checkpoint_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='آخر نقطة استئناف'),
+        ),
+    ]
@@ -762,6 +762,66 @@ class Newsletter(models.Model):
         self.save(update_fields=["last_notification_sent", "updated_at"])
 
 
+class NewsletterCampaign(models.Model):
+    """
+    One newsletter delivery run and its progress checkpoint.
+    حملة إرسال نشرة بريدية مع نقطة استئناف الإرسال
+
+    Subscribers are delivered in primary-key order; last_subscriber_id is the
+    highest subscriber already handled, so a retried campaign resumes after it
+    instead of starting over. checkpoint_at is when the run last moved; a
+    RUNNING campaign whose checkpoint_at is old lost its worker and is queued
+    again by the stalled-campaign sweep.
+    """
+
+    class Channel(models.TextChoices):
+        EMAIL = "email", _("بريد إلكتروني")
+        SMS = "sms", _("رسالة نصية")
+
+    class Status(models.TextChoices):
+        PENDING = "pending", _("قيد الانتظار")
+        RUNNING = "running", _("جاري الإرسال")
+        COMPLETED = "completed", _("مكتملة")
+        FAILED = "failed", _("فشلت")
+
+    channel = models.CharField(
+        max_length=10, choices=Channel.choices, verbose_name=_("القناة")
+    )
+    subject = models.CharField(max_length=255, blank=True, verbose_name=_("العنوان"))
+    html_body = models.TextField(blank=True, verbose_name=_("محتوى HTML"))
+    plain_body = models.TextField(blank=True, verbose_name=_("المحتوى النصي"))
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True,
+        verbose_name=_("الحالة"),
+    )
+    last_subscriber_id = models.PositiveBigIntegerField(
+        default=0, verbose_name=_("آخر مشترك تمت معالجته")
+    )
+    sent_count = models.PositiveIntegerField(default=0, verbose_name=_("تم الإرسال"))
+    failed_count = models.PositiveIntegerField(default=0, verbose_name=_("فشل الإرسال"))
+    failed_subscriber_ids = models.JSONField(
+        default=list, blank=True, verbose_name=_("المشتركون الذين فشل الإرسال لهم")
+    )
+    error = models.TextField(blank=True, verbose_name=_("الخطأ"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("تاريخ الإنشاء"))
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name=_("بدء الإرسال"))
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name=_("انتهاء الإرسال"))
+    checkpoint_at = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("آخر نقطة استئناف")
+    )
+
+    class Meta:
+        verbose_name = _("حملة النشرة البريدية")
+        verbose_name_plural = _("حملات النشرة البريدية")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.get_channel_display()} #{self.pk} ({self.get_status_display()})"
+
+
 # ──────────────────────────────────────────────────────────────────────────────
 # إدريسي تيوب
 # ──────────────────────────────────────────────────────────────────────────────
@@ -0,0 +1,477 @@
+"""
+Newsletter delivery engine
+محرك إرسال النشرة البريدية
+
+A campaign walks its subscribers in primary-key order, in keyset pages of
+BATCH_SIZE, so memory stays flat however large the list is:
+
+* email: one personalised message per subscriber, all sent over a single
+  reused SMTP/SendGrid connection, paced to RATE_PER_SECOND. Refused
+  recipients and 5xx replies are recorded as failed; 4xx replies
+  (greylisting, mailbox busy) stop the run at the checkpoint so a retry
+  sends to that subscriber again;
+* SMS: each batch is fanned out over a bounded thread pool (SMS_WORKERS)
+  sharing the same pacing.
+
+Progress is tracked per subscriber and written to the campaign row
+(last_subscriber_id, counters, failed ids, checkpoint_at) after every batch
+and whenever the run aborts, so a retried campaign resumes after the last
+handled subscriber instead of mailing everyone again.
+
+In the background (start_campaign) every batch is its own Django-Q task,
+deliver_campaign_batch, with a timeout sized to the batch; it queues the
+next batch from the new checkpoint when it is done. A batch task killed
+part-way leaves the campaign RUNNING with an old checkpoint_at, and
+resume_stalled_campaigns (scheduled) queues it again from the checkpoint.
+run_campaign delivers a whole campaign in the calling process (management
+command, queue unavailable).
+
+Settings (all optional):
+
+    NEWSLETTER_DELIVERY = {
+        "BATCH_SIZE": 100,        # subscribers per checkpoint / task
+        "RATE_PER_SECOND": 10,    # messages per second, 0 = unthrottled
+        "SMS_WORKERS": 4,         # concurrent SMS provider calls
+        "STALL_AFTER": 600,       # seconds without a checkpoint before a
+                                  # running campaign is queued again
+    }
+"""
+
+import logging
+import re
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_DEFAULTS = {
+    "BATCH_SIZE": 100,
+    "RATE_PER_SECOND": 10,
+    "SMS_WORKERS": 4,
+    "STALL_AFTER": 600,
+}
+
+# Held while a batch task runs, so a re-delivered task does not send it twice
+BATCH_LOCK_KEY = "newsletter_batch:{campaign_id}:{checkpoint}"
+# Seconds allowed per batch task on top of the paced sending time
+BATCH_TIMEOUT_MARGIN = 30
+
+# Keep the stored failure list bounded; the counter stays exact
+MAX_FAILED_IDS = 1000
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(email|phone)\s*\}\}")
+
+
+class DeliveryConfigError(Exception):
+    """The channel cannot be used (provider missing or not configured)."""
+
+
+def delivery_settings():
+    options = dict(DELIVERY_DEFAULTS)
+    options.update(getattr(settings, "NEWSLETTER_DELIVERY", {}) or {})
+    return options
+
+
+def personalize(text, subscriber):
+    """Fill {{ email }} / {{ phone }} placeholders for one subscriber."""
+    if not text:
+        return text
+    return _PLACEHOLDER.sub(lambda m: getattr(subscriber, m.group(1), "") or "", text)
+
+
+class Throttle:
+    """Spaces calls at least 1/rate seconds apart; shared safely between threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                time.sleep(self._next - now)
+                now = self._next
+            self._next = now + self.interval
+
+
+def batch_timeout(options=None):
+    """Seconds a batch task may run: one batch at the configured rate plus a margin."""
+    options = options or delivery_settings()
+    rate = options["RATE_PER_SECOND"]
+    sending = options["BATCH_SIZE"] / rate if rate else 0
+    return int(sending) + BATCH_TIMEOUT_MARGIN
+
+
+class CampaignProgress:
+    """In-memory per-subscriber checkpoint, flushed to the campaign row."""
+
+    def __init__(self, campaign):
+        self.campaign = campaign
+        self.last_id = campaign.last_subscriber_id
+        self.sent_ids = []
+        self.failed_ids = []
+
+    def sent(self, subscriber_id):
+        self.sent_ids.append(subscriber_id)
+        self.last_id = subscriber_id
+
+    def failed(self, subscriber_id):
+        self.failed_ids.append(subscriber_id)
+        self.last_id = subscriber_id
+
+    def flush(self):
+        if self.last_id == self.campaign.last_subscriber_id:
+            return
+        from .models import Newsletter
+
+        campaign = self.campaign
+        campaign.last_subscriber_id = self.last_id
+        campaign.checkpoint_at = timezone.now()
+        campaign.sent_count += len(self.sent_ids)
+        campaign.failed_count += len(self.failed_ids)
+        room = MAX_FAILED_IDS - len(campaign.failed_subscriber_ids)
+        if room > 0:
+            campaign.failed_subscriber_ids = (
+                campaign.failed_subscriber_ids + self.failed_ids[:room]
+            )
+        with transaction.atomic():
+            if self.sent_ids:
+                Newsletter.objects.filter(pk__in=self.sent_ids).update(
+                    last_notification_sent=timezone.now()
+                )
+            campaign.save(
+                update_fields=[
+                    "last_subscriber_id",
+                    "checkpoint_at",
+                    "sent_count",
+                    "failed_count",
+                    "failed_subscriber_ids",
+                ]
+            )
+        self.sent_ids = []
+        self.failed_ids = []
+
+
+def _pending_subscribers(campaign, batch_size):
+    """The next *batch_size* subscribers after the campaign's checkpoint."""
+    from .models import Newsletter
+
+    queryset = Newsletter.objects.filter(
+        is_active=True, pk__gt=campaign.last_subscriber_id
+    )
+    if campaign.channel == campaign.Channel.SMS:
+        queryset = queryset.filter(receive_sms=True).exclude(phone="")
+        fields = ("pk", "email", "phone")
+    else:
+        queryset = queryset.filter(receive_email=True)
+        fields = ("pk", "email")
+    return queryset.order_by("pk").only(*fields)[:batch_size]
+
+
+def _pending_batches(campaign, batch_size, max_batches=None):
+    # Each page starts after the checkpoint the previous batch flushed
+    handled = 0
+    while max_batches is None or handled < max_batches:
+        batch = list(_pending_subscribers(campaign, batch_size))
+        if not batch:
+            return
+        handled += 1
+        yield batch
+
+
+# ---------------------------------------------------------------------------
+# Channels
+# ---------------------------------------------------------------------------
+
+
+def _deliver_email(campaign, progress, options, batches):
+    throttle = Throttle(options["RATE_PER_SECOND"])
+    plain_body = campaign.plain_body or strip_tags(campaign.html_body)
+    connection = get_connection(fail_silently=False)
+    connection.open()
+    try:
+        for batch in batches:
+            try:
+                for subscriber in batch:
+                    message = EmailMultiAlternatives(
+                        subject=personalize(campaign.subject, subscriber),
+                        body=personalize(plain_body, subscriber),
+                        from_email=settings.DEFAULT_FROM_EMAIL,
+                        to=[subscriber.email],
+                        connection=connection,
+                    )
+                    if campaign.html_body:
+                        message.attach_alternative(
+                            personalize(campaign.html_body, subscriber), "text/html"
+                        )
+                    throttle.wait()
+                    try:
+                        message.send()
+                    except smtplib.SMTPSenderRefused:
+                        raise
+                    except smtplib.SMTPResponseException as e:
+                        if e.smtp_code < 500:
+                            # Transient: stop before this subscriber
+                            raise
+                        _rejected(progress, subscriber, e)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        _rejected(progress, subscriber, e)
+                    else:
+                        progress.sent(subscriber.pk)
+            finally:
+                progress.flush()
+    finally:
+        connection.close()
+
+
+def _rejected(progress, subscriber, error):
+    # Permanently rejected address: record it and keep going
+    logger.warning(f"Newsletter email to {subscriber.email} rejected: {error}")
+    progress.failed(subscriber.pk)
+
+
+def _twilio_sender():
+    provider = getattr(settings, "SMS_PROVIDER", None)
+    if not provider:
+        raise DeliveryConfigError("SMS provider not configured")
+    if provider.lower() != "twilio":
+        raise DeliveryConfigError(f"Unknown SMS provider: {provider}")
+    try:
+        from twilio.rest import Client
+    except ImportError as e:
+        raise DeliveryConfigError("Twilio library not installed") from e
+
+    account_sid = getattr(settings, "TWILIO_ACCOUNT_SID", "")
+    auth_token = getattr(settings, "TWILIO_AUTH_TOKEN", "")
+    from_number = getattr(settings, "TWILIO_FROM_NUMBER", "")
+    if not all([account_sid, auth_token, from_number]):
+        raise DeliveryConfigError("Twilio credentials not configured")
+
+    client = Client(account_sid, auth_token)
+
+    def send(to_number, body):
+        client.messages.create(body=body, from_=from_number, to=to_number)
+
+    return send
+
+
+def _deliver_sms(campaign, progress, options, batches, sender=None):
+    send = sender or _twilio_sender()
+    throttle = Throttle(options["RATE_PER_SECOND"])
+
+    def deliver(subscriber):
+        throttle.wait()
+        try:
+            send(subscriber.phone, personalize(campaign.plain_body, subscriber))
+            return True
+        except Exception as e:
+            logger.error(f"Error sending SMS to {subscriber.phone}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max(1, options["SMS_WORKERS"])) as pool:
+        for batch in batches:
+            try:
+                # map() keeps subscriber order, so the checkpoint stays monotonic
+                for subscriber, ok in zip(batch, pool.map(deliver, batch), strict=True):
+                    (progress.sent if ok else progress.failed)(subscriber.pk)
+            finally:
+                progress.flush()
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+
+def run_campaign(campaign_id, sms_sender=None, max_batches=None):
+    """
+    Deliver (or resume) a campaign, at most *max_batches* batches of it.
+    Returns {"success", "sent_count", "failed_count", "campaign_id",
+    "last_subscriber_id", "message"}, plus "more": True when batches remain
+    (the campaign stays RUNNING); the counts cover the whole campaign,
+    including earlier attempts.
+    """
+    from .models import NewsletterCampaign
+
+    campaign = NewsletterCampaign.objects.get(pk=campaign_id)
+    if campaign.status == NewsletterCampaign.Status.COMPLETED:
+        return _result(campaign, True, "Campaign already completed")
+
+    options = delivery_settings()
+    campaign.status = NewsletterCampaign.Status.RUNNING
+    campaign.started_at = campaign.started_at or timezone.now()
+    campaign.checkpoint_at = timezone.now()
+    campaign.error = ""
+    campaign.save(update_fields=["status", "started_at", "checkpoint_at", "error"])
+
+    progress = CampaignProgress(campaign)
+    batches = _pending_batches(campaign, options["BATCH_SIZE"], max_batches)
+    try:
+        if campaign.channel == NewsletterCampaign.Channel.SMS:
+            _deliver_sms(campaign, progress, options, batches, sender=sms_sender)
+        else:
+            _deliver_email(campaign, progress, options, batches)
+    except Exception as e:
+        logger.error(
+            f"❌ Newsletter campaign #{campaign.pk} stopped after subscriber "
+            f"{campaign.last_subscriber_id}: {e}",
+            exc_info=not isinstance(e, DeliveryConfigError),
+        )
+        campaign.status = NewsletterCampaign.Status.FAILED
+        campaign.error = str(e)
+        campaign.save(update_fields=["status", "error"])
+        return _result(campaign, False, str(e))
+
+    if max_batches and _pending_subscribers(campaign, 1).exists():
+        return dict(_result(campaign, True, "Batch delivered"), more=True)
+
+    campaign.status = NewsletterCampaign.Status.COMPLETED
+    campaign.finished_at = timezone.now()
+    campaign.save(update_fields=["status", "finished_at"])
+    logger.info(
+        f"✅ Newsletter campaign #{campaign.pk} ({campaign.channel}) sent to "
+        f"{campaign.sent_count} subscribers, {campaign.failed_count} failed"
+    )
+    return _result(
+        campaign,
+        True,
+        f"Newsletter sent to {campaign.sent_count} subscribers"
+        if campaign.sent_count or campaign.failed_count
+        else "No active subscribers found",
+    )
+
+
+def _result(campaign, success, message):
+    return {
+        "success": success,
+        "sent_count": campaign.sent_count,
+        "failed_count": campaign.failed_count,
+        "campaign_id": campaign.pk,
+        "last_subscriber_id": campaign.last_subscriber_id,
+        "message": message,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Background delivery: one Django-Q task per batch
+# ---------------------------------------------------------------------------
+
+
+def _queue_batch(campaign_id, checkpoint):
+    """Queue the batch after *checkpoint*; False if the queue is unavailable."""
+    try:
+        from django_q.tasks import async_task
+
+        async_task(
+            "content.newsletter_delivery.deliver_campaign_batch",
+            campaign_id,
+            checkpoint,
+            task_name=f"newsletter_campaign_{campaign_id}_{checkpoint}",
+            timeout=batch_timeout(),
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Could not queue newsletter campaign #{campaign_id}: {e}")
+        return False
+
+
+def start_campaign(campaign_id):
+    """
+    Deliver (or resume) a campaign in the background, one batch per task;
+    delivered here if the queue is unavailable. Returns the run_campaign
+    result shape with "queued": True when it was handed to the queue.
+    """
+    from .models import NewsletterCampaign
+
+    campaign = NewsletterCampaign.objects.get(pk=campaign_id)
+    if campaign.status == NewsletterCampaign.Status.COMPLETED:
+        return _result(campaign, True, "Campaign already completed")
+
+    campaign.status = NewsletterCampaign.Status.RUNNING
+    campaign.started_at = campaign.started_at or timezone.now()
+    campaign.checkpoint_at = timezone.now()
+    campaign.error = ""
+    campaign.save(update_fields=["status", "started_at", "checkpoint_at", "error"])
+    if not _queue_batch(campaign.pk, campaign.last_subscriber_id):
+        return run_campaign(campaign.pk)
+    campaign.refresh_from_db()
+    return dict(_result(campaign, True, "Newsletter campaign queued"), queued=True)
+
+
+def deliver_campaign_batch(campaign_id, checkpoint):
+    """
+    Django-Q task: deliver the batch after *checkpoint* and queue the next
+    one. A copy of the task for a batch already delivered (or still being
+    delivered) does nothing.
+    """
+    from .models import NewsletterCampaign
+
+    row = (
+        NewsletterCampaign.objects.filter(pk=campaign_id)
+        .values_list("status", "last_subscriber_id")
+        .first()
+    )
+    if row is None:
+        return {
+            "success": False,
+            "campaign_id": campaign_id,
+            "message": "Campaign not found",
+        }
+    status, last_subscriber_id = row
+    lock = BATCH_LOCK_KEY.format(campaign_id=campaign_id, checkpoint=checkpoint)
+    if (
+        status != NewsletterCampaign.Status.RUNNING
+        or last_subscriber_id != checkpoint
+        or not cache.add(lock, True, batch_timeout())
+    ):
+        return {
+            "success": True,
+            "campaign_id": campaign_id,
+            "skipped": True,
+            "message": "Batch already handled",
+        }
+
+    result = run_campaign(campaign_id, max_batches=1)
+    if result.get("more") and not _queue_batch(
+        campaign_id, result["last_subscriber_id"]
+    ):
+        result = run_campaign(campaign_id)
+    return result
+
+
+def resume_stalled_campaigns(now=None):
+    """
+    Queue again the RUNNING campaigns whose checkpoint has not moved for
+    STALL_AFTER seconds (their batch task was killed); the number queued.
+    """
+    from .models import NewsletterCampaign
+
+    now = now or timezone.now()
+    stalled = NewsletterCampaign.objects.filter(
+        status=NewsletterCampaign.Status.RUNNING,
+        checkpoint_at__lt=now - timedelta(seconds=delivery_settings()["STALL_AFTER"]),
+    ).values_list("pk", "last_subscriber_id")
+    queued = 0
+    for campaign_id, checkpoint in stalled:
+        logger.warning(
+            f"Newsletter campaign #{campaign_id} stalled after subscriber {checkpoint}, queuing it again"
+        )
+        # Mark the restart so the next sweep waits for this batch
+        NewsletterCampaign.objects.filter(pk=campaign_id).update(checkpoint_at=now)
+        if _queue_batch(campaign_id, checkpoint):
+            queued += 1
+    return queued
@@ -59,63 +59,39 @@ def send_newsletter_confirmation_email(newsletter_id):
         raise
 
 
-def send_newsletter_to_all(content_subject, content_html, content_plain=None):
+def send_newsletter_to_all(
+    content_subject, content_html, content_plain=None, background=True
+):
     """
     Send newsletter to all active subscribers via email
-    
+
+    Each subscriber gets an individual message; delivery is batched,
+    throttled and checkpointed by content.newsletter_delivery, one Django-Q
+    task per batch (delivered inline with background=False or when the queue
+    is unavailable). If the run stops part-way, resume it with
+    resume_newsletter_campaign(campaign_id).
+
     Args:
         content_subject: Email subject
-        content_html: HTML email body
+        content_html: HTML email body ({{ email }} is replaced per subscriber)
         content_plain: Plain text email body (optional, will be stripped from HTML)
-    
+        background: Queue the batches instead of sending them here
+
     Returns:
-        dict with success status and number of sent emails
+        dict with success status, number of sent emails and the campaign id
+        ("queued": True when the batches were handed to the queue)
     """
     try:
-        from .models import Newsletter
+        from .models import NewsletterCampaign
+        from .newsletter_delivery import run_campaign, start_campaign
 
-        # Get all active subscribers who want email
-        subscribers = Newsletter.objects.filter(
-            is_active=True,
-            receive_email=True,
-        )
-
-        if not content_plain:
-            content_plain = strip_tags(content_html)
-
-        email_list = list(subscribers.values_list("email", flat=True))
-        
-        if not email_list:
-            logger.warning("No active newsletter subscribers found")
-            return {
-                "success": True,
-                "sent_count": 0,
-                "message": "No active subscribers found",
-            }
-
-        # Send emails - using BCC to protect subscriber privacy
-        send_mail(
+        campaign = NewsletterCampaign.objects.create(
+            channel=NewsletterCampaign.Channel.EMAIL,
             subject=content_subject,
-            message=content_plain,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.DEFAULT_FROM_EMAIL],  # Main recipient
-            bcc=email_list,  # Hidden recipients for privacy
-            html_message=content_html,
-            fail_silently=False,
+            html_body=content_html,
+            plain_body=content_plain or "",
         )
-
-        # Update last_notification_sent for all subscribers
-        from django.utils import timezone
-
-        subscribers.update(last_notification_sent=timezone.now())
-
-        logger.info(f"Newsletter sent to {len(email_list)} subscribers")
-
-        return {
-            "success": True,
-            "sent_count": len(email_list),
-            "message": f"Newsletter sent to {len(email_list)} subscribers",
-        }
+        return start_campaign(campaign.pk) if background else run_campaign(campaign.pk)
 
     except Exception as e:
         logger.error(
@@ -129,112 +105,31 @@ def send_newsletter_to_all(content_subject, content_html, content_plain=None):
         }
 
 
-def send_sms_newsletter_to_all(content_message):
+def send_sms_newsletter_to_all(content_message, background=True):
     """
     Send SMS newsletter to all active subscribers via SMS
-    
-    Note: This requires configuring an SMS provider (Twilio, AWS SNS, etc.)
-    
+
+    Note: This requires configuring an SMS provider (SMS_PROVIDER = "twilio"
+    and the TWILIO_* credentials). Messages are sent concurrently through a
+    bounded worker pool (NEWSLETTER_DELIVERY["SMS_WORKERS"]), one Django-Q
+    task per batch like the email newsletter.
+
     Args:
         content_message: SMS message body (keep under 160 characters for single SMS)
-    
+        background: Queue the batches instead of sending them here
+
     Returns:
-        dict with success status and number of sent messages
+        dict with success status, number of sent messages and the campaign id
     """
     try:
-        from .models import Newsletter
+        from .models import NewsletterCampaign
+        from .newsletter_delivery import run_campaign, start_campaign
 
-        # Get all active subscribers who want SMS
-        subscribers = Newsletter.objects.filter(
-            is_active=True,
-            receive_sms=True,
-            phone__isnull=False,
-        ).exclude(phone="")
-
-        if not subscribers.exists():
-            logger.warning("No active SMS newsletter subscribers found")
-            return {
-                "success": True,
-                "sent_count": 0,
-                "message": "No active SMS subscribers found",
-            }
-
-        # Check if SMS service is configured
-        sms_provider = getattr(settings, "SMS_PROVIDER", None)
-        
-        if not sms_provider:
-            logger.warning(
-                "SMS provider not configured. "
-                "Set SMS_PROVIDER in settings to enable SMS sending."
-            )
-            return {
-                "success": False,
-                "sent_count": 0,
-                "message": "SMS provider not configured",
-            }
-
-        sent_count = 0
-
-        # Example: Using Twilio (you would need to install and configure it)
-        if sms_provider.lower() == "twilio":
-            try:
-                from twilio.rest import Client
-
-                account_sid = getattr(settings, "TWILIO_ACCOUNT_SID", "")
-                auth_token = getattr(settings, "TWILIO_AUTH_TOKEN", "")
-                from_number = getattr(settings, "TWILIO_FROM_NUMBER", "")
-
-                if not all([account_sid, auth_token, from_number]):
-                    logger.error("Twilio credentials not fully configured")
-                    return {
-                        "success": False,
-                        "sent_count": 0,
-                        "message": "Twilio credentials not configured",
-                    }
-
-                client = Client(account_sid, auth_token)
-
-                for subscriber in subscribers:
-                    try:
-                        client.messages.create(
-                            body=content_message,
-                            from_=from_number,
-                            to=subscriber.phone,
-                        )
-                        sent_count += 1
-                    except Exception as e:
-                        logger.error(
-                            f"Error sending SMS to {subscriber.phone}: {e}"
-                        )
-
-                # Update last_notification_sent
-                from django.utils import timezone
-
-                subscribers.update(last_notification_sent=timezone.now())
-
-                logger.info(f"SMS newsletter sent to {sent_count} subscribers")
-
-                return {
-                    "success": True,
-                    "sent_count": sent_count,
-                    "message": f"SMS newsletter sent to {sent_count} subscribers",
-                }
-
-            except ImportError:
-                logger.error("Twilio library not installed")
-                return {
-                    "success": False,
-                    "sent_count": 0,
-                    "message": "Twilio library not installed",
-                }
-
-        else:
-            logger.warning(f"Unknown SMS provider: {sms_provider}")
-            return {
-                "success": False,
-                "sent_count": 0,
-                "message": f"Unknown SMS provider: {sms_provider}",
-            }
+        campaign = NewsletterCampaign.objects.create(
+            channel=NewsletterCampaign.Channel.SMS,
+            plain_body=content_message,
+        )
+        return start_campaign(campaign.pk) if background else run_campaign(campaign.pk)
 
     except Exception as e:
         logger.error(
@@ -248,6 +143,39 @@ def send_sms_newsletter_to_all(content_message):
         }
 
 
+def resume_newsletter_campaign(campaign_id):
+    """
+    Continue a failed or interrupted newsletter campaign from its checkpoint
+
+    Subscribers already handled are skipped. Safe to schedule as a Django-Q
+    retry; a completed campaign is left untouched.
+    """
+    from .newsletter_delivery import start_campaign
+
+    result = start_campaign(campaign_id)
+    if not result.get("success"):
+        logger.error(
+            "Newsletter campaign #%s resume failed: %s",
+            campaign_id,
+            result.get("message"),
+        )
+    return result
+
+
+def resume_stalled_newsletter_campaigns_task():
+    """
+    Scheduled task: queue again the running newsletter campaigns whose batch
+    task was killed (no checkpoint for NEWSLETTER_DELIVERY["STALL_AFTER"]
+    seconds), from their last checkpoint.
+    """
+    from .newsletter_delivery import resume_stalled_campaigns
+
+    queued = resume_stalled_campaigns()
+    if queued:
+        logger.warning("🔁 Re-queued %s stalled newsletter campaign(s)", queued)
+    return {"success": True, "resumed": queued}
+
+
 def send_newsletter_scheduled_task():
     """
     Scheduled task to send periodic newsletters
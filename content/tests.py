@@ -1 +1,204 @@
-# Create your tests here.
+import smtplib
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Newsletter, NewsletterCampaign
+from .newsletter_delivery import run_campaign
+from .tasks import (
+    resume_newsletter_campaign,
+    resume_stalled_newsletter_campaigns_task,
+    send_newsletter_to_all,
+)
+
+queued_tasks = []
+
+
+def _run_inline(func, *args, **kwargs):
+    queued_tasks.append((func, args, kwargs))
+    return import_string(func)(*args)
+
+
+@override_settings(NEWSLETTER_DELIVERY={"BATCH_SIZE": 2, "RATE_PER_SECOND": 0, "SMS_WORKERS": 2})
+@patch("django_q.tasks.async_task", _run_inline)
+class NewsletterDeliveryTests(TestCase):
+    """Batched, checkpointed newsletter delivery"""
+
+    def setUp(self):
+        queued_tasks.clear()
+        cache.clear()
+        self.subscribers = [
+            Newsletter.objects.create(email=f"reader{i}@example.com", phone=f"+2010000000{i}")
+            for i in range(5)
+        ]
+        Newsletter.objects.create(email="inactive@example.com", is_active=False)
+        Newsletter.objects.create(email="sms-only@example.com", receive_email=False)
+
+    def test_sends_one_personalised_message_per_subscriber(self):
+        result = send_newsletter_to_all("Weekly", "<p>Hi {{ email }}</p>")
+
+        self.assertTrue(result["success"])
+        self.assertTrue(result["queued"])
+        self.assertEqual(result["sent_count"], 5)
+        self.assertEqual(len(mail.outbox), 5)
+        # One task per batch of two, each with an explicit timeout, chained
+        # from the previous checkpoint
+        self.assertEqual(
+            [(args[1], kwargs["timeout"]) for _, args, kwargs in queued_tasks],
+            [(0, 30), (self.subscribers[1].pk, 30), (self.subscribers[3].pk, 30)],
+        )
+        first = mail.outbox[0]
+        self.assertEqual(first.to, ["reader0@example.com"])
+        self.assertEqual(first.bcc, [])
+        self.assertIn("Hi reader0@example.com", first.alternatives[0][0])
+        self.assertIn("Hi reader0@example.com", first.body)
+
+        campaign = NewsletterCampaign.objects.get(pk=result["campaign_id"])
+        self.assertEqual(campaign.status, NewsletterCampaign.Status.COMPLETED)
+        self.assertEqual(campaign.last_subscriber_id, self.subscribers[-1].pk)
+        self.assertFalse(
+            Newsletter.objects.filter(is_active=True, receive_email=True, last_notification_sent__isnull=True).exists()
+        )
+
+    def test_failed_run_resumes_after_last_delivered_subscriber(self):
+        original = EmailBackend.send_messages
+        calls = {"count": 0}
+
+        def flaky(backend, messages):
+            calls["count"] += 1
+            if calls["count"] == 4:
+                raise smtplib.SMTPServerDisconnected("connection lost")
+            return original(backend, messages)
+
+        with patch.object(EmailBackend, "send_messages", flaky):
+            result = send_newsletter_to_all("Weekly", "<p>News</p>")
+
+        campaign = NewsletterCampaign.objects.get(pk=result["campaign_id"])
+        self.assertEqual(campaign.sent_count, 3)
+        self.assertEqual(campaign.status, NewsletterCampaign.Status.FAILED)
+        self.assertEqual(campaign.last_subscriber_id, self.subscribers[2].pk)
+
+        result = resume_newsletter_campaign(campaign.pk)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["sent_count"], 5)
+        recipients = [message.to[0] for message in mail.outbox]
+        self.assertEqual(recipients, [s.email for s in self.subscribers])
+
+        # A completed campaign is not sent twice
+        resume_newsletter_campaign(campaign.pk)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_transient_smtp_reply_stops_at_checkpoint(self):
+        original = EmailBackend.send_messages
+        replies = {
+            self.subscribers[1].email: smtplib.SMTPResponseException(550, b"no such user"),
+            self.subscribers[3].email: smtplib.SMTPResponseException(451, b"greylisted"),
+        }
+
+        def picky(backend, messages):
+            error = replies.pop(messages[0].to[0], None)
+            if error:
+                raise error
+            return original(backend, messages)
+
+        with patch.object(EmailBackend, "send_messages", picky):
+            result = send_newsletter_to_all("Weekly", "<p>News</p>", background=False)
+            self.assertFalse(result["success"])
+            campaign = NewsletterCampaign.objects.get(pk=result["campaign_id"])
+            # 5xx: failed for good; 4xx: not handled yet
+            self.assertEqual(campaign.failed_subscriber_ids, [self.subscribers[1].pk])
+            self.assertEqual(campaign.last_subscriber_id, self.subscribers[2].pk)
+
+            result = resume_newsletter_campaign(campaign.pk)
+
+        self.assertTrue(result["success"])
+        self.assertEqual((result["sent_count"], result["failed_count"]), (4, 1))
+        self.assertIn(self.subscribers[3].email, [message.to[0] for message in mail.outbox])
+
+    def test_sms_fan_out_records_failures(self):
+        bad_phone = self.subscribers[1].phone
+        Newsletter.objects.filter(pk__in=[s.pk for s in self.subscribers]).update(receive_sms=True)
+        delivered = []
+
+        def sender(phone, body):
+            if phone == bad_phone:
+                raise RuntimeError("provider rejected number")
+            delivered.append((phone, body))
+
+        campaign = NewsletterCampaign.objects.create(
+            channel=NewsletterCampaign.Channel.SMS, plain_body="Offer for {{ phone }}"
+        )
+        result = run_campaign(campaign.pk, sms_sender=sender)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["sent_count"], 4)
+        self.assertEqual(result["failed_count"], 1)
+        self.assertIn((self.subscribers[0].phone, f"Offer for {self.subscribers[0].phone}"), delivered)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.failed_subscriber_ids, [self.subscribers[1].pk])
+        self.assertEqual(campaign.last_subscriber_id, self.subscribers[-1].pk)
+
+    def test_sms_without_provider_fails_cleanly(self):
+        with override_settings(SMS_PROVIDER=None):
+            result = run_campaign(
+                NewsletterCampaign.objects.create(
+                    channel=NewsletterCampaign.Channel.SMS, plain_body="Hello"
+                ).pk
+            )
+        self.assertFalse(result["success"])
+        self.assertEqual(result["message"], "SMS provider not configured")
+
+    def test_stalled_campaign_is_queued_again_from_its_checkpoint(self):
+        # A batch task killed by the cluster timeout: RUNNING, old checkpoint
+        campaign = NewsletterCampaign.objects.create(
+            channel=NewsletterCampaign.Channel.EMAIL,
+            subject="Weekly",
+            html_body="<p>News</p>",
+            status=NewsletterCampaign.Status.RUNNING,
+            last_subscriber_id=self.subscribers[1].pk,
+            sent_count=2,
+            checkpoint_at=timezone.now() - timedelta(minutes=30),
+        )
+        fresh = NewsletterCampaign.objects.create(
+            channel=NewsletterCampaign.Channel.EMAIL,
+            subject="Weekly",
+            html_body="<p>News</p>",
+            status=NewsletterCampaign.Status.RUNNING,
+            checkpoint_at=timezone.now(),
+        )
+
+        result = resume_stalled_newsletter_campaigns_task()
+
+        self.assertEqual(result["resumed"], 1)
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, NewsletterCampaign.Status.COMPLETED)
+        self.assertEqual(campaign.sent_count, 5)
+        self.assertEqual(
+            [message.to[0] for message in mail.outbox],
+            [s.email for s in self.subscribers[2:]],
+        )
+        self.assertEqual(queued_tasks[0][1], (campaign.pk, self.subscribers[1].pk))
+        fresh.refresh_from_db()
+        self.assertEqual(fresh.status, NewsletterCampaign.Status.RUNNING)
+
+    def test_duplicate_batch_task_is_skipped(self):
+        from .newsletter_delivery import deliver_campaign_batch
+
+        campaign = NewsletterCampaign.objects.create(
+            channel=NewsletterCampaign.Channel.EMAIL,
+            subject="Weekly",
+            html_body="<p>News</p>",
+            status=NewsletterCampaign.Status.RUNNING,
+            last_subscriber_id=self.subscribers[1].pk,
+        )
+
+        # Its batch was already delivered: the checkpoint moved on
+        self.assertTrue(deliver_campaign_batch(campaign.pk, 0)["skipped"])
+        self.assertEqual(mail.outbox, [])
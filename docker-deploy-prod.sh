@@ -113,6 +113,10 @@ docker compose -f docker compose.prod.yml exec -T web python manage.py shell -c
 echo -e "${BLUE}🔄 Restarting services...${NC}"
 docker compose -f docker compose.prod.yml restart
 
+# Prime the shared cache so the first clients after the deploy hit it
+echo -e "${BLUE}🔥 Warming up...${NC}"
+docker compose -f docker compose.prod.yml exec -T web python manage.py warm_up --skip-process || true
+
 # Final status
 echo ""
 echo -e "${GREEN}╔════════════════════════════════════════════════════════════╗${NC}"
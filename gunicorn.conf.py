@@ -0,0 +1,38 @@
+"""
+Gunicorn configuration: preload the application and warm it in the master
+before forking workers (see main.warmup).
+
+Command-line flags (gunicorn.service, docker-compose.prod.yml) still set
+bind address, worker count and timeouts; this file only adds preloading and
+the fork hooks. Set GUNICORN_PRELOAD=False to fall back to per-worker
+loading, e.g. while debugging an import-time problem.
+"""
+
+import os
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "True") == "True"
+
+
+def when_ready(server):
+    # Runs in the master after the application is loaded, before any worker
+    # is forked; workers respawned later (max_requests) fork from here too
+    if not preload_app:
+        return
+    from main.warmup import before_fork, warm_process
+
+    report = warm_process()
+    total_ms = sum(step["ms"] for step in report.values())
+    failed = [name for name, step in report.items() if "error" in step]
+    server.log.info(
+        f"🔥 Warmed master in {total_ms:.0f} ms"
+        + (f" (failed: {', '.join(failed)})" if failed else "")
+    )
+    before_fork()
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from main.warmup import after_fork
+
+    after_fork()
@@ -21,6 +21,13 @@ django_asgi_app = get_asgi_application()
 # Import routing after Django is initialized
 from main.routing import websocket_urlpatterns
 
+# Daphne serves from one process: build its in-memory state before the
+# first connection instead of during it (see main.warmup)
+if os.environ.get("DJANGO_WARMUP") == "True":
+    from main.warmup import warm_process
+
+    warm_process()
+
 application = ProtocolTypeRouter(
     {
         # HTTP requests
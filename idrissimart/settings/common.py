@@ -91,10 +91,14 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 # Middleware
 # =======================
 MIDDLEWARE = [
+    # Sampled per-view latency/query metrics (first so it measures the whole stack)
+    "main.middleware.PerformanceInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    # Pick up .mo files compiled by the translation admin - before LocaleMiddleware
+    "main.middleware.TranslationReloadMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -245,6 +249,25 @@ MEDIA_ROOT = BASE_DIR / "media"
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "noreply@idrissimart.com")
 
+# Outbound email / SMS plumbing (main/services/messaging.py). Set
+# SMS_BACKEND to main.services.messaging.ConsoleSMSBackend or FileSMSBackend
+# to work offline.
+OUTBOUND_MESSAGING = {
+    "SMS_BACKEND": os.getenv("SMS_BACKEND", "main.services.messaging.TwilioSMSBackend"),
+    "CONNECTION_MAX_MESSAGES": 100,
+    "CONNECTION_MAX_IDLE": 30,
+    "MAX_RETRIES": 5,
+    "RETRY_BASE_DELAY": 30,
+}
+
+# Newsletter delivery: subscribers per checkpoint, messages/second (0 = no
+# limit) and concurrent SMS provider calls (content/newsletter_delivery.py)
+NEWSLETTER_DELIVERY = {
+    "BATCH_SIZE": int(os.getenv("NEWSLETTER_BATCH_SIZE", "100")),
+    "RATE_PER_SECOND": float(os.getenv("NEWSLETTER_RATE_PER_SECOND", "10")),
+    "SMS_WORKERS": int(os.getenv("NEWSLETTER_SMS_WORKERS", "4")),
+}
+
 # =======================
 # Google reCAPTCHA v2
 # =======================
@@ -285,6 +308,60 @@ CACHES = {
 # Cache time to live is 5 minutes by default
 CACHE_TTL = 60 * 5
 
+# Read-only mobile catalog endpoints (api/caching.py): how long rendered
+# responses stay cached server-side, and the max-age sent to clients
+API_RESPONSE_CACHE = {
+    "TIMEOUT": 60 * 60,
+    "MAX_AGE": 60,
+}
+
+# Request performance instrumentation (main.instrumentation)
+PERF_INSTRUMENTATION = {
+    "ENABLED": os.environ.get("PERF_INSTRUMENTATION_ENABLED", "True") == "True",
+    "SAMPLE_RATE": float(os.environ.get("PERF_SAMPLE_RATE", "0.1")),
+    "BUFFER_SIZE": 5000,
+    "PUBLISH_EVERY": 30,
+    "METRICS_TOKEN": os.environ.get("PERF_METRICS_TOKEN", ""),
+}
+
+# Worker cold-start budget checked by `manage.py profile_startup --check`
+# (main.startup_profile)
+STARTUP_BUDGET = {
+    "COLD_START_MS": int(os.environ.get("STARTUP_BUDGET_MS", "4000")),
+    "RSS_MB": int(os.environ.get("STARTUP_BUDGET_RSS_MB", "300")),
+    "RUNS": 3,
+}
+
+# Process warm-up before serving (main.warmup, gunicorn.conf.py and
+# `manage.py warm_up`); TEMPLATES / URLS default to the main pages and the
+# cached catalog API endpoints
+WARMUP = {
+    "RESOLVE_VIEWS": os.environ.get("WARMUP_RESOLVE_VIEWS", "True") == "True",
+    "PER_COUNTRY": True,
+}
+
+# Precomputed similar ads (main.recommendations, refreshed by the
+# ad_recommendations job); LIMIT ids are stored per ad
+RECOMMENDATIONS = {
+    "LIMIT": 12,
+}
+
+# Persisted listing rank (main.ranking, refreshed by the ad_ranks job): an
+# ad HALF_LIFE_HOURS newer ranks like one of twice the quality
+RANKING = {
+    "HALF_LIFE_HOURS": 72,
+}
+
+# Translation admin (main.translation_workspace): auto-translation sends
+# BATCH_SIZE texts per request; the .mo is compiled COMPILE_DELAY seconds
+# after the last save
+TRANSLATIONS = {
+    "LOCALE_PATH": BASE_DIR / "locale",
+    "SOURCE_LANGUAGE": "ar",
+    "BATCH_SIZE": 50,
+    "COMPILE_DELAY": 30,
+}
+
 # =======================
 # Compressor
 # =======================
@@ -3,13 +3,18 @@ from django.conf.urls.i18n import i18n_patterns
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.contrib.admin import AdminSite
-from django.contrib.sitemaps.views import sitemap
 from django.urls import include, path
 from django.views.generic import TemplateView
-from main import cart_wishlist_views
-from main import views as main_views
-from main import paid_ad_views
-from main.sitemaps import sitemaps
+from main.lazy_views import lazy_module
+
+# View modules are imported on first use (see main.lazy_views)
+cart_wishlist_views = lazy_module("main.cart_wishlist_views")
+main_views = lazy_module("main.views")
+paid_ad_views = lazy_module("main.paid_ad_views")
+performance_metrics = lazy_module("main.performance_views").performance_metrics
+sitemaps = lazy_module("main.sitemaps")
+sitemap_file_view = sitemaps.sitemap_file_view
+sitemap_index_view = sitemaps.sitemap_index_view
 
 # Sort models alphabetically within each app in the admin sidebar
 _original_get_app_list = AdminSite.get_app_list
@@ -110,7 +115,9 @@ AdminSite.index = _stats_index
 
 urlpatterns = [
     path("robots.txt", TemplateView.as_view(template_name="robots.txt", content_type="text/plain")),
-    path("sitemap.xml", sitemap, {"sitemaps": sitemaps}, name="django.contrib.sitemaps.views.sitemap"),
+    path("sitemap.xml", sitemap_index_view, name="django.contrib.sitemaps.views.sitemap"),
+    path("sitemaps/<str:filename>", sitemap_file_view, name="sitemap_file"),
+    path("metrics/", performance_metrics, name="performance_metrics"),
     path("i18n/", include("django.conf.urls.i18n")),
     # Cart & Wishlist APIs — BEFORE api/ include to avoid DRF router conflict
     # (DRF router matches wishlist/{pk}/ with pk="add" → 405 if placed after)
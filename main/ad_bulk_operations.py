@@ -0,0 +1,353 @@
+"""
+Admin bulk operations on classified ads
+الإجراءات الجماعية على الإعلانات
+
+Status transitions and flag changes are applied with a single
+``UPDATE ... WHERE id IN (...)``. In-app notifications are written with
+``bulk_create`` and every call is recorded in an AdBulkOperation row.
+Flag changes recompute the rank of the affected ads (main.ranking) right
+after the update, so listings reflect them before the hourly rank job.
+ClassifiedAd.save() and its pre_save/post_save signal chain are skipped, so
+the per-ad emails and SMS those signals would have sent (approve / reject)
+are handed to a Django-Q job that advances the operation's progress counters.
+"""
+
+import logging
+
+from django.db import transaction
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from main.models import AdBulkOperation, ClassifiedAd, Notification
+from main.publisher_stats import invalidate_publisher_stats
+from main.ranking import refresh_ranks
+
+logger = logging.getLogger(__name__)
+
+# Actions whose affected ads need per-ad emails / SMS in the background
+SIDE_EFFECT_ACTIONS = {"approve", "reject"}
+
+FLAG_ACTIONS = {
+    "featured_on": {"is_highlighted": True},
+    "featured_off": {"is_highlighted": False},
+    "urgent_on": {"is_urgent": True},
+    "urgent_off": {"is_urgent": False},
+    "pin": {"is_pinned": True},
+    "unpin": {"is_pinned": False},
+}
+
+STATUS_ACTIONS = {"approve", "reject", "suspend", "activate", "change_status"}
+
+BULK_ACTIONS = STATUS_ACTIONS | set(FLAG_ACTIONS) | {"delete"}
+
+# Ads processed per chunk by the background job before progress is saved
+SIDE_EFFECT_CHUNK_SIZE = 50
+
+
+def _parse_ids(ad_ids):
+    ids = set()
+    for value in ad_ids:
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return sorted(ids)
+
+
+def _ads():
+    # The default manager joins user/category/country and prefetches images
+    return ClassifiedAd.objects.select_related(None).prefetch_related(None)
+
+
+def _transition(action, admin_user, reason, status, now):
+    """Return (eligibility filter, field updates) for a status action."""
+    AdStatus = ClassifiedAd.AdStatus
+    if action == "approve":
+        return {"status": AdStatus.PENDING}, {
+            "status": AdStatus.ACTIVE,
+            "reviewed_by": admin_user,
+            "reviewed_at": now,
+            "require_review": False,
+        }
+    if action == "reject":
+        updates = {
+            "status": AdStatus.REJECTED,
+            "reviewed_by": admin_user,
+            "reviewed_at": now,
+        }
+        if reason:
+            updates["admin_notes"] = reason
+        return {"status": AdStatus.PENDING}, updates
+    if action == "suspend":
+        return {}, {"status": "suspended"}
+    if action == "activate":
+        return {}, {"status": AdStatus.ACTIVE}
+    if action == "change_status":
+        return {}, {"status": status}
+    return {}, dict(FLAG_ACTIONS[action])
+
+
+def _ad_link(slug):
+    if not slug:
+        return None
+    try:
+        return reverse("main:ad_detail", kwargs={"slug": slug})
+    except NoReverseMatch:
+        return None
+
+
+def _build_notifications(action, rows, reason, status):
+    """One Notification per affected ad (rows are (pk, user_id, title, slug))."""
+    if action == "approve":
+        return [
+            Notification(
+                user_id=user_id,
+                title=_("تمت الموافقة على إعلانك"),
+                message=_(
+                    'تهانينا! تمت الموافقة على إعلانك "{ad_title}" وهو الآن نشط على المنصة.'
+                ).format(ad_title=title),
+                notification_type=Notification.NotificationType.AD_APPROVED,
+                link=_ad_link(slug),
+            )
+            for _pk, user_id, title, slug in rows
+        ]
+    if action == "reject":
+        reason = reason or _("يرجى مراجعة شروط النشر")
+        my_ads = reverse("main:my_ads")
+        return [
+            Notification(
+                user_id=user_id,
+                title=_("تم رفض إعلانك"),
+                message=_('للأسف، تم رفض إعلانك "{ad_title}". السبب: {reason}').format(
+                    ad_title=title, reason=reason
+                ),
+                notification_type=Notification.NotificationType.AD_REJECTED,
+                link=my_ads,
+            )
+            for _pk, user_id, title, _slug in rows
+        ]
+    if action == "suspend":
+        return [
+            Notification(
+                user_id=user_id,
+                title="تم تعليق إعلانك",
+                message=f'تم تعليق إعلانك "{title}". السبب: {reason}',
+                notification_type="ad_suspended",
+            )
+            for _pk, user_id, title, _slug in rows
+        ]
+    if action == "activate":
+        return [
+            Notification(
+                user_id=user_id,
+                title="تم تفعيل إعلانك",
+                message=f'تم إعادة تفعيل إعلانك "{title}".',
+                notification_type="ad_activated",
+            )
+            for _pk, user_id, title, _slug in rows
+        ]
+    if action == "change_status":
+        label = dict(ClassifiedAd.AdStatus.choices).get(status, status)
+        return [
+            Notification(
+                user_id=user_id,
+                title="تغيير حالة الإعلان",
+                message=f'تم تغيير حالة إعلانك "{title}" إلى {label}.',
+                notification_type="ad_status_changed",
+            )
+            for _pk, user_id, title, _slug in rows
+        ]
+    return []
+
+
+def run_bulk_action(action, ad_ids, admin_user, reason="", status=None):
+    """
+    Apply *action* to the given ads and return the AdBulkOperation record.
+
+    approve / reject only touch pending ads; the operation stays QUEUED until
+    the background job has sent the per-ad emails and SMS.
+    """
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"Unknown bulk action: {action}")
+    if action == "change_status" and status not in ClassifiedAd.AdStatus.values:
+        raise ValueError(f"Invalid status: {status}")
+
+    ids = _parse_ids(ad_ids)
+    now = timezone.now()
+
+    with transaction.atomic():
+        if action == "delete":
+            affected = list(_ads().filter(pk__in=ids).values_list("pk", flat=True))
+            if affected:
+                _ads().filter(pk__in=affected).delete()
+            needs_job = False
+        else:
+            filters, updates = _transition(action, admin_user, reason, status, now)
+            rows = list(
+                _ads()
+                .filter(pk__in=ids, **filters)
+                .values_list("pk", "user_id", "title", "slug")
+            )
+            affected = [row[0] for row in rows]
+            if affected:
+                # Repeat the eligibility filter so concurrent reviews are not overwritten
+                _ads().filter(pk__in=affected, **filters).update(
+                    updated_at=now, **updates
+                )
+                if action in FLAG_ACTIONS:
+                    # The update skipped save(), which keeps rank_tier/rank_score current
+                    refresh_ranks(affected, now)
+                invalidate_publisher_stats(row[1] for row in rows)
+                Notification.objects.bulk_create(
+                    _build_notifications(action, rows, reason, status), batch_size=500
+                )
+            needs_job = action in SIDE_EFFECT_ACTIONS and bool(affected)
+
+        operation = AdBulkOperation.objects.create(
+            action=action if action != "change_status" else f"status:{status}",
+            performed_by=admin_user,
+            ad_ids=affected,
+            reason=reason,
+            total=len(affected),
+            processed=0 if needs_job else len(affected),
+            status=AdBulkOperation.Status.QUEUED
+            if needs_job
+            else AdBulkOperation.Status.COMPLETED,
+            finished_at=None if needs_job else now,
+        )
+        if needs_job:
+            transaction.on_commit(lambda: enqueue_bulk_side_effects(operation.pk))
+
+    return operation
+
+
+def run_status_change(ad_ids, admin_user, status):
+    """
+    Set *status* on the given ads. Pending ads moved to active / rejected go
+    through approve / reject so they still get the review fields, emails and
+    SMS. Returns the list of AdBulkOperation records created.
+    """
+    operations = []
+    remaining = _parse_ids(ad_ids)
+    review_action = {
+        ClassifiedAd.AdStatus.ACTIVE: "approve",
+        ClassifiedAd.AdStatus.REJECTED: "reject",
+    }.get(status)
+    if review_action:
+        operation = run_bulk_action(review_action, remaining, admin_user)
+        operations.append(operation)
+        reviewed = set(operation.ad_ids)
+        remaining = [pk for pk in remaining if pk not in reviewed]
+    if remaining or not operations:
+        operations.append(
+            run_bulk_action("change_status", remaining, admin_user, status=status)
+        )
+    return operations
+
+
+def enqueue_bulk_side_effects(operation_id):
+    """Hand the per-ad emails / SMS to Django-Q; run inline if the queue is unavailable."""
+    try:
+        from django_q.tasks import async_task
+
+        async_task(
+            "main.ad_bulk_operations.process_bulk_side_effects",
+            operation_id,
+            task_name=f"ad_bulk_operation_{operation_id}",
+        )
+    except Exception as e:
+        logger.error(
+            f"Could not queue bulk operation {operation_id}, running inline: {e}"
+        )
+        process_bulk_side_effects(operation_id)
+
+
+def _send_side_effects(action, ad, reason):
+    """The email / SMS part of send_ad_approval_notification in main.signals."""
+    from main.services.email_service import EmailService
+    from main.services.sms_service import SMSService
+    from main.signals import _email_enabled, _sms_enabled
+
+    user = ad.user
+    user_name = user.get_full_name() or user.username
+    if _email_enabled(user):
+        if action == "approve":
+            EmailService.send_ad_approved_email(
+                email=user.email,
+                ad_title=ad.title,
+                ad_url=ad.get_absolute_url(),
+                user_name=user_name,
+            )
+        else:
+            EmailService.send_ad_rejected_email(
+                email=user.email,
+                ad_title=ad.title,
+                reject_reason=reason or _("يرجى مراجعة شروط النشر"),
+                user_name=user_name,
+            )
+
+    if _sms_enabled(user):
+        user_phone = getattr(user, "mobile", None) or getattr(user, "phone", None)
+        if user_phone:
+            status = (
+                _("تمت الموافقة على إعلانك وهو الآن نشط")
+                if action == "approve"
+                else _("تم رفض إعلانك. يرجى مراجعة التفاصيل")
+            )
+            SMSService.send_ad_notification(
+                phone_number=user_phone, ad_title=ad.title[:30], status=status
+            )
+
+
+def process_bulk_side_effects(operation_id):
+    """Django-Q task: send the per-ad emails / SMS for a bulk operation."""
+    try:
+        operation = AdBulkOperation.objects.get(pk=operation_id)
+    except AdBulkOperation.DoesNotExist:
+        return {"success": False, "error": "operation not found"}
+
+    if operation.status == AdBulkOperation.Status.COMPLETED:
+        return {"success": True, "processed": operation.processed}
+
+    AdBulkOperation.objects.filter(pk=operation.pk).update(
+        status=AdBulkOperation.Status.RUNNING
+    )
+
+    processed = failed = 0
+    ids = operation.ad_ids
+    try:
+        for start in range(0, len(ids), SIDE_EFFECT_CHUNK_SIZE):
+            chunk = ids[start : start + SIDE_EFFECT_CHUNK_SIZE]
+            ads = (
+                _ads()
+                .select_related("user")
+                .filter(pk__in=chunk)
+                .only("pk", "title", "slug", "user")
+            )
+            for ad in ads:
+                try:
+                    _send_side_effects(operation.action, ad, operation.reason)
+                    processed += 1
+                except Exception as e:
+                    failed += 1
+                    logger.error(
+                        f"Bulk {operation.action} side effects failed for ad {ad.pk}: {e}"
+                    )
+            # Ads deleted since the operation was queued count as processed
+            processed += len(chunk) - len(ads)
+            AdBulkOperation.objects.filter(pk=operation.pk).update(
+                processed=processed, failed=failed
+            )
+    except Exception as e:
+        logger.error(f"Bulk operation {operation.pk} failed: {e}")
+        AdBulkOperation.objects.filter(pk=operation.pk).update(
+            status=AdBulkOperation.Status.FAILED, finished_at=timezone.now()
+        )
+        return {"success": False, "error": str(e)}
+
+    AdBulkOperation.objects.filter(pk=operation.pk).update(
+        status=AdBulkOperation.Status.COMPLETED, finished_at=timezone.now()
+    )
+    logger.info(f"✅ Bulk {operation.action}: {processed} processed, {failed} failed")
+    return {"success": True, "processed": processed, "failed": failed}
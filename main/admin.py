@@ -21,6 +21,7 @@ from .chatbot_admin import *
 from .chat_admin import *
 
 from .models import (
+    AdBulkOperation,
     AdFeature,
     AdFeaturePrice,
     AdImage,
@@ -32,6 +33,7 @@ from .models import (
     AdUpgradeHistory,
     AdvertisingConfig,
     BannerPricing,
+    BlockedWord,
     Cart,
     CartItem,
     CartSettings,
@@ -47,6 +49,7 @@ from .models import (
     FAQ,
     FAQCategory,
     FacebookShareRequest,
+    MaintenanceRun,
     NewsletterSubscriber,
     Notification,
     Order,
@@ -63,6 +66,7 @@ from .models import (
     Wishlist,
     WishlistItem,
 )
+from .registries import category_tree
 
 
 class AdFeaturePriceInline(admin.TabularInline):
@@ -144,12 +148,14 @@ class CategoryAdmin(MPTTModelAdmin):
 
     def activate_categories(self, request, queryset):
         updated = queryset.update(is_active=True)
+        category_tree.invalidate()
         self.message_user(request, _("{} قسم تم تفعيله").format(updated))
 
     activate_categories.short_description = _("✓ تفعيل الأقسام المحددة")
 
     def deactivate_categories(self, request, queryset):
         updated = queryset.update(is_active=False)
+        category_tree.invalidate()
         self.message_user(request, _("{} قسم تم إلغاء تفعيله").format(updated))
 
     deactivate_categories.short_description = _("✗ إلغاء تفعيل الأقسام المحددة")
@@ -909,6 +915,82 @@ class UserPackageAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(AdBulkOperation)
+class AdBulkOperationAdmin(admin.ModelAdmin):
+    """
+    سجل الإجراءات الجماعية على الإعلانات
+    Audit log of admin bulk actions on ads
+    """
+
+    list_display = (
+        "action",
+        "performed_by",
+        "total",
+        "processed",
+        "failed",
+        "status",
+        "created_at",
+        "finished_at",
+    )
+    list_filter = ("action", "status", "created_at")
+    search_fields = ("performed_by__username", "reason")
+    readonly_fields = (
+        "action",
+        "performed_by",
+        "ad_ids",
+        "reason",
+        "status",
+        "total",
+        "processed",
+        "failed",
+        "created_at",
+        "finished_at",
+    )
+    date_hierarchy = "created_at"
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(MaintenanceRun)
+class MaintenanceRunAdmin(admin.ModelAdmin):
+    """
+    سجل تشغيل مهام الصيانة المجدولة
+    Metrics of scheduled maintenance job runs
+    """
+
+    list_display = (
+        "job",
+        "status",
+        "scanned",
+        "updated",
+        "notified",
+        "emails_sent",
+        "failed",
+        "duration_ms",
+        "started_at",
+    )
+    list_filter = ("job", "status", "started_at")
+    readonly_fields = (
+        "job",
+        "status",
+        "chunks",
+        "scanned",
+        "updated",
+        "notified",
+        "emails_sent",
+        "failed",
+        "duration_ms",
+        "error",
+        "started_at",
+        "finished_at",
+    )
+    date_hierarchy = "started_at"
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(AdUpgradeHistory)
 class AdUpgradeHistoryAdmin(admin.ModelAdmin):
     """
@@ -1076,6 +1158,7 @@ class PaymentAdmin(admin.ModelAdmin):
     list_filter = (
         "status",
         "provider",
+        "context_type",
         "currency",
         "created_at",
         "completed_at",
@@ -4322,6 +4405,15 @@ class EmailTemplateAdmin(admin.ModelAdmin):
         return TemplateResponse(request, "admin/main/emailtemplate/send_newsletter.html", context)
 
 
+@admin.register(BlockedWord)
+class BlockedWordAdmin(admin.ModelAdmin):
+    list_display = ("word", "category", "is_active", "created_at")
+    list_filter = ("category", "is_active")
+    search_fields = ("word",)
+    list_editable = ("is_active",)
+    readonly_fields = ("created_at",)
+
+
 @admin.register(SMSTemplate)
 class SMSTemplateAdmin(admin.ModelAdmin):
     list_display = ("key", "display_name_col", "is_active", "updated_at")
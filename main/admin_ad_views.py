@@ -20,7 +20,9 @@ from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse, reverse_lazy
 from django.views.decorators.http import require_POST
 
+from main.ad_bulk_operations import BULK_ACTIONS, run_bulk_action, run_status_change
 from main.models import (
+    AdBulkOperation,
     ClassifiedAd,
     Notification,
     AdUpgradeHistory,
@@ -161,9 +163,10 @@ class AdminAllAdsView(SuperadminRequiredMixin, ListView):
             .prefetch_related("images", "upgrade_history")
         )
 
-        # Check and expire old upgrades
-        for ad in queryset:
-            ad.check_and_expire_upgrades()
+        # Check and expire old upgrades (set-based)
+        from main.scheduled_tasks import expire_lapsed_upgrades
+
+        expire_lapsed_upgrades()
 
         # Filter by status
         status = self.request.GET.get("status")
@@ -191,9 +194,7 @@ class AdminAllAdsView(SuperadminRequiredMixin, ListView):
         # Sorting - default by priority
         sort_by = self.request.GET.get("sort", "priority")
         if sort_by == "priority":
-            queryset = queryset.order_by(
-                "-is_pinned", "-is_urgent", "-is_highlighted", "-created_at"
-            )
+            queryset = queryset.order_by("-rank_tier", "-created_at")
         else:
             queryset = queryset.order_by(sort_by)
 
@@ -228,33 +229,54 @@ class AdminAllAdsView(SuperadminRequiredMixin, ListView):
         return context
 
 
+def _bulk_operation_response(operations, message):
+    """JSON payload shared by the bulk action endpoints."""
+    if not isinstance(operations, (list, tuple)):
+        operations = [operations]
+    count = sum(op.total for op in operations)
+    # Report progress on the operation that still has background work
+    tracked = next(
+        (op for op in operations if op.status != AdBulkOperation.Status.COMPLETED),
+        operations[0],
+    )
+    return JsonResponse(
+        {
+            "success": True,
+            "message": message.format(count=count),
+            "count": count,
+            "operation_id": tracked.pk,
+            "operation_status": tracked.status,
+            "status_url": reverse("main:admin_bulk_operation_status", args=[tracked.pk]),
+        }
+    )
+
+
 @admin_section_required("ads")
 def bulk_approve_ads(request):
     """Bulk approve multiple ads"""
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
 
-    ad_ids = request.POST.getlist("ad_ids[]")
+    operation = run_bulk_action("approve", request.POST.getlist("ad_ids[]"), request.user)
+    return _bulk_operation_response(operation, "تم الموافقة على {count} إعلان")
 
-    count = 0
-    for ad_id in ad_ids:
-        try:
-            ad = ClassifiedAd.objects.get(pk=ad_id)
-            if ad.approve(request.user):
-                count += 1
-                # Create notification
-                Notification.objects.create(
-                    user=ad.user,
-                    title="تم الموافقة على إعلانك",
-                    message=f'تم الموافقة على إعلانك "{ad.title}".',
-                    notification_type="ad_approved",
-                    link=ad.get_absolute_url(),
-                )
-        except ClassifiedAd.DoesNotExist:
-            continue
 
+@admin_section_required("ads")
+def bulk_operation_status(request, operation_id):
+    """Progress of a bulk operation's background emails / SMS"""
+    operation = get_object_or_404(AdBulkOperation, pk=operation_id)
     return JsonResponse(
-        {"success": True, "message": f"تم الموافقة على {count} إعلان", "count": count}
+        {
+            "success": True,
+            "action": operation.action,
+            "status": operation.status,
+            "total": operation.total,
+            "processed": operation.processed,
+            "failed": operation.failed,
+            "percent": operation.progress_percent,
+            "finished": operation.status
+            in (AdBulkOperation.Status.COMPLETED, AdBulkOperation.Status.FAILED),
+        }
     )
 
 
@@ -430,20 +452,8 @@ class AdminAdDeleteView(SuperadminRequiredMixin, DeleteView):
 @require_POST
 def bulk_delete_ads(request):
     """Bulk delete multiple ads"""
-    ad_ids = request.POST.getlist("ad_ids[]")
-
-    count = 0
-    for ad_id in ad_ids:
-        try:
-            ad = ClassifiedAd.objects.get(pk=ad_id)
-            ad.delete()
-            count += 1
-        except ClassifiedAd.DoesNotExist:
-            continue
-
-    return JsonResponse(
-        {"success": True, "message": f"تم حذف {count} إعلان", "count": count}
-    )
+    operation = run_bulk_action("delete", request.POST.getlist("ad_ids[]"), request.user)
+    return _bulk_operation_response(operation, "تم حذف {count} إعلان")
 
 
 @admin_section_required("ads")
@@ -456,27 +466,8 @@ def bulk_change_status(request):
     if new_status not in dict(ClassifiedAd.AdStatus.choices):
         return JsonResponse({"error": "حالة غير صالحة"}, status=400)
 
-    count = 0
-    for ad_id in ad_ids:
-        try:
-            ad = ClassifiedAd.objects.get(pk=ad_id)
-            ad.status = new_status
-            ad.save()
-            count += 1
-
-            # Create notification
-            Notification.objects.create(
-                user=ad.user,
-                title="تغيير حالة الإعلان",
-                message=f'تم تغيير حالة إعلانك "{ad.title}" إلى {ad.get_status_display()}.',
-                notification_type="ad_status_changed",
-            )
-        except ClassifiedAd.DoesNotExist:
-            continue
-
-    return JsonResponse(
-        {"success": True, "message": f"تم تحديث {count} إعلان", "count": count}
-    )
+    operations = run_status_change(ad_ids, request.user, new_status)
+    return _bulk_operation_response(operations, "تم تحديث {count} إعلان")
 
 
 # ============================================================================
@@ -885,90 +876,15 @@ def admin_bulk_actions(request):
     ad_ids = request.POST.getlist("ad_ids[]")
     action = request.POST.get("action")
 
-    count = 0
-    ads = ClassifiedAd.objects.filter(pk__in=ad_ids)
-
-    if action == "approve":
-        for ad in ads:
-            if ad.approve(request.user):
-                count += 1
-                Notification.objects.create(
-                    user=ad.user,
-                    title="تم الموافقة على إعلانك",
-                    message=f'تم الموافقة على إعلانك "{ad.title}".',
-                    notification_type="ad_approved",
-                )
-
-    elif action == "reject":
-        reason = request.POST.get("reason", "لم يتم تحديد سبب")
-        for ad in ads:
-            if ad.reject(request.user, reason):
-                count += 1
-                Notification.objects.create(
-                    user=ad.user,
-                    title="تم رفض إعلانك",
-                    message=f'تم رفض إعلانك "{ad.title}". السبب: {reason}',
-                    notification_type="ad_rejected",
-                )
-
-    elif action == "suspend":
-        reason = request.POST.get("reason", "")
-        ads.update(status="suspended")
-        count = ads.count()
-        for ad in ads:
-            Notification.objects.create(
-                user=ad.user,
-                title="تم تعليق إعلانك",
-                message=f'تم تعليق إعلانك "{ad.title}". السبب: {reason}',
-                notification_type="ad_suspended",
-            )
-
-    elif action == "activate":
-        ads.update(status="active")
-        count = ads.count()
-        for ad in ads:
-            Notification.objects.create(
-                user=ad.user,
-                title="تم تفعيل إعلانك",
-                message=f'تم إعادة تفعيل إعلانك "{ad.title}".',
-                notification_type="ad_activated",
-            )
-
-    elif action == "delete":
-        count = ads.count()
-        ads.delete()
-
-    elif action == "featured_on":
-        ads.update(is_highlighted=True)
-        count = ads.count()
-
-    elif action == "featured_off":
-        ads.update(is_highlighted=False)
-        count = ads.count()
-
-    elif action == "urgent_on":
-        ads.update(is_urgent=True)
-        count = ads.count()
+    if action not in BULK_ACTIONS or action == "change_status":
+        return JsonResponse({"success": False, "error": "إجراء غير صالح"}, status=400)
 
-    elif action == "urgent_off":
-        ads.update(is_urgent=False)
-        count = ads.count()
-
-    elif action == "pin":
-        ads.update(is_pinned=True)
-        count = ads.count()
-
-    elif action == "unpin":
-        ads.update(is_pinned=False)
-        count = ads.count()
+    reason = request.POST.get("reason", "")
+    if action == "reject" and not reason:
+        reason = "لم يتم تحديد سبب"
 
-    return JsonResponse(
-        {
-            "success": True,
-            "message": f"تم تنفيذ الإجراء على {count} إعلان",
-            "count": count,
-        }
-    )
+    operation = run_bulk_action(action, ad_ids, request.user, reason=reason)
+    return _bulk_operation_response(operation, "تم تنفيذ الإجراء على {count} إعلان")
 
 
 # ============================================================================
@@ -8,3 +8,6 @@ class MainConfig(AppConfig):
     def ready(self):
         # Import and connect signals
         import main.signals  # noqa: F401
+
+        # Register the system check for lazily referenced views
+        import main.lazy_views  # noqa: F401
@@ -0,0 +1,26 @@
+"""
+Arabic text folding
+توحيد أشكال الحروف العربية
+
+The spelling variants folded away before Arabic text is matched, shared by
+the moderation engine (main.moderation) and the chatbot knowledge index
+(main.chatbot_index) so both treat "أدمن" and "ادمن" alike:
+
+  - ARABIC_FOLD: alef / yaa / taa marbuta / hamza-carrier variants mapped to
+    their base letter;
+  - ARABIC_MARKS: tatweel, harakat and Quranic marks, and the dagger alef,
+    which are dropped.
+"""
+
+ARABIC_FOLD = {
+    "أ": "ا",
+    "إ": "ا",
+    "آ": "ا",
+    "ٱ": "ا",
+    "ى": "ي",
+    "ئ": "ي",
+    "ؤ": "و",
+    "ة": "ه",
+}
+
+ARABIC_MARKS = "ـ" + "".join(chr(c) for c in range(0x064B, 0x0660)) + "ٰ"
@@ -0,0 +1,333 @@
+"""
+Paid banner serving index
+فهرس عرض البانرات المدفوعة
+
+Builds an in-memory structure mapping (country, page_key, ad_type) to the
+ordered list of banners that may be served there, so rendering a page's
+banners is a dictionary lookup instead of a country/M2M/JSON query.
+
+The index is a main.registries.ReadOnlyRegistry, rebuilt:
+  - lazily once it is older than INDEX_MAX_AGE seconds, and
+  - whenever the shared version stamp in the cache changes (bumped by the
+    PaidBanner / BannerSlot signals in main.signals and by the expiry task).
+
+Start and end dates are checked at lookup time, so banners scheduled to
+start later are already in the index and appear as soon as they go live.
+
+Impressions and clicks are buffered per process and written back in
+set-based UPDATEs by flush_banner_events(), at the latest
+EVENT_FLUSH_INTERVAL seconds after the first buffered event
+(main.write_behind). Counts this process has flushed since its index was
+built are kept too, so the tracking views report counts that never go back.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from main.registries import ReadOnlyRegistry
+from main.write_behind import FlushTimer
+
+logger = logging.getLogger(__name__)
+
+BANNER_INDEX_VERSION_KEY = "paid_banner_index_version"
+
+# Rebuild the index at least this often even without invalidation
+INDEX_MAX_AGE = 300
+
+# page_key used for banners whose target_pages list is empty
+ALL_PAGES = "*"
+
+# Flush buffered banner events after this many seconds or events
+EVENT_FLUSH_INTERVAL = 30
+EVENT_FLUSH_THRESHOLD = 200
+
+
+class BannerIndex:
+    """Immutable snapshot of all servable paid banners."""
+
+    def __init__(self, banners, slot_rotations):
+        from main.models import PaidBanner
+
+        self.slot_rotations = slot_rotations
+        self.banners_by_id = {b.pk: b for b in banners}
+
+        # (country_code, page_key, ad_type) -> [banner, ...]
+        # country_code None means "any country", page_key None means "any page".
+        self._pages = defaultdict(list)
+        # (country_code, placement_type, ad_type) -> [banner, ...]
+        self._placements = defaultdict(list)
+        # (country_code, category_id, ad_type) -> [category-placement banner, ...]
+        self._categories = defaultdict(list)
+        # banner id -> ids of the categories it targets
+        self._category_ids = {}
+
+        explicit_pages = defaultdict(list)
+        for banner in banners:
+            codes = {banner.country.code} | {
+                c.code for c in banner.extra_countries.all()
+            }
+            codes.add(None)
+            category_ids = {c.pk for c in banner.categories.all()}
+            if banner.category_id:
+                category_ids.add(banner.category_id)
+            self._category_ids[banner.pk] = category_ids
+
+            for code in codes:
+                self._pages[(code, None, banner.ad_type)].append(banner)
+                target_pages = banner.target_pages or []
+                if target_pages:
+                    for page_key in set(target_pages):
+                        explicit_pages[(code, page_key, banner.ad_type)].append(banner)
+                else:
+                    self._pages[(code, ALL_PAGES, banner.ad_type)].append(banner)
+                self._placements[(code, banner.placement_type, banner.ad_type)].append(
+                    banner
+                )
+                if banner.placement_type == PaidBanner.PlacementType.CATEGORY:
+                    for category_id in category_ids:
+                        self._categories[(code, category_id, banner.ad_type)].append(
+                            banner
+                        )
+
+        # Pages with explicit targeting also show every "all pages" banner;
+        # merge both lists once here so lookups stay a single dict access.
+        position = {b.pk: i for i, b in enumerate(banners)}
+        for (code, page_key, ad_type), page_banners in explicit_pages.items():
+            merged = page_banners + self._pages.get((code, ALL_PAGES, ad_type), [])
+            self._pages[(code, page_key, ad_type)] = sorted(
+                merged, key=lambda b: position[b.pk]
+            )
+
+        self._pages = dict(self._pages)
+        self._placements = dict(self._placements)
+        self._categories = dict(self._categories)
+
+    @staticmethod
+    def _live(banners, now):
+        return [b for b in banners if b.start_date <= now <= b.end_date]
+
+    def for_page(self, country_code=None, page_key=None, ad_type=None):
+        """Banners servable on *page_key* (all pages when None), ordered by priority."""
+        from main.models import PaidBanner
+
+        now = timezone.now()
+        ad_types = [ad_type] if ad_type else PaidBanner.AdType.values
+        result = []
+        for t in ad_types:
+            banners = self._pages.get((country_code or None, page_key, t))
+            if banners is None and page_key is not None:
+                banners = self._pages.get((country_code or None, ALL_PAGES, t), [])
+            result.extend(self._live(banners or [], now))
+        if len(ad_types) > 1:
+            result.sort(key=lambda b: (-b.priority, b.order, -b.created_at.timestamp()))
+        return result
+
+    def grouped_by_space(
+        self, country_code=None, placement_type=None, category=None, ad_type=None
+    ):
+        """
+        Same shape as PaidBanner.get_ads_grouped_by_space:
+        {ad_type: {space_key: [banners...]}}
+        """
+        from main.models import PaidBanner
+
+        now = timezone.now()
+        code = country_code or None
+        category_id = getattr(category, "pk", category)
+        grouped = {}
+        for t in [ad_type] if ad_type else PaidBanner.AdType.values:
+            if (
+                category_id is not None
+                and placement_type == PaidBanner.PlacementType.CATEGORY
+            ):
+                banners = self._categories.get((code, category_id, t), [])
+            elif category_id is not None:
+                if placement_type:
+                    base = self._placements.get((code, placement_type, t), [])
+                else:
+                    base = self._pages.get((code, None, t), [])
+                banners = [
+                    b
+                    for b in base
+                    if b.placement_type == PaidBanner.PlacementType.GENERAL
+                    or category_id in self._category_ids[b.pk]
+                ]
+            elif placement_type:
+                banners = self._placements.get((code, placement_type, t), [])
+            else:
+                banners = self._pages.get((code, None, t), [])
+
+            spaces = {}
+            for banner in self._live(banners, now):
+                space_key = banner.advertising_space or f"single_{banner.pk}"
+                spaces.setdefault(space_key, []).append(banner)
+            if spaces:
+                grouped[t] = spaces
+        return grouped
+
+    def rotation_map(self, grouped_dict, default=5):
+        """Index-backed equivalent of BannerSlot.get_rotation_map."""
+        result = {}
+        for ad_type, spaces in grouped_dict.items():
+            result[ad_type] = default
+            for space_key in spaces:
+                if space_key in self.slot_rotations:
+                    result[ad_type] = self.slot_rotations[space_key]
+                    break
+        return result
+
+
+def build_banner_index():
+    """Load all active or scheduled banners and build a fresh BannerIndex."""
+    from main.models import BannerSlot, PaidBanner
+
+    now = timezone.now()
+    banners = list(
+        PaidBanner.objects.filter(
+            is_active=True,
+            status=PaidBanner.Status.ACTIVE,
+            start_date__isnull=False,
+            end_date__gte=now,
+        )
+        .select_related("country")
+        .prefetch_related("extra_countries", "categories")
+        .order_by("-priority", "order", "-created_at")
+    )
+    slot_rotations = dict(
+        BannerSlot.objects.filter(is_active=True).values_list(
+            "slot_key", "rotation_seconds"
+        )
+    )
+    return BannerIndex(banners, slot_rotations)
+
+
+def _rebuild_banner_index():
+    with _events_lock:
+        # The new snapshot reads the counts flushed so far
+        _flushed_events.clear()
+    return build_banner_index()
+
+
+banner_index = ReadOnlyRegistry(
+    "banner_index",
+    _rebuild_banner_index,
+    BANNER_INDEX_VERSION_KEY,
+    max_age=INDEX_MAX_AGE,
+)
+
+
+def get_banner_index():
+    """
+    Return the current process-wide BannerIndex, rebuilding it when it is
+    stale or the shared version stamp has moved.
+    """
+    return banner_index.get()
+
+
+def invalidate_banner_index():
+    banner_index.invalidate()
+
+
+# =======================
+# Buffered impression / click logging
+# =======================
+
+_pending_events = defaultdict(lambda: [0, 0])  # banner id -> [views, clicks]
+# Flushed by this process since the index was built
+_flushed_events = defaultdict(lambda: [0, 0])
+_pending_count = 0
+_events_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _record_event(banner_id, views=0, clicks=0):
+    global _pending_count
+    with _events_lock:
+        counts = _pending_events[banner_id]
+        counts[0] += views
+        counts[1] += clicks
+        _pending_count += 1
+        due = (
+            _pending_count >= EVENT_FLUSH_THRESHOLD
+            or time.monotonic() - _last_flush >= EVENT_FLUSH_INTERVAL
+        )
+    if due:
+        flush_banner_events()
+    else:
+        _flush_timer.arm()
+
+
+def record_banner_view(banner_id):
+    _record_event(banner_id, views=1)
+
+
+def record_banner_click(banner_id):
+    _record_event(banner_id, clicks=1)
+
+
+def pending_banner_counts(banner_id):
+    """(views, clicks) recorded in this process that the current index does not show."""
+    with _events_lock:
+        views, clicks = _pending_events.get(banner_id, (0, 0))
+        flushed_views, flushed_clicks = _flushed_events.get(banner_id, (0, 0))
+    return views + flushed_views, clicks + flushed_clicks
+
+
+def flush_banner_events():
+    """
+    Write buffered view/click counts to the database.
+    Banners sharing the same deltas are updated with one UPDATE ... WHERE id IN.
+    """
+    global _pending_events, _pending_count, _last_flush
+
+    _flush_timer.cancel()
+    with _events_lock:
+        events = _pending_events
+        _pending_events = defaultdict(lambda: [0, 0])
+        _pending_count = 0
+        _last_flush = time.monotonic()
+
+    if not events:
+        return 0
+
+    from main.models import PaidBanner
+
+    by_delta = defaultdict(list)
+    for banner_id, (views, clicks) in events.items():
+        by_delta[(views, clicks)].append(banner_id)
+
+    try:
+        with transaction.atomic():
+            for (views, clicks), ids in by_delta.items():
+                PaidBanner.objects.filter(pk__in=ids).update(
+                    views_count=F("views_count") + views,
+                    clicks_count=F("clicks_count") + clicks,
+                )
+    except Exception as e:
+        logger.error(f"Failed to flush banner events: {e}")
+        # Put the counts back so the next flush retries them
+        with _events_lock:
+            for banner_id, (views, clicks) in events.items():
+                counts = _pending_events[banner_id]
+                counts[0] += views
+                counts[1] += clicks
+        return 0
+
+    with _events_lock:
+        for banner_id, (views, clicks) in events.items():
+            counts = _flushed_events[banner_id]
+            counts[0] += views
+            counts[1] += clicks
+    return len(events)
+
+
+_flush_timer = FlushTimer("banner_events", flush_banner_events, EVENT_FLUSH_INTERVAL)
+
+atexit.register(flush_banner_events)
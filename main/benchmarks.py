@@ -0,0 +1,677 @@
+"""
+Performance benchmark suite
+مجموعة قياس الأداء
+
+Seeds a reproducible dataset (building on populate_categories_simple,
+populate_users, populate_ads and quick_seed_ads) and replays the marketplace
+hot paths through the Django test client, recording per-request query counts,
+DB time, latency and peak Python memory. Results are plain JSON so two runs can be diffed with
+compare_results() / the compare_benchmarks command.
+
+    python manage.py seed_benchmark_data --ads 100000 --users 2000
+    python manage.py run_benchmarks --output bench/baseline.json
+    ... apply a change ...
+    python manage.py run_benchmarks --output bench/current.json
+    python manage.py compare_benchmarks bench/baseline.json bench/current.json
+"""
+
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone, translation
+
+from main.bulk_seed import (
+    count_seeded_ads,
+    count_seeded_users,
+    seed_ads,
+    seed_category_tree,
+    seed_users,
+)
+from main.instrumentation import measure
+
+BENCH_USER_PREFIX = "bench_user_"
+BENCH_BUYER = "bench_buyer"
+BENCH_ADMIN = "bench_admin"
+BENCH_PASSWORD = "bench123456"
+BENCH_AD_MARKER = "-bench-"
+BENCH_CATEGORY_PREFIX = "bench-cat"
+
+RESULTS_VERSION = 1
+
+
+# =======================
+# Dataset
+# =======================
+
+
+def _log(stdout, message):
+    if stdout is not None:
+        stdout.write(message)
+
+
+def _ensure_users(total, seed=42, batch_size=5000, workers=1, stdout=None):
+    """Create bench users up to *total* with bulk inserts (signals are skipped)."""
+    from main.models import User
+
+    existing = count_seeded_users(BENCH_USER_PREFIX)
+    missing = max(0, total - existing)
+    if missing:
+        seed_users(
+            missing,
+            start=existing,
+            prefix=BENCH_USER_PREFIX,
+            email_domain="bench.local",
+            password=BENCH_PASSWORD,
+            seed=seed,
+            chunk_size=batch_size,
+            workers=workers,
+        )
+        _log(stdout, f"  - Created {missing} bench users")
+
+    buyer, _ = User.objects.get_or_create(
+        username=BENCH_BUYER,
+        defaults={
+            "email": f"{BENCH_BUYER}@bench.local",
+            "password": make_password(BENCH_PASSWORD),
+        },
+    )
+    admin, created = User.objects.get_or_create(
+        username=BENCH_ADMIN,
+        defaults={
+            "email": f"{BENCH_ADMIN}@bench.local",
+            "password": make_password(BENCH_PASSWORD),
+            "is_staff": True,
+            "is_superuser": True,
+        },
+    )
+    return buyer, admin
+
+
+def _ensure_ads(
+    total, country, batch_size, seed=42, workers=1, images_per_ad=0, stdout=None
+):
+    """Bulk-create classified ads up to *total* using populate_ads' sample data."""
+    from main.models import Category, User
+
+    existing = count_seeded_ads(BENCH_AD_MARKER)
+    missing = max(0, total - existing)
+    if not missing:
+        return 0
+
+    category_ids = list(
+        Category.objects.filter(
+            section_type=Category.SectionType.CLASSIFIED,
+            country=country,
+            parent__isnull=False,
+        ).values_list("pk", flat=True)
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith=BENCH_USER_PREFIX).values_list(
+            "pk", flat=True
+        )
+    )
+    if not category_ids or not user_ids:
+        _log(stdout, "  ! No categories or users to attach ads to")
+        return 0
+
+    return seed_ads(
+        missing,
+        country,
+        category_ids,
+        user_ids,
+        start=existing,
+        marker=BENCH_AD_MARKER,
+        images_per_ad=images_per_ad,
+        seed=seed,
+        chunk_size=batch_size,
+        workers=workers,
+        stdout=stdout,
+    )
+
+
+def seed_benchmark_data(
+    ads=10000,
+    users=500,
+    banners=10,
+    country_code="EG",
+    batch_size=5000,
+    seed=42,
+    workers=1,
+    images_per_ad=0,
+    category_roots=0,
+    stdout=None,
+):
+    """
+    Build (or top up) the benchmark dataset. Idempotent: existing bench rows
+    are counted and only the missing ones are created, so the same command
+    scales a 10k dataset up to 100k or 1M. Rows are written by main.bulk_seed,
+    in *workers* processes; *category_roots* adds that many synthetic
+    three-level category trees to the surveying one.
+    """
+    from content.models import Country
+    from main.models import Cart, CartItem, Category, ClassifiedAd, PaidBanner
+
+    country, _ = Country.objects.get_or_create(
+        code=country_code, defaults={"name": country_code, "is_active": True}
+    )
+
+    if not Category.objects.filter(
+        section_type=Category.SectionType.CLASSIFIED,
+        country=country,
+        parent__isnull=False,
+    ).exists():
+        # The surveying tree matches the sample data populate_ads picks from
+        _log(stdout, "Seeding categories (populate_categories_simple)...")
+        call_command("populate_categories_simple", country=country_code, stdout=stdout)
+
+    if (
+        category_roots
+        and not Category.objects.filter(
+            slug__startswith=f"{BENCH_CATEGORY_PREFIX}-"
+        ).exists()
+    ):
+        _log(stdout, "Seeding synthetic category trees...")
+        seed_category_tree(
+            roots=category_roots,
+            country=country,
+            prefix=BENCH_CATEGORY_PREFIX,
+            seed=seed,
+            stdout=stdout,
+        )
+
+    _log(stdout, "Seeding users...")
+    buyer, _ = _ensure_users(
+        users, seed=seed, batch_size=batch_size, workers=workers, stdout=stdout
+    )
+
+    _log(stdout, "Seeding ads...")
+    _ensure_ads(
+        ads,
+        country,
+        batch_size,
+        seed=seed,
+        workers=workers,
+        images_per_ad=images_per_ad,
+        stdout=stdout,
+    )
+
+    if banners and not PaidBanner.objects.exists():
+        _log(stdout, "Seeding paid banners (quick_seed_ads)...")
+        call_command("quick_seed_ads", count=banners, stdout=stdout)
+
+    # Give the buyer a cart so the checkout page renders instead of redirecting
+    cart, _ = Cart.objects.get_or_create(user=buyer)
+    if not cart.items.exists():
+        ad = ClassifiedAd.objects.filter(
+            country=country, status=ClassifiedAd.AdStatus.ACTIVE
+        ).first()
+        if ad:
+            CartItem.objects.create(cart=cart, ad=ad, quantity=1)
+
+    return {
+        "ads": ClassifiedAd.objects.count(),
+        "categories": Category.objects.count(),
+        "banners": PaidBanner.objects.count(),
+    }
+
+
+# =======================
+# Scenarios
+# =======================
+
+
+def _fixtures(country_code):
+    """Look up the concrete objects the scenario URLs point at."""
+    from main.models import Category, ClassifiedAd
+
+    ad = (
+        ClassifiedAd.objects.filter(
+            country__code=country_code,
+            status=ClassifiedAd.AdStatus.ACTIVE,
+            is_hidden=False,
+        )
+        .select_related(None)
+        .prefetch_related(None)
+        .order_by("-pk")
+        .only("pk", "slug", "category_id")
+        .first()
+    )
+    category = Category.objects.filter(pk=ad.category_id).first() if ad else None
+    return {"ad": ad, "category": category}
+
+
+SCENARIOS = [
+    {"name": "home", "url": lambda f: reverse("main:home")},
+    {
+        "name": "category_listing",
+        "url": lambda f: reverse(
+            "main:category_detail", kwargs={"slug": f["category"].slug}
+        ),
+        "needs": "category",
+    },
+    {"name": "ad_list", "url": lambda f: reverse("main:ad_list")},
+    {
+        "name": "search",
+        "url": lambda f: reverse("main:ad_list") + "?search=%D8%AC%D9%87%D8%A7%D8%B2",
+    },
+    {
+        "name": "ad_detail",
+        "url": lambda f: reverse("main:ad_detail", kwargs={"slug": f["ad"].slug}),
+        "needs": "ad",
+    },
+    {"name": "api_ad_list", "url": lambda f: "/api/ads/"},
+    {
+        "name": "api_ad_detail",
+        "url": lambda f: f"/api/ads/{f['ad'].pk}/",
+        "needs": "ad",
+    },
+    {
+        "name": "checkout",
+        "url": lambda f: reverse("main:checkout"),
+        "user": BENCH_BUYER,
+    },
+    {
+        "name": "admin_reports",
+        "url": lambda f: reverse("main:admin_reports"),
+        "user": BENCH_ADMIN,
+    },
+]
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            timeout=5,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _run_scenario(client, url, repeat, warmup):
+    for _ in range(warmup):
+        client.get(url)
+
+    latencies, queries, db_times = [], [], []
+    status_code = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with measure() as metrics:
+            response = client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(metrics.queries)
+        db_times.append(metrics.db_time * 1000)
+        status_code = response.status_code
+
+    # Memory is traced on a separate request: tracemalloc slows everything down
+    tracemalloc.start()
+    try:
+        client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "url": url,
+        "status_code": status_code,
+        "queries": max(queries),
+        "db_ms": round(statistics.median(db_times), 2),
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 2),
+            "p90": round(_percentile(latencies, 90), 2),
+            "max": round(max(latencies), 2),
+            "mean": round(statistics.fmean(latencies), 2),
+        },
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(names=None, repeat=5, warmup=1, country_code="EG", stdout=None):
+    """Replay the selected scenarios and return a JSON-serialisable result dict."""
+    from django.contrib.auth import get_user_model
+
+    from main.models import ClassifiedAd
+
+    User = get_user_model()
+    fixtures = _fixtures(country_code)
+    clients = {}
+
+    def client_for(username):
+        if username not in clients:
+            client = Client()
+            if username:
+                user = User.objects.filter(username=username).first()
+                if user is None:
+                    return None
+                client.force_login(user)
+            clients[username] = client
+        return clients[username]
+
+    results = {}
+    hosts = ["testserver", *settings.ALLOWED_HOSTS]
+    with (
+        override_settings(ALLOWED_HOSTS=hosts),
+        translation.override(settings.LANGUAGE_CODE),
+    ):
+        for scenario in SCENARIOS:
+            name = scenario["name"]
+            if names and name not in names:
+                continue
+            needs = scenario.get("needs")
+            client = client_for(scenario.get("user"))
+            if (needs and fixtures.get(needs) is None) or client is None:
+                results[name] = {
+                    "skipped": "missing benchmark data - run seed_benchmark_data"
+                }
+                _log(stdout, f"  - {name}: skipped")
+                continue
+            results[name] = _run_scenario(
+                client, scenario["url"](fixtures), repeat, warmup
+            )
+            _log(
+                stdout,
+                f"  - {name}: {results[name]['queries']} queries, "
+                f"p50 {results[name]['latency_ms']['p50']} ms",
+            )
+
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "created_at": timezone.now().isoformat(),
+            "git_revision": _git_revision(),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "repeat": repeat,
+            "ads": ClassifiedAd.objects.count(),
+        },
+        "scenarios": results,
+    }
+
+
+# =======================
+# Micro-benchmarks
+# =======================
+
+# A realistic mix: desktop, mobile, tablet, crawlers and tools
+SAMPLE_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/126.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/126.0.0.0 Safari/537.36 Edg/126.0.0.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 "
+    "(KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; SM-S918B) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/126.0.0.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPad; CPU OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/17.5 Safari/604.1",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+    "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+    "curl/8.5.0",
+    "python-requests/2.32.3",
+]
+
+SAMPLE_PATHS = [
+    "/ar/ads/",
+    "/ar/ads/toyota-corolla-2020/",
+    "/en/category/electronics-eg/",
+    "/wp-login.php",
+    "/ar/chat/",
+    "/.env",
+    "/api/ads/?page=2",
+    "/ar/search/?q=%D8%AC%D9%87%D8%A7%D8%B2",
+]
+
+
+def _time_ops(func, samples, iterations):
+    count = len(samples)
+    start = time.perf_counter()
+    for i in range(iterations):
+        func(samples[i % count])
+    elapsed = time.perf_counter() - start
+    return {"iterations": iterations, "us_per_op": round(elapsed / iterations * 1e6, 3)}
+
+
+def _legacy_user_agent(user_agent):
+    """The per-pattern substring loops the middlewares used before request_classifier."""
+    from main import request_classifier as rc
+
+    ua = user_agent.lower()
+    is_bot = any(bot in ua for bot in rc.BOT_USER_AGENTS)
+    if any(p in ua for p in rc.MOBILE_PATTERNS):
+        device = "mobile"
+    elif any(p in ua for p in rc.TABLET_PATTERNS):
+        device = "tablet"
+    else:
+        device = "desktop"
+    browser = next((name for key, name in rc.BROWSERS if key in ua), "Other")
+    return is_bot, device, browser
+
+
+def _legacy_blocked_path(path):
+    from main import request_classifier as rc
+
+    path = path.lower()
+    return any(blocked in path for blocked in rc.BLOCKED_PATHS) or path.endswith(
+        rc.BLOCKED_EXTENSIONS
+    )
+
+
+def _bench_request_classifier(iterations):
+    from main import request_classifier as rc
+
+    rc.classify_user_agent.cache_clear()
+    return {
+        "user_agent_legacy": _time_ops(
+            _legacy_user_agent, SAMPLE_USER_AGENTS, iterations
+        ),
+        "user_agent_compiled": _time_ops(
+            rc.classify_user_agent.__wrapped__, SAMPLE_USER_AGENTS, iterations
+        ),
+        "user_agent_cached": _time_ops(
+            rc.classify_user_agent, SAMPLE_USER_AGENTS, iterations
+        ),
+        "blocked_path_legacy": _time_ops(
+            _legacy_blocked_path, SAMPLE_PATHS, iterations
+        ),
+        "blocked_path_compiled": _time_ops(
+            rc.blocked_path_reason, SAMPLE_PATHS, iterations
+        ),
+    }
+
+
+SAMPLE_TEXTS = [
+    "سيارة تويوتا كورولا 2020 بحالة ممتازة، فحص كامل ولا تحتاج أي مصاريف",
+    "iPhone 15 Pro Max 256GB, battery 98%, with original box and charger",
+    "شقة للإيجار في المعادي ثلاث غرف وصالة، الدور الخامس مع مصعد",
+    "Selling my p0rn collection cheap, call now",
+    "adm1n_support_official",
+]
+
+
+def _legacy_contains_blocked_word(text):
+    """The per-word substring loop blocked_words used before main.moderation."""
+    from main.blocked_words import OFFENSIVE_WORDS, RESERVED_WORDS
+
+    normalized = (
+        text.lower()
+        .strip()
+        .replace(" ", "")
+        .replace("_", "")
+        .replace("-", "")
+        .replace(".", "")
+    )
+    for word in RESERVED_WORDS + OFFENSIVE_WORDS:
+        if word.lower().replace(" ", "") in normalized:
+            return True
+    return False
+
+
+def _bench_moderation(iterations):
+    from main.moderation import get_moderation_engine
+
+    engine = get_moderation_engine()
+    return {
+        "blocked_words_legacy": _time_ops(
+            _legacy_contains_blocked_word, SAMPLE_TEXTS, iterations
+        ),
+        "blocked_words_engine": _time_ops(
+            lambda t: engine.find(t, compact=True), SAMPLE_TEXTS, iterations
+        ),
+    }
+
+
+SAMPLE_QUESTIONS = [
+    "كيف انشر اعلان مبوب في الموقع؟",
+    "ما هي طرق الدفع المتاحة عندكم",
+    "عندي مشكلة في التحقق من رقم الجوال ولا يصلني الكود",
+    "how do I contact support",
+    "سؤال لا علاقة له بأي شيء",
+]
+
+SAMPLE_KNOWLEDGE = [
+    ("كيف أنشر إعلان مبوب؟", "إعلان, نشر, مبوب, classified, ads, إنشاء", "ads", 9),
+    (
+        "كيف أنشئ حساب جديد؟",
+        "حساب, تسجيل, إنشاء, register, account, signup",
+        "account",
+        9,
+    ),
+    (
+        "ما هي طرق الدفع المتاحة؟",
+        "دفع, payment, paypal, paymob, بطاقة, تحويل",
+        "payment",
+        8,
+    ),
+    (
+        "لماذا أحتاج للتحقق من رقم الجوال؟",
+        "تحقق, جوال, موبايل, otp, رقم, verification",
+        "account",
+        7,
+    ),
+    (
+        "كيف أتواصل مع الدعم الفني؟",
+        "دعم, مساعدة, تواصل, support, help, contact",
+        "support",
+        9,
+    ),
+]
+
+
+def _bench_chatbot(iterations):
+    from main.chatbot_index import KnowledgeIndex
+    from main.chatbot_models import ChatbotKnowledgeBase
+
+    entries = [
+        ChatbotKnowledgeBase(question=q, answer=q, keywords=k, category=c, priority=p)
+        for q, k, c, p in SAMPLE_KNOWLEDGE
+    ]
+    index = KnowledgeIndex(entries)
+    return {
+        "knowledge_index_search": _time_ops(
+            index.best_match, SAMPLE_QUESTIONS, iterations
+        )
+    }
+
+
+# name -> callable(iterations) returning {case: {"iterations", "us_per_op"}}
+MICRO_BENCHMARKS = {
+    "request_classifier": _bench_request_classifier,
+    "moderation": _bench_moderation,
+    "chatbot": _bench_chatbot,
+}
+
+
+def run_micro_benchmarks(names=None, iterations=20000, stdout=None):
+    """Time the pure-Python hot helpers in-process (no DB, no HTTP)."""
+    results = {}
+    for name, bench in MICRO_BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        results[name] = bench(iterations)
+        for case, timing in results[name].items():
+            _log(stdout, f"  - {name}.{case}: {timing['us_per_op']} µs/op")
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "created_at": timezone.now().isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "iterations": iterations,
+        },
+        "micro": results,
+    }
+
+
+# =======================
+# Comparison
+# =======================
+
+# metric -> minimum absolute change that can count as a regression
+COMPARED_METRICS = {
+    "queries": 1,
+    "db_ms": 1.0,
+    "latency_ms.p50": 2.0,
+    "latency_ms.p90": 2.0,
+    "peak_memory_kb": 64.0,
+}
+
+
+def _metric(result, path):
+    value = result
+    for part in path.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def compare_results(baseline, current, threshold=10.0):
+    """
+    Diff two run_benchmarks() results.
+    Returns a list of rows: {"scenario", "metric", "baseline", "current",
+    "change_pct", "regression"}.
+    """
+    rows = []
+    for name, base in baseline.get("scenarios", {}).items():
+        cur = current.get("scenarios", {}).get(name)
+        if not cur or "skipped" in base or "skipped" in cur:
+            continue
+        for metric, min_delta in COMPARED_METRICS.items():
+            before, after = _metric(base, metric), _metric(cur, metric)
+            if before is None or after is None:
+                continue
+            change = (
+                ((after - before) / before * 100)
+                if before
+                else (100.0 if after else 0.0)
+            )
+            rows.append(
+                {
+                    "scenario": name,
+                    "metric": metric,
+                    "baseline": before,
+                    "current": after,
+                    "change_pct": round(change, 1),
+                    "regression": change > threshold and after - before >= min_delta,
+                }
+            )
+    return rows
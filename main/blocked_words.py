@@ -1,5 +1,7 @@
 """
 Blocked/Banned words for usernames and content
+The lists below (plus admin-added BlockedWord rows) are compiled into a
+single matcher by main.moderation.
 """
 
 # Reserved system words (Arabic and English)
@@ -140,6 +142,10 @@ def contains_blocked_word(text, check_offensive=True, check_reserved=True):
     """
     Check if text contains any blocked words
 
+    Matching is done by the compiled engine in main.moderation (Arabic
+    normalisation, leetspeak folding, admin-added words). Spaces, "_", "-"
+    and "." are ignored, as for usernames.
+
     Args:
         text: The text to check (username, etc.)
         check_offensive: Whether to check offensive words
@@ -148,34 +154,37 @@ def contains_blocked_word(text, check_offensive=True, check_reserved=True):
     Returns:
         tuple: (is_blocked, reason) where reason explains why it's blocked
     """
+    from main.moderation import OFFENSIVE, RESERVED, get_moderation_engine
+
     if not text:
         return False, ""
 
-    # Normalize text for checking
-    text_lower = text.lower().strip()
-    text_normalized = (
-        text_lower.replace(" ", "").replace("_", "").replace("-", "").replace(".", "")
-    )
+    categories = ((RESERVED,) if check_reserved else ()) + ((OFFENSIVE,) if check_offensive else ())
+    if not categories:
+        return False, ""
 
-    # Check reserved words
-    if check_reserved:
-        for word in RESERVED_WORDS:
-            if not word:  # Skip None or empty values
-                continue
-            word_normalized = word.lower().replace(" ", "")
-            if word_normalized in text_normalized:
-                return True, f"الاسم يحتوي على كلمة محجوزة: {word}"
+    matches = get_moderation_engine().find(text, categories, compact=True)
+    if not matches:
+        return False, ""
 
-    # Check offensive words
-    if check_offensive:
-        for word in OFFENSIVE_WORDS:
-            if not word:  # Skip None or empty values
-                continue
-            word_normalized = word.lower().replace(" ", "")
-            if word_normalized in text_normalized:
-                return True, "الاسم يحتوي على كلمة غير لائقة"
+    # Reserved words take precedence in the message, as before
+    reserved = [m for m in matches if m.category == RESERVED]
+    if reserved:
+        return True, f"الاسم يحتوي على كلمة محجوزة: {reserved[0].word}"
+    return True, "الاسم يحتوي على كلمة غير لائقة"
 
-    return False, ""
+
+def find_blocked_words(text):
+    """
+    Offensive words in free text (ads, comments, messages) with their spans
+    in *text*, for highlighting. Word boundaries (spaces) are kept.
+
+    Returns:
+        list of main.moderation.Match(word, category, start, end)
+    """
+    from main.moderation import OFFENSIVE, get_moderation_engine
+
+    return get_moderation_engine().find(text, (OFFENSIVE,))
 
 
 def is_username_allowed(username):
@@ -209,16 +218,8 @@ def clean_text_content(text):
     Returns:
         tuple: (is_clean, list_of_issues)
     """
-    issues = []
+    matches = find_blocked_words(text)
 
-    # Check for offensive words
-    is_blocked, reason = contains_blocked_word(
-        text,
-        check_offensive=True,
-        check_reserved=False,  # Don't check reserved words in content
-    )
-
-    if is_blocked:
-        issues.append(reason)
+    issues = ["الاسم يحتوي على كلمة غير لائقة"] if matches else []
 
     return len(issues) == 0, issues
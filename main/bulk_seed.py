@@ -0,0 +1,697 @@
+"""
+Bulk seeding
+توليد بيانات الاختبار بالجملة
+
+populate_users, populate_ads and populate_dummy_data create rows one save()
+at a time: every row fires its signals (welcome emails, default packages,
+admin notifications, registry refreshes) and every ad image is copied and
+watermarked on its own, so a production-sized dataset takes hours. The
+functions here build the same kind of data for perf testing and the
+benchmark suite (main.benchmarks):
+
+  - rows are inserted with bulk_create in chunks, each chunk in its own
+    transaction, with model signals muted;
+  - category trees get their MPTT fields (tree_id, lft, rght, level)
+    computed before the insert, siblings in the order_insertion_by order
+    the tree manager would have used;
+  - ad images come from a small pool of JPEGs rendered and stored once and
+    shared by every seeded AdImage row;
+  - chunks can run in a pool of forked worker processes. Each chunk draws
+    from its own random.Random seeded by (seed, first row), so a seed and
+    chunk size give the same rows whatever the number of workers.
+
+Seeded rows skip what their signals would have done (default packages,
+notifications, emails); derived columns the data relies on (ad ratings)
+are recomputed per chunk and the read-only registries are invalidated once
+at the end.
+
+    python manage.py populate_users 100000 --bulk --workers 4
+    python manage.py populate_ads 1000000 --bulk --workers 8 --images-per-ad 2
+    python manage.py populate_dummy_data --reviews 500000 --bulk --workers 4
+    python manage.py seed_benchmark_data --ads 1000000 --users 20000 --workers 8
+"""
+
+import logging
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+
+from django.db import connection, connections, transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.utils import timezone
+from django.utils.text import slugify
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+SEED_USER_PREFIX = "seed_user_"
+SEED_AD_MARKER = "-seed-"
+SEED_PASSWORD = "admin123456"
+IMAGE_POOL_DIR = "ads/images/seed_pool"
+
+MUTED_SIGNALS = (pre_save, post_save, pre_delete, post_delete, m2m_changed)
+
+CITIES = [
+    "القاهرة",
+    "الجيزة",
+    "الإسكندرية",
+    "المنصورة",
+    "طنطا",
+    "أسوان",
+    "الأقصر",
+    "بورسعيد",
+    "السويس",
+    "شرم الشيخ",
+]
+
+REVIEW_COMMENTS = [
+    "منتج ممتاز وجودة عالية",
+    "البائع محترم جداً وسريع في الرد",
+    "السعر مناسب والمنتج كما في الوصف",
+    "تجربة رائعة، أنصح بالتعامل",
+    "خدمة ممتازة ومنتج أصلي",
+    "استلمت المنتج بسرعة وحالة ممتازة",
+    "البائع أمين وصادق في التعامل",
+    "المنتج مطابق للمواصفات تماماً",
+    "تعامل راقي ومحترم",
+    "جودة عالية وسعر تنافسي",
+]
+
+POOL_COLORS = [
+    ("#667eea", "#ffffff"),
+    ("#764ba2", "#ffffff"),
+    ("#43e97b", "#000000"),
+    ("#fa709a", "#ffffff"),
+    ("#fee140", "#000000"),
+    ("#30cfd0", "#ffffff"),
+    ("#a8edea", "#000000"),
+    ("#f093fb", "#ffffff"),
+]
+
+
+def _log(stdout, message):
+    if stdout is not None:
+        stdout.write(message)
+
+
+# =======================
+# Signals and timestamps
+# =======================
+
+
+@contextmanager
+def muted_signals(signals=MUTED_SIGNALS):
+    """Disconnect every receiver of *signals* for the duration of the block."""
+    saved = []
+    for signal in signals:
+        with signal.lock:
+            saved.append((signal, signal.receivers))
+            signal.receivers = []
+            signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        for signal, receivers in saved:
+            with signal.lock:
+                signal.receivers = receivers
+                signal.sender_receivers_cache.clear()
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """Let bulk_create keep the values set on auto_now / auto_now_add fields."""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def invalidate_registries():
+    """Rebuild the read-only registries whose change signals were muted."""
+    from main.registries import REGISTRIES
+
+    for registry in REGISTRIES:
+        registry.invalidate()
+
+
+# =======================
+# Chunks and workers
+# =======================
+
+
+def plan_chunks(start, count, chunk_size=DEFAULT_CHUNK_SIZE):
+    """[(first, count), ...] covering rows start .. start + count - 1."""
+    chunk_size = max(1, chunk_size)
+    return [
+        (first, min(chunk_size, start + count - first))
+        for first in range(start, start + count, chunk_size)
+    ]
+
+
+def chunk_random(seed, first):
+    """The random generator of the chunk starting at row *first*."""
+    return random.Random(seed * 1_000_003 + first)
+
+
+# Read-only inputs of the running chunk function (ids, image names, ...):
+# set before the pool forks, so workers inherit them instead of each chunk
+# pickling them again
+_shared = {}
+
+
+def _effective_workers(workers, stdout=None):
+    if workers <= 1:
+        return 1
+    if connection.in_atomic_block:
+        _log(
+            stdout,
+            "  ! Called inside a transaction: running every chunk in this process",
+        )
+        return 1
+    if connection.vendor == "sqlite":
+        _log(
+            stdout,
+            "  ! SQLite allows a single writer: running every chunk in this process",
+        )
+        return 1
+    if "fork" not in multiprocessing.get_all_start_methods():
+        _log(
+            stdout,
+            "  ! Worker processes need fork(): running every chunk in this process",
+        )
+        return 1
+    return workers
+
+
+def run_chunks(
+    func, chunks, workers=1, shared=None, stdout=None, label="rows", **kwargs
+):
+    """
+    Call func(first, count, **kwargs) for each chunk, in this process or in
+    *workers* forked processes; the total it returns.
+    """
+    total = sum(count for _first, count in chunks)
+    workers = _effective_workers(workers, stdout)
+    _shared.clear()
+    _shared.update(shared or {})
+    done = created = 0
+    try:
+        if workers == 1:
+            for first, count in chunks:
+                created += func(first, count, **kwargs)
+                done += count
+                _log(stdout, f"  - {done}/{total} {label}")
+        else:
+            # Children must open their own connections, not share the parent's
+            connections.close_all()
+            context = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {
+                    pool.submit(func, first, count, **kwargs): count
+                    for first, count in chunks
+                }
+                for future in as_completed(futures):
+                    created += future.result()
+                    done += futures[future]
+                    _log(stdout, f"  - {done}/{total} {label}")
+    finally:
+        _shared.clear()
+    return created
+
+
+def _bulk_create_with_pks(model, objs, key, batch_size):
+    """bulk_create *objs* and make sure each has its pk (MySQL returns none)."""
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    if objs and objs[0].pk is None:
+        pks = dict(
+            model.objects.filter(
+                **{f"{key}__in": [getattr(obj, key) for obj in objs]}
+            ).values_list(key, "pk")
+        )
+        for obj in objs:
+            obj.pk = pks[getattr(obj, key)]
+    return objs
+
+
+# =======================
+# Images
+# =======================
+
+
+@lru_cache(maxsize=64)
+def render_image(width, height, text, bg_color="#667eea", text_color="#ffffff"):
+    """JPEG bytes of a plain colored image with *text* centered, rendered once per arguments."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    img = Image.new("RGB", (width, height), color=bg_color)
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype(
+            "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", max(16, width // 20)
+        )
+    except OSError:
+        font = ImageFont.load_default()
+    bbox = draw.textbbox((0, 0), text, font=font)
+    draw.text(
+        ((width - (bbox[2] - bbox[0])) // 2, (height - (bbox[3] - bbox[1])) // 2),
+        text,
+        fill=text_color,
+        font=font,
+    )
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def image_pool(size=8, width=800, height=600):
+    """
+    Storage names of *size* ad images, rendered and stored on first use and
+    shared by every seeded AdImage row.
+    """
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    names = []
+    for i in range(size):
+        name = f"{IMAGE_POOL_DIR}/pool_{width}x{height}_{i}.jpg"
+        if not default_storage.exists(name):
+            bg_color, text_color = POOL_COLORS[i % len(POOL_COLORS)]
+            name = default_storage.save(
+                name,
+                ContentFile(
+                    render_image(
+                        width, height, f"IdrissiMart {i + 1}", bg_color, text_color
+                    )
+                ),
+            )
+        names.append(name)
+    return names
+
+
+# =======================
+# Users
+# =======================
+
+
+def _create_user_chunk(first, count, seed, prefix, email_domain):
+    from faker import Faker
+
+    from main.models import User
+
+    rng = chunk_random(seed, first)
+    fake = Faker("ar_EG")
+    fake.seed_instance(seed * 1_000_003 + first)
+    profile_types = [choice[0] for choice in User.ProfileType.choices]
+    users = [
+        User(
+            username=f"{prefix}{n}",
+            email=f"{prefix}{n}@{email_domain}",
+            password=_shared["password"],
+            first_name=fake.first_name(),
+            last_name=fake.last_name(),
+            profile_type=rng.choice(profile_types),
+            # Same distribution as populate_users
+            verification_status=rng.choices(
+                list(User.VerificationStatus), weights=[40, 10, 45, 5], k=1
+            )[0],
+        )
+        for n in range(first, first + count)
+    ]
+    with muted_signals(), transaction.atomic():
+        User.objects.bulk_create(users, batch_size=1000)
+    return len(users)
+
+
+def count_seeded_users(prefix=SEED_USER_PREFIX):
+    from main.models import User
+
+    return User.objects.filter(username__startswith=prefix).count()
+
+
+def seed_users(
+    count,
+    start=0,
+    prefix=SEED_USER_PREFIX,
+    email_domain="seed.local",
+    password=SEED_PASSWORD,
+    seed=42,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    workers=1,
+    stdout=None,
+):
+    """Create users <prefix><start> .. <prefix><start + count - 1>; the number created."""
+    from django.contrib.auth.hashers import make_password
+
+    return run_chunks(
+        _create_user_chunk,
+        plan_chunks(start, count, chunk_size),
+        workers=workers,
+        # Hashing is deliberately slow: do it once for every seeded user
+        shared={"password": make_password(password)},
+        stdout=stdout,
+        label="users",
+        seed=seed,
+        prefix=prefix,
+        email_domain=email_domain,
+    )
+
+
+# =======================
+# Category trees
+# =======================
+
+
+def assign_mptt_fields(nodes, first_tree_id):
+    """
+    Set tree_id, lft, rght and level on unsaved MPTT instances whose
+    ``parent`` is another instance of *nodes* (None for roots). Every root
+    starts a new tree from *first_tree_id*; siblings are numbered in the
+    model's order_insertion_by order.
+    """
+    order_by = nodes[0]._mptt_meta.order_insertion_by if nodes else []
+    children = {}
+    roots = []
+    for node in nodes:
+        parent = node._state.fields_cache.get("parent")
+        if parent is None:
+            roots.append(node)
+        else:
+            children.setdefault(id(parent), []).append(node)
+
+    def sort_key(node):
+        return tuple(getattr(node, name) for name in order_by)
+
+    for tree_id, root in enumerate(sorted(roots, key=sort_key), start=first_tree_id):
+        counter = 1
+        # Iterative pre/post-order walk: lft on the way down, rght on the way up
+        stack = [(root, 0, False)]
+        while stack:
+            node, level, done = stack.pop()
+            if done:
+                node.rght = counter
+                counter += 1
+                continue
+            node.tree_id, node.level, node.lft = tree_id, level, counter
+            counter += 1
+            stack.append((node, level, True))
+            for child in sorted(children.get(id(node), ()), key=sort_key, reverse=True):
+                stack.append((child, level + 1, False))
+    return nodes
+
+
+def seed_category_tree(
+    roots=10,
+    fanout=5,
+    depth=3,
+    country=None,
+    section_type=None,
+    prefix="seed-cat",
+    seed=42,
+    stdout=None,
+):
+    """
+    Create *roots* category trees, each node with *fanout* children down to
+    *depth* levels, inserted level by level with their MPTT fields already
+    computed; the number of categories created.
+    """
+    from django.db.models import Max
+
+    from main.models import Category
+
+    section_type = section_type or Category.SectionType.CLASSIFIED
+    rng = random.Random(seed)
+    existing = Category.objects.filter(slug__startswith=f"{prefix}-").count()
+
+    levels = []
+    serial = existing
+    parents = [None] * roots
+    for level in range(depth):
+        nodes = []
+        for parent in parents:
+            for i in range(1 if parent is None else fanout):
+                serial += 1
+                name_ar = f"قسم تجريبي {serial}"
+                category = Category(
+                    name=f"Seed category {serial}",
+                    name_ar=name_ar,
+                    slug=f"{prefix}-{serial}",
+                    slug_ar=f"{prefix}-ar-{serial}",
+                    section_type=section_type,
+                    country=country,
+                    icon="fas fa-folder",
+                    order=i,
+                    ad_creation_price=Decimal(rng.choice([0, 0, 10, 25, 50]))
+                    if level == 0
+                    else Decimal("0.00"),
+                )
+                category.parent = parent
+                nodes.append(category)
+        levels.append(nodes)
+        parents = nodes
+
+    nodes = [node for level in levels for node in level]
+    first_tree_id = (Category.objects.aggregate(last=Max("tree_id"))["last"] or 0) + 1
+    assign_mptt_fields(nodes, first_tree_id)
+
+    with muted_signals(), transaction.atomic():
+        for level in levels:
+            for node in level:
+                # Parents were inserted (and given their pk) by the previous level
+                node.parent_id = node.parent.pk if node.parent is not None else None
+            _bulk_create_with_pks(Category, level, "slug", batch_size=1000)
+    invalidate_registries()
+    _log(stdout, f"  - Created {len(nodes)} categories in {roots} trees")
+    return len(nodes)
+
+
+# =======================
+# Ads
+# =======================
+
+
+@lru_cache(maxsize=1)
+def _ad_samples():
+    """populate_ads' sample ads, with their title slugs."""
+    from main.management.commands.populate_ads import Command as PopulateAdsCommand
+
+    return [
+        dict(item, slug=slugify(item["title"], allow_unicode=True)[:180])
+        for group in PopulateAdsCommand().get_surveying_equipment_data().values()
+        for item in group
+    ]
+
+
+def _create_ad_chunk(first, count, seed, country_id, marker, images_per_ad, days):
+    from main.models import AdImage, ClassifiedAd
+    from main.ranking import quality_score, rank_score, rank_tier
+
+    rng = chunk_random(seed, first)
+    samples = _ad_samples()
+    category_ids = _shared["category_ids"]
+    user_ids = _shared["user_ids"]
+    now = timezone.now()
+
+    ads = []
+    for n in range(first, first + count):
+        item = rng.choice(samples)
+        created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+        ads.append(
+            ClassifiedAd(
+                user_id=rng.choice(user_ids),
+                category_id=rng.choice(category_ids),
+                country_id=country_id,
+                title=item["title"],
+                slug=f"{item['slug']}{marker}{n}",
+                description=item["description"],
+                price=Decimal(str(item["price"])),
+                is_negotiable=item.get("is_negotiable", True),
+                custom_fields=item.get("custom_fields", {}),
+                city=rng.choice(CITIES),
+                status=rng.choices(
+                    [ClassifiedAd.AdStatus.ACTIVE, ClassifiedAd.AdStatus.PENDING],
+                    weights=[85, 15],
+                    k=1,
+                )[0],
+                is_urgent=rng.random() < 0.1,
+                is_highlighted=rng.random() < 0.08,
+                allow_cart=rng.random() < 0.1,
+                views_count=rng.randint(0, 200),
+                created_at=created_at,
+                updated_at=created_at,
+                expires_at=created_at + timedelta(days=30),
+            )
+        )
+        # bulk_create skips save(); owner-dependent quality comes with the ad_ranks job
+        ad = ads[-1]
+        ad.rank_tier = rank_tier(ad.is_pinned, ad.is_urgent, ad.is_highlighted)
+        ad.rank_score = rank_score(
+            ad.rank_tier,
+            quality_score(views_count=ad.views_count, price=ad.price),
+            created_at,
+        )
+
+    with (
+        muted_signals(),
+        explicit_timestamps(ClassifiedAd, "created_at", "updated_at"),
+        transaction.atomic(),
+    ):
+        if images_per_ad:
+            _bulk_create_with_pks(ClassifiedAd, ads, "slug", batch_size=1000)
+            pool = _shared["images"]
+            images = [
+                AdImage(ad_id=ad.pk, image=name, order=order)
+                for ad in ads
+                for order, name in enumerate(
+                    rng.sample(pool, min(len(pool), rng.randint(1, images_per_ad))),
+                    start=1,
+                )
+            ]
+            AdImage.objects.bulk_create(images, batch_size=1000)
+        else:
+            ClassifiedAd.objects.bulk_create(ads, batch_size=1000)
+    return len(ads)
+
+
+def count_seeded_ads(marker=SEED_AD_MARKER):
+    from main.models import ClassifiedAd
+
+    return ClassifiedAd.objects.filter(slug__contains=marker).count()
+
+
+def seed_ads(
+    count,
+    country,
+    category_ids,
+    user_ids,
+    start=0,
+    marker=SEED_AD_MARKER,
+    images_per_ad=0,
+    image_pool_size=8,
+    days=30,
+    seed=42,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    workers=1,
+    stdout=None,
+):
+    """
+    Create ads numbered start .. start + count - 1 (the number is part of
+    the slug, after *marker*), created over the last *days* days, each with
+    1..*images_per_ad* pooled images; the number created.
+    """
+    if not count or not category_ids or not user_ids:
+        return 0
+    shared = {"category_ids": list(category_ids), "user_ids": list(user_ids)}
+    if images_per_ad:
+        shared["images"] = image_pool(image_pool_size)
+    _ad_samples()
+    return run_chunks(
+        _create_ad_chunk,
+        plan_chunks(start, count, chunk_size),
+        workers=workers,
+        shared=shared,
+        stdout=stdout,
+        label="ads",
+        seed=seed,
+        country_id=country.pk,
+        marker=marker,
+        images_per_ad=images_per_ad,
+        days=days,
+    )
+
+
+# =======================
+# Reviews
+# =======================
+
+
+def _create_review_chunk(first, count, seed, days):
+    from django.db.models import Avg, Count, OuterRef, Subquery
+    from django.db.models.functions import Coalesce
+
+    from main.models import AdReview, ClassifiedAd
+
+    rng = chunk_random(seed, first)
+    ad_ids = _shared["ad_ids"]
+    user_ids = _shared["user_ids"]
+    now = timezone.now()
+
+    reviews = []
+    for _n in range(count):
+        created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+        reviews.append(
+            AdReview(
+                ad_id=rng.choice(ad_ids),
+                user_id=rng.choice(user_ids),
+                rating=rng.choices([1, 2, 3, 4, 5], weights=[5, 10, 15, 30, 40], k=1)[
+                    0
+                ],
+                comment=rng.choice(REVIEW_COMMENTS),
+                is_approved=rng.random() > 0.1,
+                created_at=created_at,
+                updated_at=created_at,
+            )
+        )
+    reviewed = {review.ad_id for review in reviews}
+
+    with (
+        muted_signals(),
+        explicit_timestamps(AdReview, "created_at", "updated_at"),
+        transaction.atomic(),
+    ):
+        # One review per user and ad: duplicates drawn at random are skipped
+        AdReview.objects.bulk_create(reviews, batch_size=1000, ignore_conflicts=True)
+        # What AdReview.save() does per review, once per chunk
+        approved = AdReview.objects.filter(ad=OuterRef("pk"), is_approved=True).values(
+            "ad"
+        )
+        ClassifiedAd.objects.filter(pk__in=reviewed).update(
+            rating=Subquery(approved.annotate(avg=Avg("rating")).values("avg")),
+            rating_count=Coalesce(
+                Subquery(approved.annotate(n=Count("pk")).values("n")), 0
+            ),
+        )
+    return len(reviews)
+
+
+def seed_reviews(
+    count,
+    ad_ids,
+    user_ids,
+    days=180,
+    seed=42,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    workers=1,
+    stdout=None,
+):
+    """
+    Draw *count* random reviews (duplicates of an existing user/ad pair are
+    skipped) and refresh the rating of every reviewed ad; the number drawn.
+    """
+    if not count or not ad_ids or not user_ids:
+        return 0
+    return run_chunks(
+        _create_review_chunk,
+        plan_chunks(0, count, chunk_size),
+        workers=workers,
+        shared={"ad_ids": list(ad_ids), "user_ids": list(user_ids)},
+        stdout=stdout,
+        label="reviews",
+        seed=seed,
+        days=days,
+    )
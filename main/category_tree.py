@@ -0,0 +1,232 @@
+"""
+Category tree
+شجرة الأقسام في الذاكرة
+
+The category tree is read on every page (header, sidebars, subcategory
+AJAX, listing filters), each read a query or an MPTT descendant subquery.
+CategoryTree is an immutable snapshot of every category, built from two
+queries and served from memory through the main.registries registry
+``category_tree``:
+
+  - each node keeps its Category instance (for templates), its active
+    children in display order ("order", "name"), its ancestor ids and the
+    precomputed ids of its whole subtree for ``category_id__in`` filters;
+  - country visibility follows Category.get_by_country(): a category is
+    shown in a country it names (``country`` or ``countries``) or, when it
+    names none, everywhere. Per-country child lists are built on first use;
+  - effective ad creation prices are resolved up the ancestors once.
+
+The snapshot is rebuilt when a Category or its countries change (see
+main.signals) and holds shared instances: treat them as read-only.
+"""
+
+import threading
+from decimal import Decimal
+
+# Fields never read from the shared instances; loaded on access if needed
+DEFERRED_FIELDS = ("description", "meta_description", "cart_instructions")
+
+
+class CategoryNode:
+    __slots__ = (
+        "category",
+        "id",
+        "parent_id",
+        "country_ids",
+        "children",
+        "ancestor_ids",
+        "descendant_ids",
+        "effective_price",
+    )
+
+    def __init__(self, category, country_ids):
+        self.category = category
+        self.id = category.pk
+        self.parent_id = category.parent_id
+        self.country_ids = country_ids
+        self.children = ()
+        self.ancestor_ids = ()
+        self.descendant_ids = frozenset()
+        self.effective_price = Decimal("0.00")
+
+    @property
+    def is_active(self):
+        return self.category.is_active
+
+    def visible_in(self, country_id):
+        """Shown in the country with *country_id* (None: in every country)."""
+        return (
+            country_id is None or not self.country_ids or country_id in self.country_ids
+        )
+
+
+def _sort_key(node):
+    return (node.category.order, node.category.name)
+
+
+class CategoryTree:
+    """Immutable snapshot of all categories."""
+
+    def __init__(self, categories, category_countries=()):
+        country_ids = {}
+        for category in categories:
+            country_ids[category.pk] = (
+                {category.country_id} if category.country_id else set()
+            )
+        for category_id, country_id in category_countries:
+            if category_id in country_ids:
+                country_ids[category_id].add(country_id)
+
+        self.nodes = {
+            category.pk: CategoryNode(category, frozenset(country_ids[category.pk]))
+            for category in categories
+        }
+        self.by_slug = {node.category.slug: node for node in self.nodes.values()}
+        self.by_slug_ar = {
+            node.category.slug_ar: node
+            for node in self.nodes.values()
+            if node.category.slug_ar
+        }
+
+        all_children = {}
+        for node in self.nodes.values():
+            if node.parent_id in self.nodes:
+                all_children.setdefault(node.parent_id, []).append(node)
+        self._child_counts = {
+            parent_id: len(children) for parent_id, children in all_children.items()
+        }
+        for parent_id, children in all_children.items():
+            self.nodes[parent_id].children = tuple(
+                sorted((child for child in children if child.is_active), key=_sort_key)
+            )
+        self.roots = tuple(
+            sorted(
+                (
+                    node
+                    for node in self.nodes.values()
+                    if node.parent_id is None and node.is_active
+                ),
+                key=_sort_key,
+            )
+        )
+
+        # Ancestors, subtrees and inherited prices, walking down from every root
+        for root in (
+            node for node in self.nodes.values() if node.parent_id not in self.nodes
+        ):
+            self._walk(root, all_children, (), Decimal("0.00"))
+
+        self._by_country = {}
+        self._lock = threading.Lock()
+
+    def _walk(self, root, all_children, root_ancestors, inherited_price):
+        # Iterative post-order walk: MPTT trees can be deeper than the
+        # recursion limit would like after bad imports
+        stack = [(root, root_ancestors, inherited_price, False)]
+        while stack:
+            node, ancestors, price, done = stack.pop()
+            children = all_children.get(node.id, ())
+            if done:
+                subtree = {node.id}
+                for child in children:
+                    subtree |= child.descendant_ids
+                node.descendant_ids = frozenset(subtree)
+                continue
+            own_price = node.category.ad_creation_price
+            node.effective_price = own_price if own_price and own_price > 0 else price
+            node.ancestor_ids = ancestors
+            stack.append((node, ancestors, price, True))
+            for child in children:
+                stack.append(
+                    (child, ancestors + (node.id,), node.effective_price, False)
+                )
+
+    # =======================
+    # Lookups
+    # =======================
+
+    def get(self, category_id):
+        """The node of *category_id* (active or not), or None."""
+        try:
+            return self.nodes.get(int(category_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get_by_slug(self, slug):
+        return self.by_slug.get(slug) or self.by_slug_ar.get(slug)
+
+    def descendant_ids(self, category_id):
+        """Ids of *category_id* and all its descendants, as get_descendants(include_self=True)."""
+        node = self.get(category_id)
+        return node.descendant_ids if node else frozenset()
+
+    def ancestors(self, category_id):
+        """Category instances from the root down to the parent of *category_id*."""
+        node = self.get(category_id)
+        return (
+            [self.nodes[ancestor_id].category for ancestor_id in node.ancestor_ids]
+            if node
+            else []
+        )
+
+    def child_count(self, category_id):
+        """Number of children, active or not."""
+        return self._child_counts.get(category_id, 0)
+
+    # =======================
+    # Per-country views
+    # =======================
+
+    def _country_children(self, country_id):
+        children = self._by_country.get(country_id)
+        if children is None:
+            children = {
+                node.id: tuple(
+                    child for child in node.children if child.visible_in(country_id)
+                )
+                for node in self.nodes.values()
+                if node.children
+            }
+            children[None] = tuple(
+                root for root in self.roots if root.visible_in(country_id)
+            )
+            with self._lock:
+                self._by_country.setdefault(country_id, children)
+        return children
+
+    def children(self, category_id=None, country_id=None):
+        """
+        Active child nodes of *category_id* (roots when None) in display
+        order, restricted to those shown in *country_id* when given.
+        """
+        if country_id is None:
+            if category_id is None:
+                return self.roots
+            node = self.get(category_id)
+            return node.children if node else ()
+        return self._country_children(country_id).get(category_id, ())
+
+    def roots_for(self, country_id=None, section_type=None):
+        roots = self.children(None, country_id)
+        if section_type:
+            roots = tuple(
+                root for root in roots if root.category.section_type == section_type
+            )
+        return roots
+
+    def has_children(self, category_id, country_id=None):
+        return bool(self.children(category_id, country_id))
+
+
+def build_category_tree():
+    from main.models import Category
+
+    categories = list(
+        Category.objects.select_related(None)
+        .defer(*DEFERRED_FIELDS)
+        .order_by("tree_id", "lft")
+    )
+    category_countries = Category.countries.through.objects.values_list(
+        "category_id", "country_id"
+    )
+    return CategoryTree(categories, category_countries)
@@ -0,0 +1,72 @@
+"""
+Chat inbox listings
+قوائم صناديق المحادثات
+
+Inbox pages are read straight from the ChatRoom summary columns
+(last message preview, per-participant unread counters), ordered by
+(last_activity_at, id) and paginated with an opaque keyset cursor, so a
+page costs one query regardless of how many rooms or messages there are.
+"""
+
+from datetime import UTC, datetime, timedelta
+
+from django.db.models import Q, Sum
+
+INBOX_PAGE_SIZE = 30
+INBOX_MAX_PAGE_SIZE = 100
+
+INBOX_ORDERING = ("-last_activity_at", "-id")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+
+def encode_cursor(room):
+    delta = room.last_activity_at - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return f"{micros}_{room.pk}"
+
+
+def decode_cursor(value):
+    """Return (timestamp, room id) or None for a missing/invalid cursor."""
+    try:
+        micros, pk = value.split("_", 1)
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def paginate_inbox(queryset, cursor=None, limit=INBOX_PAGE_SIZE):
+    """
+    One page of rooms from *queryset* newest activity first, after *cursor*.
+    Returns (rooms, next_cursor); next_cursor is None on the last page.
+    """
+    try:
+        limit = max(1, min(int(limit or INBOX_PAGE_SIZE), INBOX_MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        limit = INBOX_PAGE_SIZE
+    queryset = queryset.order_by(*INBOX_ORDERING)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        timestamp, pk = position
+        queryset = queryset.filter(
+            Q(last_activity_at__lt=timestamp) | Q(last_activity_at=timestamp, pk__lt=pk)
+        )
+    rooms = list(queryset[: limit + 1])
+    next_cursor = encode_cursor(rooms[limit - 1]) if len(rooms) > limit else None
+    return rooms[:limit], next_cursor
+
+
+def unread_totals(user):
+    """
+    Unread chat messages for *user* from the summary counters:
+    {"publisher": in rooms they publish, "client": in rooms they joined as a client}.
+    """
+    from main.models import ChatRoom
+
+    totals = ChatRoom.objects.filter(
+        Q(publisher=user) | Q(client=user), is_active=True
+    ).aggregate(
+        publisher=Sum("unread_publisher", filter=Q(publisher=user)),
+        client=Sum("unread_client", filter=Q(client=user)),
+    )
+    return {key: value or 0 for key, value in totals.items()}
@@ -0,0 +1,330 @@
+"""
+Chat message transport for the WebSocket consumers
+نقل رسائل المحادثة عبر WebSocket
+
+Messages get a server-generated UUID and are broadcast immediately; a
+per-process background writer persists them in micro-batches with
+bulk_create. A batch that fails is retried one row at a time and rows that
+keep failing are logged and dropped, so one bad row cannot hold up the
+room. History is served in pages with a ``before_id`` cursor and
+sender display names are cached per room, so neither path joins the users
+table per message.
+
+Socket protocol (client -> server)::
+
+    {"type": "message", "message": "...", "client_id": "<optional uuid, echoed back>"}
+    {"type": "history", "before_id": 1234, "limit": 30}
+
+Server -> client::
+
+    {"type": "message", "message_id": "<uuid>", "client_id": "<uuid>", ...}
+    {"type": "history", "messages": [...], "has_more": true, "next_before_id": 1200}
+
+``client_id`` only lets the sender match the broadcast to its optimistic
+copy; it is not stored. ``message_id`` is stored as
+ChatMessage.message_uuid. History entries carry the database ``id`` (use it
+as the next cursor) and the ``message_id`` of the broadcast so clients can
+de-duplicate.
+"""
+
+import asyncio
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+
+from channels.db import database_sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Writer flushes after this many seconds or this many queued messages
+FLUSH_INTERVAL = 0.25
+FLUSH_BATCH_SIZE = 200
+# Stop accepting new messages into the buffer past this size (DB outage)
+MAX_PENDING = 10000
+# Flushes a message may fail before it is dropped
+MAX_SAVE_ATTEMPTS = 5
+
+HISTORY_PAGE_SIZE = 30
+HISTORY_MAX_PAGE_SIZE = 100
+
+# Rooms whose sender-name maps are kept in memory
+SENDER_CACHE_ROOMS = 1000
+
+
+def new_message_id():
+    return str(uuid.uuid4())
+
+
+def parse_client_id(value):
+    """The client's own id for a message as a UUID string, or None."""
+    if value:
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            pass
+    return None
+
+
+def display_name(user):
+    return user.get_full_name() or user.username
+
+
+# =======================
+# Sender display names
+# =======================
+
+
+class SenderNameCache:
+    """room id -> {user id: (display name, is_staff)}, LRU over rooms."""
+
+    def __init__(self, max_rooms=SENDER_CACHE_ROOMS):
+        self.max_rooms = max_rooms
+        self._rooms = OrderedDict()
+        self._lock = threading.Lock()
+
+    def remember(self, room_id, user):
+        with self._lock:
+            senders = self._rooms.setdefault(room_id, {})
+            senders[user.pk] = (display_name(user), user.is_staff)
+            self._rooms.move_to_end(room_id)
+            self._evict()
+
+    def resolve(self, room_id, user_ids):
+        """Return {user id: (name, is_staff)}, loading unknown ids in one query."""
+        with self._lock:
+            senders = dict(self._rooms.get(room_id, {}))
+        missing = set(user_ids) - set(senders)
+        if missing:
+            from main.models import User
+
+            for pk, first, last, username, is_staff in User.objects.filter(
+                pk__in=missing
+            ).values_list("pk", "first_name", "last_name", "username", "is_staff"):
+                full_name = f"{first} {last}".strip()
+                senders[pk] = (full_name or username, is_staff)
+            with self._lock:
+                self._rooms.setdefault(room_id, {}).update(senders)
+                self._rooms.move_to_end(room_id)
+                self._evict()
+        return senders
+
+    def _evict(self):
+        while len(self._rooms) > self.max_rooms:
+            self._rooms.popitem(last=False)
+
+
+sender_names = SenderNameCache()
+
+
+# =======================
+# Write-behind message writer
+# =======================
+
+
+class ChatMessageWriter:
+    """
+    Buffers chat messages and persists them with bulk_create from an
+    asyncio task running on the consumer's event loop.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._task = None
+        self._loop = None
+        self._wakeup = None
+        self._flush_lock = None
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = loop.create_task(self._run())
+
+    def enqueue(self, room_id, sender_id, message, message_id):
+        """Queue a message; returns False when the buffer is full."""
+        if len(self._pending) >= MAX_PENDING:
+            return False
+        self._ensure_task()
+        self._pending.append(
+            {
+                "room_id": room_id,
+                "sender_id": sender_id,
+                "message": message,
+                "message_id": message_id,
+                "timestamp": timezone.now(),
+                "attempts": 0,
+            }
+        )
+        if len(self._pending) >= FLUSH_BATCH_SIZE:
+            self._wakeup.set()
+        return True
+
+    def pending_for_room(self, room_id):
+        """Messages for *room_id* accepted by this process but not yet saved."""
+        return [p for p in self._pending if p["room_id"] == room_id]
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=FLUSH_INTERVAL)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._pending:
+                await self.flush()
+
+    async def flush(self):
+        """Persist everything queued so far."""
+        if self._loop is not asyncio.get_running_loop():
+            self._loop = None
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            save = database_sync_to_async(_save_batch)
+            try:
+                await save(batch)
+                return len(batch)
+            except Exception as e:
+                logger.warning(
+                    f"Failed to save {len(batch)} chat messages, saving one by one: {e}"
+                )
+
+            saved, retry = 0, []
+            for item in batch:
+                try:
+                    await save([item])
+                    saved += 1
+                except Exception as e:
+                    item["attempts"] += 1
+                    if item["attempts"] >= MAX_SAVE_ATTEMPTS:
+                        logger.error(
+                            f"Dropping chat message {item['message_id']} of room {item['room_id']} "
+                            f"after {item['attempts']} failed saves: {e}"
+                        )
+                    else:
+                        retry.append(item)
+            # Keep ordering: failed rows go back in front of newer messages
+            self._pending = retry + self._pending
+            return saved
+
+
+def _save_batch(batch):
+    from main.models import ChatMessage, ChatRoom
+
+    message_ids = [item["message_id"] for item in batch]
+    with transaction.atomic():
+        # A retried batch may already be partly saved
+        saved = {
+            str(pk)
+            for pk in ChatMessage.objects.filter(message_uuid__in=message_ids).values_list(
+                "message_uuid", flat=True
+            )
+        }
+        batch = [item for item in batch if item["message_id"] not in saved]
+        if not batch:
+            return
+        ChatMessage.objects.bulk_create(
+            [
+                ChatMessage(
+                    room_id=item["room_id"],
+                    sender_id=item["sender_id"],
+                    message=item["message"],
+                    message_uuid=item["message_id"],
+                )
+                for item in batch
+            ]
+        )
+        # MySQL leaves pks unset after bulk_create; reload to fold the new
+        # rows into the room summaries
+        created = ChatMessage.objects.filter(
+            message_uuid__in=[item["message_id"] for item in batch]
+        ).only("pk", "room_id", "sender_id", "message", "created_at", "is_read")
+        by_room = {}
+        for message in created:
+            by_room.setdefault(message.room_id, []).append(message)
+        for room_id, messages in by_room.items():
+            ChatRoom.record_messages(room_id, messages)
+
+
+_writer = None
+
+
+def get_message_writer():
+    global _writer
+    if _writer is None:
+        _writer = ChatMessageWriter()
+    return _writer
+
+
+# =======================
+# History
+# =======================
+
+
+def fetch_history(room_id, before_id=None, limit=HISTORY_PAGE_SIZE, include_role=False):
+    """
+    One page of saved messages older than *before_id* (newest page when None),
+    oldest first. Returns (messages, has_more).
+    """
+    from main.models import ChatMessage
+
+    limit = max(1, min(int(limit or HISTORY_PAGE_SIZE), HISTORY_MAX_PAGE_SIZE))
+    queryset = ChatMessage.objects.filter(room_id=room_id)
+    if before_id:
+        queryset = queryset.filter(pk__lt=before_id)
+    rows = list(
+        queryset.order_by("-pk").values_list(
+            "pk", "message_uuid", "message", "sender_id", "created_at", "is_read"
+        )[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    names = sender_names.resolve(room_id, {row[3] for row in rows})
+    messages = []
+    for pk, message_uuid, message, sender_id, created_at, is_read in reversed(rows):
+        name, is_staff = names.get(sender_id, ("", False))
+        entry = {
+            "id": pk,
+            "message_id": str(message_uuid) if message_uuid else None,
+            "message": message,
+            "sender_id": sender_id,
+            "sender_name": name,
+            "timestamp": created_at.isoformat(),
+            "is_read": is_read,
+        }
+        if include_role:
+            entry["sender_role"] = "admin" if is_staff else "publisher"
+        messages.append(entry)
+    return messages, has_more
+
+
+def pending_history(room_id, include_role=False):
+    """Unsaved messages of *room_id* in this process, in history-entry format."""
+    pending = get_message_writer().pending_for_room(room_id)
+    if not pending:
+        return []
+    names = sender_names.resolve(room_id, {p["sender_id"] for p in pending})
+    messages = []
+    for item in pending:
+        name, is_staff = names.get(item["sender_id"], ("", False))
+        entry = {
+            "id": None,
+            "message_id": item["message_id"],
+            "message": item["message"],
+            "sender_id": item["sender_id"],
+            "sender_name": name,
+            "timestamp": item["timestamp"].isoformat(),
+            "is_read": False,
+        }
+        if include_role:
+            entry["sender_role"] = "admin" if is_staff else "publisher"
+        messages.append(entry)
+    return messages
@@ -6,11 +6,12 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods, require_POST
-from django.db.models import Q, Max, Count
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 import json
 from django.contrib.auth import get_user_model
+from .chat_inbox import paginate_inbox
 from .models import ChatRoom, ChatMessage
 
 User = get_user_model()
@@ -23,23 +24,15 @@ def chat_list(request):
     """
     user = request.user
 
-    # Get all chat rooms where user is either publisher or client
-    chat_rooms = (
+    # One ordered query over the room summaries, keyset-paginated
+    chat_rooms, next_cursor = paginate_inbox(
         ChatRoom.objects.filter(Q(publisher=user) | Q(client=user), is_active=True)
-        .select_related("publisher", "client", "ad")
-        .annotate(
-            last_message_time=Max("messages__created_at"),
-            unread_count=Count(
-                "messages",
-                filter=Q(messages__is_read=False) & ~Q(messages__sender=user),
-            ),
-        )
-        .order_by("-last_message_time")
+        .select_related("publisher", "client", "ad"),
+        cursor=request.GET.get("cursor"),
     )
 
-    # Get last message for each room
     for room in chat_rooms:
-        room.last_message = room.messages.order_by("-created_at").first()
+        room.unread_count = room.get_unread_count(user)
         # Determine other user - handle admin chat rooms where client can be None
         if room.room_type == "publisher_admin":
             # For admin chats, if current user is staff, other_user is the publisher
@@ -50,6 +43,7 @@ def chat_list(request):
 
     context = {
         "chat_rooms": chat_rooms,
+        "next_cursor": next_cursor,
     }
 
     return render(request, "chat/chat_list.html", context)
@@ -393,6 +387,50 @@ def mark_read(request, room_id):
     return JsonResponse({"success": True})
 
 
+@login_required
+@require_http_methods(["GET"])
+def chat_presence(request):
+    """
+    Presence snapshot for a page of chat rooms (?rooms=1,2,3)
+    لقطة حالة التواجد لمجموعة من المحادثات
+
+    Returns the other participant's online state per room from the Redis
+    presence sets, plus who currently has each room open.
+    """
+    from .presence import get_presence_store
+
+    try:
+        room_ids = [int(pk) for pk in request.GET.get("rooms", "").split(",") if pk.strip()][:100]
+    except ValueError:
+        return JsonResponse({"error": "Invalid room ids"}, status=400)
+
+    rooms = ChatRoom.objects.filter(pk__in=room_ids)
+    if not request.user.is_staff:
+        rooms = rooms.filter(Q(publisher=request.user) | Q(client=request.user))
+    participants = {
+        pk: [uid for uid in (publisher_id, client_id) if uid and uid != request.user.id]
+        for pk, publisher_id, client_id in rooms.values_list("pk", "publisher_id", "client_id")
+    }
+
+    user_ids = {uid for uids in participants.values() for uid in uids}
+    try:
+        snapshot = get_presence_store().snapshot(user_ids=user_ids, room_ids=list(participants))
+    except Exception as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=503)
+
+    online = set(snapshot["online"])
+    result = {}
+    for pk, uids in participants.items():
+        in_room = snapshot["rooms"].get(pk, [])
+        result[str(pk)] = {
+            # Support rooms have no fixed admin: any other member counts
+            "online": any(uid in online for uid in uids)
+            or any(uid != request.user.id for uid in in_room),
+            "in_room": in_room,
+        }
+    return JsonResponse({"success": True, "rooms": result})
+
+
 @login_required
 @require_POST
 def archive_chat_room(request, room_id):
@@ -407,7 +445,7 @@ def archive_chat_room(request, room_id):
 
     # Soft delete by setting is_active to False
     chat_room.is_active = False
-    chat_room.save()
+    chat_room.save(update_fields=["is_active", "updated_at"])
 
     return JsonResponse({"success": True})
 
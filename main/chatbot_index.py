@@ -0,0 +1,303 @@
+"""
+Chatbot knowledge index
+فهرس قاعدة معرفة المساعد الذكي
+
+The helper widget used to answer each message with a three-field icontains
+query and, on a miss, another query per word. Active ChatbotKnowledgeBase
+entries and quick actions are now loaded once per process into an inverted
+index:
+
+  - text is lowercased, Arabic diacritics and tatweel are removed and alef /
+    yaa / taa marbuta / hamza-carrier variants are unified, then split into
+    word tokens; "ال" and its attached forms ("وال", "بال", ...) are also
+    indexed stripped, so "الإعلانات" is found by "اعلانات";
+  - every token of an entry's question and keywords (weight 3) and answer
+    (weight 1) is posted, together with its prefixes of at least
+    MIN_TOKEN_LENGTH characters at half weight, so "اعلان" still finds
+    "اعلانات" like the old substring search did;
+  - a message is scored by summing the postings of its tokens, weighted by
+    how rare each token is, and boosted by the entry's priority.
+
+The index is a main.registries.ReadOnlyRegistry: rebuilt when a knowledge
+entry or quick action changes (main.signals) or another process bumps the
+shared version stamp.
+
+Conversation rows are buffered per process and written with one bulk INSERT
+per batch on the Django-Q cluster, so created_at is the time the batch was
+written. A buffer is flushed once it holds LOG_FLUSH_THRESHOLD rows or
+LOG_FLUSH_INTERVAL seconds after its first row (main.write_behind), so an
+idle worker does not hold replies back from the history and the admin.
+Replies are identified by a UUID reference, so a reply can be rated before
+its row exists: every reference issued is marked in the cache, where a
+rating is parked until the batch is saved; unknown references are refused.
+"""
+
+import atexit
+import logging
+import math
+import re
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from main.arabic_text import ARABIC_FOLD, ARABIC_MARKS
+from main.registries import ReadOnlyRegistry
+from main.write_behind import FlushTimer
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_VERSION_KEY = "chatbot_index_version"
+
+# Shorter words (and prefixes) are not indexed, as before
+MIN_TOKEN_LENGTH = 3
+FIELD_WEIGHTS = (("question", 3.0), ("keywords", 3.0), ("answer", 1.0))
+PREFIX_WEIGHT = 0.5
+# Score multiplier per priority point
+PRIORITY_BOOST = 0.1
+
+# Flush buffered conversation rows after this many seconds or rows
+LOG_FLUSH_INTERVAL = 5
+LOG_FLUSH_THRESHOLD = 50
+# Ratings of replies whose row is not written yet wait this long in the cache
+PENDING_RATING_KEY = "chatbot_rating:{}"
+PENDING_RATING_TTL = 60 * 10
+# Cached for a reference issued but not rated yet
+UNRATED = "unrated"
+
+_FOLD = str.maketrans({**ARABIC_FOLD, **dict.fromkeys(ARABIC_MARKS)})
+# \w matches Arabic letters; "_" is a separator here
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_ARTICLES = ("وال", "بال", "كال", "فال", "لل", "ال")
+
+
+def normalize(text):
+    return (text or "").lower().translate(_FOLD)
+
+
+def tokenize(text):
+    """Normalised tokens of *text*, plus their article-stripped forms."""
+    tokens = []
+    for token in _TOKEN_RE.findall(normalize(text)):
+        tokens.append(token)
+        for article in _ARTICLES:
+            if (
+                token.startswith(article)
+                and len(token) - len(article) >= MIN_TOKEN_LENGTH
+            ):
+                tokens.append(token[len(article) :])
+                break
+    return [token for token in tokens if len(token) >= MIN_TOKEN_LENGTH]
+
+
+class KnowledgeIndex:
+    """Immutable snapshot of the active knowledge entries and quick actions."""
+
+    def __init__(self, entries, quick_actions=()):
+        """*entries* in tie-break order (priority, then newest first)."""
+        self.entries = list(entries)
+        self.quick_actions = list(quick_actions)
+        self._boost = [
+            1 + PRIORITY_BOOST * max(entry.priority, 0) for entry in self.entries
+        ]
+
+        postings = defaultdict(dict)  # token -> {entry position: weight}
+        for position, entry in enumerate(self.entries):
+            for field, weight in FIELD_WEIGHTS:
+                for token in set(tokenize(getattr(entry, field))):
+                    self._post(postings, token, position, weight)
+                    for end in range(MIN_TOKEN_LENGTH, len(token)):
+                        self._post(
+                            postings, token[:end], position, weight * PREFIX_WEIGHT
+                        )
+
+        # Tokens found in many entries ("كيف", "ما") count for less
+        total = len(self.entries)
+        self._postings = {
+            token: [
+                (position, weight * math.log(1 + total / len(hits)))
+                for position, weight in hits.items()
+            ]
+            for token, hits in postings.items()
+        }
+
+    @staticmethod
+    def _post(postings, token, position, weight):
+        hits = postings[token]
+        if weight > hits.get(position, 0):
+            hits[position] = weight
+
+    def search(self, message, limit=5):
+        """Entries matching *message*, best first."""
+        scores = defaultdict(float)
+        for token in set(tokenize(message)):
+            for position, weight in self._postings.get(token, ()):
+                scores[position] += weight
+        ranked = sorted(
+            scores,
+            key=lambda position: (-scores[position] * self._boost[position], position),
+        )
+        return [self.entries[position] for position in ranked[:limit]]
+
+    def best_match(self, message):
+        matches = self.search(message, limit=1)
+        return matches[0] if matches else None
+
+
+# =======================
+# Process-wide index
+# =======================
+
+
+def build_knowledge_index():
+    from main.chatbot_models import ChatbotKnowledgeBase, ChatbotQuickAction
+
+    entries = ChatbotKnowledgeBase.objects.filter(is_active=True).order_by(
+        "-priority", "-created_at", "-pk"
+    )
+    quick_actions = ChatbotQuickAction.objects.filter(is_active=True).order_by(
+        "order", "pk"
+    )
+    return KnowledgeIndex(entries, quick_actions)
+
+
+knowledge_index = ReadOnlyRegistry(
+    "chatbot_index", build_knowledge_index, KNOWLEDGE_VERSION_KEY
+)
+
+
+def get_knowledge_index():
+    """The current KnowledgeIndex, rebuilt when the knowledge base has changed."""
+    return knowledge_index.get()
+
+
+def invalidate_knowledge_index():
+    knowledge_index.invalidate()
+
+
+# =======================
+# Buffered conversation log
+# =======================
+
+_pending_rows = []
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def log_conversation(
+    session_id, user, user_message, bot_response, matched_knowledge=None
+):
+    """
+    Queue one conversation row; return (reference, created_at) of the reply.
+    """
+    reference = uuid.uuid4()
+    created_at = timezone.now()
+    row = {
+        "reference": reference,
+        "session_id": session_id,
+        "user_id": getattr(user, "pk", None),
+        "user_message": user_message,
+        "bot_response": bot_response,
+        "matched_knowledge_id": getattr(matched_knowledge, "pk", None),
+    }
+    try:
+        cache.set(PENDING_RATING_KEY.format(reference), UNRATED, PENDING_RATING_TTL)
+    except Exception as e:
+        logger.warning(f"Could not record chatbot reply reference: {e}")
+    with _pending_lock:
+        _pending_rows.append(row)
+        due = (
+            len(_pending_rows) >= LOG_FLUSH_THRESHOLD
+            or time.monotonic() - _last_flush >= LOG_FLUSH_INTERVAL
+        )
+    if due:
+        flush_conversation_log()
+    else:
+        _flush_timer.arm()
+    return reference, created_at
+
+
+def rate_pending(reference, is_helpful):
+    """Rate a reply still in this process's buffer; False when it is not there."""
+    with _pending_lock:
+        for row in _pending_rows:
+            if row["reference"] == reference:
+                row["is_helpful"] = is_helpful
+                return True
+    return False
+
+
+def park_rating(reference, is_helpful):
+    """
+    Keep the rating of a reply another process has not written yet; False
+    when no such reply was issued.
+    """
+    key = PENDING_RATING_KEY.format(reference)
+    try:
+        if cache.get(key) is None:
+            return False
+        cache.set(key, is_helpful, PENDING_RATING_TTL)
+    except Exception as e:
+        logger.warning(f"Could not park chatbot rating: {e}")
+        return False
+    return True
+
+
+def save_conversation_batch(rows):
+    """Django-Q task: write buffered conversation rows with one bulk INSERT."""
+    from main.chatbot_models import ChatbotConversation
+
+    keys = [PENDING_RATING_KEY.format(row["reference"]) for row in rows]
+    try:
+        ratings = cache.get_many(keys) if keys else {}
+    except Exception as e:
+        logger.warning(f"Chatbot rating lookup failed: {e}")
+        ratings = {}
+
+    conversations = []
+    for row in rows:
+        fields = dict(row)
+        rating = ratings.get(PENDING_RATING_KEY.format(row["reference"]))
+        fields.setdefault("is_helpful", None if rating == UNRATED else rating)
+        conversations.append(ChatbotConversation(**fields))
+    ChatbotConversation.objects.bulk_create(conversations, batch_size=500)
+
+    if ratings:
+        try:
+            cache.delete_many(list(ratings))
+        except Exception:
+            pass
+    return {"success": True, "count": len(conversations)}
+
+
+def flush_conversation_log():
+    """Hand the buffered rows to the task queue; write them inline if it is unavailable."""
+    global _pending_rows, _last_flush
+
+    _flush_timer.cancel()
+    with _pending_lock:
+        rows, _pending_rows = _pending_rows, []
+        _last_flush = time.monotonic()
+    if not rows:
+        return 0
+
+    try:
+        from django_q.tasks import async_task
+
+        async_task("main.chatbot_index.save_conversation_batch", rows)
+    except Exception as e:
+        logger.warning(f"Could not queue chatbot log batch, saving inline: {e}")
+        try:
+            save_conversation_batch(rows)
+        except Exception as e:
+            logger.error(f"Failed to save {len(rows)} chatbot conversations: {e}")
+            return 0
+    return len(rows)
+
+
+_flush_timer = FlushTimer("chatbot_log", flush_conversation_log, LOG_FLUSH_INTERVAL)
+
+atexit.register(flush_conversation_log)
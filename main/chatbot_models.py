@@ -64,6 +64,14 @@ class ChatbotKnowledgeBase(models.Model):
 class ChatbotConversation(models.Model):
     """Store chatbot conversations"""
     
+    reference = models.UUIDField(
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        verbose_name=_("مرجع الرد"),
+        help_text=_("Identifies the reply before its row is written (see main.chatbot_index)")
+    )
     session_id = models.CharField(
         max_length=255,
         verbose_name=_("معرف الجلسة")
@@ -4,7 +4,7 @@ Chatbot Service for Idrissimart Helper
 import re
 import uuid
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Q
+from .chatbot_index import get_knowledge_index, log_conversation, park_rating, rate_pending
 from .chatbot_models import ChatbotKnowledgeBase, ChatbotConversation, ChatbotQuickAction
 
 
@@ -69,34 +69,8 @@ class IdrissmartChatbot:
     
     def search_knowledge_base(self, message):
         """Search knowledge base for relevant answers"""
-        # Preprocess message
-        clean_message = self.preprocess_message(message)
-        
-        # Search in questions and keywords
-        results = ChatbotKnowledgeBase.objects.filter(
-            Q(question__icontains=clean_message) |
-            Q(keywords__icontains=clean_message) |
-            Q(answer__icontains=clean_message),
-            is_active=True
-        ).order_by('-priority', '-created_at')
-        
-        if results.exists():
-            return results.first()
-        
-        # Try word-by-word search
-        words = clean_message.split()
-        for word in words:
-            if len(word) > 2:  # Skip very short words
-                results = ChatbotKnowledgeBase.objects.filter(
-                    Q(question__icontains=word) |
-                    Q(keywords__icontains=word),
-                    is_active=True
-                ).order_by('-priority', '-created_at')
-                
-                if results.exists():
-                    return results.first()
-        
-        return None
+        # Ranked lookup in the in-memory index (see main.chatbot_index)
+        return get_knowledge_index().best_match(self.preprocess_message(message))
     
     def get_response(self, message, session_id=None, user=None):
         """Get chatbot response for user message"""
@@ -126,8 +100,8 @@ class IdrissmartChatbot:
         if suggestions:
             response += f"\n\n{suggestions}"
         
-        # Save conversation
-        conversation = ChatbotConversation.objects.create(
+        # Save conversation (buffered, written in bulk by the task queue)
+        reference, created_at = log_conversation(
             session_id=session_id,
             user=user,
             user_message=message,
@@ -138,7 +112,8 @@ class IdrissmartChatbot:
         return {
             'response': response,
             'session_id': session_id,
-            'conversation_id': conversation.id,
+            'conversation_id': str(reference),
+            'created_at': created_at,
             'matched_knowledge': matched_knowledge,
             'quick_actions': self.get_quick_actions(intent, matched_knowledge),
             'suggestions': self.get_text_suggestions(intent, matched_knowledge, message)
@@ -148,27 +123,28 @@ class IdrissmartChatbot:
         """Get relevant quick action buttons"""
         actions = []
         
-        # Get active quick actions
-        quick_actions = ChatbotQuickAction.objects.filter(is_active=True)
+        # Active quick actions, cached with the knowledge index
+        quick_actions = get_knowledge_index().quick_actions
         
         if intent == 'greeting':
             # Show most common actions for new users
-            actions = quick_actions.filter(
-                action_type__in=['message', 'url']
-            )[:4]
+            actions = [
+                action for action in quick_actions
+                if action.action_type in ('message', 'url')
+            ][:4]
         elif matched_knowledge:
             # Show category-related actions
-            category_actions = quick_actions.filter(
-                action_value__icontains=matched_knowledge.category
-            )[:3]
-            actions.extend(category_actions)
+            category = matched_knowledge.category.lower()
+            actions = [
+                action for action in quick_actions
+                if category in action.action_value.lower()
+            ][:3]
         
         # Always include some general actions
-        general_actions = quick_actions.filter(
-            action_type='message'
-        ).exclude(
-            id__in=[action.id for action in actions]
-        )[:2]
+        general_actions = [
+            action for action in quick_actions
+            if action.action_type == 'message' and action not in actions
+        ][:2]
         actions.extend(general_actions)
         
         return actions[:5]  # Limit to 5 actions
@@ -295,13 +271,24 @@ class IdrissmartChatbot:
     
     def rate_response(self, conversation_id, is_helpful):
         """Rate chatbot response"""
+        # Older clients send the row id, current ones the reply reference
+        if str(conversation_id).isdigit():
+            return ChatbotConversation.objects.filter(
+                id=conversation_id
+            ).update(is_helpful=is_helpful) > 0
+        
         try:
-            conversation = ChatbotConversation.objects.get(id=conversation_id)
-            conversation.is_helpful = is_helpful
-            conversation.save()
-            return True
-        except ChatbotConversation.DoesNotExist:
+            reference = uuid.UUID(str(conversation_id))
+        except ValueError:
             return False
+        if rate_pending(reference, is_helpful):
+            return True
+        if ChatbotConversation.objects.filter(
+            reference=reference
+        ).update(is_helpful=is_helpful):
+            return True
+        # Still buffered by another process: applied when its batch is saved
+        return park_rating(reference, is_helpful)
     
     def get_conversation_history(self, session_id, limit=10):
         """Get conversation history for session"""
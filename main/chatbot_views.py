@@ -10,8 +10,9 @@ from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.core.paginator import Paginator
+from .chatbot_index import get_knowledge_index
 from .chatbot_service import IdrissmartChatbot
-from .chatbot_models import ChatbotConversation, ChatbotQuickAction
+from .chatbot_models import ChatbotConversation
 
 
 class ChatbotView(View):
@@ -19,7 +20,7 @@ class ChatbotView(View):
     
     def get(self, request):
         """Render chatbot interface"""
-        quick_actions = ChatbotQuickAction.objects.filter(is_active=True)[:5]
+        quick_actions = get_knowledge_index().quick_actions[:5]
         
         context = {
             'quick_actions': quick_actions,
@@ -74,9 +75,7 @@ def chatbot_message(request):
             'conversation_id': response_data['conversation_id'],
             'quick_actions': quick_actions,
             'suggestions': response_data.get('suggestions', []),
-            'timestamp': ChatbotConversation.objects.get(
-                id=response_data['conversation_id']
-            ).created_at.isoformat()
+            'timestamp': response_data['created_at'].isoformat()
         })
         
     except json.JSONDecodeError:
@@ -145,7 +144,7 @@ def chatbot_history(request):
         history = []
         for conv in conversations:
             history.append({
-                'id': conv.id,
+                'id': str(conv.reference),
                 'user_message': conv.user_message,
                 'bot_response': conv.bot_response,
                 'timestamp': conv.created_at.isoformat(),
@@ -173,7 +172,7 @@ class ChatbotAdminView(View):
         if not request.user.is_staff:
             return render(request, '403.html', status=403)
         
-        from .chatbot_models import ChatbotKnowledgeBase, ChatbotQuickAction
+        from .chatbot_models import ChatbotKnowledgeBase
         
         # Get conversation statistics
         total_conversations = ChatbotConversation.objects.count()
@@ -213,8 +212,7 @@ class ChatbotAdminView(View):
 
 def chatbot_widget_data(request):
     """Get data for chatbot widget"""
-    from .chatbot_models import ChatbotQuickAction
-    quick_actions = ChatbotQuickAction.objects.filter(is_active=True)[:3]
+    quick_actions = get_knowledge_index().quick_actions[:3]
     
     actions_data = []
     for action in quick_actions:
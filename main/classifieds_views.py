@@ -3,7 +3,7 @@ from decimal import Decimal
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models import F
 from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
@@ -28,6 +28,7 @@ from .models import (
     User,
     UserPackage,
 )
+from .recommendations import get_similar_ads
 from .utils import get_selected_country_from_request
 
 
@@ -103,22 +104,12 @@ class ClassifiedAdListView(FilterView):
         # Get custom fields for filtering if category is selected
         category_id = self.request.GET.get('category') or self.request.GET.get('subcategory')
         if category_id:
-            from .models import CategoryCustomField
+            from .registries import get_custom_field_schemas
 
             try:
                 category = Category.objects.get(pk=int(category_id))
-                # Get all custom fields that should show in filters
-                filter_fields = (
-                    CategoryCustomField.objects.filter(
-                        category=category,
-                        show_in_filters=True,
-                        is_active=True
-                    )
-                    .select_related('custom_field')
-                    .order_by('order')
-                )
-
-                context['category_filter_fields'] = filter_fields
+                # Custom fields that should show in filters (in-memory schema)
+                context['category_filter_fields'] = get_custom_field_schemas().filter_fields(category.pk)
                 context['selected_category'] = category
             except (Category.DoesNotExist, ValueError, TypeError):
                 pass
@@ -315,51 +306,27 @@ class PublisherReportsView(LoginRequiredMixin, ListView):
         )
 
     def get_context_data(self, **kwargs):
-        from django.db.models import Avg, Count, Max, Min, Sum
+        from django.db.models import Count, Sum
         from datetime import timedelta
 
+        from main.publisher_stats import get_publisher_stats, status_breakdown
+
         context = super().get_context_data(**kwargs)
         context["active_nav"] = "statistics"
 
         user_ads = ClassifiedAd.objects.filter(user=self.request.user)
         now = timezone.now()
 
-        # Overall Statistics
-        context["stats"] = {
-            "total_ads": user_ads.count(),
-            "active_ads": user_ads.filter(status=ClassifiedAd.AdStatus.ACTIVE).count(),
-            "pending_ads": user_ads.filter(
-                status=ClassifiedAd.AdStatus.PENDING
-            ).count(),
-            "rejected_ads": user_ads.filter(
-                status=ClassifiedAd.AdStatus.REJECTED
-            ).count(),
-            "expired_ads": user_ads.filter(
-                status=ClassifiedAd.AdStatus.EXPIRED
-            ).count(),
-            "total_views": user_ads.aggregate(Sum("views_count"))["views_count__sum"]
-            or 0,
-            "avg_views": user_ads.aggregate(Avg("views_count"))["views_count__avg"]
-            or 0,
-            "highlighted_ads": user_ads.filter(is_highlighted=True).count(),
-            "pinned_ads": user_ads.filter(is_pinned=True).count(),
-            "urgent_ads": user_ads.filter(is_urgent=True).count(),
-        }
-
-        # This Month Statistics
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_ads = user_ads.filter(created_at__gte=month_start)
+        # Overall, this month and this week: one aggregate query, cached per publisher
+        stats = get_publisher_stats(self.request.user)
+        context["stats"] = stats
         context["month_stats"] = {
-            "new_ads": month_ads.count(),
-            "views": month_ads.aggregate(Sum("views_count"))["views_count__sum"] or 0,
+            "new_ads": stats["month_new_ads"],
+            "views": stats["month_views"],
         }
-
-        # This Week Statistics
-        week_start = now - timedelta(days=now.weekday())
-        week_ads = user_ads.filter(created_at__gte=week_start)
         context["week_stats"] = {
-            "new_ads": week_ads.count(),
-            "views": week_ads.aggregate(Sum("views_count"))["views_count__sum"] or 0,
+            "new_ads": stats["week_new_ads"],
+            "views": stats["week_views"],
         }
 
         # Top Performing Ads
@@ -373,9 +340,7 @@ class PublisherReportsView(LoginRequiredMixin, ListView):
         )
 
         # Ads by Status
-        context["status_stats"] = (
-            user_ads.values("status").annotate(count=Count("id")).order_by("-count")
-        )
+        context["status_stats"] = status_breakdown(stats)
 
         # Recent Activity (last 7 days)
         last_7_days = now - timedelta(days=7)
@@ -1431,34 +1396,8 @@ class ClassifiedAdDetailView(DetailView):
         # Use the already-fetched object to avoid incrementing views_count twice
         ad = context.get("ad") or getattr(self, "object", None)
 
-        # Define a price range (e.g., +/- 25%)
-        price_range_min = ad.price * Decimal("0.75")
-        price_range_max = ad.price * Decimal("1.25")
-
-        # Build a relevance score using annotations
-        related_ads = (
-            ClassifiedAd.objects.filter(
-                category=ad.category, status=ClassifiedAd.AdStatus.ACTIVE
-            )
-            .exclude(pk=ad.pk)
-            .annotate(
-                relevance_score=Case(
-                    When(city__iexact=ad.city, then=Value(2)),
-                    default=Value(0),
-                    output_field=IntegerField(),
-                )
-                + Case(
-                    When(
-                        price__range=(price_range_min, price_range_max), then=Value(1)
-                    ),
-                    default=Value(0),
-                    output_field=IntegerField(),
-                )
-            )
-            .select_related("user")
-            .prefetch_related("images", "features")
-            .order_by("-relevance_score", "-created_at")[:12]
-        )
+        # Precomputed similar ads (main.recommendations)
+        related_ads = get_similar_ads(ad, limit=12)
 
         context["related_ads"] = related_ads
 
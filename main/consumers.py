@@ -3,20 +3,270 @@ WebSocket Consumers for Real-time Chat
 """
 
 import json
+import logging
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
 from django.utils import timezone
-from .models import ChatMessage, ChatRoom, ClassifiedAd
+from .chat_transport import (
+    HISTORY_PAGE_SIZE,
+    display_name,
+    fetch_history,
+    get_message_writer,
+    new_message_id,
+    parse_client_id,
+    pending_history,
+    sender_names,
+)
+from .models import ChatRoom, ClassifiedAd
+from .presence import TypingDebouncer, get_presence_store, online_user_ids
+from .services.email_service import EmailService
+from .services.messaging import asend_email
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
+# An offline participant gets at most one new-message email per room per window
+OFFLINE_EMAIL_KEY = "chat_offline_email:{room_id}:{user_id}"
+OFFLINE_EMAIL_INTERVAL = 600
+
 
-class PublisherClientChatConsumer(AsyncWebsocketConsumer):
+class BufferedChatMixin:
+    """
+    Shared message/history handling for the chat consumers: messages are
+    broadcast first and saved by the write-behind writer in chat_transport.
+    """
+
+    include_sender_role = False
+    history_page_size = HISTORY_PAGE_SIZE
+    # Email the other participant of the room when they are not connected
+    notify_offline = False
+
+    def remember_sender(self):
+        self.display_name = display_name(self.user)
+        sender_names.remember(self.room.id, self.user)
+
+    def message_extra(self):
+        return {}
+
+    async def broadcast_message(self, data):
+        message = data.get("message", "").strip()
+        if not message:
+            return
+
+        message_id = new_message_id()
+        client_id = parse_client_id(data.get("client_id"))
+        if not get_message_writer().enqueue(self.room.id, self.user.id, message, message_id):
+            await self.send(
+                text_data=json.dumps(
+                    {"type": "error", "message": "Chat is busy, please retry", "client_id": client_id}
+                )
+            )
+            return
+
+        # Send message to room group
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                "type": "chat_message",
+                "message": message,
+                "sender_id": self.user.id,
+                "sender_name": self.display_name,
+                "timestamp": timezone.now().isoformat(),
+                "message_id": message_id,
+                "client_id": client_id,
+                **self.message_extra(),
+            },
+        )
+        await self.stop_typing()
+        if self.notify_offline:
+            await self.notify_offline_recipient(message)
+
+    async def notify_offline_recipient(self, message):
+        try:
+            email = await self.offline_recipient_email(message)
+            if email:
+                await asend_email(*email)
+        except Exception as e:
+            logger.warning(f"New message email failed for room {self.room.id}: {e}")
+
+    @database_sync_to_async
+    def offline_recipient_email(self, message):
+        """
+        ([address], subject, html) of the new-message email for the other
+        participant, or None when they are online, opted out or were emailed
+        about this room less than OFFLINE_EMAIL_INTERVAL ago.
+        """
+        room = self.room
+        recipient_id = room.client_id if self.user.id == room.publisher_id else room.publisher_id
+        if not recipient_id or online_user_ids([recipient_id]):
+            return None
+        recipient = (
+            User.objects.filter(pk=recipient_id)
+            .only("email", "username", "first_name", "last_name", "notify_new_messages")
+            .first()
+        )
+        if not recipient or not recipient.email or not recipient.notify_new_messages:
+            return None
+        if not cache.add(
+            OFFLINE_EMAIL_KEY.format(room_id=room.id, user_id=recipient_id), True, OFFLINE_EMAIL_INTERVAL
+        ):
+            return None
+
+        from constance import config
+
+        ad_title = ClassifiedAd.objects.filter(pk=room.ad_id).values_list("title", flat=True).first() or ""
+        site_url = (getattr(config, "SITE_URL", "") or "").rstrip("/")
+        rendered = EmailService.render_new_message_email(
+            receiver_name=recipient.get_full_name() or recipient.username,
+            sender_name=self.display_name,
+            message_preview=message[:200],
+            chat_url=site_url + reverse("main:chat_room", kwargs={"room_id": room.id}),
+            ad_title=ad_title,
+        )
+        return ([recipient.email], *rendered) if rendered else None
+
+    async def send_chat_history(self, before_id=None, limit=None):
+        """
+        Send one page of history. The first page (no before_id) also includes
+        messages this process has broadcast but not saved yet.
+        """
+        messages, has_more = await self.get_history_page(before_id, limit or self.history_page_size)
+        await self.send(
+            text_data=json.dumps(
+                {
+                    "type": "history",
+                    "messages": messages,
+                    "has_more": has_more,
+                    "next_before_id": next((m["id"] for m in messages if m["id"]), None),
+                    "before_id": before_id,
+                }
+            )
+        )
+
+    @database_sync_to_async
+    def get_history_page(self, before_id, limit):
+        messages, has_more = fetch_history(
+            self.room.id, before_id=before_id, limit=limit, include_role=self.include_sender_role
+        )
+        if before_id is None:
+            saved = {m["message_id"] for m in messages}
+            messages += [
+                m
+                for m in pending_history(self.room.id, include_role=self.include_sender_role)
+                if m["message_id"] not in saved
+            ]
+        return messages, has_more
+
+    async def handle_history_request(self, data):
+        try:
+            before_id = int(data["before_id"]) if data.get("before_id") else None
+            limit = int(data.get("limit") or self.history_page_size)
+        except (TypeError, ValueError):
+            await self.send(text_data=json.dumps({"type": "error", "message": "Invalid cursor"}))
+            return
+        await self.send_chat_history(before_id=before_id, limit=limit)
+
+    async def flush_pending_messages(self):
+        await get_message_writer().flush()
+
+    # -- presence / typing -------------------------------------------------
+
+    async def touch_presence(self):
+        try:
+            await get_presence_store().atouch(self.user.id, self.room.id)
+        except Exception as e:
+            logger.warning(f"Presence heartbeat failed for user {self.user.id}: {e}")
+
+    async def join_presence(self):
+        self.typing_debouncer = TypingDebouncer()
+        self.is_typing = False
+        await self.touch_presence()
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {"type": "user_presence", "user_id": self.user.id, "status": "online"},
+        )
+
+    async def leave_presence(self):
+        try:
+            await get_presence_store().aleave(self.user.id, self.room.id)
+        except Exception as e:
+            logger.warning(f"Presence leave failed for user {self.user.id}: {e}")
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {"type": "user_presence", "user_id": self.user.id, "status": "offline"},
+        )
+
+    async def handle_heartbeat(self):
+        await self.touch_presence()
+        await self.send(text_data=json.dumps({"type": "heartbeat_ack"}))
+
+    async def handle_typing(self, data):
+        """
+        Typing starts are broadcast at most once per TYPING_DEBOUNCE seconds;
+        a stop ({"is_typing": false}) or a sent message always goes through.
+        """
+        is_typing = bool(data.get("is_typing", True))
+        if is_typing and not self.typing_debouncer.should_send():
+            return
+        if not is_typing and not self.is_typing:
+            return
+        self.is_typing = is_typing
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                "type": "user_typing",
+                "user_id": self.user.id,
+                "user_name": self.display_name,
+                "is_typing": is_typing,
+            },
+        )
+
+    async def stop_typing(self):
+        self.typing_debouncer.reset()
+        if self.is_typing:
+            await self.handle_typing({"is_typing": False})
+
+    async def user_typing(self, event):
+        """
+        Receive typing indicator from room group
+        """
+        # Don't send typing indicator to self
+        if event["user_id"] != self.user.id:
+            await self.send(
+                text_data=json.dumps(
+                    {
+                        "type": "typing",
+                        "user_id": event["user_id"],
+                        "user_name": event["user_name"],
+                        "is_typing": event.get("is_typing", True),
+                    }
+                )
+            )
+
+    async def user_presence(self, event):
+        """
+        Receive online/offline changes of the other participants
+        """
+        if event["user_id"] != self.user.id:
+            await self.send(
+                text_data=json.dumps(
+                    {"type": "presence", "user_id": event["user_id"], "status": event["status"]}
+                )
+            )
+
+
+class PublisherClientChatConsumer(BufferedChatMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for chat between publisher and client about a specific ad
     """
 
+    notify_offline = True
+
     async def connect(self):
         self.ad_id = self.scope["url_route"]["kwargs"]["ad_id"]
         self.user = self.scope["user"]
@@ -33,11 +283,13 @@ class PublisherClientChatConsumer(AsyncWebsocketConsumer):
             return
 
         self.room_group_name = f"chat_ad_{self.ad_id}_{self.room.id}"
+        self.remember_sender()
 
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
         await self.accept()
+        await self.join_presence()
 
         # Send chat history
         await self.send_chat_history()
@@ -48,6 +300,8 @@ class PublisherClientChatConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_discard(
                 self.room_group_name, self.channel_name
             )
+            await self.leave_presence()
+            await self.flush_pending_messages()
 
     async def receive(self, text_data):
         try:
@@ -55,36 +309,16 @@ class PublisherClientChatConsumer(AsyncWebsocketConsumer):
             message_type = data.get("type", "message")
 
             if message_type == "message":
-                message = data.get("message", "").strip()
-
-                if message:
-                    # Save message to database
-                    chat_message = await self.save_message(message)
-
-                    # Send message to room group
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            "type": "chat_message",
-                            "message": message,
-                            "sender_id": self.user.id,
-                            "sender_name": self.user.get_full_name()
-                            or self.user.username,
-                            "timestamp": chat_message.created_at.isoformat(),
-                            "message_id": chat_message.id,
-                        },
-                    )
+                await self.broadcast_message(data)
+
+            elif message_type == "history":
+                await self.handle_history_request(data)
 
             elif message_type == "typing":
-                # Broadcast typing indicator
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "user_typing",
-                        "user_id": self.user.id,
-                        "user_name": self.user.get_full_name() or self.user.username,
-                    },
-                )
+                await self.handle_typing(data)
+
+            elif message_type == "heartbeat":
+                await self.handle_heartbeat()
 
         except Exception as e:
             await self.send(text_data=json.dumps({"type": "error", "message": str(e)}))
@@ -102,26 +336,11 @@ class PublisherClientChatConsumer(AsyncWebsocketConsumer):
                     "sender_name": event["sender_name"],
                     "timestamp": event["timestamp"],
                     "message_id": event["message_id"],
+                    "client_id": event["client_id"],
                 }
             )
         )
 
-    async def user_typing(self, event):
-        """
-        Receive typing indicator from room group
-        """
-        # Don't send typing indicator to self
-        if event["user_id"] != self.user.id:
-            await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "typing",
-                        "user_id": event["user_id"],
-                        "user_name": event["user_name"],
-                    }
-                )
-            )
-
     @database_sync_to_async
     def get_or_create_room(self):
         """
@@ -152,52 +371,15 @@ class PublisherClientChatConsumer(AsyncWebsocketConsumer):
         except ClassifiedAd.DoesNotExist:
             return None
 
-    @database_sync_to_async
-    def save_message(self, message):
-        """
-        Save message to database
-        """
-        return ChatMessage.objects.create(
-            room=self.room, sender=self.user, message=message
-        )
 
-    async def send_chat_history(self):
-        """
-        Send recent chat history to newly connected user
-        """
-        messages = await self.get_recent_messages()
-
-        await self.send(text_data=json.dumps({"type": "history", "messages": messages}))
-
-    @database_sync_to_async
-    def get_recent_messages(self, limit=50):
-        """
-        Get recent messages from database
-        """
-        messages = (
-            ChatMessage.objects.filter(room=self.room)
-            .select_related("sender")
-            .order_by("-created_at")[:limit]
-        )
-
-        return [
-            {
-                "id": msg.id,
-                "message": msg.message,
-                "sender_id": msg.sender.id,
-                "sender_name": msg.sender.get_full_name() or msg.sender.username,
-                "timestamp": msg.created_at.isoformat(),
-                "is_read": msg.is_read,
-            }
-            for msg in reversed(messages)
-        ]
-
-
-class PublisherAdminChatConsumer(AsyncWebsocketConsumer):
+class PublisherAdminChatConsumer(BufferedChatMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for chat between publisher and admin
     """
 
+    include_sender_role = True
+    history_page_size = 50
+
     async def connect(self):
         self.room_name = self.scope["url_route"]["kwargs"]["room_name"]
         self.user = self.scope["user"]
@@ -220,11 +402,13 @@ class PublisherAdminChatConsumer(AsyncWebsocketConsumer):
             return
 
         self.room_group_name = f"chat_support_{self.room_name}"
+        self.remember_sender()
 
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
         await self.accept()
+        await self.join_presence()
 
         # Send chat history
         await self.send_chat_history()
@@ -235,6 +419,11 @@ class PublisherAdminChatConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_discard(
                 self.room_group_name, self.channel_name
             )
+            await self.leave_presence()
+            await self.flush_pending_messages()
+
+    def message_extra(self):
+        return {"sender_role": "admin" if self.user.is_staff else "publisher"}
 
     async def receive(self, text_data):
         try:
@@ -242,39 +431,16 @@ class PublisherAdminChatConsumer(AsyncWebsocketConsumer):
             message_type = data.get("type", "message")
 
             if message_type == "message":
-                message = data.get("message", "").strip()
-
-                if message:
-                    # Save message to database
-                    chat_message = await self.save_message(message)
-
-                    # Send message to room group
-                    await self.channel_layer.group_send(
-                        self.room_group_name,
-                        {
-                            "type": "chat_message",
-                            "message": message,
-                            "sender_id": self.user.id,
-                            "sender_name": self.user.get_full_name()
-                            or self.user.username,
-                            "sender_role": (
-                                "admin" if self.user.is_staff else "publisher"
-                            ),
-                            "timestamp": chat_message.created_at.isoformat(),
-                            "message_id": chat_message.id,
-                        },
-                    )
+                await self.broadcast_message(data)
+
+            elif message_type == "history":
+                await self.handle_history_request(data)
 
             elif message_type == "typing":
-                # Broadcast typing indicator
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        "type": "user_typing",
-                        "user_id": self.user.id,
-                        "user_name": self.user.get_full_name() or self.user.username,
-                    },
-                )
+                await self.handle_typing(data)
+
+            elif message_type == "heartbeat":
+                await self.handle_heartbeat()
 
         except Exception as e:
             await self.send(text_data=json.dumps({"type": "error", "message": str(e)}))
@@ -293,32 +459,17 @@ class PublisherAdminChatConsumer(AsyncWebsocketConsumer):
                     "sender_role": event["sender_role"],
                     "timestamp": event["timestamp"],
                     "message_id": event["message_id"],
+                    "client_id": event["client_id"],
                 }
             )
         )
 
-    async def user_typing(self, event):
-        """
-        Receive typing indicator from room group
-        """
-        # Don't send typing indicator to self
-        if event["user_id"] != self.user.id:
-            await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "typing",
-                        "user_id": event["user_id"],
-                        "user_name": event["user_name"],
-                    }
-                )
-            )
-
     @database_sync_to_async
     def check_permission(self):
         """
         Check if user is allowed to access this chat
         """
-        return self.user.is_publisher() or self.user.is_staff
+        return self.user.profile_type == User.ProfileType.PUBLISHER or self.user.is_staff
 
     @database_sync_to_async
     def get_or_create_support_room(self):
@@ -328,6 +479,9 @@ class PublisherAdminChatConsumer(AsyncWebsocketConsumer):
         # Extract publisher ID from room name (format: publisher_123)
         try:
             publisher_id = int(self.room_name.split("_")[-1])
+            # Publishers may only open their own support room
+            if not self.user.is_staff and publisher_id != self.user.id:
+                return None
             publisher = User.objects.get(id=publisher_id)
 
             # Get or create support room
@@ -345,47 +499,6 @@ class PublisherAdminChatConsumer(AsyncWebsocketConsumer):
         except (ValueError, User.DoesNotExist):
             return None
 
-    @database_sync_to_async
-    def save_message(self, message):
-        """
-        Save message to database
-        """
-        return ChatMessage.objects.create(
-            room=self.room, sender=self.user, message=message
-        )
-
-    async def send_chat_history(self):
-        """
-        Send recent chat history to newly connected user
-        """
-        messages = await self.get_recent_messages()
-
-        await self.send(text_data=json.dumps({"type": "history", "messages": messages}))
-
-    @database_sync_to_async
-    def get_recent_messages(self, limit=100):
-        """
-        Get recent messages from database
-        """
-        messages = (
-            ChatMessage.objects.filter(room=self.room)
-            .select_related("sender")
-            .order_by("-created_at")[:limit]
-        )
-
-        return [
-            {
-                "id": msg.id,
-                "message": msg.message,
-                "sender_id": msg.sender.id,
-                "sender_name": msg.sender.get_full_name() or msg.sender.username,
-                "sender_role": "admin" if msg.sender.is_staff else "publisher",
-                "timestamp": msg.created_at.isoformat(),
-                "is_read": msg.is_read,
-            }
-            for msg in reversed(messages)
-        ]
-
 
 class NotificationConsumer(AsyncWebsocketConsumer):
     """
@@ -405,6 +518,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
 
         await self.accept()
+        await self.touch_presence()
 
     async def disconnect(self, close_code):
         if hasattr(self, "room_group_name"):
@@ -413,11 +527,19 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             )
 
     async def receive(self, text_data):
-        # Handle ping/pong for connection keep-alive
+        # Handle ping/pong for connection keep-alive; pings also keep the
+        # user marked online for the dashboards
         data = json.loads(text_data)
         if data.get("type") == "ping":
+            await self.touch_presence()
             await self.send(text_data=json.dumps({"type": "pong"}))
 
+    async def touch_presence(self):
+        try:
+            await get_presence_store().atouch(self.user.id)
+        except Exception as e:
+            logger.warning(f"Presence heartbeat failed for user {self.user.id}: {e}")
+
     async def notification_message(self, event):
         """
         Send notification to user
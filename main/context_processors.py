@@ -64,7 +64,7 @@ def cart_wishlist_counts(request):
         # Add notification and message counts for authenticated users
         try:
             from main.models import ChatRoom, ChatMessage, Notification
-            from django.db.models import Q
+            from django.db.models import Count, Q, Sum
             from django.utils import timezone
             from datetime import timedelta
             import logging
@@ -84,39 +84,22 @@ def cart_wishlist_counts(request):
                 f"User {request.user.username} - Unread notifications: {context['user_unread_notifications']}"
             )
 
-            # Chat message counts for publishers
-            if (
-                hasattr(request.user, "classifiedad_set")
-                and request.user.classifiedad_set.exists()
-            ):
-                # User is a publisher - get chat messages
-                context["unread_chat_messages"] = (
-                    ChatMessage.objects.filter(
-                        room__publisher=request.user,
-                        is_read=False,
-                    )
-                    .exclude(sender=request.user)
-                    .count()
-                )  # Messages from others
-            else:
-                context["unread_chat_messages"] = 0
+            # Chat message counts for publishers, from the room summary counters
+            from main.chat_inbox import unread_totals
+
+            context["unread_chat_messages"] = unread_totals(request.user)["publisher"]
 
             # Admin-specific counts
             if request.user.is_staff:
-                # Support chat statistics
-                context["unread_support_messages"] = ChatMessage.objects.filter(
-                    room__room_type="publisher_admin",
-                    is_read=False,
-                    sender__is_staff=False,  # Messages from publishers
-                ).count()
-
-                context["active_support_chats"] = ChatRoom.objects.filter(
-                    room_type="publisher_admin", is_active=True
-                ).count()
-
-                context["total_support_chats"] = ChatRoom.objects.filter(
-                    room_type="publisher_admin"
-                ).count()
+                # Support chat statistics (one aggregate over the room summaries)
+                support = ChatRoom.objects.filter(room_type="publisher_admin").aggregate(
+                    unread=Sum("unread_admin"),  # Messages from publishers
+                    active=Count("id", filter=Q(is_active=True)),
+                    total=Count("id"),
+                )
+                context["unread_support_messages"] = support["unread"] or 0
+                context["active_support_chats"] = support["active"]
+                context["total_support_chats"] = support["total"]
 
                 logger.info(
                     f"Admin {request.user.username} - Unread support: {context['unread_support_messages']}, Total chats: {context['total_support_chats']}"
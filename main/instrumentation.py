@@ -0,0 +1,442 @@
+"""
+Request performance instrumentation
+قياس أداء الطلبات
+
+Records, per resolved URL name, the DB query count, DB time, cache hits and
+misses, template render time and total latency of sampled requests into a
+per-process ring buffer. Workers publish their buffers to the cache so the
+admin dashboard and the Prometheus endpoint can report percentiles across
+all processes.
+
+Configuration (settings.PERF_INSTRUMENTATION):
+    ENABLED        - turn the middleware on/off (default True)
+    SAMPLE_RATE    - fraction of requests measured, 0.0-1.0 (default 0.1)
+    BUFFER_SIZE    - samples kept per process (default 5000)
+    PUBLISH_EVERY  - seconds between publishing the buffer to the cache (default 30)
+    METRICS_TOKEN  - bearer token accepted by the Prometheus endpoint
+
+query_budget(n) works as a view decorator (logs when a view exceeds its
+budget, raises in DEBUG) and as a context manager in tests (always raises).
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+WORKERS_CACHE_KEY = "perf_metrics_workers"
+WORKER_CACHE_KEY = "perf_metrics_worker_{pid}"
+WORKER_CACHE_TTL = 600
+
+METRIC_FIELDS = (
+    "queries",
+    "db_ms",
+    "cache_hits",
+    "cache_misses",
+    "template_ms",
+    "total_ms",
+)
+PERCENTILES = (50, 90, 99)
+
+_current = contextvars.ContextVar("perf_request_metrics", default=None)
+_in_cache_call = contextvars.ContextVar("perf_in_cache_call", default=False)
+_template_depth = contextvars.ContextVar("perf_template_depth", default=0)
+
+_MISSING = object()
+
+
+def get_config():
+    config = {
+        "ENABLED": True,
+        "SAMPLE_RATE": 0.1,
+        "BUFFER_SIZE": 5000,
+        "PUBLISH_EVERY": 30,
+        "METRICS_TOKEN": "",
+    }
+    config.update(getattr(settings, "PERF_INSTRUMENTATION", {}))
+    return config
+
+
+class RequestMetrics:
+    """Counters collected for one measured request (or query_budget block)."""
+
+    __slots__ = ("queries", "db_time", "cache_hits", "cache_misses", "template_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+class measure:
+    """
+    Context manager collecting RequestMetrics for the enclosed block on all
+    database connections. Nested blocks share the outer metrics object.
+    """
+
+    def __init__(self):
+        self.metrics = None
+        self._token = None
+        self._wrappers = []
+
+    def __enter__(self):
+        outer = _current.get()
+        self.metrics = outer or RequestMetrics()
+        if outer is None:
+            self._token = _current.set(self.metrics)
+            for conn in connections.all(initialized_only=False):
+                wrapper = conn.execute_wrapper(_query_wrapper)
+                wrapper.__enter__()
+                self._wrappers.append(wrapper)
+        return self.metrics
+
+    def __exit__(self, exc_type, exc, tb):
+        for wrapper in reversed(self._wrappers):
+            wrapper.__exit__(exc_type, exc, tb)
+        self._wrappers = []
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        return False
+
+
+# =======================
+# Cache and template hooks
+# =======================
+
+
+def _wrap_cache_get(original):
+    @functools.wraps(original)
+    def get(self, key, default=None, version=None):
+        metrics = _current.get()
+        if metrics is None or _in_cache_call.get():
+            return original(self, key, default, version)
+        token = _in_cache_call.set(True)
+        try:
+            value = original(self, key, _MISSING, version)
+        finally:
+            _in_cache_call.reset(token)
+        if value is _MISSING:
+            metrics.cache_misses += 1
+            return default
+        metrics.cache_hits += 1
+        return value
+
+    get._perf_wrapped = True
+    return get
+
+
+def _wrap_cache_get_many(original):
+    @functools.wraps(original)
+    def get_many(self, keys, version=None):
+        metrics = _current.get()
+        if metrics is None or _in_cache_call.get():
+            return original(self, keys, version)
+        keys = list(keys)
+        token = _in_cache_call.set(True)
+        try:
+            found = original(self, keys, version)
+        finally:
+            _in_cache_call.reset(token)
+        metrics.cache_hits += len(found)
+        metrics.cache_misses += len(keys) - len(found)
+        return found
+
+    get_many._perf_wrapped = True
+    return get_many
+
+
+def _wrap_template_render(original):
+    @functools.wraps(original)
+    def render(self, context):
+        metrics = _current.get()
+        depth = _template_depth.get()
+        if metrics is None or depth:
+            return original(self, context)
+        token = _template_depth.set(depth + 1)
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+            _template_depth.reset(token)
+
+    render._perf_wrapped = True
+    return render
+
+
+_installed = False
+
+
+def install_hooks():
+    """Wrap the configured cache backends and Template.render once per process."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.core.cache import caches
+    from django.template.base import Template
+
+    for alias in settings.CACHES:
+        backend_cls = type(caches[alias])
+        if not getattr(backend_cls.get, "_perf_wrapped", False):
+            backend_cls.get = _wrap_cache_get(backend_cls.get)
+        if not getattr(backend_cls.get_many, "_perf_wrapped", False):
+            backend_cls.get_many = _wrap_cache_get_many(backend_cls.get_many)
+
+    if not getattr(Template.render, "_perf_wrapped", False):
+        Template.render = _wrap_template_render(Template.render)
+
+
+# =======================
+# Ring buffer
+# =======================
+
+
+class MetricsBuffer:
+    """Per-process ring buffer of (url_name, queries, db_ms, hits, misses, tpl_ms, total_ms)."""
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.last_publish = time.monotonic()
+
+    def add(self, url_name, metrics, total):
+        sample = (
+            url_name,
+            metrics.queries,
+            round(metrics.db_time * 1000, 2),
+            metrics.cache_hits,
+            metrics.cache_misses,
+            round(metrics.template_time * 1000, 2),
+            round(total * 1000, 2),
+        )
+        with self.lock:
+            self.samples.append(sample)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.samples)
+
+    def publish(self):
+        """Store this worker's samples in the cache for cross-process reports."""
+        self.last_publish = time.monotonic()
+        pid = os.getpid()
+        try:
+            cache.set(
+                WORKER_CACHE_KEY.format(pid=pid), self.snapshot(), WORKER_CACHE_TTL
+            )
+            # Drop workers whose samples expired (restarted or recycled pids);
+            # the list itself expires once no worker publishes any more
+            workers = [w for w in cache.get(WORKERS_CACHE_KEY) or [] if w != pid]
+            live = (
+                cache.get_many([WORKER_CACHE_KEY.format(pid=w) for w in workers])
+                if workers
+                else {}
+            )
+            workers = [w for w in workers if WORKER_CACHE_KEY.format(pid=w) in live]
+            cache.set(WORKERS_CACHE_KEY, sorted(workers + [pid]), WORKER_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Could not publish performance metrics: {e}")
+
+
+_buffer = None
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        _buffer = MetricsBuffer(get_config()["BUFFER_SIZE"])
+    return _buffer
+
+
+def record_sample(url_name, metrics, total):
+    buffer = get_buffer()
+    buffer.add(url_name, metrics, total)
+    if time.monotonic() - buffer.last_publish >= get_config()["PUBLISH_EVERY"]:
+        buffer.publish()
+
+
+def collect_samples():
+    """All samples published by live workers plus this process's buffer."""
+    pid = os.getpid()
+    samples = list(get_buffer().snapshot())
+    workers = cache.get(WORKERS_CACHE_KEY) or []
+    keys = [WORKER_CACHE_KEY.format(pid=w) for w in workers if w != pid]
+    if keys:
+        for worker_samples in cache.get_many(keys).values():
+            samples.extend(worker_samples)
+    return samples
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0
+    index = min(
+        len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1)))
+    )
+    return sorted_values[index]
+
+
+def summarize(samples=None):
+    """
+    Return {url_name: {"count": n, "queries": {"p50":..}, ...}} sorted by
+    p90 latency, slowest first.
+    """
+    if samples is None:
+        samples = collect_samples()
+    by_view = defaultdict(list)
+    for sample in samples:
+        by_view[sample[0]].append(sample[1:])
+
+    report = {}
+    for url_name, rows in by_view.items():
+        entry = {"count": len(rows)}
+        for i, field in enumerate(METRIC_FIELDS):
+            values = sorted(row[i] for row in rows)
+            entry[field] = {f"p{p}": _percentile(values, p) for p in PERCENTILES}
+            entry[field]["max"] = values[-1]
+        report[url_name] = entry
+    return dict(
+        sorted(
+            report.items(), key=lambda item: item[1]["total_ms"]["p90"], reverse=True
+        )
+    )
+
+
+def prometheus_text(report=None):
+    """Render a summary in the Prometheus text exposition format."""
+    if report is None:
+        report = summarize()
+    lines = [
+        "# HELP idrissimart_view_requests_sampled Sampled requests per view",
+        "# TYPE idrissimart_view_requests_sampled gauge",
+    ]
+    for url_name, entry in report.items():
+        lines.append(
+            f'idrissimart_view_requests_sampled{{view="{url_name}"}} {entry["count"]}'
+        )
+    for field in METRIC_FIELDS:
+        metric = f"idrissimart_view_{field}"
+        lines.append(f"# HELP {metric} Per-view {field.replace('_', ' ')} percentiles")
+        lines.append(f"# TYPE {metric} summary")
+        for url_name, entry in report.items():
+            for p in PERCENTILES:
+                value = entry[field][f"p{p}"]
+                lines.append(
+                    f'{metric}{{view="{url_name}",quantile="{p / 100}"}} {value}'
+                )
+    return "\n".join(lines) + "\n"
+
+
+def reset_samples():
+    """Clear this process's buffer and the published worker buffers."""
+    get_buffer().samples.clear()
+    workers = cache.get(WORKERS_CACHE_KEY) or []
+    cache.delete_many(
+        [WORKER_CACHE_KEY.format(pid=w) for w in workers] + [WORKERS_CACHE_KEY]
+    )
+
+
+# =======================
+# Query budgets
+# =======================
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class query_budget:
+    """
+    Enforce a maximum number of DB queries.
+
+    As a context manager (tests)::
+
+        with query_budget(12):
+            self.client.get(reverse("main:home"))
+
+    As a view decorator it logs a warning when the budget is exceeded and
+    raises only when settings.DEBUG is on::
+
+        @query_budget(20)
+        def my_view(request): ...
+    """
+
+    def __init__(self, limit, strict=True, label=""):
+        self.limit = limit
+        self.strict = strict
+        self.label = label
+        self._measure = None
+        self._start = 0
+        self.queries = 0
+
+    def __enter__(self):
+        self._measure = measure()
+        metrics = self._measure.__enter__()
+        self._start = metrics.queries
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics = self._measure.metrics
+        self._measure.__exit__(exc_type, exc, tb)
+        self.queries = metrics.queries - self._start
+        if exc_type is None and self.queries > self.limit:
+            message = (
+                f"Query budget exceeded: {self.queries} queries (budget {self.limit})"
+            )
+            if self.label:
+                message = f"{self.label}: {message}"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return False
+
+    def __call__(self, view_func):
+        limit = self.limit
+
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            with query_budget(limit, strict=settings.DEBUG, label=view_func.__name__):
+                response = view_func(request, *args, **kwargs)
+                # Lazy TemplateResponses render after the view returns
+                if hasattr(response, "render") and not getattr(
+                    response, "is_rendered", True
+                ):
+                    response.render()
+            return response
+
+        return wrapper
+
+
+def should_sample():
+    config = get_config()
+    if not config["ENABLED"]:
+        return False
+    rate = config["SAMPLE_RATE"]
+    return rate >= 1 or (rate > 0 and random.random() < rate)
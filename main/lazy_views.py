@@ -0,0 +1,126 @@
+"""
+Lazily imported views
+استيراد العروض عند أول طلب فقط
+
+The URLconfs used to import every view module (main.views alone is ~9,500
+lines) when the first request loaded them, so each web worker paid for all
+of them before serving anything. They now reference views through
+lazy_module():
+
+    views = lazy_module("main.views")
+    path("", views.HomeView.as_view(), name="home")
+
+``views.HomeView.as_view()`` returns a LazyView, a callable that imports its
+module and builds the real view the first time it is called or one of its
+attributes is read (CsrfViewMiddleware reads ``csrf_exempt`` just before the
+call). A worker therefore only imports the view modules of the URLs it has
+actually served. Reversing URLs never imports anything.
+
+Views must be synchronous: Django decides how to call an async view by
+inspecting the callback before it is resolved.
+
+Since any attribute of a lazy module is accepted, a misspelled view name only
+fails when its URL is first requested. The check_lazy_views system check
+(``manage.py check``, also run by runserver, migrate and test) resolves every
+LazyView in the URLconf and reports the ones that cannot be imported.
+"""
+
+import importlib
+import threading
+
+from django.core import checks
+from django.urls import URLPattern, URLResolver, get_resolver
+
+
+class LazyView:
+    """A view named by module path and attribute, resolved on first use."""
+
+    def __init__(self, module, name, initkwargs=None):
+        self._lazy_module = module
+        self._lazy_name = name
+        # None: a function view; a dict: a class-based view's as_view() kwargs
+        self._lazy_initkwargs = initkwargs
+        self._lazy_view = None
+        self._lazy_lock = threading.Lock()
+        # What ResolverMatch and error pages show for the view
+        self.__module__ = module
+        self.__name__ = self.__qualname__ = name
+
+    def as_view(self, **initkwargs):
+        return LazyView(self._lazy_module, self._lazy_name, initkwargs)
+
+    def resolve(self):
+        """Import the module and return the real view callable."""
+        view = self._lazy_view
+        if view is None:
+            with self._lazy_lock:
+                if self._lazy_view is None:
+                    target = getattr(
+                        importlib.import_module(self._lazy_module), self._lazy_name
+                    )
+                    if self._lazy_initkwargs is not None:
+                        target = target.as_view(**self._lazy_initkwargs)
+                    self._lazy_view = target
+                view = self._lazy_view
+        return view
+
+    def __call__(self, request, *args, **kwargs):
+        return self.resolve()(request, *args, **kwargs)
+
+    def __getattr__(self, attr):
+        # Only reached for attributes not set above: csrf_exempt, view_class,
+        # _non_atomic_requests, ... come from the real view
+        if attr.startswith("__") or attr.startswith("_lazy_"):
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __repr__(self):
+        return f"<LazyView {self._lazy_module}.{self._lazy_name}>"
+
+
+class LazyViewModule:
+    """Stand-in for a views module: each attribute is a LazyView."""
+
+    def __init__(self, module):
+        self._lazy_module = module
+
+    def __getattr__(self, name):
+        if name.startswith("__") or name.startswith("_lazy_"):
+            raise AttributeError(name)
+        return LazyView(self._lazy_module, name)
+
+    def __repr__(self):
+        return f"<LazyViewModule {self._lazy_module}>"
+
+
+def lazy_module(module):
+    return LazyViewModule(module)
+
+
+def iter_lazy_views(patterns):
+    """Yield (route, LazyView) for every lazily referenced view in *patterns*."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            for route, view in iter_lazy_views(pattern.url_patterns):
+                yield str(pattern.pattern) + route, view
+        elif isinstance(pattern, URLPattern) and isinstance(pattern.callback, LazyView):
+            yield str(pattern.pattern), pattern.callback
+
+
+@checks.register(checks.Tags.urls)
+def check_lazy_views(app_configs=None, **kwargs):
+    """Report URL patterns whose lazily referenced view does not exist."""
+    errors = []
+    for route, view in iter_lazy_views(get_resolver().url_patterns):
+        try:
+            view.resolve()
+        except (ImportError, AttributeError) as e:
+            errors.append(
+                checks.Error(
+                    f"URL pattern '{route}' references {view._lazy_module}.{view._lazy_name}, "
+                    f"which cannot be loaded: {e}",
+                    obj=view,
+                    id="main.E001",
+                )
+            )
+    return errors
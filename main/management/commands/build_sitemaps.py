@@ -0,0 +1,29 @@
+"""
+Management command to build the precomputed, gzipped sitemap files.
+Runs incrementally by default (only chunks touched since the last build);
+use --full to repartition and rewrite every file.
+"""
+
+from django.core.management.base import BaseCommand
+
+from main.sitemap_builder import build_sitemaps
+
+
+class Command(BaseCommand):
+    help = "بناء ملفات خريطة الموقع - Build gzipped sitemap files and the sitemap index"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="إعادة بناء كل الملفات - Rebuild every sitemap file instead of only changed chunks",
+        )
+
+    def handle(self, *args, **options):
+        summary = build_sitemaps(full=options["full"])
+
+        mode = "full" if summary["full"] else "incremental"
+        self.stdout.write(self.style.SUCCESS(f"✅ Sitemaps built ({mode})"))
+        for section, files in summary["files"].items():
+            rebuilt = summary["rebuilt"].get(section, 0)
+            self.stdout.write(f"  • {section}: {files} file(s), {rebuilt} rewritten")
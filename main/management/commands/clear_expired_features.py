@@ -3,6 +3,7 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from main.models import AdFeature
+from main.scheduled_tasks import FeaturedSectionExpiryJob
 
 
 class Command(BaseCommand):
@@ -47,6 +48,9 @@ class Command(BaseCommand):
                     )
                 )
             else:
+                # Unhighlight the ads of lapsed featured-section features first:
+                # the featured section filters on is_highlighted
+                FeaturedSectionExpiryJob(now=now).run()
                 expired_features.delete()
                 self.stdout.write(
                     self.style.SUCCESS(
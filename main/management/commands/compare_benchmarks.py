@@ -0,0 +1,64 @@
+"""
+Management command to diff two run_benchmarks JSON files.
+Exits with an error when --fail-on-regression is set and any metric got
+worse by more than --threshold percent.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.benchmarks import compare_results
+
+
+class Command(BaseCommand):
+    help = "مقارنة نتائج الأداء - Compare benchmark results against a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("baseline", type=str, help="Baseline results JSON")
+        parser.add_argument("current", type=str, help="Current results JSON")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10.0,
+            help="Allowed increase in percent (default: 10)",
+        )
+        parser.add_argument(
+            "--fail-on-regression",
+            action="store_true",
+            help="Exit non-zero on regressions",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["baseline"], encoding="utf-8") as f:
+                baseline = json.load(f)
+            with open(options["current"], encoding="utf-8") as f:
+                current = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read benchmark results: {e}") from e
+
+        rows = compare_results(baseline, current, threshold=options["threshold"])
+        regressions = [row for row in rows if row["regression"]]
+
+        self.stdout.write(
+            f"{'scenario':<18} {'metric':<16} {'baseline':>10} {'current':>10} {'change':>9}"
+        )
+        for row in rows:
+            line = (
+                f"{row['scenario']:<18} {row['metric']:<16} {row['baseline']:>10} "
+                f"{row['current']:>10} {row['change_pct']:>+8.1f}%"
+            )
+            if row["regression"]:
+                line = self.style.ERROR(line)
+            elif row["change_pct"] < -options["threshold"]:
+                line = self.style.SUCCESS(line)
+            self.stdout.write(line)
+
+        if regressions:
+            message = f"{len(regressions)} metric(s) regressed by more than {options['threshold']}%"
+            if options["fail_on_regression"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(f"\n⚠️  {message}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("\n✅ No regressions"))
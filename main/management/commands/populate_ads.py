@@ -9,6 +9,7 @@ import os
 from pathlib import Path
 
 from content.models import Country
+from main.bulk_seed import count_seeded_ads, seed_ads
 from main.models import Category, ClassifiedAd, User, AdImage
 
 
@@ -37,10 +38,29 @@ class Command(BaseCommand):
             action="store_true",
             help="Update existing ads without images to add images.",
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Bulk-insert ads in chunks, without signals, with pooled images (see main.bulk_seed).",
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (--bulk only).")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Ads per chunk (--bulk only).")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (--bulk only).")
+        parser.add_argument(
+            "--images-per-ad", type=int, default=2, help="Up to this many pooled images per ad (--bulk only)."
+        )
 
-    @transaction.atomic
     def handle(self, *args, **kwargs):
         """The main logic for the command."""
+        if kwargs["bulk"] and not kwargs.get("update_existing"):
+            # Outside any transaction: each chunk commits on its own
+            self.bulk_populate(kwargs["total"], kwargs["country_code"].upper(), kwargs)
+            return
+        self.populate(**kwargs)
+
+    @transaction.atomic
+    def populate(self, **kwargs):
+        """Create the ads one by one, with their signals and images."""
         total = kwargs["total"]
         country_code = kwargs["country_code"].upper()
         update_existing = kwargs.get("update_existing", False)
@@ -187,6 +207,45 @@ class Command(BaseCommand):
             )
         )
 
+    def bulk_populate(self, total, country_code, options):
+        """Create ads with chunked bulk inserts, numbered after the existing seeded ones."""
+        country = Country.objects.filter(code=country_code).first()
+        if country is None:
+            self.stdout.write(
+                self.style.ERROR(f"Country {country_code} not found. Please run populate_countries first.")
+            )
+            return
+
+        category_ids = list(
+            Category.objects.filter(
+                section_type=Category.SectionType.CLASSIFIED, country=country, parent__isnull=False
+            ).values_list("pk", flat=True)
+        )
+        user_ids = list(User.objects.filter(is_superuser=False).values_list("pk", flat=True))
+        if not category_ids or not user_ids:
+            self.stdout.write(
+                self.style.ERROR(
+                    "No classified categories or users found. "
+                    "Please run populate_categories and populate_users first."
+                )
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Starting to bulk populate {total} ads for country: {country_code}"))
+        created_count = seed_ads(
+            total,
+            country,
+            category_ids,
+            user_ids,
+            start=count_seeded_ads(),
+            images_per_ad=options["images_per_ad"],
+            seed=options["seed"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f"\n✅ Successfully created {created_count} ads!"))
+
     def add_images_to_ad(self, ad):
         """Add images to a classified ad from static/images/ads directory"""
         try:
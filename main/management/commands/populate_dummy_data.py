@@ -5,10 +5,10 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from faker import Faker
 
+from main.bulk_seed import seed_reviews
 from main.models import (
     AdPackage,
     AdReport,
-    AdReservation,
     AdReview,
     ClassifiedAd,
     Payment,
@@ -25,6 +25,7 @@ class Command(BaseCommand):
     Example usage:
     python manage.py populate_dummy_data --reviews 50 --reports 30 --packages 20 --reservations 40
     python manage.py populate_dummy_data --all 100
+    python manage.py populate_dummy_data --reviews 500000 --bulk --workers 4
     """
 
     help = "Populates the database with dummy data for reviews, reports, user packages, and reservations."
@@ -60,6 +61,14 @@ class Command(BaseCommand):
             type=int,
             help="Create equal number of all types (overrides individual counts)",
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Bulk-insert reviews in chunks, without signals (see main.bulk_seed); other types are unchanged",
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (--bulk only)")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Reviews per chunk (--bulk only)")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (--bulk only)")
 
     def handle(self, *args, **kwargs):
         """The main logic for the command."""
@@ -74,6 +83,12 @@ class Command(BaseCommand):
             package_count = kwargs["packages"]
             reservation_count = kwargs["reservations"]
 
+        if kwargs["bulk"] and review_count > 0:
+            self._bulk_create_reviews(review_count, kwargs)
+            review_count = 0
+            if not (report_count or package_count or reservation_count):
+                return
+
         # Get existing data
         users = list(User.objects.all())
         ads = list(ClassifiedAd.objects.all())
@@ -157,6 +172,32 @@ class Command(BaseCommand):
             self.style.SUCCESS("\n[SUCCESS] Dummy data population completed!")
         )
 
+    def _bulk_create_reviews(self, count, options):
+        """Draw *count* reviews with chunked bulk inserts over the ad and user ids."""
+        ad_ids = list(ClassifiedAd.objects.values_list("pk", flat=True))
+        user_ids = list(User.objects.values_list("pk", flat=True))
+        if not ad_ids or not user_ids:
+            self.stdout.write(self.style.WARNING("No ads or users found! Skipping review creation."))
+            return
+
+        self.stdout.write(f"\nBulk creating {count} ad reviews...")
+        before = AdReview.objects.count()
+        seed_reviews(
+            count,
+            ad_ids,
+            user_ids,
+            seed=options["seed"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            stdout=self.stdout,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Successfully created {AdReview.objects.count() - before} ad reviews "
+                f"(duplicate user/ad pairs skipped)."
+            )
+        )
+
     def _create_reviews(self, fake, users, ads, count):
         """Create dummy ad reviews."""
         created = 0
@@ -404,6 +445,15 @@ class Command(BaseCommand):
 
     def _create_reservations(self, fake, users, ads, count):
         """Create dummy ad reservations."""
+        try:
+            from main.models import AdReservation
+        except ImportError:
+            # Reservations were folded into orders (migration 0026)
+            self.stdout.write(
+                self.style.WARNING("Ad reservations no longer exist; use create_orders instead.")
+            )
+            return 0
+
         created = 0
         self.stdout.write(f"\nCreating {count} ad reservations...")
 
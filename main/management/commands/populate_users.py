@@ -4,6 +4,7 @@ from django.core.management.base import BaseCommand
 from django.db import IntegrityError
 from faker import Faker
 
+from main.bulk_seed import SEED_PASSWORD, SEED_USER_PREFIX, count_seeded_users, seed_users
 from main.models import User
 
 
@@ -14,6 +15,7 @@ class Command(BaseCommand):
 
     Example usage:
     python manage.py populate_users 20
+    python manage.py populate_users 100000 --bulk --workers 4
     """
 
     help = "Populates the database with dummy users."
@@ -25,10 +27,22 @@ class Command(BaseCommand):
             type=int,
             help="Indicates the number of users to be created.",
         )
+        parser.add_argument(
+            "--bulk",
+            action="store_true",
+            help="Bulk-insert seed_user_<n> users in chunks, without signals (see main.bulk_seed).",
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes (--bulk only).")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Users per chunk (--bulk only).")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed (--bulk only).")
 
     def handle(self, *args, **kwargs):
         """The main logic for the command."""
         total = kwargs["total"]
+        if kwargs["bulk"]:
+            self.bulk_populate(total, kwargs)
+            return
+
         fake = Faker("ar_EG")  # Use Arabic locale for names
         password = "admin123456"
         created_count = 0
@@ -74,3 +88,21 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS(f"\nSuccessfully created {created_count} users.")
         )
+
+    def bulk_populate(self, total, options):
+        """Create seed_user_<n> users after the existing ones with chunked bulk inserts."""
+        start = count_seeded_users()
+        self.stdout.write(
+            self.style.SUCCESS(f"Starting to bulk populate {total} users (from {SEED_USER_PREFIX}{start})...")
+        )
+        created_count = seed_users(
+            total,
+            start=start,
+            seed=options["seed"],
+            chunk_size=options["chunk_size"],
+            workers=options["workers"],
+            stdout=self.stdout,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"\nSuccessfully created {created_count} users (Password: {SEED_PASSWORD}).")
+        )
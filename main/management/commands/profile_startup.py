@@ -0,0 +1,111 @@
+"""
+Management command to measure worker cold start and list the slowest
+imports (see main.startup_profile).
+
+    python manage.py profile_startup                  # timings + slowest imports
+    python manage.py profile_startup --check          # CI: fail when over STARTUP_BUDGET
+    python manage.py profile_startup --no-urls --limit 40
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from main.startup_profile import (
+    budget_settings,
+    check_budget,
+    measure_cold_start,
+    profile_imports,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس زمن بدء التشغيل - Measure worker cold start, RSS and the slowest imports"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--runs",
+            type=int,
+            help="Fresh start-ups to measure (default: STARTUP_BUDGET RUNS)",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=20, help="Modules listed per ranking"
+        )
+        parser.add_argument(
+            "--no-urls",
+            action="store_true",
+            help="Measure django.setup() only, as a Django-Q worker starts",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Skip the import profile and exit with an error when over budget",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the results as JSON"
+        )
+
+    def handle(self, *args, **options):
+        load_urls = not options["no_urls"]
+        budget = budget_settings()
+        measurement = measure_cold_start(runs=options["runs"], load_urls=load_urls)
+        results = {"cold_start": measurement, "budget": budget}
+        if not options["check"]:
+            results["imports"] = profile_imports(
+                limit=options["limit"], load_urls=load_urls
+            )
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self._report(results)
+
+        if options["check"]:
+            failures = check_budget(measurement, budget)
+            if failures:
+                raise CommandError(
+                    "❌ Start-up budget exceeded: " + "; ".join(failures)
+                )
+            self.stdout.write(self.style.SUCCESS("✅ Start-up within budget"))
+
+    def _report(self, results):
+        m = results["cold_start"]
+        self.stdout.write(
+            self.style.WARNING(f"\n⏱️  Cold start (median of {m['runs']} runs)\n")
+        )
+        self.stdout.write(f"  django.setup():  {m['setup_ms']:.0f} ms")
+        self.stdout.write(f"  URLconf load:    {m['urls_ms']:.0f} ms")
+        self.stdout.write(
+            f"  Total:           {m['total_ms']:.0f} ms (budget {results['budget']['COLD_START_MS']} ms)"
+        )
+        self.stdout.write(
+            f"  Peak RSS:        {m['rss_mb']:.0f} MB (budget {results['budget']['RSS_MB']} MB)"
+        )
+        self.stdout.write(f"  Modules loaded:  {m['modules']}")
+        if m["view_modules"]:
+            self.stdout.write(
+                f"  View modules imported eagerly: {', '.join(m['view_modules'])}"
+            )
+
+        imports = results.get("imports")
+        if not imports:
+            return
+        self.stdout.write(
+            self.style.WARNING(
+                f"\n📦 Imports ({imports['total_ms']:.0f} ms under -X importtime)\n"
+            )
+        )
+        for title, key in (
+            ("Slowest modules (self)", "by_self"),
+            ("Slowest modules (cumulative)", "by_cumulative"),
+        ):
+            self.stdout.write(f"  {title}:")
+            for row in imports[key]:
+                self.stdout.write(
+                    f"    {row['self_ms']:>8.1f} {row['cumulative_ms']:>9.1f} ms  {row['module']}"
+                )
+        self.stdout.write("  By top-level package (self):")
+        for row in imports["packages"]:
+            self.stdout.write(f"    {row['self_ms']:>8.1f} ms  {row['package']}")
@@ -10,8 +10,8 @@ from django.utils import timezone
 from django.db import transaction
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
-from PIL import Image, ImageDraw, ImageFont
-from io import BytesIO
+
+from main.bulk_seed import render_image
 
 User = get_user_model()
 
@@ -33,35 +33,10 @@ class Command(BaseCommand):
         )
 
     def create_simple_image(self, width, height, text, bg_color, text_color):
-        """Create a simple colored image with text"""
-        # Create image
-        img = Image.new('RGB', (width, height), color=bg_color)
-        draw = ImageDraw.Draw(img)
-
-        # Try to use a font, fallback to default if not available
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 40)
-        except:
-            font = ImageFont.load_default()
-
-        # Calculate text position (centered)
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        x = (width - text_width) // 2
-        y = (height - text_height) // 2
-
-        # Draw text
-        draw.text((x, y), text, fill=text_color, font=font)
-
-        # Save to BytesIO
-        buffer = BytesIO()
-        img.save(buffer, format='JPEG', quality=85)
-        buffer.seek(0)
-
+        """Create a simple colored image with text (rendered once per distinct arguments)"""
         return SimpleUploadedFile(
             f"{text.lower().replace(' ', '_')}.jpg",
-            buffer.read(),
+            render_image(width, height, text, bg_color, text_color),
             content_type='image/jpeg'
         )
 
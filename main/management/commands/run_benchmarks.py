@@ -0,0 +1,83 @@
+"""
+Management command to replay the hot-path benchmark scenarios and write
+the results as JSON (see main.benchmarks).
+
+    python manage.py run_benchmarks --micro request_classifier
+"""
+
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from main.benchmarks import (
+    MICRO_BENCHMARKS,
+    SCENARIOS,
+    run_benchmarks,
+    run_micro_benchmarks,
+)
+
+
+class Command(BaseCommand):
+    help = "تشغيل قياس الأداء - Measure queries, latency and memory of the hot paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output", "-o", type=str, help="Write JSON results to this file"
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=[s["name"] for s in SCENARIOS],
+            help="Only run this scenario (repeatable)",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Measured requests per scenario"
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=1, help="Unmeasured warm-up requests"
+        )
+        parser.add_argument(
+            "--country", type=str, default="EG", help="Country code (default: EG)"
+        )
+        parser.add_argument(
+            "--micro",
+            action="append",
+            nargs="?",
+            const="all",
+            choices=["all", *MICRO_BENCHMARKS],
+            help="Run in-process micro-benchmarks instead of the HTTP scenarios",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=20000,
+            help="Calls per micro-benchmark case",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("\n⏱️  Running benchmarks...\n"))
+        if options["micro"]:
+            names = [n for n in options["micro"] if n != "all"]
+            results = run_micro_benchmarks(
+                names=names or None,
+                iterations=options["iterations"],
+                stdout=self.stdout,
+            )
+        else:
+            results = run_benchmarks(
+                names=options["scenario"],
+                repeat=options["repeat"],
+                warmup=options["warmup"],
+                country_code=options["country"].upper(),
+                stdout=self.stdout,
+            )
+
+        payload = json.dumps(results, indent=2, ensure_ascii=False)
+        if options["output"]:
+            path = Path(options["output"])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(payload, encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"\n✅ Results written to {path}"))
+        else:
+            self.stdout.write(payload)
@@ -138,7 +138,7 @@ class Command(BaseCommand):
             room.updated_at = start_time + timedelta(
                 minutes=(messages_per_chat - 1) * 30
             )
-            room.save()
+            room.save(update_fields=["updated_at"])
 
             self.stdout.write(
                 self.style.SUCCESS(
@@ -0,0 +1,74 @@
+"""
+Management command to build the benchmark dataset.
+Safe to re-run: only the missing users/ads are created, so a dataset can be
+scaled up in steps (e.g. --ads 100000, then --ads 1000000). Rows are
+bulk-inserted in chunks, optionally in parallel (--workers, see
+main.bulk_seed).
+"""
+
+from django.core.management.base import BaseCommand
+
+from main.benchmarks import seed_benchmark_data
+
+
+class Command(BaseCommand):
+    help = "إنشاء بيانات قياس الأداء - Seed a reproducible dataset for run_benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ads", type=int, default=10000, help="Total bench ads (default: 10000)"
+        )
+        parser.add_argument(
+            "--users", type=int, default=500, help="Total bench users (default: 500)"
+        )
+        parser.add_argument(
+            "--banners", type=int, default=10, help="Paid banners to seed if none exist"
+        )
+        parser.add_argument(
+            "--country", type=str, default="EG", help="Country code (default: EG)"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=5000, help="Rows per bulk insert"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=42, help="Random seed for reproducible data"
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Worker processes writing chunks (not on SQLite)",
+        )
+        parser.add_argument(
+            "--images-per-ad",
+            type=int,
+            default=0,
+            help="Up to this many pooled images per ad",
+        )
+        parser.add_argument(
+            "--category-roots",
+            type=int,
+            default=0,
+            help="Also seed this many synthetic 3-level category trees",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.WARNING("\n🚀 Seeding benchmark data...\n"))
+        counts = seed_benchmark_data(
+            ads=options["ads"],
+            users=options["users"],
+            banners=options["banners"],
+            country_code=options["country"].upper(),
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+            workers=options["workers"],
+            images_per_ad=options["images_per_ad"],
+            category_roots=options["category_roots"],
+            stdout=self.stdout,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\n✅ Dataset ready: {counts['ads']} ads, {counts['categories']} categories, "
+                f"{counts['banners']} banners"
+            )
+        )
@@ -11,8 +11,8 @@ from django.utils import timezone
 from django.db import transaction
 from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
-import requests
-from io import BytesIO
+
+from main.bulk_seed import render_image
 
 User = get_user_model()
 
@@ -40,16 +40,10 @@ class Command(BaseCommand):
 
     def get_placeholder_image(self, width=1200, height=600, text="Ad"):
         """
-        Get a placeholder image from a placeholder service
+        Get a placeholder image, rendered locally (once per size and text)
+        instead of downloaded from a placeholder service for every ad
         """
-        try:
-            url = f"https://via.placeholder.com/{width}x{height}/667eea/ffffff?text={text.replace(' ', '+')}"
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                return ContentFile(response.content, name=f"ad_{text.lower().replace(' ', '_')}.jpg")
-        except Exception as e:
-            self.stdout.write(self.style.WARNING(f"Failed to download image: {str(e)}"))
-        return None
+        return ContentFile(render_image(width, height, text), name=f"ad_{text.lower().replace(' ', '_')}.jpg")
 
     @transaction.atomic
     def handle(self, *args, **options):
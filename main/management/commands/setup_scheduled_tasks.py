@@ -146,7 +146,60 @@ class Command(BaseCommand):
                 "repeats": -1,
                 "next_run": next_day_2am.replace(hour=10, minute=0),
             },
+            # === SEO ===
+            {
+                "func": "main.scheduled_tasks.build_sitemaps_task",
+                "name": "Hourly Sitemap Build",
+                "schedule_type": Schedule.HOURLY,
+                "repeats": -1,
+                "minutes": 60,
+            },
+            {
+                "func": "django.core.management.call_command",
+                "name": "Weekly Full Sitemap Rebuild",
+                "args": format_args("build_sitemaps,--full"),
+                "schedule_type": Schedule.WEEKLY,
+                "repeats": -1,
+                "next_run": next_day_2am.replace(hour=4, minute=30),
+            },
+            # === RANKING ===
+            {
+                "func": "main.scheduled_tasks.refresh_ad_ranks_task",
+                "name": "Hourly Ad Rank Refresh",
+                "schedule_type": Schedule.HOURLY,
+                "repeats": -1,
+                "minutes": 60,
+            },
+            # === RECOMMENDATIONS ===
+            {
+                "func": "main.scheduled_tasks.refresh_ad_recommendations_task",
+                "name": "Ad Recommendations",
+                "schedule_type": Schedule.MINUTES,
+                "repeats": -1,
+                "minutes": 15,
+            },
+            {
+                "func": "main.scheduled_tasks.rebuild_ad_recommendations_task",
+                "name": "Daily Ad Recommendation Rebuild",
+                "schedule_type": Schedule.DAILY,
+                "repeats": -1,
+                "next_run": next_day_2am.replace(hour=3, minute=15),
+            },
             # === ADMIN REPORTS ===
+            {
+                "func": "main.scheduled_tasks.refresh_payment_rollups_task",
+                "name": "Payment Revenue Rollups",
+                "schedule_type": Schedule.MINUTES,
+                "repeats": -1,
+                "minutes": 10,
+            },
+            {
+                "func": "main.scheduled_tasks.rebuild_payment_rollups_task",
+                "name": "Weekly Payment Rollup Rebuild",
+                "schedule_type": Schedule.WEEKLY,
+                "repeats": -1,
+                "next_run": next_day_2am.replace(hour=4, minute=0),
+            },
             {
                 "func": "main.scheduled_tasks.send_daily_admin_report_task",
                 "name": "Daily Admin Report Email",
@@ -0,0 +1,90 @@
+"""
+Management command to warm the application after a deploy (see
+main.warmup).
+
+    python manage.py warm_up                  # warm this process + prime the shared cache
+    python manage.py warm_up --skip-process   # only prime the shared cache
+    python manage.py warm_up --json
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from main.warmup import prime_shared_cache, warm_process, warmup_settings
+
+
+class Command(BaseCommand):
+    help = "تسخين التطبيق بعد النشر - Warm in-process state and prime the shared cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--skip-process",
+            action="store_true",
+            help="Do not build the in-process state (useful when only the shared cache needs priming)",
+        )
+        parser.add_argument(
+            "--skip-cache", action="store_true", help="Do not prime the shared cache"
+        )
+        parser.add_argument(
+            "--no-views",
+            action="store_true",
+            help="Do not import the lazily loaded view modules",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the results as JSON"
+        )
+
+    def handle(self, *args, **options):
+        settings = warmup_settings()
+        if options["no_views"]:
+            settings["RESOLVE_VIEWS"] = False
+
+        results = {}
+        if not options["skip_process"]:
+            results["process"] = warm_process(settings)
+        if not options["skip_cache"]:
+            results["cache"] = prime_shared_cache(settings)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        if "process" in results:
+            self.stdout.write(self.style.WARNING("\n🔥 In-process warm-up\n"))
+            for name, step in results["process"].items():
+                details = ", ".join(
+                    f"{key}={value}"
+                    for key, value in step.items()
+                    if key not in ("ms", "error")
+                )
+                if "error" in step:
+                    self.stdout.write(
+                        self.style.ERROR(
+                            f"  ❌ {name:<14} {step['ms']:>8.1f} ms  {step['error']}"
+                        )
+                    )
+                else:
+                    self.stdout.write(
+                        f"  ✅ {name:<14} {step['ms']:>8.1f} ms  {details}"
+                    )
+
+        if "cache" in results:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"\n📦 Shared cache ({len(results['cache'])} requests)\n"
+                )
+            )
+            failed = 0
+            for path, language, status, ms in results["cache"]:
+                if status != 200:
+                    failed += 1
+                    self.stdout.write(
+                        self.style.ERROR(f"  ❌ {status} {language} {path}")
+                    )
+            total_ms = sum(row[3] for row in results["cache"])
+            self.stdout.write(
+                f"  {len(results['cache']) - failed} primed, {failed} failed, {total_ms:.0f} ms"
+            )
+
+        self.stdout.write(self.style.SUCCESS("\n✅ Warm-up complete"))
@@ -1,5 +1,8 @@
 from content.models import Country
 import logging
+import time
+
+from . import request_classifier
 
 logger = logging.getLogger(__name__)
 
@@ -9,33 +12,9 @@ class BlockMaliciousRequestsMiddleware:
     Block common attack patterns and malicious bot requests
     """
 
-    # Patterns that indicate malicious requests
-    BLOCKED_PATHS = [
-        "telescope",
-        "wp-admin",
-        "wp-login",
-        "wp-json",
-        "wordpress",
-        "xmlrpc.php",
-        "info.php",
-        "phpinfo",
-        ".env",
-        "config.php",
-        ".git",
-        "admin.php",
-        "wp-config",
-        "phpmyadmin",
-        "shell",
-        "eval-stdin.php",
-        "wp-includes",
-        "wp-content",
-    ]
-
-    BLOCKED_QUERY_PARAMS = [
-        "rest_route",
-        "wp_",
-        "XDEBUG",
-    ]
+    # Patterns that indicate malicious requests (compiled in main.request_classifier)
+    BLOCKED_PATHS = request_classifier.BLOCKED_PATHS
+    BLOCKED_QUERY_PARAMS = request_classifier.BLOCKED_QUERY_PARAMS
 
     def __init__(self, get_response):
         self.get_response = get_response
@@ -43,28 +22,18 @@ class BlockMaliciousRequestsMiddleware:
     def __call__(self, request):
         from django.http import HttpResponseNotFound
 
-        # Check path for malicious patterns
-        path = request.path.lower()
-        for blocked in self.BLOCKED_PATHS:
-            if blocked in path:
-                logger.warning(
-                    f"Blocked malicious request to {request.path} from {self.get_client_ip(request)}"
-                )
-                return HttpResponseNotFound()
+        # Check path for malicious patterns and script extensions
+        if request_classifier.blocked_path_reason(request.path):
+            logger.warning(
+                f"Blocked malicious request to {request.path} from {self.get_client_ip(request)}"
+            )
+            return HttpResponseNotFound()
 
         # Check query parameters
-        query_string = request.META.get("QUERY_STRING", "").lower()
-        for blocked_param in self.BLOCKED_QUERY_PARAMS:
-            if blocked_param in query_string:
-                logger.warning(
-                    f"Blocked malicious query {query_string} from {self.get_client_ip(request)}"
-                )
-                return HttpResponseNotFound()
-
-        # Check for PHP files
-        if path.endswith((".php", ".asp", ".aspx", ".jsp")):
+        query_string = request.META.get("QUERY_STRING", "")
+        if query_string and request_classifier.blocked_query_reason(query_string):
             logger.warning(
-                f"Blocked request to {path} from {self.get_client_ip(request)}"
+                f"Blocked malicious query {query_string} from {self.get_client_ip(request)}"
             )
             return HttpResponseNotFound()
 
@@ -165,32 +134,8 @@ class VisitorTrackingMiddleware:
         "/.well-known/",
     ]
 
-    # Common bot user agents to exclude
-    BOT_USER_AGENTS = [
-        "bot",
-        "crawler",
-        "spider",
-        "scraper",
-        "curl",
-        "wget",
-        "python-requests",
-        "googlebot",
-        "bingbot",
-        "slurp",
-        "duckduckbot",
-        "baiduspider",
-        "yandexbot",
-        "facebookexternalhit",
-        "linkedinbot",
-        "twitterbot",
-        "whatsapp",
-        "telegram",
-        "headlesschrome",
-        "phantomjs",
-        "nightmarejs",
-        "selenium",
-        "playwright",
-    ]
+    # Common bot user agents to exclude (compiled in main.request_classifier)
+    BOT_USER_AGENTS = request_classifier.BOT_USER_AGENTS
 
     def __init__(self, get_response):
         self.get_response = get_response
@@ -208,9 +153,8 @@ class VisitorTrackingMiddleware:
         path = request.path
 
         # Skip excluded paths
-        for excluded in self.EXCLUDED_PATHS:
-            if path.startswith(excluded):
-                return False
+        if path.startswith(tuple(self.EXCLUDED_PATHS)):
+            return False
 
         # Only track GET requests (actual page views)
         if request.method != "GET":
@@ -225,8 +169,8 @@ class VisitorTrackingMiddleware:
             return False
 
         # Skip bots and crawlers
-        user_agent = request.META.get("HTTP_USER_AGENT", "").lower()
-        if any(bot in user_agent for bot in self.BOT_USER_AGENTS):
+        user_agent = request.META.get("HTTP_USER_AGENT", "")
+        if request_classifier.classify_user_agent(user_agent).is_bot:
             return False
 
         return True
@@ -258,71 +202,15 @@ class VisitorTrackingMiddleware:
 
     def _is_valid_ip(self, ip):
         """Validate IP address format"""
-        import re
-
-        # Simple IPv4 validation
-        ipv4_pattern = r"^(\d{1,3}\.){3}\d{1,3}$"
-        # Simple IPv6 validation
-        ipv6_pattern = r"^([\da-fA-F]{1,4}:){7}[\da-fA-F]{1,4}$|^::1$"
-
-        if re.match(ipv4_pattern, ip):
-            parts = ip.split(".")
-            return all(0 <= int(part) <= 255 for part in parts)
-        elif re.match(ipv6_pattern, ip):
-            return True
-        return False
+        return request_classifier.is_valid_ip(ip)
 
     def _get_device_type(self, user_agent):
         """Determine device type from user agent with better detection"""
-        user_agent_lower = user_agent.lower()
-
-        # Mobile devices
-        mobile_patterns = [
-            "mobile",
-            "android",
-            "iphone",
-            "ipod",
-            "blackberry",
-            "windows phone",
-            "opera mini",
-        ]
-        if any(pattern in user_agent_lower for pattern in mobile_patterns):
-            return "mobile"
-
-        # Tablet devices
-        tablet_patterns = [
-            "ipad",
-            "tablet",
-            "kindle",
-            "playbook",
-            "nexus 7",
-            "nexus 10",
-        ]
-        if any(pattern in user_agent_lower for pattern in tablet_patterns):
-            return "tablet"
-
-        # Desktop/Laptop
-        return "desktop"
+        return request_classifier.classify_user_agent(user_agent).device_type
 
     def _get_browser_info(self, user_agent):
         """Extract browser name from user agent"""
-        user_agent_lower = user_agent.lower()
-
-        browsers = {
-            "edg": "Edge",
-            "chrome": "Chrome",
-            "safari": "Safari",
-            "firefox": "Firefox",
-            "opera": "Opera",
-            "msie": "IE",
-            "trident": "IE",
-        }
-
-        for key, name in browsers.items():
-            if key in user_agent_lower:
-                return name
-
-        return "Other"
+        return request_classifier.classify_user_agent(user_agent).browser
 
     def _track_visitor(self, request):
         """Track visitor information with improved accuracy"""
@@ -406,3 +294,56 @@ class VisitorTrackingMiddleware:
         except Exception as e:
             # Log error but don't break the request
             logger.error(f"Error tracking visitor: {e}", exc_info=True)
+
+
+class PerformanceInstrumentationMiddleware:
+    """
+    Sample requests and record DB query count/time, cache hits/misses,
+    template render time and total latency per resolved URL name.
+    See main.instrumentation for settings and reporting.
+    """
+
+    def __init__(self, get_response):
+        from main.instrumentation import install_hooks
+
+        install_hooks()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from main.instrumentation import measure, record_sample, should_sample
+
+        if not should_sample():
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with measure() as metrics:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        url_name = match.view_name if match else "<unresolved>"
+        try:
+            record_sample(url_name, metrics, total)
+        except Exception as e:
+            logger.warning(f"Could not record performance sample: {e}")
+        return response
+
+
+class TranslationReloadMiddleware:
+    """
+    Reload the gettext catalogs once the translation admin has compiled new
+    .mo files (main.translation_workspace); must come before LocaleMiddleware,
+    which activates the request's language.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from main.registries import translations
+
+        try:
+            translations.get()
+        except Exception as e:
+            logger.warning(f"Could not check the translations version: {e}")
+        return self.get_response(request)
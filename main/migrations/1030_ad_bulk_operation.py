@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1029_alter_adsenseslot_slot_key_alter_bannerslot_ad_type_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdBulkOperation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=30, verbose_name='الإجراء')),
+                ('ad_ids', models.JSONField(default=list, verbose_name='الإعلانات')),
+                ('reason', models.TextField(blank=True, verbose_name='السبب')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار - Queued'), ('running', 'قيد التنفيذ - Running'), ('completed', 'مكتمل - Completed'), ('failed', 'فشل - Failed')], default='queued', max_length=20, verbose_name='الحالة')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='الإجمالي')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='تمت معالجته')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='فشل')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('performed_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ad_bulk_operations', to=settings.AUTH_USER_MODEL, verbose_name='بواسطة')),
+            ],
+            options={
+                'verbose_name': 'Ad Bulk Operation',
+                'verbose_name_plural': 'Ad Bulk Operations',
+                'db_table': 'ad_bulk_operations',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
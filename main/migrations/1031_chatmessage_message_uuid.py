@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1030_ad_bulk_operation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='message_uuid',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='معرف الرسالة'),
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_summaries(apps, schema_editor):
+    """Fill the inbox summary of existing rooms from their messages."""
+    ChatRoom = apps.get_model("main", "ChatRoom")
+    ChatMessage = apps.get_model("main", "ChatMessage")
+
+    rooms = {room.pk: room for room in ChatRoom.objects.all()}
+    if not rooms:
+        return
+
+    last_ids = dict(
+        ChatMessage.objects.values("room_id").annotate(last=Max("id")).values_list("room_id", "last")
+    )
+    last_messages = ChatMessage.objects.in_bulk(list(last_ids.values()))
+    for room_id, message_id in last_ids.items():
+        room, message = rooms.get(room_id), last_messages.get(message_id)
+        if room is None or message is None:
+            continue
+        room.last_message_id = message.pk
+        room.last_message_sender_id = message.sender_id
+        room.last_message_preview = message.message[:255]
+        room.last_activity_at = message.created_at
+
+    for room in rooms.values():
+        if room.last_message_id is None:
+            room.last_activity_at = room.updated_at or room.created_at
+
+    unread = (
+        ChatMessage.objects.filter(is_read=False)
+        .values("room_id", "sender_id")
+        .annotate(total=Count("id"))
+    )
+    for row in unread:
+        room = rooms.get(row["room_id"])
+        if room is None:
+            continue
+        from_publisher = row["sender_id"] == room.publisher_id
+        if room.room_type == "publisher_admin":
+            field = "unread_admin" if from_publisher else "unread_publisher"
+        else:
+            field = "unread_client" if from_publisher else "unread_publisher"
+        setattr(room, field, getattr(room, field) + row["total"])
+
+    ChatRoom.objects.bulk_update(
+        rooms.values(),
+        [
+            "last_message",
+            "last_message_sender",
+            "last_message_preview",
+            "last_activity_at",
+            "unread_publisher",
+            "unread_client",
+            "unread_admin",
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1031_chatmessage_message_uuid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='آخر نشاط'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.chatmessage', verbose_name='آخر رسالة'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255, verbose_name='معاينة آخر رسالة'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='مرسل آخر رسالة'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='unread_admin',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='غير مقروءة للإدارة'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='unread_client',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='غير مقروءة للعميل'),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='unread_publisher',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='غير مقروءة للناشر'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['publisher', '-last_activity_at', '-id'], name='chat_room_pub_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['client', '-last_activity_at', '-id'], name='chat_room_client_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['room_type', '-last_activity_at', '-id'], name='chat_room_type_inbox_idx'),
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1032_chat_room_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaintenanceRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(db_index=True, max_length=60, verbose_name='المهمة')),
+                ('status', models.CharField(choices=[('running', 'قيد التنفيذ - Running'), ('completed', 'مكتمل - Completed'), ('failed', 'فشل - Failed')], default='running', max_length=20, verbose_name='الحالة')),
+                ('chunks', models.PositiveIntegerField(default=0, verbose_name='الدفعات')),
+                ('scanned', models.PositiveIntegerField(default=0, verbose_name='تم فحصه')),
+                ('updated', models.PositiveIntegerField(default=0, verbose_name='تم تحديثه')),
+                ('notified', models.PositiveIntegerField(default=0, verbose_name='الإشعارات')),
+                ('emails_sent', models.PositiveIntegerField(default=0, verbose_name='الرسائل المرسلة')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='فشل')),
+                ('duration_ms', models.PositiveIntegerField(default=0, verbose_name='المدة (مللي ثانية)')),
+                ('error', models.TextField(blank=True, verbose_name='الخطأ')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Maintenance Run',
+                'verbose_name_plural': 'Maintenance Runs',
+                'db_table': 'maintenance_runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('general', 'عام'), ('ad_approved', 'الإعلان معتمد'), ('ad_rejected', 'الإعلان مرفوض'), ('ad_expired', 'الإعلان منتهي'), ('ad_expiring', 'الإعلان قارب على الانتهاء'), ('package_expired', 'الباقة منتهية'), ('saved_search', 'نتائج البحث المحفوظ'), ('facebook_share_rejected', 'طلب مشاركة فيسبوك مرفوض'), ('admin_facebook_pending', 'طلب مشاركة فيسبوك معلق للمراجعة')], max_length=30),
+        ),
+        migrations.CreateModel(
+            name='MaintenanceNotice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=40, verbose_name='النوع')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='المعرف')),
+                ('window', models.DateField(verbose_name='الفترة')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+                ('run', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notices', to='main.maintenancerun', verbose_name='التشغيل')),
+            ],
+            options={
+                'verbose_name': 'Maintenance Notice',
+                'verbose_name_plural': 'Maintenance Notices',
+                'db_table': 'maintenance_notices',
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id', 'window'), name='uniq_maintenance_notice')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 21:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1033_maintenance_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockedWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.CharField(max_length=100, verbose_name='الكلمة - Word')),
+                ('category', models.CharField(choices=[('reserved', 'محجوزة - Reserved (usernames)'), ('offensive', 'غير لائقة - Offensive (usernames and content)')], default='offensive', max_length=20, verbose_name='التصنيف - Category')),
+                ('is_active', models.BooleanField(default=True, verbose_name='نشط - Active')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+            ],
+            options={
+                'verbose_name': 'كلمة محظورة - Blocked Word',
+                'verbose_name_plural': 'الكلمات المحظورة - Blocked Words',
+                'db_table': 'blocked_words',
+                'ordering': ['category', 'word'],
+                'constraints': [models.UniqueConstraint(fields=('word', 'category'), name='uniq_blocked_word')],
+            },
+        ),
+    ]
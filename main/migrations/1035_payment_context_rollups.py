@@ -0,0 +1,80 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:13
+
+from django.db import migrations, models
+
+# Same priority as Payment.CONTEXT_KEYS
+CONTEXT_KEYS = (
+    ("ad_id", "ad"),
+    ("package_id", "package"),
+    ("order_id", "order"),
+    ("subscription_type", "subscription"),
+    ("paid_banner_ad_id", "banner"),
+)
+
+
+def backfill_context(apps, schema_editor):
+    """Derive context_type of existing payments from their metadata keys."""
+    Payment = apps.get_model("main", "Payment")
+    # Lowest priority first, so a payment carrying several keys ends up
+    # with the context of the highest-priority one
+    for key, context in reversed(CONTEXT_KEYS):
+        Payment.objects.filter(metadata__has_key=key).update(context_type=context)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1034_blocked_words'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('provider', models.CharField(blank=True, max_length=20, verbose_name='مزود الدفع')),
+                ('context_type', models.CharField(max_length=20, verbose_name='سياق الدفع')),
+                ('status', models.CharField(max_length=20, verbose_name='حالة الدفع')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='العدد')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='المبلغ')),
+            ],
+            options={
+                'verbose_name': 'Payment Revenue Rollup',
+                'verbose_name_plural': 'Payment Revenue Rollups',
+                'db_table': 'payment_revenue_rollups',
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='context_type',
+            field=models.CharField(choices=[('ad', 'إعلان - Ad'), ('package', 'باقة - Package'), ('order', 'طلب - Order'), ('subscription', 'اشتراك - Subscription'), ('banner', 'بانر مدفوع - Paid Banner'), ('other', 'أخرى - Other')], default='other', editable=False, max_length=20, verbose_name='سياق الدفع - Payment Context'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='provider_transaction_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, verbose_name='معرف المعاملة - Transaction ID'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['context_type', '-created_at'], name='payment_context_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-created_at'], name='payment_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['updated_at'], name='payment_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentrevenuerollup',
+            index=models.Index(fields=['status', 'day'], name='payment_rollup_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrevenuerollup',
+            constraint=models.UniqueConstraint(fields=('day', 'provider', 'context_type', 'status'), name='uniq_payment_rollup'),
+        ),
+        migrations.RunPython(backfill_context, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1035_payment_context_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatbotconversation',
+            name='reference',
+            field=models.UUIDField(blank=True, editable=False, help_text='Identifies the reply before its row is written (see main.chatbot_index)', null=True, unique=True, verbose_name='مرجع الرد'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1036_chatbot_conversation_reference'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdRecommendation',
+            fields=[
+                ('ad', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation', serialize=False, to='main.classifiedad', verbose_name='الإعلان')),
+                ('similar_ids', models.JSONField(default=list, verbose_name='الإعلانات المشابهة')),
+                ('computed_at', models.DateTimeField(verbose_name='تاريخ الحساب')),
+            ],
+            options={
+                'verbose_name': 'Ad Recommendation',
+                'verbose_name_plural': 'Ad Recommendations',
+                'db_table': 'ad_recommendations',
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:02
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+# Same as main.ranking; the quality part is added by the first ad_ranks run
+TIER_SPAN = 1_000_000.0
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+HALF_LIFE_HOURS = 72
+
+
+def backfill_ranks(apps, schema_editor):
+    """Rank existing ads by their flags, then by age."""
+    ClassifiedAd = apps.get_model("main", "ClassifiedAd")
+    rows = ClassifiedAd.objects.values_list("pk", "is_pinned", "is_urgent", "is_highlighted", "created_at")
+    batch = []
+    for pk, pinned, urgent, highlighted, created_at in rows.iterator(chunk_size=2000):
+        tier = 4 * pinned + 2 * urgent + highlighted
+        freshness = (created_at - EPOCH).total_seconds() / 3600 / HALF_LIFE_HOURS if created_at else 0.0
+        batch.append(ClassifiedAd(pk=pk, rank_tier=tier, rank_score=tier * TIER_SPAN + freshness))
+        if len(batch) >= 2000:
+            ClassifiedAd.objects.bulk_update(batch, ["rank_tier", "rank_score"])
+            batch = []
+    if batch:
+        ClassifiedAd.objects.bulk_update(batch, ["rank_tier", "rank_score"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('content', '0038_newsletter_campaigns'),
+        ('main', '1037_ad_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classifiedad',
+            name='rank_score',
+            field=models.FloatField(default=0, editable=False, help_text='ترتيب القوائم: الفئة ثم الحداثة والجودة', verbose_name='درجة الترتيب'),
+        ),
+        migrations.AddField(
+            model_name='classifiedad',
+            name='rank_tier',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='مثبت 4 + عاجل 2 + مميز 1', verbose_name='فئة الترتيب'),
+        ),
+        migrations.AddIndex(
+            model_name='classifiedad',
+            index=models.Index(fields=['country', 'status', '-rank_score'], name='ad_country_status_rank_idx'),
+        ),
+        migrations.RunPython(backfill_ranks, migrations.RunPython.noop),
+    ]
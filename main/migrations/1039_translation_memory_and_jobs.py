@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1038_classified_ad_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=10, verbose_name='اللغة - Language')),
+                ('overwrite', models.BooleanField(default=False, verbose_name='استبدال الموجود - Overwrite')),
+                ('status', models.CharField(choices=[('queued', 'في الانتظار - Queued'), ('running', 'قيد التنفيذ - Running'), ('completed', 'مكتمل - Completed'), ('failed', 'فشل - Failed')], default='queued', max_length=20, verbose_name='الحالة')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='الإجمالي')),
+                ('translated', models.PositiveIntegerField(default=0, verbose_name='تمت ترجمته')),
+                ('from_memory', models.PositiveIntegerField(default=0, verbose_name='من ذاكرة الترجمة')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='تم تخطيه')),
+                ('failed', models.PositiveIntegerField(default=0, verbose_name='فشل')),
+                ('error', models.TextField(blank=True, verbose_name='الخطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='translation_jobs', to=settings.AUTH_USER_MODEL, verbose_name='بواسطة')),
+            ],
+            options={
+                'verbose_name': 'Translation Job',
+                'verbose_name_plural': 'Translation Jobs',
+                'db_table': 'translation_jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TranslationMemory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_language', models.CharField(max_length=10, verbose_name='لغة المصدر - Source Language')),
+                ('target_language', models.CharField(max_length=10, verbose_name='لغة الهدف - Target Language')),
+                ('source_hash', models.CharField(editable=False, max_length=64, verbose_name='بصمة النص - Source Hash')),
+                ('source_text', models.TextField(verbose_name='النص الأصلي - Source Text')),
+                ('translated_text', models.TextField(verbose_name='الترجمة - Translation')),
+                ('provider', models.CharField(blank=True, max_length=30, verbose_name='المزود - Provider')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+            ],
+            options={
+                'verbose_name': 'ذاكرة الترجمة - Translation Memory',
+                'verbose_name_plural': 'ذاكرة الترجمة - Translation Memory',
+                'db_table': 'translation_memory',
+                'constraints': [models.UniqueConstraint(fields=('source_language', 'target_language', 'source_hash'), name='uniq_translation_memory')],
+            },
+        ),
+    ]
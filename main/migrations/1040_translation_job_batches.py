@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '1039_translation_memory_and_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translationjob',
+            name='pending',
+            field=models.JSONField(blank=True, default=list, verbose_name='قيد الانتظار'),
+        ),
+        migrations.AddField(
+            model_name='translationjob',
+            name='progress_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -2,7 +2,8 @@ import uuid
 
 from django.contrib.auth.models import AbstractUser, BaseUserManager, Group, Permission
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
@@ -1469,43 +1470,28 @@ class ClassifiedAdManager(models.Manager):
             if country_code
             else self.active()
         )
-        # Order by: pinned first, then urgent, then highlighted, then by date
-        return queryset.order_by(
-            "-is_pinned", "-is_urgent", "-is_highlighted", "-created_at"
-        )
+        # Order by rank: paid tier (pinned, urgent, highlighted), then
+        # freshness and quality (main.ranking)
+        return queryset.order_by("-rank_score")
 
     def featured_for_country(self, country_code):
         """Get only highlighted ads for a specific country (featured section)
 
-        Returns ads that are either:
-        1. Marked as is_highlighted=True (manual or via AdUpgrade)
-        2. Have an active FEATURED_SECTION feature via AdFeature
+        is_highlighted is set manually, by a highlighted upgrade or by an
+        active FEATURED_SECTION AdFeature (see AdFeature.save and
+        main.scheduled_tasks.clear_lapsed_highlights), so the flag alone
+        selects the section.
         """
-        from django.utils import timezone
-        from django.db.models import Q, Exists, OuterRef
-
-        # Get active featured section features
-        active_features = AdFeature.objects.filter(
-            ad=OuterRef("pk"),
-            feature_type=AdFeature.FeatureType.FEATURED_SECTION,
-            is_active=True,
-            end_date__gte=timezone.now(),
-        )
-
-        # Get ads that are either highlighted OR have active featured section
-        queryset = (
+        return (
             self.get_queryset()
             .filter(
-                Q(is_highlighted=True) | Q(Exists(active_features)),
+                is_highlighted=True,
                 status=self.model.AdStatus.ACTIVE,
                 country__code=country_code if country_code else "EG",
             )
-            .order_by("-is_pinned", "-is_urgent", "-created_at")
-            .distinct()
+            .order_by("-rank_score")
         )
 
-        return queryset
-
     def highlighted(self):
         """Get highlighted ads"""
         return self.get_queryset().filter(
@@ -1846,6 +1832,20 @@ class ClassifiedAd(models.Model):  # This model is correct, no changes needed he
         default=0, verbose_name=_("عدد المشاهدات")
     )
 
+    # Ranking (main.ranking)
+    rank_tier = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("فئة الترتيب"),
+        help_text=_("مثبت 4 + عاجل 2 + مميز 1"),
+    )
+    rank_score = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name=_("درجة الترتيب"),
+        help_text=_("ترتيب القوائم: الفئة ثم الحداثة والجودة"),
+    )
+
     # Custom manager
     objects = ClassifiedAdManager()
 
@@ -1854,6 +1854,9 @@ class ClassifiedAd(models.Model):  # This model is correct, no changes needed he
         verbose_name = _("Classified Ad")
         verbose_name_plural = _("Classified Ads")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["country", "status", "-rank_score"], name="ad_country_status_rank_idx"),
+        ]
 
     def __str__(self):
         return self.title
@@ -1949,6 +1952,15 @@ class ClassifiedAd(models.Model):  # This model is correct, no changes needed he
                 self.reviewed_at = timezone.now()
                 self.require_review = False
 
+        # Keep the listing rank in step with the flags and counters it reads
+        from main.ranking import RANK_INPUT_FIELDS, apply_rank
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or RANK_INPUT_FIELDS.intersection(update_fields):
+            apply_rank(self)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "rank_tier", "rank_score"}
+
         super().save(*args, **kwargs)
 
     def calculate_reservation_amount(self):
@@ -2012,14 +2024,12 @@ class ClassifiedAd(models.Model):  # This model is correct, no changes needed he
             "file": "fa-paperclip",
         }
 
-        # Get all custom fields for this category that should show on card
-        category_custom_fields = (
-            CategoryCustomField.objects.filter(
-                category=self.category, show_on_card=True, is_active=True
-            )
-            .select_related("custom_field")
-            .order_by("order")
-        )
+        # Custom fields of this category shown on cards (in-memory schema,
+        # see main.registries)
+        from main.registries import get_custom_field_schemas
+
+        schemas = get_custom_field_schemas()
+        category_custom_fields = schemas.card_fields(self.category_id)
 
         import re as _re
 
@@ -2043,13 +2053,9 @@ class ClassifiedAd(models.Model):  # This model is correct, no changes needed he
 
             # For select/radio fields, get the option label
             if cat_cf.custom_field.field_type in ["select", "radio"]:
-                try:
-                    option = CustomFieldOption.objects.get(
-                        custom_field=cat_cf.custom_field, value=field_value
-                    )
+                option = schemas.option(cat_cf.custom_field_id, field_value)
+                if option is not None:
                     field_value = option.label
-                except CustomFieldOption.DoesNotExist:
-                    pass
 
             # For checkbox fields
             elif cat_cf.custom_field.field_type == "checkbox":
@@ -2191,15 +2197,15 @@ class ClassifiedAd(models.Model):  # This model is correct, no changes needed he
         return fields_to_display
 
     def check_and_expire_upgrades(self):
-        """Check and deactivate expired upgrades"""
-        expired_upgrades = self.upgrade_history.filter(
-            is_active=True, end_date__lt=timezone.now()
-        )
+        """Check and deactivate expired upgrades (set-based, see UpgradeExpiryJob)"""
+        from main.scheduled_tasks import expire_lapsed_upgrades
 
-        for upgrade in expired_upgrades:
-            upgrade.deactivate()
-
-        return expired_upgrades.count()
+        expired = expire_lapsed_upgrades(ad_id=self.pk)
+        if expired:
+            self.refresh_from_db(
+                fields=["is_highlighted", "is_urgent", "is_pinned", "rank_tier", "rank_score"]
+            )
+        return expired
 
     def get_active_upgrades(self):
         """Get list of active upgrades"""
@@ -2658,6 +2664,140 @@ class AdUpgradeHistory(models.Model):
         self.save()
 
 
+class AdBulkOperation(models.Model):
+    """
+    سجل الإجراءات الجماعية على الإعلانات
+    Audit record and progress tracker for admin bulk actions on ads.
+    The status change itself is applied in one UPDATE; per-ad side effects
+    (emails / SMS) run in a background job that advances `processed`.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", _("في الانتظار - Queued")
+        RUNNING = "running", _("قيد التنفيذ - Running")
+        COMPLETED = "completed", _("مكتمل - Completed")
+        FAILED = "failed", _("فشل - Failed")
+
+    action = models.CharField(max_length=30, verbose_name=_("الإجراء"))
+    performed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="ad_bulk_operations",
+        verbose_name=_("بواسطة"),
+    )
+    ad_ids = models.JSONField(default=list, verbose_name=_("الإعلانات"))
+    reason = models.TextField(blank=True, verbose_name=_("السبب"))
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.QUEUED,
+        verbose_name=_("الحالة"),
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name=_("الإجمالي"))
+    processed = models.PositiveIntegerField(default=0, verbose_name=_("تمت معالجته"))
+    failed = models.PositiveIntegerField(default=0, verbose_name=_("فشل"))
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "ad_bulk_operations"
+        verbose_name = _("Ad Bulk Operation")
+        verbose_name_plural = _("Ad Bulk Operations")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.action} ({self.total}) - {self.get_status_display()}"
+
+    @property
+    def progress_percent(self):
+        if not self.total:
+            return 100
+        return min(100, round((self.processed + self.failed) * 100 / self.total))
+
+
+class MaintenanceRun(models.Model):
+    """
+    سجل تشغيل مهام الصيانة المجدولة
+    Per-run metrics of a scheduled maintenance job (expiry, upgrades, banners).
+    """
+
+    class Status(models.TextChoices):
+        RUNNING = "running", _("قيد التنفيذ - Running")
+        COMPLETED = "completed", _("مكتمل - Completed")
+        FAILED = "failed", _("فشل - Failed")
+
+    job = models.CharField(max_length=60, db_index=True, verbose_name=_("المهمة"))
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.RUNNING,
+        verbose_name=_("الحالة"),
+    )
+    chunks = models.PositiveIntegerField(default=0, verbose_name=_("الدفعات"))
+    scanned = models.PositiveIntegerField(default=0, verbose_name=_("تم فحصه"))
+    updated = models.PositiveIntegerField(default=0, verbose_name=_("تم تحديثه"))
+    notified = models.PositiveIntegerField(default=0, verbose_name=_("الإشعارات"))
+    emails_sent = models.PositiveIntegerField(default=0, verbose_name=_("الرسائل المرسلة"))
+    failed = models.PositiveIntegerField(default=0, verbose_name=_("فشل"))
+    duration_ms = models.PositiveIntegerField(default=0, verbose_name=_("المدة (مللي ثانية)"))
+    error = models.TextField(blank=True, verbose_name=_("الخطأ"))
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "maintenance_runs"
+        verbose_name = _("Maintenance Run")
+        verbose_name_plural = _("Maintenance Runs")
+        ordering = ["-started_at"]
+
+    def __str__(self):
+        return f"{self.job} @ {self.started_at:%Y-%m-%d %H:%M} - {self.get_status_display()}"
+
+
+class MaintenanceNotice(models.Model):
+    """
+    مفتاح منع تكرار إشعارات الصيانة
+    One row per notice sent by a maintenance job. The unique
+    (kind, object_id, window) key makes re-runs idempotent: notices are
+    claimed with INSERT ... ON CONFLICT DO NOTHING instead of a lookup.
+    """
+
+    kind = models.CharField(max_length=40, verbose_name=_("النوع"))
+    object_id = models.PositiveBigIntegerField(verbose_name=_("المعرف"))
+    # Date the notice refers to (e.g. the ad's expiry date), so a renewed
+    # ad gets a fresh notice for its new expiry
+    window = models.DateField(verbose_name=_("الفترة"))
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        null=True,
+        related_name="+",
+        verbose_name=_("المستخدم"),
+    )
+    run = models.ForeignKey(
+        MaintenanceRun,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="notices",
+        verbose_name=_("التشغيل"),
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "maintenance_notices"
+        verbose_name = _("Maintenance Notice")
+        verbose_name_plural = _("Maintenance Notices")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id", "window"], name="uniq_maintenance_notice"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} ({self.window})"
+
+
 class AdImage(models.Model):  # This model is correct, no changes needed here.
     """Model for multiple ad images"""
 
@@ -2691,6 +2831,33 @@ class AdImage(models.Model):  # This model is correct, no changes needed here.
         super().save(*args, **kwargs)
 
 
+class AdRecommendation(models.Model):
+    """
+    الإعلانات المشابهة
+    Precomputed "similar ads" of an active ad, best first, rebuilt by
+    main.scheduled_tasks.AdRecommendationJob and read by the ad detail pages
+    and the API in one primary-key lookup (see main.recommendations).
+    """
+
+    ad = models.OneToOneField(
+        ClassifiedAd,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="recommendation",
+        verbose_name=_("الإعلان"),
+    )
+    similar_ids = models.JSONField(default=list, verbose_name=_("الإعلانات المشابهة"))
+    computed_at = models.DateTimeField(verbose_name=_("تاريخ الحساب"))
+
+    class Meta:
+        db_table = "ad_recommendations"
+        verbose_name = _("Ad Recommendation")
+        verbose_name_plural = _("Ad Recommendations")
+
+    def __str__(self):
+        return f"{self.ad_id}: {self.similar_ids}"
+
+
 class AdReview(models.Model):
     """Model for ad reviews and ratings"""
 
@@ -2791,48 +2958,34 @@ class AdFeature(models.Model):  # This model is correct, no changes needed here.
         return f"{self.ad.title} - {self.get_feature_type_display()}"
 
     def save(self, *args, **kwargs):
-        """Update ad flags when feature is activated"""
+        """Update ad flags when feature is activated or deactivated"""
+        featured = self.feature_type == self.FeatureType.FEATURED_SECTION
         # If this is a FEATURED_SECTION feature and it's active, set is_highlighted
-        if self.is_active and self.feature_type == self.FeatureType.FEATURED_SECTION:
+        if self.is_active and featured:
             self.ad.is_highlighted = True
             self.ad.save(update_fields=["is_highlighted"])
 
         super().save(*args, **kwargs)
 
-    def is_feature_active(self):
-        return self.is_active and self.end_date >= timezone.now()
-
-    def deactivate(self):
-        """Deactivate this feature and update the ad if needed"""
-        self.is_active = False
+        if featured and not self.is_active:
+            # Unhighlight the ad unless another feature or upgrade keeps it
+            from main.scheduled_tasks import clear_lapsed_highlights
 
-        # If this is FEATURED_SECTION, check if ad should still be highlighted
-        if self.feature_type == self.FeatureType.FEATURED_SECTION:
-            # Check if there are other active FEATURED_SECTION features
-            other_features = (
-                AdFeature.objects.filter(
-                    ad=self.ad,
-                    feature_type=self.FeatureType.FEATURED_SECTION,
-                    is_active=True,
-                )
-                .exclude(id=self.id)
-                .exists()
-            )
+            clear_lapsed_highlights([self.ad_id])
+            if "ad" in self._state.fields_cache:
+                self.ad.refresh_from_db(fields=["is_highlighted"])
 
-            # If no other features and no active AdUpgrade, remove highlight
-            if not other_features:
-                from .models import AdUpgrade
+        # Active features count towards the ad's rank
+        from main.ranking import refresh_ranks
 
-                has_upgrade = AdUpgrade.objects.filter(
-                    ad=self.ad,
-                    upgrade_type=AdUpgrade.UpgradeType.HIGHLIGHTED,
-                    is_active=True,
-                ).exists()
+        refresh_ranks([self.ad_id])
 
-                if not has_upgrade:
-                    self.ad.is_highlighted = False
-                    self.ad.save(update_fields=["is_highlighted"])
+    def is_feature_active(self):
+        return self.is_active and self.end_date >= timezone.now()
 
+    def deactivate(self):
+        """Deactivate this feature and update the ad if needed (see save)"""
+        self.is_active = False
         self.save()
 
 
@@ -2994,6 +3147,23 @@ class Payment(models.Model):
         COD = "cod", _("الدفع عند الاستلام - Cash on Delivery")
         CASH = "cash", _("نقداً - Cash")
 
+    class PaymentContext(models.TextChoices):
+        AD = "ad", _("إعلان - Ad")
+        PACKAGE = "package", _("باقة - Package")
+        ORDER = "order", _("طلب - Order")
+        SUBSCRIPTION = "subscription", _("اشتراك - Subscription")
+        BANNER = "banner", _("بانر مدفوع - Paid Banner")
+        OTHER = "other", _("أخرى - Other")
+
+    # metadata key -> context, in priority order
+    CONTEXT_KEYS = (
+        ("ad_id", PaymentContext.AD),
+        ("package_id", PaymentContext.PACKAGE),
+        ("order_id", PaymentContext.ORDER),
+        ("subscription_type", PaymentContext.SUBSCRIPTION),
+        ("paid_banner_ad_id", PaymentContext.BANNER),
+    )
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="payments")
     provider = models.CharField(
         max_length=20,
@@ -3003,7 +3173,10 @@ class Payment(models.Model):
         verbose_name=_("مزود الدفع - Payment Provider"),
     )
     provider_transaction_id = models.CharField(
-        max_length=255, blank=True, verbose_name=_("معرف المعاملة - Transaction ID")
+        max_length=255,
+        blank=True,
+        db_index=True,
+        verbose_name=_("معرف المعاملة - Transaction ID"),
     )
     amount = models.DecimalField(
         max_digits=10, decimal_places=2, verbose_name=_("المبلغ - Amount")
@@ -3021,6 +3194,15 @@ class Payment(models.Model):
     metadata = models.JSONField(
         default=dict, blank=True, verbose_name=_("بيانات إضافية - Metadata")
     )
+    # Derived from metadata on save (see CONTEXT_KEYS) so the admin console
+    # can filter and roll up by it without JSON key lookups
+    context_type = models.CharField(
+        max_length=20,
+        choices=PaymentContext.choices,
+        default=PaymentContext.OTHER,
+        editable=False,
+        verbose_name=_("سياق الدفع - Payment Context"),
+    )
 
     # Offline Payment Receipt
     offline_payment_receipt = models.ImageField(
@@ -3042,10 +3224,33 @@ class Payment(models.Model):
         verbose_name = _("Payment")
         verbose_name_plural = _("Payments")
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["context_type", "-created_at"], name="payment_context_idx"),
+            models.Index(fields=["status", "-created_at"], name="payment_status_idx"),
+            models.Index(fields=["updated_at"], name="payment_updated_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} {self.currency} - {self.get_status_display()}"
 
+    @classmethod
+    def context_for_metadata(cls, metadata):
+        """The PaymentContext a metadata dict belongs to."""
+        if isinstance(metadata, dict):
+            for key, context in cls.CONTEXT_KEYS:
+                if key in metadata:
+                    return context
+        return cls.PaymentContext.OTHER
+
+    def save(self, *args, **kwargs):
+        self.context_type = self.context_for_metadata(self.metadata)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            # Keep the context and the revenue rollup watermark (updated_at)
+            # current on partial saves such as mark_completed()
+            kwargs["update_fields"] = {*update_fields, "context_type", "updated_at"}
+        super().save(*args, **kwargs)
+
     def mark_completed(self, transaction_id=None):
         """Mark payment as completed"""
         self.status = self.PaymentStatus.COMPLETED
@@ -3062,6 +3267,41 @@ class Payment(models.Model):
         self.save(update_fields=["status", "metadata"])
 
 
+class PaymentRevenueRollup(models.Model):
+    """
+    ملخص الإيرادات اليومي
+    Payment counts and amounts per (day, provider, context, status), rebuilt
+    by main.scheduled_tasks.PaymentRollupJob and read by the admin payments
+    console. Completed payments are counted on their completion day, all
+    others on their creation day (see main.payment_rollups).
+    """
+
+    day = models.DateField(verbose_name=_("اليوم"))
+    provider = models.CharField(max_length=20, blank=True, verbose_name=_("مزود الدفع"))
+    context_type = models.CharField(max_length=20, verbose_name=_("سياق الدفع"))
+    status = models.CharField(max_length=20, verbose_name=_("حالة الدفع"))
+    count = models.PositiveIntegerField(default=0, verbose_name=_("العدد"))
+    amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, verbose_name=_("المبلغ")
+    )
+
+    class Meta:
+        db_table = "payment_revenue_rollups"
+        verbose_name = _("Payment Revenue Rollup")
+        verbose_name_plural = _("Payment Revenue Rollups")
+        ordering = ["-day"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "provider", "context_type", "status"],
+                name="uniq_payment_rollup",
+            )
+        ]
+        indexes = [models.Index(fields=["status", "day"], name="payment_rollup_status_idx")]
+
+    def __str__(self):
+        return f"{self.day} {self.provider}/{self.context_type}/{self.status}: {self.amount}"
+
+
 class UserPackage(models.Model):  # This model is correct, no changes needed here.
     """Model to track user's purchased packages"""
 
@@ -3197,6 +3437,7 @@ class Notification(models.Model):  # This model is correct, no changes needed he
         AD_APPROVED = "ad_approved", _("الإعلان معتمد")
         AD_REJECTED = "ad_rejected", _("الإعلان مرفوض")
         AD_EXPIRED = "ad_expired", _("الإعلان منتهي")
+        AD_EXPIRING = "ad_expiring", _("الإعلان قارب على الانتهاء")
         PACKAGE_EXPIRED = "package_expired", _("الباقة منتهية")
         SAVED_SEARCH = "saved_search", _("نتائج البحث المحفوظ")
         FACEBOOK_SHARE_REJECTED = "facebook_share_rejected", _("طلب مشاركة فيسبوك مرفوض")
@@ -3988,6 +4229,49 @@ class ChatRoom(models.Model):
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_("آخر تحديث"))
     is_active = models.BooleanField(default=True, verbose_name=_("نشط"))
 
+    # Inbox summary, kept in step with the messages by ChatMessage.save,
+    # record_messages() and mark_as_read() so listings need no per-room queries
+    last_message = models.ForeignKey(
+        "ChatMessage",
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("آخر رسالة"),
+    )
+    last_message_sender = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("مرسل آخر رسالة"),
+    )
+    last_message_preview = models.CharField(
+        max_length=255, blank=True, default="", editable=False, verbose_name=_("معاينة آخر رسالة")
+    )
+    last_activity_at = models.DateTimeField(
+        default=timezone.now, editable=False, verbose_name=_("آخر نشاط")
+    )
+    unread_publisher = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("غير مقروءة للناشر")
+    )
+    unread_client = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("غير مقروءة للعميل")
+    )
+    unread_admin = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name=_("غير مقروءة للإدارة")
+    )
+
+    PREVIEW_LENGTH = 255
+    UNREAD_FIELDS = {
+        "publisher": "unread_publisher",
+        "client": "unread_client",
+        "admin": "unread_admin",
+    }
+
     class Meta:
         db_table = "chat_rooms"
         verbose_name = _("Chat Room")
@@ -3996,6 +4280,10 @@ class ChatRoom(models.Model):
         indexes = [
             models.Index(fields=["publisher", "client"]),
             models.Index(fields=["room_type", "is_active"]),
+            # Inbox keyset ordering per participant
+            models.Index(fields=["publisher", "-last_activity_at", "-id"], name="chat_room_pub_inbox_idx"),
+            models.Index(fields=["client", "-last_activity_at", "-id"], name="chat_room_client_inbox_idx"),
+            models.Index(fields=["room_type", "-last_activity_at", "-id"], name="chat_room_type_inbox_idx"),
         ]
 
     def __str__(self):
@@ -4003,13 +4291,78 @@ class ChatRoom(models.Model):
             return f"Chat: {self.publisher.username} <-> {self.client.username if self.client else 'Unknown'}"
         return f"Support: {self.publisher.username} <-> Admin"
 
+    def participant_role(self, user):
+        """publisher / client / admin for *user* in this room, or None."""
+        if user.pk == self.publisher_id:
+            return "publisher"
+        if self.client_id and user.pk == self.client_id:
+            return "client"
+        if user.is_staff:
+            return "admin"
+        return None
+
+    def recipient_role(self, sender_id):
+        """Whose unread counter a message from *sender_id* increments."""
+        if self.room_type == "publisher_admin":
+            return "admin" if sender_id == self.publisher_id else "publisher"
+        return "client" if sender_id == self.publisher_id else "publisher"
+
     def get_unread_count(self, user):
         """Get unread message count for a specific user"""
-        return self.messages.filter(is_read=False).exclude(sender=user).count()
+        role = self.participant_role(user)
+        return getattr(self, self.UNREAD_FIELDS[role]) if role else 0
 
     def mark_as_read(self, user):
         """Mark all messages as read for a specific user"""
-        self.messages.filter(is_read=False).exclude(sender=user).update(is_read=True)
+        role = self.participant_role(user)
+        if role is None:
+            return 0
+        if role == "admin":
+            unread = Q(sender_id=self.publisher_id)
+        else:
+            unread = ~Q(sender_id=user.pk)
+        field = self.UNREAD_FIELDS[role]
+        with transaction.atomic():
+            updated = self.messages.filter(unread, is_read=False).update(
+                is_read=True, read_at=timezone.now()
+            )
+            ChatRoom.objects.filter(pk=self.pk).update(**{field: 0})
+        setattr(self, field, 0)
+        return updated
+
+    @classmethod
+    def record_messages(cls, room_id, messages):
+        """
+        Fold newly saved *messages* of one room into its summary: bump the
+        recipients' unread counters and move the last-message fields forward.
+        Call inside the transaction that saved the messages.
+        """
+        messages = [m for m in messages if m.pk]
+        if not messages:
+            return
+        room = cls.objects.only("pk", "room_type", "publisher", "client").get(pk=room_id)
+        increments = {}
+        for message in messages:
+            if message.is_read:
+                continue
+            field = cls.UNREAD_FIELDS[room.recipient_role(message.sender_id)]
+            increments[field] = increments.get(field, 0) + 1
+        if increments:
+            cls.objects.filter(pk=room_id).update(
+                **{field: F(field) + count for field, count in increments.items()}
+            )
+
+        latest = max(messages, key=lambda m: m.pk)
+        # Only move forward: a concurrent writer may already have a newer message here
+        cls.objects.filter(pk=room_id).filter(
+            Q(last_message__isnull=True) | Q(last_message_id__lt=latest.pk)
+        ).update(
+            last_message_id=latest.pk,
+            last_message_sender_id=latest.sender_id,
+            last_message_preview=latest.message[: cls.PREVIEW_LENGTH],
+            last_activity_at=latest.created_at or timezone.now(),
+            updated_at=timezone.now(),
+        )
 
 
 class ChatMessage(models.Model):
@@ -4030,6 +4383,11 @@ class ChatMessage(models.Model):
         verbose_name=_("المرسل"),
     )
     message = models.TextField(verbose_name=_("الرسالة"))
+    # Server-generated ID assigned when the message is broadcast, before it
+    # is saved (the "message_id" of the chat protocol)
+    message_uuid = models.UUIDField(
+        null=True, blank=True, unique=True, editable=False, verbose_name=_("معرف الرسالة")
+    )
 
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("وقت الإرسال"))
@@ -4057,12 +4415,25 @@ class ChatMessage(models.Model):
     def __str__(self):
         return f"{self.sender.username}: {self.message[:50]}"
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        # New messages update the room summary in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ChatRoom.record_messages(self.room_id, [self])
+
     def mark_as_read(self):
         """Mark message as read"""
         if not self.is_read:
             self.is_read = True
             self.read_at = timezone.now()
             self.save(update_fields=["is_read", "read_at"])
+            recipient = self.room.recipient_role(self.sender_id)
+            field = ChatRoom.UNREAD_FIELDS[recipient]
+            ChatRoom.objects.filter(pk=self.room_id, **{f"{field}__gt": 0}).update(
+                **{field: F(field) - 1}
+            )
 
 
 class Visitor(models.Model):
@@ -4839,6 +5210,39 @@ class SMSTemplate(models.Model):
         return text
 
 
+class BlockedWord(models.Model):
+    """
+    Admin-managed additions to the built-in blocked word lists (main.blocked_words).
+    كلمات محظورة يضيفها المشرف إلى القوائم الثابتة
+    """
+
+    class Category(models.TextChoices):
+        RESERVED = "reserved", _("محجوزة - Reserved (usernames)")
+        OFFENSIVE = "offensive", _("غير لائقة - Offensive (usernames and content)")
+
+    word = models.CharField(max_length=100, verbose_name=_("الكلمة - Word"))
+    category = models.CharField(
+        max_length=20,
+        choices=Category.choices,
+        default=Category.OFFENSIVE,
+        verbose_name=_("التصنيف - Category"),
+    )
+    is_active = models.BooleanField(default=True, verbose_name=_("نشط - Active"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("تاريخ الإنشاء"))
+
+    class Meta:
+        db_table = "blocked_words"
+        verbose_name = _("كلمة محظورة - Blocked Word")
+        verbose_name_plural = _("الكلمات المحظورة - Blocked Words")
+        ordering = ["category", "word"]
+        constraints = [
+            models.UniqueConstraint(fields=["word", "category"], name="uniq_blocked_word"),
+        ]
+
+    def __str__(self):
+        return self.word
+
+
 class AdSenseSlot(models.Model):
     """
     Google AdSense slot configuration. Admin-only — not exposed to advertisers or users.
@@ -5032,22 +5436,11 @@ class BannerSlot(models.Model):
         Given the result of PaidBanner.get_ads_grouped_by_space (a dict like
         {ad_type: {space_key: [ads...]}}), return {ad_type: rotation_seconds}
         by looking up BannerSlot for each space key. Falls back to `default`.
+        Slot rotations are read from the in-memory banner index.
         """
-        all_space_keys = {
-            sk for spaces in grouped_dict.values() for sk in spaces.keys()
-        }
-        slot_map = {
-            s.slot_key: s.rotation_seconds
-            for s in cls.objects.filter(slot_key__in=all_space_keys, is_active=True)
-        }
-        result = {}
-        for ad_type, spaces in grouped_dict.items():
-            result[ad_type] = default
-            for space_key in spaces:
-                if space_key in slot_map:
-                    result[ad_type] = slot_map[space_key]
-                    break
-        return result
+        from main.banner_index import get_banner_index
+
+        return get_banner_index().rotation_map(grouped_dict, default=default)
 
 
 class PaidBanner(models.Model):
@@ -5619,28 +6012,17 @@ class PaidBanner(models.Model):
         Get ads grouped by advertising_space.
         Returns a dictionary where keys are ad types and values are lists of ads for each space.
         Ads sharing the same advertising_space will be returned together to enable carousel display.
+        Served from the in-memory banner index (see main.banner_index).
         """
-        ads = cls.get_active_ads(
+        from main.banner_index import get_banner_index
+
+        return get_banner_index().grouped_by_space(
             country_code=country_code,
             placement_type=placement_type,
-            category=category
+            category=category,
+            ad_type=ad_type,
         )
 
-        if ad_type:
-            ads = ads.filter(ad_type=ad_type)
-
-        # Group ads by advertising_space and ad_type
-        from collections import defaultdict
-        grouped = defaultdict(lambda: defaultdict(list))
-
-        for ad in ads:
-            # If ad has a specific advertising_space, group by that
-            # Otherwise, treat each ad as its own space
-            space_key = ad.advertising_space if ad.advertising_space else f"single_{ad.id}"
-            grouped[ad.ad_type][space_key].append(ad)
-
-        return dict(grouped)
-
     @classmethod
     def get_category_ads_grouped(cls, category, country_code):
         """
@@ -5832,3 +6214,96 @@ class CustomPage(models.Model):
     def get_absolute_url(self):
         from django.urls import reverse
         return reverse("main:custom_page", kwargs={"slug": self.slug})
+
+
+# ===========================
+# Translations
+# ===========================
+
+
+class TranslationMemory(models.Model):
+    """
+    ذاكرة الترجمة: النصوص المترجمة آلياً مرة واحدة
+    Machine translations kept so a msgid is never sent to the provider twice
+    (main.translation_workspace).
+    """
+
+    source_language = models.CharField(max_length=10, verbose_name=_("لغة المصدر - Source Language"))
+    target_language = models.CharField(max_length=10, verbose_name=_("لغة الهدف - Target Language"))
+    source_hash = models.CharField(max_length=64, editable=False, verbose_name=_("بصمة النص - Source Hash"))
+    source_text = models.TextField(verbose_name=_("النص الأصلي - Source Text"))
+    translated_text = models.TextField(verbose_name=_("الترجمة - Translation"))
+    provider = models.CharField(max_length=30, blank=True, verbose_name=_("المزود - Provider"))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_("تاريخ الإنشاء"))
+
+    class Meta:
+        db_table = "translation_memory"
+        verbose_name = _("ذاكرة الترجمة - Translation Memory")
+        verbose_name_plural = _("ذاكرة الترجمة - Translation Memory")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source_language", "target_language", "source_hash"], name="uniq_translation_memory"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source_language}→{self.target_language}: {self.source_text[:50]}"
+
+
+class TranslationJob(models.Model):
+    """
+    مهمة الترجمة التلقائية
+    Progress of a background auto-translation of one language's catalog.
+
+    pending holds the [msgid, entry count] pairs still to be sent to the
+    provider, one batch per task; progress_at is when a task last moved the
+    job on.
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", _("في الانتظار - Queued")
+        RUNNING = "running", _("قيد التنفيذ - Running")
+        COMPLETED = "completed", _("مكتمل - Completed")
+        FAILED = "failed", _("فشل - Failed")
+
+    language = models.CharField(max_length=10, verbose_name=_("اللغة - Language"))
+    overwrite = models.BooleanField(default=False, verbose_name=_("استبدال الموجود - Overwrite"))
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="translation_jobs",
+        verbose_name=_("بواسطة"),
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=Status.choices,
+        default=Status.QUEUED,
+        verbose_name=_("الحالة"),
+    )
+    total = models.PositiveIntegerField(default=0, verbose_name=_("الإجمالي"))
+    translated = models.PositiveIntegerField(default=0, verbose_name=_("تمت ترجمته"))
+    from_memory = models.PositiveIntegerField(default=0, verbose_name=_("من ذاكرة الترجمة"))
+    skipped = models.PositiveIntegerField(default=0, verbose_name=_("تم تخطيه"))
+    failed = models.PositiveIntegerField(default=0, verbose_name=_("فشل"))
+    pending = models.JSONField(default=list, blank=True, verbose_name=_("قيد الانتظار"))
+    error = models.TextField(blank=True, verbose_name=_("الخطأ"))
+    created_at = models.DateTimeField(auto_now_add=True)
+    progress_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "translation_jobs"
+        verbose_name = _("Translation Job")
+        verbose_name_plural = _("Translation Jobs")
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.language} ({self.total}) - {self.get_status_display()}"
+
+    @property
+    def progress_percent(self):
+        if not self.total:
+            return 100 if self.status == self.Status.COMPLETED else 0
+        return min(100, round((self.translated + self.failed) * 100 / self.total))
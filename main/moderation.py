@@ -0,0 +1,221 @@
+"""
+Content moderation engine
+محرك الإشراف على المحتوى (الكلمات المحظورة)
+
+All blocked words, the built-in RESERVED_WORDS / OFFENSIVE_WORDS lists in
+main.blocked_words plus active BlockedWord rows from the admin, are merged
+into a prefix trie per category and compiled into a single regex, so text is
+scanned once by the C regex engine instead of once per word. (A pure-Python
+Aho–Corasick loop was measured slower than even the old per-word `in` checks
+on typical ad text.)
+
+Both the words and the scanned text go through the same normalisation:
+  - lowercase; Arabic diacritics and tatweel removed; alef / yaa / taa
+    marbuta / hamza-carrier variants unified (أدمن == ادمن);
+  - leetspeak symbols and digits folded to letters when they sit next to a
+    Latin letter and not next to another digit (p0rn, b!tch, 4dmin, but not
+    the model number "53x");
+  - "_", "-" and "." removed; whitespace collapsed to one space, or removed
+    entirely in compact mode (usernames).
+Leetspeak is folded on the text side, which keeps the compiled patterns plain
+literals. Clean text is checked on a normalised copy built with C-level
+string operations; only when something matches is the text re-normalised character by character,
+remembering each character's original offset, so matches are reported as
+spans of the original text for highlighting.
+
+The compiled engine is a main.registries.ReadOnlyRegistry: rebuilt when a
+BlockedWord changes (main.signals) or another process bumps the shared
+version stamp.
+"""
+
+import logging
+import re
+from typing import NamedTuple
+
+from main.arabic_text import ARABIC_FOLD, ARABIC_MARKS
+from main.registries import ReadOnlyRegistry
+from main.request_classifier import compile_alternation
+
+logger = logging.getLogger(__name__)
+
+MODERATION_VERSION_KEY = "moderation_engine_version"
+
+RESERVED = "reserved"
+OFFENSIVE = "offensive"
+
+# Arabic marks and the separators ignored in words
+_DROPPED = frozenset(ARABIC_MARKS + "_-.")
+
+# Leetspeak substitutes folded back to their letter
+_LEET_FOLD = {
+    "0": "o",
+    "1": "i",
+    "!": "i",
+    "3": "e",
+    "4": "a",
+    "@": "a",
+    "5": "s",
+    "$": "s",
+    "7": "t",
+}
+_LEET_CHARS = re.escape("".join(_LEET_FOLD))
+# A substitute next to a letter and not part of a number ("p0rn", not "53x").
+# Written to start with the substitute itself so the regex engine can skip
+# ahead to candidate characters instead of trying every position.
+_LEET_RE = re.compile(f"[{_LEET_CHARS}](?:(?<=[a-z].)(?![0-9])|(?<![0-9].)(?=[a-z]))")
+# Regex used for a space inside a compiled word
+_CLASSES = {" ": r"\s+"}
+
+_DROPPED_RE = re.compile("[" + re.escape("".join(sorted(_DROPPED))) + "]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _fold_leet(text):
+    # Replacements are one character for one, so offsets are unchanged
+    return _LEET_RE.sub(lambda m: _LEET_FOLD[m.group()], text)
+
+
+def normalize(text, compact=False):
+    """
+    Return (normalised text, origins) where origins[i] is the index in *text*
+    of the character that produced normalised character i.
+    """
+    chars = []
+    origins = []
+    for i, ch in enumerate(text):
+        if ch in _DROPPED or (compact and ch.isspace()):
+            continue
+        for out in ARABIC_FOLD.get(ch, ch).lower():
+            chars.append(out)
+            origins.append(i)
+    return _fold_leet("".join(chars)), origins
+
+
+def normalize_text(text, compact=False):
+    """normalize(text)[0] built with C-level string operations."""
+    text = _DROPPED_RE.sub("", text)
+    for variant, base in ARABIC_FOLD.items():
+        if variant in text:
+            text = text.replace(variant, base)
+    text = _fold_leet(text.lower())
+    return "".join(text.split()) if compact else text
+
+
+def canonical_word(text, compact=False):
+    """Key a blocked word (or a matched span) is stored under: spaces collapsed."""
+    text = normalize_text(text, compact)
+    return text if compact else _SPACE_RE.sub(" ", text).strip()
+
+
+class Match(NamedTuple):
+    word: str  # the blocked word as listed
+    category: str  # RESERVED or OFFENSIVE
+    start: int  # span in the original text
+    end: int
+
+
+class ModerationEngine:
+    """
+    The normalised blocked words of each category compiled into one
+    trie-shaped pattern (see main.request_classifier.compile_alternation).
+    """
+
+    def __init__(self, entries):
+        """*entries*: iterable of (word, category)."""
+        self._words = {}  # category -> normalised key -> listed word
+        for word, category in entries:
+            if not word:
+                continue
+            keys = self._words.setdefault(category, {})
+            for key in (canonical_word(word), canonical_word(word, compact=True)):
+                if key:
+                    keys.setdefault(key, word)
+        self._patterns = {
+            category: compile_alternation(keys, classes=_CLASSES)
+            for category, keys in self._words.items()
+        }
+        self.size = sum(len(keys) for keys in self._words.values())
+
+    def find(self, text, categories=(RESERVED, OFFENSIVE), compact=False):
+        """Non-overlapping matches in *text* as original-text spans, in order."""
+        if not text:
+            return []
+        patterns = [(c, self._patterns[c]) for c in categories if c in self._patterns]
+        # Clean text (the common case) never pays for the offset bookkeeping
+        quick = normalize_text(text, compact)
+        if not any(pattern.search(quick) for _, pattern in patterns):
+            return []
+
+        normalized, origins = normalize(text, compact)
+        matches = []
+        for category, pattern in patterns:
+            words = self._words[category]
+            for m in pattern.finditer(normalized):
+                word = words.get(canonical_word(m.group(), compact), m.group())
+                matches.append(
+                    Match(word, category, origins[m.start()], origins[m.end() - 1] + 1)
+                )
+        matches.sort(key=lambda m: (m.start, m.end))
+        return matches
+
+    def first(self, text, categories=(RESERVED, OFFENSIVE), compact=False):
+        matches = self.find(text, categories, compact)
+        return matches[0] if matches else None
+
+
+def highlight(text, matches, before="[", after="]"):
+    """Wrap the (merged) match spans of *text* in *before* / *after*."""
+    spans = []
+    for match in sorted(matches, key=lambda m: m.start):
+        if spans and match.start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], match.end)
+        else:
+            spans.append([match.start, match.end])
+    parts = []
+    cursor = 0
+    for start, end in spans:
+        parts.extend([text[cursor:start], before, text[start:end], after])
+        cursor = end
+    parts.append(text[cursor:])
+    return "".join(parts)
+
+
+# =======================
+# Process-wide engine
+# =======================
+
+
+def _word_entries():
+    from main.blocked_words import OFFENSIVE_WORDS, RESERVED_WORDS
+
+    entries = [(w, RESERVED) for w in RESERVED_WORDS] + [
+        (w, OFFENSIVE) for w in OFFENSIVE_WORDS
+    ]
+    try:
+        from main.models import BlockedWord
+
+        entries += list(
+            BlockedWord.objects.filter(is_active=True).values_list("word", "category")
+        )
+    except Exception as e:
+        # e.g. before migrations have run
+        logger.warning(f"Could not load admin blocked words: {e}")
+    return entries
+
+
+def build_moderation_engine():
+    return ModerationEngine(_word_entries())
+
+
+moderation_engine = ReadOnlyRegistry(
+    "moderation", build_moderation_engine, MODERATION_VERSION_KEY
+)
+
+
+def get_moderation_engine():
+    """The current ModerationEngine, rebuilt when the word list has changed."""
+    return moderation_engine.get()
+
+
+def invalidate_moderation_engine():
+    moderation_engine.invalidate()
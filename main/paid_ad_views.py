@@ -6,23 +6,42 @@ from django.views import View
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from main.banner_index import (
+    get_banner_index,
+    pending_banner_counts,
+    record_banner_click,
+    record_banner_view,
+)
 from main.models import PaidBanner
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _get_tracked_banner(ad_id):
+    """
+    Resolve a banner for impression/click tracking from the serving index,
+    falling back to the database for banners that are not currently served.
+    Counts are buffered and flushed in batches by main.banner_index.
+    """
+    ad = get_banner_index().banners_by_id.get(ad_id)
+    if ad is None:
+        ad = PaidBanner.objects.only("pk", "views_count", "clicks_count").get(id=ad_id)
+    return ad
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class PaidAdViewTrackingView(View):
     """Track paid banner views"""
 
     def post(self, request, ad_id):
         try:
-            ad = PaidBanner.objects.get(id=ad_id)
-            ad.increment_views()
+            ad = _get_tracked_banner(ad_id)
+            record_banner_view(ad.pk)
+            views, _clicks = pending_banner_counts(ad.pk)
             return JsonResponse({
                 'success': True,
-                'views_count': ad.views_count
+                'views_count': ad.views_count + views
             })
         except PaidBanner.DoesNotExist:
             return JsonResponse({
@@ -43,12 +62,15 @@ class PaidAdClickTrackingView(View):
 
     def post(self, request, ad_id):
         try:
-            ad = PaidBanner.objects.get(id=ad_id)
-            ad.increment_clicks()
+            ad = _get_tracked_banner(ad_id)
+            record_banner_click(ad.pk)
+            views, clicks = pending_banner_counts(ad.pk)
+            views += ad.views_count
+            clicks += ad.clicks_count
             return JsonResponse({
                 'success': True,
-                'clicks_count': ad.clicks_count,
-                'ctr': ad.ctr
+                'clicks_count': clicks,
+                'ctr': (clicks / views) * 100 if views else 0
             })
         except PaidBanner.DoesNotExist:
             return JsonResponse({
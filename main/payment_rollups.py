@@ -0,0 +1,209 @@
+"""
+Payment revenue rollups
+ملخصات الإيرادات اليومية للوحة المدفوعات
+
+The admin payments console used to aggregate over every Payment, Order and
+UserPackage row on each load, with one extra query per month of the revenue
+chart. Payment totals are now read from PaymentRevenueRollup: one row per
+(day, provider, context, status) holding the payment count and amount.
+
+A completed payment is rolled up on the local day it was completed, any
+other payment on the day it was created, so revenue windows (today, this
+week, this month) are plain ranges over ``day``.
+
+Rollups are rebuilt by PaymentRollupJob (main.scheduled_tasks): each run
+recomputes the days touched by payments updated since the previous run, and
+the first run or ``full=True`` rebuilds everything. Console figures can
+therefore lag by up to one job interval.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, When
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+# Providers counted separately on the console ("offline" is a legacy value)
+CONSOLE_PROVIDERS = ("paypal", "paymob", "bank_transfer", "offline")
+# Months shown in the revenue chart
+CHART_MONTHS = 6
+
+
+def rollup_day_expression():
+    """Local date a payment is rolled up on."""
+    from main.models import Payment
+
+    moment = Case(
+        When(
+            status=Payment.PaymentStatus.COMPLETED,
+            completed_at__isnull=False,
+            then=F("completed_at"),
+        ),
+        default=F("created_at"),
+    )
+    return TruncDate(moment, tzinfo=timezone.get_current_timezone())
+
+
+def payment_days(payment_ids):
+    """Every day the given payments are, or may have been, rolled up on."""
+    from main.models import Payment
+
+    days = set()
+    rows = Payment.objects.filter(pk__in=payment_ids).values_list(
+        "created_at", "completed_at"
+    )
+    for created_at, completed_at in rows:
+        # A status change moves a payment between these two days
+        for moment in (created_at, completed_at):
+            if moment:
+                days.add(timezone.localdate(moment))
+    return days
+
+
+def rebuild_rollups(days=None):
+    """
+    Recompute the rollup rows of *days* (all days when None) in one
+    transaction; return the number of rows written.
+    """
+    from main.models import Payment, PaymentRevenueRollup
+
+    payments = Payment.objects.annotate(day=rollup_day_expression())
+    rollups = PaymentRevenueRollup.objects.all()
+    if days is not None:
+        days = sorted(days)
+        if not days:
+            return 0
+        payments = payments.filter(day__in=days)
+        rollups = rollups.filter(day__in=days)
+
+    rows = (
+        payments.order_by()
+        .values("day", "provider", "context_type", "status")
+        .annotate(total=Count("pk"), revenue=Sum("amount"))
+    )
+    with transaction.atomic():
+        rollups.delete()
+        created = PaymentRevenueRollup.objects.bulk_create(
+            [
+                PaymentRevenueRollup(
+                    day=row["day"],
+                    provider=row["provider"],
+                    context_type=row["context_type"],
+                    status=row["status"],
+                    count=row["total"],
+                    amount=row["revenue"] or 0,
+                )
+                for row in rows
+            ],
+            batch_size=500,
+        )
+    return len(created)
+
+
+def _month_starts(today, months):
+    """First day of each of the last *months* months, oldest first."""
+    starts = [today.replace(day=1)]
+    while len(starts) < months:
+        starts.append((starts[-1] - timedelta(days=1)).replace(day=1))
+    return starts[::-1]
+
+
+def payment_totals(now=None):
+    """Payment counts and revenue for the console, in one query over the rollups."""
+    from main.models import Payment, PaymentRevenueRollup
+
+    today = timezone.localdate(now)
+    completed = Q(status=Payment.PaymentStatus.COMPLETED)
+
+    def total(field, condition=None):
+        if field == "amount":
+            return Coalesce(
+                Sum(field, filter=condition), 0, output_field=DecimalField()
+            )
+        return Coalesce(Sum(field, filter=condition), 0)
+
+    aggregates = {
+        "total_transactions": total("count"),
+        "completed_transactions": total("count", completed),
+        "total_revenue": total("amount", completed),
+        "monthly_revenue": total(
+            "amount", completed & Q(day__gte=today.replace(day=1))
+        ),
+        "weekly_revenue": total(
+            "amount", completed & Q(day__gt=today - timedelta(days=7))
+        ),
+        "today_revenue": total("amount", completed & Q(day=today)),
+    }
+    for status in ("pending", "failed", "refunded", "cancelled"):
+        aggregates[f"{status}_payments"] = total("count", Q(status=status))
+    for provider in CONSOLE_PROVIDERS:
+        aggregates[f"{provider}_payments"] = total(
+            "count", completed & Q(provider=provider)
+        )
+    return PaymentRevenueRollup.objects.aggregate(**aggregates)
+
+
+def monthly_revenue(now=None, months=CHART_MONTHS):
+    """[{"month": "YYYY-MM", "revenue": float}, ...] for the last *months* months."""
+    from main.models import Payment, PaymentRevenueRollup
+
+    starts = _month_starts(timezone.localdate(now), months)
+    revenue = {
+        row["month"].strftime("%Y-%m"): row["revenue"]
+        for row in PaymentRevenueRollup.objects.filter(
+            status=Payment.PaymentStatus.COMPLETED, day__gte=starts[0]
+        )
+        .annotate(month=TruncMonth("day"))
+        .order_by()
+        .values("month")
+        .annotate(revenue=Sum("amount"))
+    }
+    return [
+        {
+            "month": start.strftime("%Y-%m"),
+            "revenue": float(revenue.get(start.strftime("%Y-%m")) or 0),
+        }
+        for start in starts
+    ]
+
+
+def console_stats(now=None):
+    """All counters of the admin payments console."""
+    from main.models import Order, User, UserPackage
+
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    today_start = timezone.localtime(now).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+
+    stats = payment_totals(now)
+    stats.update(
+        User.objects.filter(is_premium=True).aggregate(
+            premium_members=Count("pk"),
+            active_premium_members=Count("pk", filter=Q(subscription_end__gte=today)),
+            expired_premium_members=Count("pk", filter=Q(subscription_end__lt=today)),
+        )
+    )
+    stats.update(
+        Order.objects.aggregate(
+            total_orders=Count("pk"),
+            completed_orders=Count(
+                "pk", filter=Q(status="delivered", payment_status="paid")
+            ),
+            pending_orders=Count("pk", filter=Q(payment_status="pending")),
+            orders_revenue=Coalesce(
+                Sum("total_amount", filter=Q(payment_status="paid")),
+                0,
+                output_field=DecimalField(),
+            ),
+        )
+    )
+    stats.update(
+        UserPackage.objects.aggregate(
+            active_packages=Count("pk", filter=Q(expiry_date__gte=today_start)),
+            expired_packages=Count("pk", filter=Q(expiry_date__lt=today_start)),
+        )
+    )
+    return stats
@@ -0,0 +1,66 @@
+"""
+Admin Performance Views
+Per-view latency / query percentiles collected by main.instrumentation
+"""
+
+from django.contrib import messages
+from django.http import HttpResponse, HttpResponseForbidden
+from django.shortcuts import redirect
+from django.utils.translation import gettext as _
+from django.views.decorators.http import require_GET, require_POST
+from django.views.generic import TemplateView
+
+from main.admin_groups import can_admin
+from main.decorators import SuperadminRequiredMixin, admin_section_required
+from main.instrumentation import (
+    METRIC_FIELDS,
+    get_config,
+    prometheus_text,
+    reset_samples,
+    summarize,
+)
+
+
+class AdminPerformanceView(SuperadminRequiredMixin, TemplateView):
+    """Admin dashboard page listing sampled per-view performance percentiles."""
+
+    required_admin_group = "reports"
+    template_name = "admin_dashboard/performance.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["active_nav"] = "performance"
+
+        report = summarize()
+        config = get_config()
+        context["report"] = report
+        context["metric_fields"] = METRIC_FIELDS
+        context["total_samples"] = sum(entry["count"] for entry in report.values())
+        context["sample_rate_percent"] = round(config["SAMPLE_RATE"] * 100, 1)
+        context["instrumentation_enabled"] = config["ENABLED"]
+        return context
+
+
+@require_POST
+@admin_section_required("reports")
+def admin_performance_reset(request):
+    """Clear collected performance samples."""
+    reset_samples()
+    messages.success(request, _("تم مسح بيانات الأداء."))
+    return redirect("main:admin_performance")
+
+
+@require_GET
+def performance_metrics(request):
+    """
+    Prometheus text endpoint.
+    Accessible with `Authorization: Bearer <PERF_METRICS_TOKEN>` or an admin session.
+    """
+    token = get_config()["METRICS_TOKEN"]
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    authorized = bool(token) and auth == f"Bearer {token}"
+    if not authorized and not (
+        request.user.is_authenticated and can_admin(request.user, "reports")
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(prometheus_text(), content_type="text/plain; version=0.0.4")
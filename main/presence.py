@@ -0,0 +1,222 @@
+"""
+Chat presence and typing state
+حالة التواجد والكتابة في المحادثات
+
+Online state lives next to the Channels layer in Redis sorted sets, scored
+by the last heartbeat timestamp:
+
+    presence:users            user id -> last seen (any socket)
+    presence:room:<room id>   user id -> last seen in that room
+
+A user is online while their score is newer than PRESENCE_TTL seconds.
+Sockets heartbeat on connect, on every client {"type": "heartbeat"} and on
+NotificationConsumer pings; stale members are trimmed on write. Dashboards
+read a whole page of users/rooms in one pipelined round trip via snapshot().
+
+When the channel layer is not Redis (tests, local runs without Redis) an
+in-process store with the same interface is used.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds without a heartbeat before a user counts as offline
+PRESENCE_TTL = 75
+# Clients are asked to heartbeat at this interval
+HEARTBEAT_INTERVAL = 30
+# Minimum seconds between two "typing" broadcasts from the same socket
+TYPING_DEBOUNCE = 2.0
+
+USERS_KEY = "presence:users"
+ROOM_KEY = "presence:room:{room_id}"
+
+
+def _redis_url():
+    url = getattr(settings, "PRESENCE_REDIS_URL", None)
+    if url:
+        return url
+    layer = getattr(settings, "CHANNEL_LAYERS", {}).get("default", {})
+    if "redis" not in layer.get("BACKEND", "").lower():
+        return None
+    hosts = layer.get("CONFIG", {}).get("hosts") or [("127.0.0.1", 6379)]
+    host = hosts[0]
+    if isinstance(host, dict):
+        host = host.get("address")
+    if isinstance(host, (list, tuple)):
+        return f"redis://{host[0]}:{host[1]}/0"
+    return host
+
+
+class RedisPresenceStore:
+    """Presence in Redis sorted sets, with sync (views) and async (consumers) clients."""
+
+    def __init__(self, url):
+        self.url = url
+        self._sync_client = None
+        self._async_clients = {}
+
+    # -- clients ---------------------------------------------------------
+
+    def _client(self):
+        if self._sync_client is None:
+            import redis
+
+            self._sync_client = redis.Redis.from_url(self.url, socket_timeout=2)
+        return self._sync_client
+
+    def _aclient(self):
+        import redis.asyncio as aioredis
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(id(loop))
+        if client is None:
+            client = aioredis.Redis.from_url(self.url, socket_timeout=2)
+            self._async_clients = {id(loop): client}
+        return client
+
+    # -- writes ----------------------------------------------------------
+
+    @staticmethod
+    def _touch_commands(pipe, user_id, room_id, now):
+        pipe.zadd(USERS_KEY, {user_id: now})
+        pipe.zremrangebyscore(USERS_KEY, "-inf", now - PRESENCE_TTL)
+        if room_id is not None:
+            key = ROOM_KEY.format(room_id=room_id)
+            pipe.zadd(key, {user_id: now})
+            pipe.zremrangebyscore(key, "-inf", now - PRESENCE_TTL)
+            pipe.expire(key, PRESENCE_TTL * 2)
+
+    def touch(self, user_id, room_id=None):
+        pipe = self._client().pipeline(transaction=False)
+        self._touch_commands(pipe, user_id, room_id, time.time())
+        pipe.execute()
+
+    async def atouch(self, user_id, room_id=None):
+        pipe = self._aclient().pipeline(transaction=False)
+        self._touch_commands(pipe, user_id, room_id, time.time())
+        await pipe.execute()
+
+    def leave(self, user_id, room_id):
+        self._client().zrem(ROOM_KEY.format(room_id=room_id), user_id)
+
+    async def aleave(self, user_id, room_id):
+        await self._aclient().zrem(ROOM_KEY.format(room_id=room_id), user_id)
+
+    # -- reads -----------------------------------------------------------
+
+    def snapshot(self, user_ids=(), room_ids=()):
+        """
+        {"online": [user ids online anywhere], "rooms": {room id: [user ids]}}
+        in a single pipelined round trip.
+        """
+        user_ids = list(user_ids)
+        room_ids = list(room_ids)
+        cutoff = time.time() - PRESENCE_TTL
+        pipe = self._client().pipeline(transaction=False)
+        if user_ids:
+            pipe.zmscore(USERS_KEY, user_ids)
+        for room_id in room_ids:
+            pipe.zrangebyscore(ROOM_KEY.format(room_id=room_id), cutoff, "+inf")
+        results = pipe.execute() if (user_ids or room_ids) else []
+
+        online = []
+        if user_ids:
+            scores = results.pop(0)
+            online = [
+                uid
+                for uid, score in zip(user_ids, scores, strict=True)
+                if score and score >= cutoff
+            ]
+        rooms = {
+            room_id: [int(member) for member in members]
+            for room_id, members in zip(room_ids, results, strict=True)
+        }
+        return {"online": online, "rooms": rooms}
+
+
+class MemoryPresenceStore:
+    """Single-process stand-in used when the channel layer is not Redis."""
+
+    def __init__(self):
+        self._users = {}
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def touch(self, user_id, room_id=None):
+        now = time.time()
+        with self._lock:
+            self._users[user_id] = now
+            if room_id is not None:
+                self._rooms.setdefault(room_id, {})[user_id] = now
+
+    async def atouch(self, user_id, room_id=None):
+        self.touch(user_id, room_id)
+
+    def leave(self, user_id, room_id):
+        with self._lock:
+            self._rooms.get(room_id, {}).pop(user_id, None)
+
+    async def aleave(self, user_id, room_id):
+        self.leave(user_id, room_id)
+
+    def snapshot(self, user_ids=(), room_ids=()):
+        cutoff = time.time() - PRESENCE_TTL
+        with self._lock:
+            online = [uid for uid in user_ids if self._users.get(uid, 0) >= cutoff]
+            rooms = {
+                room_id: [
+                    uid
+                    for uid, seen in self._rooms.get(room_id, {}).items()
+                    if seen >= cutoff
+                ]
+                for room_id in room_ids
+            }
+        return {"online": online, "rooms": rooms}
+
+
+_store = None
+
+
+def get_presence_store():
+    global _store
+    if _store is None:
+        url = _redis_url()
+        _store = RedisPresenceStore(url) if url else MemoryPresenceStore()
+    return _store
+
+
+def online_user_ids(user_ids):
+    """Set of the given user ids that are currently online; empty on Redis errors."""
+    user_ids = [uid for uid in set(user_ids) if uid]
+    if not user_ids:
+        return set()
+    try:
+        return set(get_presence_store().snapshot(user_ids=user_ids)["online"])
+    except Exception as e:
+        logger.warning(f"Presence lookup failed: {e}")
+        return set()
+
+
+class TypingDebouncer:
+    """Per-socket rate limit for typing broadcasts."""
+
+    def __init__(self, interval=TYPING_DEBOUNCE):
+        self.interval = interval
+        self._last = 0.0
+
+    def should_send(self):
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            return True
+        return False
+
+    def reset(self):
+        """Call after a message is sent so the next keystroke is broadcast again."""
+        self._last = 0.0
@@ -0,0 +1,129 @@
+"""
+Publisher statistics
+إحصائيات المعلن (لوحة التحكم والتقارير)
+
+Every counter shown on the publisher dashboard and reports page (per-status
+counts, upgrade flags, view totals and averages, this month / this week) is
+computed in a single conditional-aggregation query over the publisher's ads
+and cached per publisher.
+
+The cached snapshot is dropped after commit whenever one of the publisher's
+ads is saved or deleted (main.signals) or changed in bulk by the expiry /
+upgrade jobs and admin bulk actions. View counters are incremented with
+QuerySet.update() and send no signal, so snapshots also expire after
+STATS_CACHE_TTL seconds.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_KEY = "publisher_stats:{}"
+STATS_CACHE_TTL = 60 * 5
+
+# Upgrade flags counted as "<name>_ads"
+UPGRADE_FLAGS = {
+    "highlighted": "is_highlighted",
+    "urgent": "is_urgent",
+    "pinned": "is_pinned",
+}
+
+
+def period_starts(now=None):
+    """Start of the current month and of the current week (Monday), local time."""
+    today = timezone.localtime(now or timezone.now()).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    return today.replace(day=1), today - timedelta(days=today.weekday())
+
+
+def compute_publisher_stats(user_id, now=None):
+    """All dashboard / report counters for one publisher, in one query."""
+    from main.models import ClassifiedAd
+
+    month_start, week_start = period_starts(now)
+    in_month = Q(created_at__gte=month_start)
+    in_week = Q(created_at__gte=week_start)
+
+    aggregates = {
+        "total_ads": Count("pk"),
+        "resubmitted_ads": Count(
+            "pk", filter=Q(status=ClassifiedAd.AdStatus.PENDING, is_resubmitted=True)
+        ),
+        "total_views": Coalesce(Sum("views_count"), 0),
+        "avg_views": Avg("views_count"),
+        "month_new_ads": Count("pk", filter=in_month),
+        "month_views": Coalesce(Sum("views_count", filter=in_month), 0),
+        "week_new_ads": Count("pk", filter=in_week),
+        "week_views": Coalesce(Sum("views_count", filter=in_week), 0),
+    }
+    for status in ClassifiedAd.AdStatus.values:
+        aggregates[f"{status}_ads"] = Count("pk", filter=Q(status=status))
+    for name, flag in UPGRADE_FLAGS.items():
+        aggregates[f"{name}_ads"] = Count("pk", filter=Q(**{flag: True}))
+
+    # The default manager joins user/category/country and prefetches images
+    stats = (
+        ClassifiedAd.objects.select_related(None)
+        .prefetch_related(None)
+        .filter(user_id=user_id)
+        .aggregate(**aggregates)
+    )
+    stats["avg_views"] = stats["avg_views"] or 0
+    stats["computed_at"] = timezone.now()
+    return stats
+
+
+def get_publisher_stats(user):
+    """Cached compute_publisher_stats() for *user*."""
+    key = STATS_CACHE_KEY.format(user.pk)
+    try:
+        stats = cache.get(key)
+    except Exception as e:
+        logger.warning(f"Publisher stats cache lookup failed: {e}")
+        return compute_publisher_stats(user.pk)
+
+    # A snapshot from before midnight has stale month / week slices
+    if (
+        stats is None
+        or timezone.localdate(stats["computed_at"]) != timezone.localdate()
+    ):
+        stats = compute_publisher_stats(user.pk)
+        try:
+            cache.set(key, stats, STATS_CACHE_TTL)
+        except Exception as e:
+            logger.warning(f"Publisher stats cache store failed: {e}")
+    return stats
+
+
+def _drop_snapshots(user_ids):
+    try:
+        cache.delete_many([STATS_CACHE_KEY.format(user_id) for user_id in user_ids])
+    except Exception as e:
+        logger.warning(f"Publisher stats invalidation failed: {e}")
+
+
+def invalidate_publisher_stats(user_ids):
+    """Drop the cached stats of *user_ids* once the current transaction commits."""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if user_ids:
+        transaction.on_commit(lambda: _drop_snapshots(user_ids))
+
+
+def status_breakdown(stats):
+    """[{"status", "count"}, ...] for the non-empty statuses, largest first."""
+    from main.models import ClassifiedAd
+
+    rows = [
+        {"status": status, "count": stats[f"{status}_ads"]}
+        for status in ClassifiedAd.AdStatus.values
+        if stats[f"{status}_ads"]
+    ]
+    return sorted(rows, key=lambda row: -row["count"])
@@ -82,12 +82,13 @@ class PublisherMyAdsView(PublisherRequiredMixin, ListView):
             ClassifiedAd.objects.filter(user=self.request.user)
             .select_related("category", "country")
             .prefetch_related("images", "upgrade_history")
-            .order_by("-is_pinned", "-is_urgent", "-is_highlighted", "-created_at")
+            .order_by("-rank_tier", "-created_at")
         )
 
-        # Check and expire old upgrades
-        for ad in queryset:
-            ad.check_and_expire_upgrades()
+        # Check and expire old upgrades (set-based)
+        from main.scheduled_tasks import expire_user_upgrades
+
+        expire_user_upgrades(self.request.user.pk)
 
         # Filters
         status = self.request.GET.get("status")
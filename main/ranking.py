@@ -0,0 +1,222 @@
+"""
+Ad ranking
+ترتيب الإعلانات
+
+Listings used to sort on ``-is_pinned, -is_urgent, -is_highlighted,
+-created_at``. Every ad now carries two persisted columns:
+
+  - rank_tier: its paid placement as bits, pinned (4) over urgent (2) over
+    highlighted (1), so ordering by it alone is the old flag sort;
+  - rank_score: the tier, then freshness and quality within a tier, so
+    ``order_by("-rank_score")`` on the (country, status, rank_score) index
+    is the default listing order.
+
+Within a tier the score is ``log2(1 + quality) + hours since EPOCH /
+HALF_LIFE_HOURS``: an ad HALF_LIFE_HOURS newer ranks like one of twice the
+quality (calculate_ad_score without its recency part). Freshness is
+anchored on created_at rather than on "now", so stored scores decay
+relative to newer ads without being rewritten as time passes.
+
+The columns are recomputed on ClassifiedAd.save(), when an AdFeature
+changes and when the upgrade expiry job clears flags; the hourly ad_ranks
+job (main.scheduled_tasks.AdRankJob) refreshes what changes without a
+save, such as views and owner verification.
+
+Settings (optional):
+
+    RANKING = {
+        "HALF_LIFE_HOURS": 72,
+    }
+"""
+
+import math
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+RANKING_DEFAULTS = {
+    "HALF_LIFE_HOURS": 72,
+}
+
+TIER_PINNED = 4
+TIER_URGENT = 2
+TIER_HIGHLIGHTED = 1
+
+# Score span of one tier; far above any freshness + quality an ad can reach
+TIER_SPAN = 1_000_000.0
+# Freshness is measured from here
+EPOCH = datetime(2024, 1, 1, tzinfo=UTC)
+
+# Fields save() recomputes the rank for
+RANK_INPUT_FIELDS = frozenset(
+    {
+        "is_pinned",
+        "is_urgent",
+        "is_highlighted",
+        "views_count",
+        "price",
+        "created_at",
+        "user",
+    }
+)
+
+
+def ranking_settings():
+    options = dict(RANKING_DEFAULTS)
+    options.update(getattr(settings, "RANKING", {}) or {})
+    return options
+
+
+def rank_tier(is_pinned, is_urgent, is_highlighted):
+    return (
+        (TIER_PINNED if is_pinned else 0)
+        | (TIER_URGENT if is_urgent else 0)
+        | (TIER_HIGHLIGHTED if is_highlighted else 0)
+    )
+
+
+def quality_score(
+    views_count=0,
+    is_verified=False,
+    has_profile_image=False,
+    price=None,
+    has_features=False,
+):
+    """Quality of an ad out of 80 (calculate_ad_score without recency)."""
+    score = 10
+    score += min((views_count or 0) * 0.1, 20)
+    if has_features:
+        score += 25
+    if is_verified:
+        score += 15
+    if has_profile_image:
+        score += 5
+    if price and 100 <= price <= 100000:  # Reasonable price range
+        score += 5
+    return score
+
+
+def rank_score(tier, quality, created_at, half_life_hours=None):
+    half_life_hours = half_life_hours or ranking_settings()["HALF_LIFE_HOURS"]
+    freshness = (
+        (created_at - EPOCH).total_seconds() / 3600 / half_life_hours
+        if created_at
+        else 0.0
+    )
+    return tier * TIER_SPAN + math.log2(1 + quality) + freshness
+
+
+def _active_features(now):
+    from main.models import AdFeature
+
+    return AdFeature.objects.filter(
+        ad=OuterRef("pk"), is_active=True, end_date__gte=now
+    )
+
+
+def apply_rank(ad):
+    """Set rank_tier and rank_score of an ad instance from its fields."""
+    from main.models import User
+
+    has_features = False
+    if ad.pk:
+        if "features" in getattr(ad, "_prefetched_objects_cache", {}):
+            now = timezone.now()
+            has_features = any(
+                f.is_active and f.end_date >= now for f in ad.features.all()
+            )
+        else:
+            has_features = ad.features.filter(
+                is_active=True, end_date__gte=timezone.now()
+            ).exists()
+    user = ad.user if ad.user_id else None
+    ad.rank_tier = rank_tier(ad.is_pinned, ad.is_urgent, ad.is_highlighted)
+    quality = quality_score(
+        views_count=ad.views_count,
+        is_verified=bool(
+            user and user.verification_status == User.VerificationStatus.VERIFIED
+        ),
+        has_profile_image=bool(user and user.profile_image),
+        price=ad.price,
+        has_features=has_features,
+    )
+    ad.rank_score = rank_score(ad.rank_tier, quality, ad.created_at or timezone.now())
+
+
+def compute_ranks(ad_ids, now=None):
+    """{ad id: (rank_tier, rank_score, stored tier, stored score)} in one query."""
+    from main.models import ClassifiedAd, User
+
+    now = now or timezone.now()
+    half_life_hours = ranking_settings()["HALF_LIFE_HOURS"]
+    rows = (
+        ClassifiedAd.objects.select_related(None)
+        .prefetch_related(None)
+        .filter(pk__in=ad_ids)
+        .annotate(has_features=Exists(_active_features(now)))
+        .values_list(
+            "pk",
+            "is_pinned",
+            "is_urgent",
+            "is_highlighted",
+            "views_count",
+            "price",
+            "created_at",
+            "user__verification_status",
+            "user__profile_image",
+            "has_features",
+            "rank_tier",
+            "rank_score",
+        )
+    )
+    ranks = {}
+    for (
+        pk,
+        pinned,
+        urgent,
+        highlighted,
+        views,
+        price,
+        created_at,
+        verification,
+        profile_image,
+        has_features,
+        stored_tier,
+        stored_score,
+    ) in rows:
+        tier = rank_tier(pinned, urgent, highlighted)
+        quality = quality_score(
+            views_count=views,
+            is_verified=verification == User.VerificationStatus.VERIFIED,
+            has_profile_image=bool(profile_image),
+            price=price,
+            has_features=has_features,
+        )
+        ranks[pk] = (
+            tier,
+            rank_score(tier, quality, created_at, half_life_hours),
+            stored_tier,
+            stored_score,
+        )
+    return ranks
+
+
+def refresh_ranks(ad_ids, now=None):
+    """Recompute the rank of *ad_ids*, writing only those that changed; the number written."""
+    from main.models import ClassifiedAd
+
+    changed = [
+        ClassifiedAd(pk=pk, rank_tier=tier, rank_score=score)
+        for pk, (tier, score, stored_tier, stored_score) in compute_ranks(
+            ad_ids, now
+        ).items()
+        if tier != stored_tier
+        or not math.isclose(score, stored_score, rel_tol=0, abs_tol=1e-6)
+    ]
+    if changed:
+        ClassifiedAd.objects.bulk_update(
+            changed, ["rank_tier", "rank_score"], batch_size=500
+        )
+    return len(changed)
@@ -0,0 +1,412 @@
+"""
+Similar ads
+الإعلانات المشابهة
+
+Ad detail pages used to pick their "related ads" with a query per view
+(same category, ranked by city and price band) and main.utils.get_similar_ads
+ran its own price-band and city queries; ads of sparse categories got few or
+none. Similar ads are now precomputed per ad into AdRecommendation (ad id ->
+ordered list of ad ids) and read with one primary-key lookup.
+
+Candidates are active ads of the same country, gathered by walking up the
+category tree (main.category_tree): the ads nearest in price in the ad's own
+category, then in its parent's subtree and so on up to the root, until
+enough are found, plus the ads saved in the same wishlists. Each candidate
+is scored on
+
+  - category ancestry: the share of the ad's category path it shares;
+  - price proximity: 1 at the same price down to 0 at 4x apart (log scale);
+  - same city;
+  - custom fields: Jaccard similarity of the field/value pairs;
+  - co-wishlist: users who saved both ads;
+
+weighted by RECOMMENDATIONS["WEIGHTS"], newer ads first on ties.
+
+AdRecommendationJob (main.scheduled_tasks) recomputes the ads created or
+changed since its previous run, then the ads they now point at so new ads
+show up in their neighbours' lists too; a daily full rebuild refreshes the
+rest. Reads skip ids that are no longer active. An active ad without a row
+yet is queued for computation on its first view and meanwhile shows the
+top-ranked ads of its category; inactive ads get no similar ads.
+
+Settings (all optional):
+
+    RECOMMENDATIONS = {
+        "LIMIT": 12,          # ids stored per ad
+        "CANDIDATES": 60,     # candidates gathered before scoring
+        "NEIGHBOURS": 30,     # price neighbours taken per category level
+        "POOL_SIZE": 5000,    # newest active ads loaded per category level
+        "WEIGHTS": {"category": 4.0, "price": 2.0, "city": 1.5,
+                    "custom_fields": 1.5, "wishlist": 3.0},
+    }
+"""
+
+import bisect
+import logging
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+RECOMMENDATION_DEFAULTS = {
+    "LIMIT": 12,
+    "CANDIDATES": 60,
+    "NEIGHBOURS": 30,
+    "POOL_SIZE": 5000,
+    "WEIGHTS": {
+        "category": 4.0,
+        "price": 2.0,
+        "city": 1.5,
+        "custom_fields": 1.5,
+        "wishlist": 3.0,
+    },
+}
+
+# Prices this many times apart score 0 on proximity
+PRICE_RATIO_CUTOFF = 4
+# Users who saved both ads for a full co-wishlist score
+WISHLIST_SATURATION = 3
+# An ad without recommendations is queued at most once per this many seconds
+QUEUE_KEY = "recommendation_queued:{}"
+QUEUE_TTL = 300
+
+FEATURE_FIELDS = (
+    "pk",
+    "category_id",
+    "country_id",
+    "price",
+    "city",
+    "custom_fields",
+    "created_at",
+)
+
+
+def recommendation_settings():
+    options = dict(RECOMMENDATION_DEFAULTS)
+    options.update(getattr(settings, "RECOMMENDATIONS", {}) or {})
+    options["WEIGHTS"] = {**RECOMMENDATION_DEFAULTS["WEIGHTS"], **options["WEIGHTS"]}
+    return options
+
+
+def _ads():
+    from main.models import ClassifiedAd
+
+    # The default manager joins user/category/country and prefetches images
+    return ClassifiedAd.objects.select_related(None).prefetch_related(None)
+
+
+def _active_ads():
+    from main.models import ClassifiedAd
+
+    return _ads().filter(status=ClassifiedAd.AdStatus.ACTIVE, is_hidden=False)
+
+
+class AdFeatures:
+    """What the scores read of an ad."""
+
+    __slots__ = (
+        "id",
+        "category_id",
+        "country_id",
+        "price",
+        "city",
+        "fields",
+        "created",
+    )
+
+    def __init__(self, row):
+        pk, category_id, country_id, price, city, custom_fields, created_at = row
+        self.id = pk
+        self.category_id = category_id
+        self.country_id = country_id
+        self.price = float(price or 0)
+        self.city = (city or "").strip().casefold()
+        self.fields = frozenset(
+            (name, str(value))
+            for name, value in (
+                custom_fields.items() if isinstance(custom_fields, dict) else ()
+            )
+            if value not in (None, "", [], {})
+        )
+        self.created = created_at.timestamp() if created_at else 0.0
+
+
+class SimilarityIndexer:
+    """
+    Computes similar ads. Candidate pools (the newest active ads of a
+    country under a category, sorted by price) are loaded once and kept for
+    the indexer's lifetime, i.e. one job run.
+    """
+
+    def __init__(self, options=None):
+        from main.registries import get_category_tree
+
+        self.options = options or recommendation_settings()
+        self.weights = self.options["WEIGHTS"]
+        self.tree = get_category_tree()
+        self._pools = {}
+        self._paths = {}
+
+    # -- candidates -------------------------------------------------------
+
+    def _path(self, category_id):
+        path = self._paths.get(category_id)
+        if path is None:
+            node = self.tree.get(category_id)
+            path = self._paths[category_id] = (node.ancestor_ids if node else ()) + (
+                category_id,
+            )
+        return path
+
+    def _pool(self, country_id, category_id):
+        key = (country_id, category_id)
+        pool = self._pools.get(key)
+        if pool is None:
+            node = self.tree.get(category_id)
+            category_ids = node.descendant_ids if node else {category_id}
+            rows = (
+                _active_ads()
+                .filter(country_id=country_id, category_id__in=category_ids)
+                .order_by("-pk")
+                .values_list(*FEATURE_FIELDS)[: self.options["POOL_SIZE"]]
+            )
+            features = sorted(
+                (AdFeatures(row) for row in rows), key=lambda ad: ad.price
+            )
+            pool = self._pools[key] = ([ad.price for ad in features], features)
+        return pool
+
+    def _price_neighbours(self, pool, price, count):
+        prices, features = pool
+        right = bisect.bisect_left(prices, price)
+        left = right - 1
+        found = []
+        while len(found) < count and (left >= 0 or right < len(features)):
+            if right >= len(features) or (
+                left >= 0 and price - prices[left] <= prices[right] - price
+            ):
+                found.append(features[left])
+                left -= 1
+            else:
+                found.append(features[right])
+                right += 1
+        return found
+
+    def candidates(self, ad):
+        """Candidate ads by id, nearest category level first."""
+        found = {}
+        for category_id in reversed(self._path(ad.category_id)):
+            for candidate in self._price_neighbours(
+                self._pool(ad.country_id, category_id),
+                ad.price,
+                self.options["NEIGHBOURS"],
+            ):
+                if candidate.id != ad.id:
+                    found.setdefault(candidate.id, candidate)
+            if len(found) >= self.options["CANDIDATES"]:
+                break
+        return found
+
+    def _co_wishlisted(self, ad_ids):
+        """{ad id: Counter(other ad id: users who saved both)}."""
+        from main.models import WishlistItem
+
+        owners = defaultdict(list)
+        for wishlist_id, ad_id in WishlistItem.objects.filter(
+            ad_id__in=ad_ids
+        ).values_list("wishlist_id", "ad_id"):
+            owners[wishlist_id].append(ad_id)
+        co = defaultdict(Counter)
+        if owners:
+            for wishlist_id, other_id in WishlistItem.objects.filter(
+                wishlist_id__in=owners
+            ).values_list("wishlist_id", "ad_id"):
+                for ad_id in owners[wishlist_id]:
+                    if other_id != ad_id:
+                        co[ad_id][other_id] += 1
+        return co
+
+    # -- scoring ----------------------------------------------------------
+
+    def score(self, ad, candidate, co_count=0):
+        weights = self.weights
+        path, other = self._path(ad.category_id), self._path(candidate.category_id)
+        common = 0
+        for mine, theirs in zip(path, other, strict=False):
+            if mine != theirs:
+                break
+            common += 1
+        score = weights["category"] * common / len(path)
+        if ad.price > 0 and candidate.price > 0:
+            distance = abs(math.log(candidate.price / ad.price)) / math.log(
+                PRICE_RATIO_CUTOFF
+            )
+            score += weights["price"] * max(0.0, 1 - distance)
+        if ad.city and ad.city == candidate.city:
+            score += weights["city"]
+        if ad.fields and candidate.fields:
+            score += (
+                weights["custom_fields"]
+                * len(ad.fields & candidate.fields)
+                / len(ad.fields | candidate.fields)
+            )
+        if co_count:
+            score += weights["wishlist"] * min(1.0, co_count / WISHLIST_SATURATION)
+        return score
+
+    def compute(self, ad_ids):
+        """{ad id: [similar ad ids, best first]} for the given ads."""
+        ads = [
+            AdFeatures(row)
+            for row in _ads().filter(pk__in=ad_ids).values_list(*FEATURE_FIELDS)
+        ]
+        co = self._co_wishlisted([ad.id for ad in ads])
+        candidates = {ad.id: self.candidates(ad) for ad in ads}
+
+        # Co-wishlisted ads the category walk did not reach
+        missing = {
+            other_id
+            for ad in ads
+            for other_id in co.get(ad.id, ())
+            if other_id not in candidates[ad.id]
+        }
+        extra = {
+            row[0]: AdFeatures(row)
+            for row in _active_ads().filter(pk__in=missing).values_list(*FEATURE_FIELDS)
+        }
+
+        results = {}
+        limit = self.options["LIMIT"]
+        for ad in ads:
+            found = candidates[ad.id]
+            counts = co.get(ad.id, Counter())
+            for other_id in counts:
+                if (
+                    other_id not in found
+                    and other_id in extra
+                    and extra[other_id].country_id == ad.country_id
+                ):
+                    found[other_id] = extra[other_id]
+            scored = sorted(
+                found.values(),
+                key=lambda candidate: (
+                    -self.score(ad, candidate, counts[candidate.id]),
+                    -candidate.created,
+                ),
+            )
+            results[ad.id] = [candidate.id for candidate in scored[:limit]]
+        return results
+
+
+def store_recommendations(results, now=None):
+    """Write {ad id: [ids]} into AdRecommendation, replacing existing rows."""
+    from main.models import AdRecommendation
+
+    now = now or timezone.now()
+    with transaction.atomic():
+        AdRecommendation.objects.bulk_create(
+            [
+                AdRecommendation(ad_id=ad_id, similar_ids=ids, computed_at=now)
+                for ad_id, ids in results.items()
+            ],
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=["ad"],
+            update_fields=["similar_ids", "computed_at"],
+        )
+    return len(results)
+
+
+def refresh_recommendations(ad_ids, indexer=None):
+    """Recompute and store the similar ads of *ad_ids*; {ad id: [ids]}."""
+    results = (indexer or SimilarityIndexer()).compute(ad_ids)
+    store_recommendations(results)
+    return results
+
+
+def prune_recommendations():
+    """Drop the rows of ads that are no longer active; the number deleted."""
+    from main.models import AdRecommendation
+
+    deleted, _ = AdRecommendation.objects.exclude(
+        ad_id__in=_active_ads().values("pk")
+    ).delete()
+    return deleted
+
+
+def refresh_recommendations_task(ad_ids):
+    """Django-Q task: compute the similar ads of ads viewed before the job reached them."""
+    results = refresh_recommendations(ad_ids)
+    return {"success": True, "count": len(results)}
+
+
+def queue_recommendations(ad_id):
+    """Queue the computation of one ad's similar ads, once per QUEUE_TTL."""
+    try:
+        if not cache.add(QUEUE_KEY.format(ad_id), 1, QUEUE_TTL):
+            return False
+        from django_q.tasks import async_task
+
+        async_task("main.recommendations.refresh_recommendations_task", [ad_id])
+    except Exception as e:
+        # The ad_recommendations job picks it up on its next run
+        logger.warning(f"Could not queue similar ads of ad {ad_id}: {e}")
+        return False
+    return True
+
+
+def fallback_ad_ids(ad, limit):
+    """Top-ranked active ads of the same category and country (one query)."""
+    return list(
+        _active_ads()
+        .filter(category_id=ad.category_id, country_id=ad.country_id)
+        .exclude(pk=ad.pk)
+        .order_by("-rank_score")
+        .values_list("pk", flat=True)[:limit]
+    )
+
+
+def similar_ad_ids(ad):
+    """
+    Stored similar ad ids of *ad*. An active ad without a row yet is queued
+    and gets the fallback meanwhile; an inactive one gets none.
+    """
+    from main.models import AdRecommendation, ClassifiedAd
+
+    ids = (
+        AdRecommendation.objects.filter(ad_id=ad.pk)
+        .values_list("similar_ids", flat=True)
+        .first()
+    )
+    if ids is not None:
+        return ids
+    if ad.status != ClassifiedAd.AdStatus.ACTIVE or ad.is_hidden:
+        return []
+    queue_recommendations(ad.pk)
+    return fallback_ad_ids(ad, recommendation_settings()["LIMIT"])
+
+
+def get_similar_ads(ad, limit=None, queryset=None):
+    """
+    Active similar ads of *ad*, best first: one lookup for the ids, one
+    query for the ads (from *queryset*, by default the card-ready default
+    manager).
+    """
+    from main.models import ClassifiedAd
+
+    if ad is None or ad.pk is None:
+        return []
+    limit = limit or recommendation_settings()["LIMIT"]
+    ids = similar_ad_ids(ad)
+    if not ids:
+        return []
+    queryset = ClassifiedAd.objects.all() if queryset is None else queryset
+    found = queryset.filter(
+        pk__in=ids, status=ClassifiedAd.AdStatus.ACTIVE, is_hidden=False
+    ).in_bulk()
+    return [found[pk] for pk in ids if pk in found][:limit]
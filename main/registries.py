@@ -0,0 +1,248 @@
+"""
+Read-only registries
+سجلات القراءة فقط المشتركة بين العمليات
+
+Small reference tables read on nearly every page are kept as immutable
+per-process snapshots instead of being queried per request:
+
+  - countries: the active Country rows, in display order and by code;
+  - custom_field_schemas: the active CategoryCustomField links of every
+    category with their CustomField and options, so ad cards, filters and
+    forms no longer query them per ad;
+  - category_tree: every category with its children, ancestors, subtree ids
+    and effective prices (main.category_tree);
+  - translations: no data, only a version; rebuilding it drops the loaded
+    gettext catalogs so the .mo files compiled by the translation admin are
+    read again (main.translation_workspace).
+
+Each registry is rebuilt when one of its models changes (main.signals) or
+another process bumps its version stamp in the shared cache. Under the
+preloading server (gunicorn.conf.py) the snapshots are built once in the
+master before it forks, so every worker starts with them already in
+memory, shared copy-on-write; see main.warmup.
+
+Snapshots hold model instances shared by every thread of the process:
+treat them as read-only.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# Seconds between reads of the shared version stamp
+VERSION_CHECK_INTERVAL = 10
+
+
+class ReadOnlyRegistry:
+    """
+    A process-wide snapshot produced by *builder*, versioned in the shared
+    cache under *version_key*. With *max_age* the snapshot is also rebuilt
+    once it is that many seconds old, for tables also written with
+    QuerySet.update(), which sends no signals.
+    """
+
+    def __init__(self, name, builder, version_key, max_age=None):
+        self.name = name
+        self.builder = builder
+        self.version_key = version_key
+        self.max_age = max_age
+        self._snapshot = None
+        self._version = None
+        self._built_at = 0.0
+        self._last_version_check = 0.0
+        self._lock = threading.Lock()
+
+    def _shared_version(self):
+        try:
+            return cache.get(self.version_key)
+        except Exception as e:
+            logger.warning(f"{self.name} registry version lookup failed: {e}")
+            return None
+
+    def get(self):
+        """The current snapshot, rebuilt when it has changed."""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and (
+            self.max_age is None or now - self._built_at < self.max_age
+        ):
+            if now - self._last_version_check < VERSION_CHECK_INTERVAL:
+                return snapshot
+            self._last_version_check = now
+            if self._shared_version() == self._version:
+                return snapshot
+
+        with self._lock:
+            if self._snapshot is not snapshot and self._snapshot is not None:
+                return self._snapshot
+            version = self._shared_version()
+            self._snapshot = self.builder()
+            self._version = version
+            self._built_at = self._last_version_check = time.monotonic()
+            return self._snapshot
+
+    def _bump_shared_version(self):
+        try:
+            cache.set(self.version_key, time.time_ns(), None)
+        except Exception as e:
+            logger.warning(f"{self.name} registry version bump failed: {e}")
+
+    def invalidate(self):
+        """
+        Drop this process's snapshot and, once the current transaction
+        commits, tell other processes to rebuild theirs.
+        """
+        self._snapshot = None
+        transaction.on_commit(self._bump_shared_version)
+
+    def __repr__(self):
+        return f"<ReadOnlyRegistry {self.name}>"
+
+
+# =======================
+# Countries
+# =======================
+
+
+class CountrySnapshot:
+    def __init__(self, countries):
+        self.active = tuple(countries)
+        self.by_code = {country.code: country for country in self.active}
+
+
+def build_country_snapshot():
+    from content.models import Country
+
+    return CountrySnapshot(
+        Country.objects.filter(is_active=True).order_by("order", "name")
+    )
+
+
+countries = ReadOnlyRegistry(
+    "countries", build_country_snapshot, "registry_version:countries"
+)
+
+
+def get_active_countries():
+    """Active countries in display order."""
+    return countries.get().active
+
+
+def get_country(code):
+    """The active Country with *code*, or None."""
+    return countries.get().by_code.get(code)
+
+
+# =======================
+# Custom field schemas
+# =======================
+
+
+class CustomFieldSchemas:
+    """Active CategoryCustomField links by category id, in display order."""
+
+    def __init__(self, links):
+        by_category = defaultdict(list)
+        options = {}
+        for link in links:
+            by_category[link.category_id].append(link)
+            field = link.custom_field
+            if field.pk not in options:
+                options[field.pk] = {
+                    option.value: option for option in field.field_options.all()
+                }
+        self._by_category = {
+            category_id: tuple(rows) for category_id, rows in by_category.items()
+        }
+        self._options = options
+
+    def fields(self, category_id):
+        return self._by_category.get(category_id, ())
+
+    def card_fields(self, category_id):
+        return tuple(link for link in self.fields(category_id) if link.show_on_card)
+
+    def filter_fields(self, category_id):
+        return tuple(link for link in self.fields(category_id) if link.show_in_filters)
+
+    def option(self, custom_field_id, value):
+        """The CustomFieldOption with *value*, or None."""
+        return self._options.get(custom_field_id, {}).get(str(value))
+
+
+def build_custom_field_schemas():
+    from main.models import CategoryCustomField
+
+    links = (
+        CategoryCustomField.objects.filter(is_active=True)
+        .select_related("custom_field")
+        .prefetch_related("custom_field__field_options")
+        .order_by("category_id", "order", "pk")
+    )
+    return CustomFieldSchemas(links)
+
+
+custom_field_schemas = ReadOnlyRegistry(
+    "custom_field_schemas",
+    build_custom_field_schemas,
+    "registry_version:custom_field_schemas",
+)
+
+
+def get_custom_field_schemas():
+    return custom_field_schemas.get()
+
+
+# =======================
+# Category tree
+# =======================
+
+
+def _build_category_tree():
+    from main.category_tree import build_category_tree
+
+    return build_category_tree()
+
+
+# Admin actions and management commands activate categories with update()
+category_tree = ReadOnlyRegistry(
+    "category_tree", _build_category_tree, "registry_version:category_tree", max_age=600
+)
+
+
+def get_category_tree():
+    return category_tree.get()
+
+
+def country_id_for(code):
+    """Id of the active country with *code*, or None (no country filtering)."""
+    country = get_country(code) if code else None
+    return country.pk if country is not None else None
+
+
+# =======================
+# Compiled translations
+# =======================
+
+
+def _reload_translations():
+    from main.translation_workspace import reload_translation_catalogs
+
+    return reload_translation_catalogs()
+
+
+# Bumped when a .mo file is compiled; read per request by
+# main.middleware.TranslationReloadMiddleware
+translations = ReadOnlyRegistry(
+    "translations", _reload_translations, "registry_version:translations"
+)
+
+
+# Warmed by main.warmup, in this order
+REGISTRIES = [countries, custom_field_schemas, category_tree, translations]
@@ -4,124 +4,680 @@ Django Q Scheduled Tasks
 """
 
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
-from django.template.loader import render_to_string
-from main.models import ClassifiedAd, Notification
+from django.db import transaction
+from main.models import ClassifiedAd, MaintenanceNotice, MaintenanceRun, Notification
+from main.publisher_stats import invalidate_publisher_stats
+from main.ranking import refresh_ranks
 import logging
+import time
 from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per keyset page by the maintenance jobs
+MAINTENANCE_CHUNK_SIZE = 500
+# Emails sent per SMTP batch
+EMAIL_BATCH_SIZE = 100
 
-def expire_ads_task():
+
+# =======================
+# Maintenance job framework
+# =======================
+
+
+class EmailBatch:
+    """
+    Queue of EmailMessages sent in batches over one SMTP connection that is
+    kept open for the whole job run.
     """
-    Task to expire ads that have passed their expiration date
-    مهمة لإنهاء صلاحية الإعلانات التي انتهى وقتها
 
-    Schedule: Daily at 2:00 AM
+    def __init__(self, batch_size=EMAIL_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending = []
+        self.sent = 0
+        self.failed = 0
+        self._connection = None
+
+    def add(self, message):
+        self.pending.append(message)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, []
+        try:
+            if self._connection is None:
+                self._connection = get_connection(fail_silently=False)
+                self._connection.open()
+            self.sent += self._connection.send_messages(batch) or 0
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to send {len(batch)} maintenance emails: {e}")
+            # Reconnect for the next batch
+            self.close()
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception:
+                pass
+            self._connection = None
+
+
+class MaintenanceJob:
     """
-    try:
-        now = timezone.now()
+    Base class for scheduled maintenance jobs.
 
-        # Find active ads that have expired
-        expired_ads = ClassifiedAd.objects.filter(
+    Candidate rows are walked in primary-key keyset pages of ``chunk_size``.
+    Each page is handled by ``process_chunk`` inside its own transaction
+    (set-based UPDATEs, bulk notifications); emails queued for the page are
+    sent after it commits. Every run is recorded in a MaintenanceRun row.
+    """
+
+    name = ""
+    chunk_size = MAINTENANCE_CHUNK_SIZE
+
+    def __init__(self, now=None):
+        self.now = now or timezone.now()
+        self.run_record = None
+        self.emails = None
+        self._chunk_emails = []
+
+    def candidates(self):
+        """Queryset of rows still needing work."""
+        raise NotImplementedError
+
+    def process_chunk(self, ids):
+        """Handle one page of primary keys; return the number of rows updated."""
+        raise NotImplementedError
+
+    def finish(self):
+        """Hook called once after the last page."""
+
+    # -- helpers for subclasses -------------------------------------------
+
+    def claim_notices(self, kind, rows):
+        """
+        Record notices for *rows* of (object_id, window date, user_id) and
+        return the object ids not notified before for that window.
+        """
+        if not rows:
+            return set()
+        MaintenanceNotice.objects.bulk_create(
+            [
+                MaintenanceNotice(
+                    kind=kind, object_id=pk, window=window, user_id=user_id, run=self.run_record
+                )
+                for pk, window, user_id in rows
+            ],
+            ignore_conflicts=True,
+        )
+        return set(
+            MaintenanceNotice.objects.filter(
+                kind=kind, run=self.run_record, object_id__in=[row[0] for row in rows]
+            ).values_list("object_id", flat=True)
+        )
+
+    def notify(self, notifications):
+        Notification.objects.bulk_create(notifications, batch_size=500)
+        self.run_record.notified += len(notifications)
+
+    def queue_email(self, message):
+        """Queue an email; it is sent only if the current page commits."""
+        self._chunk_emails.append(message)
+
+    # -- driver -----------------------------------------------------------
+
+    def run(self):
+        run = self.run_record = MaintenanceRun.objects.create(job=self.name)
+        self.emails = EmailBatch()
+        start = time.perf_counter()
+        last_pk = 0
+        committed_notified = 0
+        try:
+            while True:
+                ids = list(
+                    self.candidates()
+                    .filter(pk__gt=last_pk)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[: self.chunk_size]
+                )
+                if not ids:
+                    break
+                last_pk = ids[-1]
+                self._chunk_emails = []
+                with transaction.atomic():
+                    run.updated += self.process_chunk(ids)
+                run.chunks += 1
+                run.scanned += len(ids)
+                committed_notified = run.notified
+                for message in self._chunk_emails:
+                    self.emails.add(message)
+            self.finish()
+            run.status = MaintenanceRun.Status.COMPLETED
+        except Exception as e:
+            run.status = MaintenanceRun.Status.FAILED
+            run.error = str(e)
+            # Notifications of the rolled-back page were never saved
+            run.notified = committed_notified
+            logger.error(f"❌ Maintenance job {self.name} failed: {e}")
+        finally:
+            self.emails.flush()
+            self.emails.close()
+            run.emails_sent = self.emails.sent
+            run.failed += self.emails.failed
+            run.duration_ms = int((time.perf_counter() - start) * 1000)
+            run.finished_at = timezone.now()
+            run.save()
+        return run
+
+
+def _ads():
+    # The default manager joins user/category/country and prefetches images
+    return ClassifiedAd.objects.select_related(None).prefetch_related(None)
+
+
+def _owners(user_ids):
+    """{user id: user} with just the fields needed for notices and emails."""
+    from main.models import User
+
+    return User.objects.only(
+        "pk", "username", "first_name", "last_name", "email", "email_notifications"
+    ).in_bulk(set(user_ids))
+
+
+def _wants_email(user):
+    from main.signals import _email_enabled
+
+    return bool(user and user.email and _email_enabled(user))
+
+
+def _run_job(job):
+    run = job.run()
+    success = run.status == MaintenanceRun.Status.COMPLETED
+    if success:
+        logger.info(
+            f"✅ {job.name}: {run.updated} updated, {run.notified} notified, "
+            f"{run.emails_sent} emails in {run.duration_ms} ms"
+        )
+    result = {
+        "success": success,
+        "run_id": run.pk,
+        "count": run.updated,
+        "scanned": run.scanned,
+        "notifications_sent": run.notified,
+        "emails_sent": run.emails_sent,
+        "duration_ms": run.duration_ms,
+    }
+    if not success:
+        result["error"] = run.error
+    return result
+
+
+class ExpireAdsJob(MaintenanceJob):
+    """Flip active ads past their expiry date to expired and tell their owners."""
+
+    name = "expire_ads"
+
+    def candidates(self):
+        return _ads().filter(
             status=ClassifiedAd.AdStatus.ACTIVE,
             expires_at__isnull=False,
-            expires_at__lte=now,
-        ).select_related("user", "category")
+            expires_at__lte=self.now,
+        )
 
-        count = expired_ads.count()
+    def process_chunk(self, ids):
+        rows = list(
+            self.candidates().filter(pk__in=ids).values_list("pk", "user_id", "title", "expires_at")
+        )
+        if not rows:
+            return 0
+        updated = (
+            _ads()
+            .filter(pk__in=[row[0] for row in rows], status=ClassifiedAd.AdStatus.ACTIVE)
+            .update(status=ClassifiedAd.AdStatus.EXPIRED, updated_at=self.now)
+        )
+        invalidate_publisher_stats(row[1] for row in rows)
 
-        if count == 0:
-            logger.info("✅ No expired ads found")
-            return {"success": True, "count": 0, "message": "No expired ads"}
+        fresh = self.claim_notices(
+            "ad_expired", [(pk, expires_at.date(), user_id) for pk, user_id, _t, expires_at in rows]
+        )
+        rows = [row for row in rows if row[0] in fresh]
+        owners = _owners(row[1] for row in rows)
+        self.notify(
+            [
+                Notification(
+                    user_id=user_id,
+                    title="انتهت صلاحية إعلانك",
+                    message=f'انتهت صلاحية إعلانك "{title}". قم بتجديده ليظهر مرة أخرى.',
+                    notification_type=Notification.NotificationType.AD_EXPIRED,
+                    link=f"/publisher/ads/{pk}/renew-options/",
+                )
+                for pk, user_id, title, _e in rows
+            ]
+        )
+        for pk, user_id, title, _e in rows:
+            owner = owners.get(user_id)
+            if _wants_email(owner):
+                self.queue_email(_expiration_email(owner, pk, title, days_left=0))
+        return updated
 
-        # Update ads to expired status
-        updated = expired_ads.update(status=ClassifiedAd.AdStatus.EXPIRED)
 
-        logger.info(f"✅ Expired {updated} ads automatically")
+class ExpiringSoonJob(MaintenanceJob):
+    """Warn owners once per expiry date about ads expiring within ``days``."""
 
-        return {
-            "success": True,
-            "count": updated,
-            "message": f"Successfully expired {updated} ads",
-        }
+    def __init__(self, days=3, now=None):
+        super().__init__(now=now)
+        self.days = days
+        self.name = f"ad_expiring_{days}d"
 
-    except Exception as e:
-        logger.error(f"❌ Error in expire_ads_task: {str(e)}")
-        return {"success": False, "error": str(e), "message": "Failed to expire ads"}
+    def candidates(self):
+        return _ads().filter(
+            status=ClassifiedAd.AdStatus.ACTIVE,
+            expires_at__isnull=False,
+            expires_at__gt=self.now,
+            expires_at__lte=self.now + timedelta(days=self.days),
+        )
+
+    def process_chunk(self, ids):
+        rows = list(
+            self.candidates().filter(pk__in=ids).values_list("pk", "user_id", "title", "expires_at")
+        )
+        fresh = self.claim_notices(
+            f"ad_expiring_{self.days}",
+            [(pk, expires_at.date(), user_id) for pk, user_id, _t, expires_at in rows],
+        )
+        rows = [row for row in rows if row[0] in fresh]
+        owners = _owners(row[1] for row in rows)
+        notifications = []
+        for pk, user_id, title, expires_at in rows:
+            days_left = max((expires_at - self.now).days, 0)
+            notifications.append(
+                Notification(
+                    user_id=user_id,
+                    title="إعلانك سينتهي قريباً",
+                    message=f'إعلانك "{title}" سينتهي خلال {days_left} يوم. قم بتجديده الآن لتجنب إيقاف ظهوره.',
+                    notification_type=Notification.NotificationType.AD_EXPIRING,
+                    link=f"/publisher/ads/{pk}/renew-options/",
+                )
+            )
+            owner = owners.get(user_id)
+            if _wants_email(owner):
+                self.queue_email(_expiration_email(owner, pk, title, days_left))
+        self.notify(notifications)
+        return 0
 
 
-def send_expiration_notifications_task(days=3):
+def featured_section_ad_ids(ad_ids, now):
+    """Subquery of the ads among *ad_ids* with an active featured-section feature."""
+    from main.models import AdFeature
+
+    return AdFeature.objects.filter(
+        ad_id__in=ad_ids,
+        feature_type=AdFeature.FeatureType.FEATURED_SECTION,
+        is_active=True,
+        end_date__gte=now,
+    ).values("ad_id")
+
+
+def clear_lapsed_highlights(ad_ids, now=None):
     """
-    Task to send notifications for ads expiring soon
-    مهمة لإرسال إشعارات للإعلانات القريبة من الانتهاء
+    Clear is_highlighted on the ads among *ad_ids* that no active highlighted
+    upgrade or featured-section feature keeps highlighted; the number cleared.
+    """
+    from main.models import AdUpgradeHistory
+
+    now = now or timezone.now()
+    upgraded = AdUpgradeHistory.objects.filter(
+        ad_id__in=ad_ids, upgrade_type="highlighted", is_active=True, end_date__gt=now
+    ).values("ad_id")
+    return (
+        _ads()
+        .filter(pk__in=ad_ids, is_highlighted=True)
+        .exclude(pk__in=upgraded)
+        .exclude(pk__in=featured_section_ad_ids(ad_ids, now))
+        .update(is_highlighted=False)
+    )
 
-    Args:
-        days: Number of days before expiry to send notification
 
-    Schedule: Daily at 10:00 AM (for 3 days) and 11:00 AM (for 7 days)
+class UpgradeExpiryJob(MaintenanceJob):
+    """Deactivate expired ad upgrades and clear the ad flags nothing else keeps on."""
+
+    name = "upgrade_expiry"
+
+    UPGRADE_FLAGS = {
+        "highlighted": "is_highlighted",
+        "urgent": "is_urgent",
+        "pinned": "is_pinned",
+    }
+
+    def candidates(self):
+        from main.models import AdUpgradeHistory
+
+        return AdUpgradeHistory.objects.filter(is_active=True, end_date__lt=self.now)
+
+    def process_chunk(self, ids):
+        from main.models import AdUpgradeHistory
+
+        rows = list(self.candidates().filter(pk__in=ids).values_list("pk", "ad_id", "upgrade_type"))
+        if not rows:
+            return 0
+        updated = AdUpgradeHistory.objects.filter(
+            pk__in=[row[0] for row in rows], is_active=True
+        ).update(is_active=False)
+
+        for upgrade_type, flag in self.UPGRADE_FLAGS.items():
+            ad_ids = {ad_id for _pk, ad_id, kind in rows if kind == upgrade_type}
+            if not ad_ids:
+                continue
+            still_active = AdUpgradeHistory.objects.filter(
+                ad_id__in=ad_ids,
+                upgrade_type=upgrade_type,
+                is_active=True,
+                end_date__gt=self.now,
+            ).values("ad_id")
+            lapsed = _ads().filter(pk__in=ad_ids).exclude(pk__in=still_active)
+            if flag == "is_highlighted":
+                # An active featured-section feature keeps the ad highlighted
+                lapsed = lapsed.exclude(pk__in=featured_section_ad_ids(ad_ids, self.now))
+            lapsed.update(**{flag: False})
+        ad_ids = {row[1] for row in rows}
+        refresh_ranks(ad_ids, now=self.now)
+        invalidate_publisher_stats(_ads().filter(pk__in=ad_ids).values_list("user_id", flat=True))
+        return updated
+
+
+class FeaturedSectionExpiryJob(MaintenanceJob):
+    """
+    Deactivate lapsed featured-section features and unhighlight their ads,
+    so the featured section (ClassifiedAd.objects.featured_for_country) can
+    filter on is_highlighted alone.
     """
-    try:
-        # Get ads expiring soon
-        expiring_ads = ClassifiedAd.objects.expiring_soon(days=days)
 
-        count = expiring_ads.count()
+    name = "featured_section_expiry"
 
-        if count == 0:
-            logger.info(f"✅ No ads expiring within {days} days")
-            return {
-                "success": True,
-                "count": 0,
-                "message": f"No ads expiring within {days} days",
-            }
+    def candidates(self):
+        from main.models import AdFeature
 
-        notifications_sent = 0
-        emails_sent = 0
+        return AdFeature.objects.filter(
+            feature_type=AdFeature.FeatureType.FEATURED_SECTION,
+            is_active=True,
+            end_date__lt=self.now,
+        )
 
-        for ad in expiring_ads:
-            days_left = ad.days_until_expiry()
+    def process_chunk(self, ids):
+        from main.models import AdFeature
 
-            # Create in-app notification
-            try:
-                notification_created = _create_notification(ad, days_left)
-                if notification_created:
-                    notifications_sent += 1
-            except Exception as e:
-                logger.error(f"Error creating notification for ad {ad.id}: {str(e)}")
+        ad_ids = set(self.candidates().filter(pk__in=ids).values_list("ad_id", flat=True))
+        if not ad_ids:
+            return 0
+        updated = AdFeature.objects.filter(pk__in=ids, is_active=True).update(is_active=False)
+        clear_lapsed_highlights(ad_ids, self.now)
+        refresh_ranks(ad_ids, now=self.now)
+        invalidate_publisher_stats(_ads().filter(pk__in=ad_ids).values_list("user_id", flat=True))
+        return updated
 
-            # Send email notification
-            try:
-                if ad.user.email and getattr(
-                    ad.user, "email_notifications_enabled", True
-                ):
-                    email_sent = _send_email_notification(ad, days_left)
-                    if email_sent:
-                        emails_sent += 1
-            except Exception as e:
-                logger.error(f"Error sending email for ad {ad.id}: {str(e)}")
 
-        logger.info(
-            f"✅ Sent {notifications_sent} in-app notifications and "
-            f"{emails_sent} emails for ads expiring in {days} days"
+def expire_lapsed_upgrades(**filters):
+    """
+    Deactivate lapsed upgrades and featured-section features right away
+    (dashboards, ad pages), narrowed by *filters* on their ``ad``; a single
+    query when there is nothing to do.
+    """
+    from django.db.models import Value
+
+    jobs = (UpgradeExpiryJob(), FeaturedSectionExpiryJob())
+    # Both kinds of candidates in one UNION, tagged with their job
+    lapsed = [
+        job.candidates()
+        .filter(**filters)
+        .order_by()
+        .annotate(job=Value(position))
+        .values_list("pk", "job")
+        for position, job in enumerate(jobs)
+    ]
+    ids = [[] for _ in jobs]
+    for pk, position in lapsed[0].union(*lapsed[1:], all=True):
+        ids[position].append(pk)
+
+    expired = 0
+    for job, job_ids in zip(jobs, ids, strict=True):
+        if job_ids:
+            with transaction.atomic():
+                expired += job.process_chunk(job_ids)
+    return expired
+
+
+def expire_user_upgrades(user_id):
+    """Deactivate one publisher's lapsed upgrades (publisher dashboard)."""
+    return expire_lapsed_upgrades(ad__user_id=user_id)
+
+
+class ExpirePaidBannersJob(MaintenanceJob):
+    """Expire active paid banners past their end date and notify advertisers."""
+
+    name = "expire_paid_banners"
+
+    def candidates(self):
+        from main.models import PaidBanner
+
+        return PaidBanner.objects.filter(status=PaidBanner.Status.ACTIVE, end_date__lte=self.now)
+
+    def process_chunk(self, ids):
+        from main.models import PaidBanner
+
+        rows = list(
+            self.candidates().filter(pk__in=ids).values_list("pk", "advertiser_id", "title", "end_date")
+        )
+        if not rows:
+            return 0
+        updated = PaidBanner.objects.filter(
+            pk__in=[row[0] for row in rows], status=PaidBanner.Status.ACTIVE
+        ).update(status=PaidBanner.Status.EXPIRED)
+
+        fresh = self.claim_notices(
+            "banner_expired",
+            [(pk, end_date.date(), advertiser_id) for pk, advertiser_id, _t, end_date in rows],
+        )
+        self.notify(
+            [
+                Notification(
+                    user_id=advertiser_id,
+                    notification_type=Notification.NotificationType.GENERAL,
+                    title="انتهت مدة إعلانك البانري",
+                    message=f"انتهت المدة المحددة للإعلان البانري «{title}». يمكنك التواصل معنا لتجديده.",
+                    link="",
+                )
+                for pk, advertiser_id, title, _e in rows
+                if pk in fresh
+            ]
         )
+        return updated
 
-        return {
-            "success": True,
-            "count": count,
-            "notifications_sent": notifications_sent,
-            "emails_sent": emails_sent,
-            "message": f"Sent notifications for {count} ads",
-        }
+    def finish(self):
+        if self.run_record.updated:
+            # Bulk updates bypass the model signals, so refresh the serving index here
+            from main.banner_index import invalidate_banner_index
 
-    except Exception as e:
-        logger.error(f"❌ Error in send_expiration_notifications_task: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e),
-            "message": "Failed to send expiration notifications",
-        }
+            invalidate_banner_index()
+
+
+class PaymentRollupJob(MaintenanceJob):
+    """
+    Rebuild the daily revenue rollups read by the admin payments console.
+
+    Walks the payments updated since the previous completed run (a little
+    earlier, for transactions still open then) and recomputes the days they
+    touch; the first run, or ``full=True``, rebuilds every day.
+    """
+
+    name = "payment_rollups"
+    # Re-scan this far behind the previous run's start
+    OVERLAP = timedelta(minutes=5)
+
+    def __init__(self, now=None, full=False):
+        super().__init__(now=now)
+        self.since = None
+        if not full:
+            previous = (
+                MaintenanceRun.objects.filter(job=self.name, status=MaintenanceRun.Status.COMPLETED)
+                .order_by("-started_at")
+                .values_list("started_at", flat=True)
+                .first()
+            )
+            if previous:
+                self.since = previous - self.OVERLAP
+        self.days = set()
+
+    def candidates(self):
+        from main.models import Payment
+
+        payments = Payment.objects.all()
+        if self.since:
+            payments = payments.filter(updated_at__gte=self.since)
+        return payments
+
+    def process_chunk(self, ids):
+        if self.since:
+            from main.payment_rollups import payment_days
+
+            self.days |= payment_days(ids)
+        return 0
+
+    def finish(self):
+        from main.payment_rollups import rebuild_rollups
+
+        # A full rebuild also drops the rows of deleted payments
+        self.run_record.updated = rebuild_rollups(self.days if self.since else None)
+
+
+class AdRecommendationJob(MaintenanceJob):
+    """
+    Recompute the precomputed similar ads (main.recommendations).
+
+    Walks the active ads changed since the previous completed run, or still
+    without recommendations, then recomputes the ads their new lists point
+    at so they pick up the new ads as well; the first run, or
+    ``full=True``, recomputes every active ad. Rows of ads that are no longer
+    active are dropped at the end.
+    """
+
+    name = "ad_recommendations"
+    chunk_size = 500
+    # Re-scan this far behind the previous run's start
+    OVERLAP = timedelta(minutes=5)
+
+    def __init__(self, now=None, full=False):
+        from main.recommendations import SimilarityIndexer
+
+        super().__init__(now=now)
+        self.since = None
+        if not full:
+            previous = (
+                MaintenanceRun.objects.filter(job=self.name, status=MaintenanceRun.Status.COMPLETED)
+                .order_by("-started_at")
+                .values_list("started_at", flat=True)
+                .first()
+            )
+            if previous:
+                self.since = previous - self.OVERLAP
+        self.indexer = SimilarityIndexer()
+        self.done = set()
+        self.neighbours = set()
+
+    def candidates(self):
+        from django.db.models import Q
+
+        ads = _ads().filter(status=ClassifiedAd.AdStatus.ACTIVE, is_hidden=False)
+        if self.since:
+            ads = ads.filter(Q(updated_at__gte=self.since) | Q(recommendation__isnull=True))
+        return ads
+
+    def process_chunk(self, ids):
+        from main.recommendations import store_recommendations
+
+        results = self.indexer.compute(ids)
+        self.done.update(results)
+        if self.since:
+            for similar_ids in results.values():
+                self.neighbours.update(similar_ids)
+        return store_recommendations(results, now=self.now)
+
+    def finish(self):
+        from main.recommendations import prune_recommendations, store_recommendations
+
+        neighbours = sorted(self.neighbours - self.done)
+        for start in range(0, len(neighbours), self.chunk_size):
+            with transaction.atomic():
+                self.run_record.updated += store_recommendations(
+                    self.indexer.compute(neighbours[start : start + self.chunk_size]), now=self.now
+                )
+        prune_recommendations()
+
+
+class AdRankJob(MaintenanceJob):
+    """
+    Refresh the persisted listing rank (main.ranking) of every active ad.
+
+    Saves keep the rank current; this catches what changes without one:
+    views counted with UPDATE, owner verification and profile images,
+    features lapsing and flags changed by bulk updates. Only ads whose rank
+    changed are written.
+    """
+
+    name = "ad_ranks"
+    chunk_size = 1000
+
+    def candidates(self):
+        return _ads().filter(status=ClassifiedAd.AdStatus.ACTIVE)
+
+    def process_chunk(self, ids):
+        return refresh_ranks(ids, now=self.now)
+
+
+def expire_ads_task():
+    """
+    Task to expire ads that have passed their expiration date
+    مهمة لإنهاء صلاحية الإعلانات التي انتهى وقتها
+
+    Owners get an in-app notification and an email (once per expiry date).
+
+    Schedule: Daily at 2:00 AM
+    """
+    result = _run_job(ExpireAdsJob())
+    if result["success"]:
+        result["message"] = f"Successfully expired {result['count']} ads"
+    else:
+        result["message"] = "Failed to expire ads"
+    return result
+
+
+def send_expiration_notifications_task(days=3):
+    """
+    Task to send notifications for ads expiring soon
+    مهمة لإرسال إشعارات للإعلانات القريبة من الانتهاء
+
+    Each ad is notified once per expiry date for a given ``days`` window;
+    re-running the task the same day sends nothing new.
+
+    Args:
+        days: Number of days before expiry to send notification
+
+    Schedule: Daily at 10:00 AM (for 3 days) and 11:00 AM (for 7 days)
+    """
+    result = _run_job(ExpiringSoonJob(days=days))
+    # "count" is the number of expiring ads looked at, as before
+    result["count"] = result["scanned"]
+    if result["success"]:
+        result["message"] = f"Sent notifications for {result['notifications_sent']} ads"
+    else:
+        result["message"] = "Failed to send expiration notifications"
+    return result
 
 
 def send_7day_expiration_notifications_task():
@@ -134,56 +690,26 @@ def send_7day_expiration_notifications_task():
     return send_expiration_notifications_task(days=7)
 
 
-def _create_notification(ad, days_left):
-    """Create in-app notification for user"""
-    # Check if notification already sent for this ad recently
-    existing = Notification.objects.filter(
-        user=ad.user,
-        notification_type="ad_expiring",
-        related_ad=ad,
-        created_at__gte=timezone.now() - timezone.timedelta(hours=24),
-    ).exists()
-
-    if existing:
-        return False
-
-    message_ar = f'إعلانك "{ad.title}" سينتهي خلال {days_left} يوم. قم بتجديده الآن لتجنب إيقاف ظهوره.'
-    message_en = f'Your ad "{ad.title}" will expire in {days_left} day(s). Renew it now to keep it active.'
-
-    Notification.objects.create(
-        user=ad.user,
-        notification_type="ad_expiring",
-        message_ar=message_ar,
-        message_en=message_en,
-        related_ad=ad,
-        action_url=f"/publisher/ads/{ad.id}/renew-options/",
-    )
+def _expiration_email(user, ad_id, ad_title, days_left):
+    """Build the expiry reminder (days_left > 0) or expired notice email."""
+    from constance import config
 
-    return True
+    site_url = (getattr(config, "SITE_URL", "") or getattr(settings, "SITE_URL", "")).rstrip("/")
+    renewal_url = f"{site_url}/publisher/ads/{ad_id}/renew-options/"
+    user_name = user.get_full_name() or user.username
 
+    if days_left:
+        subject = f'⏰ إعلانك "{ad_title[:40]}" سينتهي قريباً'
+        intro = f'إعلانك "{ad_title}" سينتهي خلال {days_left} يوم.\n\nلتجنب إيقاف ظهور إعلانك، قم بتجديده الآن:'
+    else:
+        subject = f'إعلانك "{ad_title[:40]}" انتهت صلاحيته'
+        intro = f'انتهت صلاحية إعلانك "{ad_title}" ولم يعد ظاهراً.\n\nيمكنك تجديده الآن:'
 
-def _send_email_notification(ad, days_left):
-    """Send email notification to user"""
-    try:
-        subject = f'⏰ إعلانك "{ad.title[:40]}" سينتهي قريباً'
+    message = f"""
+مرحباً {user_name},
 
-        # Prepare context for email template
-        context = {
-            "ad": ad,
-            "days_left": days_left,
-            "renewal_url": f"{settings.SITE_URL}/publisher/ads/{ad.id}/renew-options/",
-            "dashboard_url": f"{settings.SITE_URL}/dashboard/",
-            "user": ad.user,
-        }
-
-        # Render email body
-        message = f"""
-مرحباً {ad.user.get_full_name() or ad.user.username},
-
-إعلانك "{ad.title}" سينتهي خلال {days_left} يوم.
-
-لتجنب إيقاف ظهور إعلانك، قم بتجديده الآن:
-{context['renewal_url']}
+{intro}
+{renewal_url}
 
 تتوفر خيارات تجديد متعددة:
 - تجديد مجاني لمدة 30 يوم
@@ -194,19 +720,12 @@ def _send_email_notification(ad, days_left):
 فريق إدريسي مارت
         """
 
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[ad.user.email],
-            fail_silently=False,
-        )
-
-        return True
-
-    except Exception as e:
-        logger.error(f"Failed to send email to {ad.user.email}: {str(e)}")
-        return False
+    return EmailMessage(
+        subject=subject,
+        body=message,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
 
 
 def cleanup_old_notifications_task():
@@ -224,6 +743,10 @@ def cleanup_old_notifications_task():
             is_read=True, created_at__lt=cutoff_date
         ).delete()
 
+        # Dedupe keys whose window has passed and old run records
+        MaintenanceNotice.objects.filter(window__lt=cutoff_date.date()).delete()
+        MaintenanceRun.objects.filter(started_at__lt=cutoff_date - timedelta(days=60)).delete()
+
         logger.info(f"✅ Deleted {deleted_count} old read notifications")
 
         return {
@@ -243,44 +766,24 @@ def cleanup_old_notifications_task():
 
 def check_upgrade_expiry_task():
     """
-    Task to check and deactivate expired ad upgrades
+    Task to check and deactivate expired ad upgrades and featured-section features
     مهمة للتحقق من انتهاء صلاحية تمييزات الإعلانات
 
     Schedule: Every 6 hours
     """
-    try:
-        from main.models import AdUpgradeHistory
-
-        # Find active upgrades that have expired
-        expired_upgrades = AdUpgradeHistory.objects.filter(
-            is_active=True, end_date__lt=timezone.now()
-        ).select_related("ad")
-
-        count = expired_upgrades.count()
-
-        if count == 0:
-            logger.info("✅ No expired upgrades found")
-            return {"success": True, "count": 0}
-
-        # Deactivate expired upgrades
-        for upgrade in expired_upgrades:
-            upgrade.deactivate()
-
-        logger.info(f"✅ Deactivated {count} expired upgrades")
-
-        return {
-            "success": True,
-            "count": count,
-            "message": f"Deactivated {count} expired upgrades",
-        }
-
-    except Exception as e:
-        logger.error(f"❌ Error in check_upgrade_expiry_task: {str(e)}")
-        return {
-            "success": False,
-            "error": str(e),
-            "message": "Failed to check upgrade expiry",
-        }
+    result = _run_job(UpgradeExpiryJob())
+    features = _run_job(FeaturedSectionExpiryJob())
+    result["featured_sections"] = features["count"]
+    if not features["success"]:
+        result.update(success=False, error=features["error"])
+    if result["success"]:
+        result["message"] = (
+            f"Deactivated {result['count']} expired upgrades and "
+            f"{features['count']} featured-section features"
+        )
+    else:
+        result["message"] = "Failed to check upgrade expiry"
+    return result
 
 
 def send_daily_admin_report_task():
@@ -385,38 +888,105 @@ def expire_paid_banners_task():
 
     Schedule: Hourly
     """
-    from main.models import PaidBanner
+    return _run_job(ExpirePaidBannersJob())
+
+
+def refresh_payment_rollups_task(full=False):
+    """
+    Rebuild the daily revenue rollups of the admin payments console.
+    مهمة لتحديث ملخصات الإيرادات اليومية
+
+    Schedule: Every 10 minutes, weekly full rebuild
+    """
+    result = _run_job(PaymentRollupJob(full=full))
+    if result["success"]:
+        result["message"] = f"Rebuilt {result['count']} payment rollup rows"
+    else:
+        result["message"] = "Failed to refresh payment rollups"
+    return result
+
+
+def rebuild_payment_rollups_task():
+    """
+    Full rebuild of the revenue rollups (also drops deleted payments).
+    إعادة بناء كاملة لملخصات الإيرادات
+
+    Schedule: Weekly
+    """
+    return refresh_payment_rollups_task(full=True)
+
 
+def refresh_ad_ranks_task():
+    """
+    Refresh the listing rank of active ads.
+    مهمة لتحديث ترتيب الإعلانات
+
+    Schedule: Every hour
+    """
+    result = _run_job(AdRankJob())
+    if result["success"]:
+        result["message"] = f"Re-ranked {result['count']} ads"
+    else:
+        result["message"] = "Failed to refresh ad ranks"
+    return result
+
+
+def refresh_ad_recommendations_task(full=False):
+    """
+    Recompute the similar ads of new and changed ads.
+    مهمة لتحديث الإعلانات المشابهة
+
+    Schedule: Every 15 minutes, daily full rebuild
+    """
+    result = _run_job(AdRecommendationJob(full=full))
+    if result["success"]:
+        result["message"] = f"Recomputed similar ads of {result['count']} ads"
+    else:
+        result["message"] = "Failed to refresh ad recommendations"
+    return result
+
+
+def rebuild_ad_recommendations_task():
+    """
+    Recompute the similar ads of every active ad.
+    إعادة حساب الإعلانات المشابهة لكل الإعلانات
+
+    Schedule: Daily
+    """
+    return refresh_ad_recommendations_task(full=True)
+
+
+def build_sitemaps_task(full=False):
+    """
+    Regenerate the precomputed, gzipped sitemap files and sitemap index.
+    مهمة لإعادة بناء ملفات خريطة الموقع المضغوطة
+
+    Incremental runs only rewrite the chunks touched since the last build.
+
+    Schedule: Hourly (incremental), weekly full rebuild
+    """
     try:
-        now = timezone.now()
-        expired = PaidBanner.objects.filter(
-            status=PaidBanner.Status.ACTIVE,
-            end_date__lte=now,
-        ).select_related("advertiser")
-
-        count = expired.count()
-        if count == 0:
-            logger.info("✅ No expired paid banners found")
-            return {"success": True, "count": 0}
-
-        for banner in expired:
-            PaidBanner.objects.filter(pk=banner.pk).update(status=PaidBanner.Status.EXPIRED)
-            Notification.objects.create(
-                user=banner.advertiser,
-                notification_type=Notification.NotificationType.GENERAL,
-                title="انتهت مدة إعلانك البانري",
-                message=f"انتهت المدة المحددة للإعلان البانري «{banner.title}». يمكنك التواصل معنا لتجديده.",
-                link="",
-            )
+        from main.sitemap_builder import build_sitemaps
 
-        logger.info(f"✅ Expired {count} paid banners automatically")
-        return {"success": True, "count": count}
+        summary = build_sitemaps(full=full)
+        logger.info(f"✅ Sitemaps rebuilt: {summary['rebuilt']}")
+        return {"success": True, **summary}
 
     except Exception as e:
-        logger.error(f"❌ Error in expire_paid_banners_task: {str(e)}")
+        logger.error(f"❌ Error in build_sitemaps_task: {str(e)}")
         return {"success": False, "error": str(e)}
 
 
+def build_full_sitemaps_task():
+    """
+    Full sitemap rebuild that repartitions all chunks.
+    إعادة بناء كاملة لخريطة الموقع
+
+    Schedule: Weekly
+    """
+    return build_sitemaps_task(full=True)
+
+
 # =======================
 # Task Registration
 # =======================
@@ -424,6 +994,25 @@ def expire_paid_banners_task():
 # Or use this function to register them programmatically
 
 
+def fail_stalled_translation_jobs_task():
+    """
+    Mark failed the auto-translation jobs whose task stopped reporting progress.
+    إنهاء مهام الترجمة التلقائية المتوقفة
+
+    Schedule: Every 10 minutes
+    """
+    from main.translation_workspace import fail_stalled_translation_jobs
+
+    count = fail_stalled_translation_jobs()
+    if count:
+        logger.warning(f"⚠️ Marked {count} stalled translation job(s) as failed")
+    return {
+        "success": True,
+        "count": count,
+        "message": f"Marked {count} stalled translation jobs as failed",
+    }
+
+
 def register_scheduled_tasks():
     """
     Register all scheduled tasks with Django Q
@@ -478,6 +1067,60 @@ def register_scheduled_tasks():
             "schedule_type": Schedule.HOURLY,
             "repeats": -1,
         },
+        {
+            "func": "main.scheduled_tasks.build_sitemaps_task",
+            "name": "Build Sitemaps Hourly",
+            "schedule_type": Schedule.HOURLY,
+            "repeats": -1,
+        },
+        {
+            "func": "main.scheduled_tasks.build_full_sitemaps_task",
+            "name": "Rebuild Sitemaps Weekly",
+            "schedule_type": Schedule.WEEKLY,
+            "repeats": -1,
+            "next_run": timezone.now().replace(hour=4, minute=30, second=0, microsecond=0),
+        },
+        {
+            "func": "main.scheduled_tasks.refresh_payment_rollups_task",
+            "name": "Refresh Payment Rollups",
+            "schedule_type": Schedule.MINUTES,
+            "minutes": 10,
+            "repeats": -1,
+        },
+        {
+            "func": "main.scheduled_tasks.rebuild_payment_rollups_task",
+            "name": "Rebuild Payment Rollups Weekly",
+            "schedule_type": Schedule.WEEKLY,
+            "repeats": -1,
+            "next_run": timezone.now().replace(hour=4, minute=0, second=0, microsecond=0),
+        },
+        {
+            "func": "main.scheduled_tasks.refresh_ad_ranks_task",
+            "name": "Refresh Ad Ranks Hourly",
+            "schedule_type": Schedule.HOURLY,
+            "repeats": -1,
+        },
+        {
+            "func": "main.scheduled_tasks.refresh_ad_recommendations_task",
+            "name": "Refresh Ad Recommendations",
+            "schedule_type": Schedule.MINUTES,
+            "minutes": 15,
+            "repeats": -1,
+        },
+        {
+            "func": "main.scheduled_tasks.rebuild_ad_recommendations_task",
+            "name": "Rebuild Ad Recommendations Daily",
+            "schedule_type": Schedule.DAILY,
+            "repeats": -1,
+            "next_run": timezone.now().replace(hour=3, minute=15, second=0, microsecond=0),
+        },
+        {
+            "func": "main.scheduled_tasks.fail_stalled_translation_jobs_task",
+            "name": "Fail Stalled Translation Jobs",
+            "schedule_type": Schedule.MINUTES,
+            "minutes": 10,
+            "repeats": -1,
+        },
         {
             "func": "main.scheduled_tasks.send_daily_admin_report_task",
             "name": "Send Daily Admin Report",
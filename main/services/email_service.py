@@ -1,14 +1,15 @@
 """
 Email Service using Django's built-in email backend.
+Messages share a pooled connection; see main.services.messaging.
 """
 
 import logging
 from typing import List, Optional
 
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+
+from . import messaging
 
 logger = logging.getLogger(__name__)
 
@@ -34,22 +35,30 @@ class EmailService:
             else:
                 sender = sender_email
 
-            plain_text = text_content or strip_tags(html_content)
-
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=plain_text,
+            if messaging.delivery_is_queued() and not attachments:
+                # Sent by a Django-Q task after commit, retried on failure
+                messaging.queue_email(
+                    to_emails,
+                    subject,
+                    html_content,
+                    text_content=text_content,
+                    from_email=sender,
+                    reply_to=reply_to,
+                )
+                logger.info("Email queued for %s", ", ".join(to_emails))
+                return True
+
+            email = messaging.build_email(
+                to_emails,
+                subject,
+                html_content,
+                text_content=text_content,
                 from_email=sender,
-                to=to_emails,
-                reply_to=[reply_to] if reply_to else None,
+                reply_to=reply_to,
+                attachments=attachments,
             )
-            email.attach_alternative(html_content, "text/html")
-
-            if attachments:
-                for attachment in attachments:
-                    email.attach(*attachment)
-
-            email.send()
+            # Reuses this thread's open connection instead of a new handshake
+            messaging.mail_pool.send([email])
             logger.info("Email sent successfully to %s", ", ".join(to_emails))
             return True
 
@@ -86,22 +95,16 @@ class EmailService:
         """
         Try to load a template from DB (EmailTemplate model).
         Returns (subject, html_body) tuple if found and active, else None.
-        Language is determined by ``lang`` ("ar" or "en").
+        Language is determined by ``lang`` ("ar" or "en"). Templates are
+        compiled once and cached per process (see main.services.messaging).
         """
         try:
-            from main.models import EmailTemplate
-            tmpl = EmailTemplate.get_template(template_key)
-            if tmpl is None:
-                return None
-            subject = (tmpl.subject_ar if lang == "ar" else tmpl.subject) or tmpl.subject_ar or tmpl.subject
-            body = (tmpl.body_ar if lang == "ar" else tmpl.body) or tmpl.body_ar or tmpl.body
-            if not body:
+            compiled = messaging.compiled_email_template(template_key, lang)
+            if compiled is None:
                 return None
+            subject, body = compiled
             # Simple variable substitution: replace {{var}} with context values
-            for key, value in context.items():
-                body = body.replace(f"{{{{{key}}}}}", str(value))
-                subject = subject.replace(f"{{{{{key}}}}}", str(value))
-            return subject, body
+            return subject.render(context), body.render(context)
         except Exception as e:
             logger.warning("DB email template lookup failed for key '%s': %s", template_key, e)
             return None
@@ -462,12 +465,39 @@ class EmailService:
         Returns:
             bool: True if email sent successfully, False otherwise
         """
+        try:
+            rendered = EmailService.render_new_message_email(
+                receiver_name, sender_name, message_preview, chat_url, ad_title
+            )
+        except Exception as e:
+            logger.error("Failed to send template email: %s", str(e))
+            return False
+        if rendered is None:
+            return False
+        subject, html_content = rendered
+        return EmailService.send_email(
+            to_emails=[email], subject=subject, html_content=html_content
+        )
+
+    @staticmethod
+    def render_new_message_email(
+        receiver_name: str,
+        sender_name: str,
+        message_preview: str,
+        chat_url: str,
+        ad_title: str = ""
+    ) -> Optional[tuple]:
+        """
+        (subject, html) of the new chat message email, or None when email
+        notifications are disabled. The chat consumers send it with
+        messaging.asend_email.
+        """
         from constance import config
 
         # Check if email notifications are enabled
         if not getattr(config, "ENABLE_EMAIL_NOTIFICATIONS", True):
             logger.info("Email notifications disabled in settings")
-            return False
+            return None
 
         # Truncate message preview if too long
         if len(message_preview) > 200:
@@ -486,18 +516,8 @@ class EmailService:
         # Try to get template from database first
         db = EmailService._render_db_template("new_message", context)
         if db:
-            subject, html_content = db
-            return EmailService.send_email(
-                to_emails=[email],
-                subject=subject,
-                html_content=html_content
-            )
+            return db
 
         # Fallback to file template
         subject = f"{config.SITE_NAME} - رسالة جديدة من {sender_name}"
-        return EmailService.send_template_email(
-            to_emails=[email],
-            subject=subject,
-            template_name="emails/new_message.html",
-            context=context,
-        )
+        return subject, render_to_string("emails/new_message.html", context)
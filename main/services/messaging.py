@@ -0,0 +1,507 @@
+"""
+Outbound messaging layer
+طبقة إرسال الرسائل الصادرة (بريد إلكتروني ورسائل نصية)
+
+Shared plumbing under EmailService and SMSService:
+
+* Email goes through a per-thread pooled connection that stays open between
+  messages (up to CONNECTION_MAX_MESSAGES, or CONNECTION_MAX_IDLE seconds
+  idle) instead of a new SMTP/SendGrid handshake per message.
+* SMS goes through a pluggable backend. The Twilio backend reuses one client
+  per credential set; console, file and in-memory backends stand in offline.
+* DB templates (EmailTemplate / SMSTemplate) are compiled once and cached per
+  process by (template key, language), including "no template" results, in
+  a main.registries.ReadOnlyRegistry. The cache is dropped by the template
+  signals in main.signals and other processes notice through its shared
+  version stamp.
+* queue_email() / queue_sms() hand delivery to Django-Q once the current
+  transaction commits; failed attempts are rescheduled with exponential
+  backoff up to MAX_RETRIES. Inside queued_delivery() (the notification
+  signal receivers in main.signals), EmailService.send_email and
+  SMSService.send_sms queue their message this way instead of sending it
+  inside the request.
+* asend_email() / asend_sms() queue the same way from async code (the
+  Channels consumers) without blocking the event loop.
+
+Settings (all optional):
+
+    OUTBOUND_MESSAGING = {
+        "EMAIL_BACKEND": None,       # defaults to settings.EMAIL_BACKEND
+        "SMS_BACKEND": "main.services.messaging.TwilioSMSBackend",
+        "SMS_FILE_PATH": "logs/sms-outbox.log",
+        "CONNECTION_MAX_MESSAGES": 100,
+        "CONNECTION_MAX_IDLE": 30,
+        "MAX_RETRIES": 5,
+        "RETRY_BASE_DELAY": 30,
+        "RETRY_MAX_DELAY": 3600,
+    }
+"""
+
+import json
+import logging
+import random
+import re
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.module_loading import import_string
+
+from main.registries import ReadOnlyRegistry
+
+logger = logging.getLogger(__name__)
+
+MESSAGING_DEFAULTS = {
+    "EMAIL_BACKEND": None,
+    "SMS_BACKEND": "main.services.messaging.TwilioSMSBackend",
+    "SMS_FILE_PATH": "logs/sms-outbox.log",
+    "CONNECTION_MAX_MESSAGES": 100,
+    "CONNECTION_MAX_IDLE": 30,
+    "MAX_RETRIES": 5,
+    "RETRY_BASE_DELAY": 30,
+    "RETRY_MAX_DELAY": 3600,
+}
+
+TEMPLATE_VERSION_KEY = "message_templates_version"
+# Recompile cached templates at least this often even without invalidation
+TEMPLATE_MAX_AGE = 600
+
+
+def messaging_settings():
+    options = dict(MESSAGING_DEFAULTS)
+    options.update(getattr(settings, "OUTBOUND_MESSAGING", {}) or {})
+    return options
+
+
+# =======================
+# Compiled templates
+# =======================
+
+_VARIABLE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+class CompiledTemplate:
+    """{{variable}} text split once into literal and variable parts."""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, text):
+        # Odd positions hold variable names
+        self.parts = _VARIABLE.split(text or "")
+
+    def render(self, context):
+        parts = list(self.parts)
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            # Unknown variables are left in place, as before
+            parts[i] = str(context[name]) if name in context else f"{{{{{name}}}}}"
+        return "".join(parts)
+
+
+# The snapshot is a dict filled as templates are first used:
+# (kind, key, lang) -> compiled entry or None
+message_templates = ReadOnlyRegistry(
+    "message_templates", dict, TEMPLATE_VERSION_KEY, max_age=TEMPLATE_MAX_AGE
+)
+_templates_lock = threading.Lock()
+
+
+def invalidate_message_templates():
+    """
+    Drop this process's compiled templates and, once the current transaction
+    commits, tell other processes to drop theirs.
+    """
+    message_templates.invalidate()
+
+
+def _cached_template(cache_key, loader):
+    templates = message_templates.get()
+    try:
+        return templates[cache_key]
+    except KeyError:
+        pass
+    entry = loader()
+    with _templates_lock:
+        templates[cache_key] = entry
+    return entry
+
+
+def compiled_email_template(key, lang="ar"):
+    """(subject, body) CompiledTemplates for an active EmailTemplate, or None."""
+
+    def load():
+        from main.models import EmailTemplate
+
+        tmpl = EmailTemplate.get_template(key)
+        if tmpl is None:
+            return None
+        subject = (
+            (tmpl.subject_ar if lang == "ar" else tmpl.subject)
+            or tmpl.subject_ar
+            or tmpl.subject
+        )
+        body = (
+            (tmpl.body_ar if lang == "ar" else tmpl.body) or tmpl.body_ar or tmpl.body
+        )
+        if not body:
+            return None
+        return CompiledTemplate(subject), CompiledTemplate(body)
+
+    return _cached_template(("email", key, lang), load)
+
+
+def compiled_sms_template(key):
+    """CompiledTemplate for an active SMSTemplate, or None."""
+
+    def load():
+        from main.models import SMSTemplate
+
+        tmpl = SMSTemplate.get_template(key)
+        return CompiledTemplate(tmpl.body) if tmpl else None
+
+    return _cached_template(("sms", key, None), load)
+
+
+# =======================
+# Email delivery
+# =======================
+
+
+class MailConnectionPool:
+    """
+    Keeps one open mail connection per thread and reuses it for consecutive
+    sends; a connection the server dropped is reopened once transparently.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _connection(self):
+        options = messaging_settings()
+        state = getattr(self._local, "state", None)
+        now = time.monotonic()
+        if state is not None and (
+            now - state["last_used"] > options["CONNECTION_MAX_IDLE"]
+            or state["sent"] >= options["CONNECTION_MAX_MESSAGES"]
+        ):
+            self.close()
+            state = None
+        if state is None:
+            connection = get_connection(options["EMAIL_BACKEND"], fail_silently=False)
+            connection.open()
+            state = self._local.state = {
+                "connection": connection,
+                "sent": 0,
+                "last_used": now,
+            }
+        return state
+
+    def send(self, messages):
+        try:
+            state = self._connection()
+            sent = state["connection"].send_messages(messages)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.close()
+            state = self._connection()
+            sent = state["connection"].send_messages(messages)
+        state["sent"] += len(messages)
+        state["last_used"] = time.monotonic()
+        return sent
+
+    def close(self):
+        state = getattr(self._local, "state", None)
+        self._local.state = None
+        if state is not None:
+            try:
+                state["connection"].close()
+            except Exception:
+                pass
+
+
+mail_pool = MailConnectionPool()
+
+
+def build_email(
+    to_emails,
+    subject,
+    html_content,
+    text_content=None,
+    from_email=None,
+    reply_to=None,
+    attachments=None,
+):
+    message = EmailMultiAlternatives(
+        subject=subject,
+        body=text_content or strip_tags(html_content),
+        from_email=from_email
+        or getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@idrissimart.com"),
+        to=list(to_emails),
+        reply_to=[reply_to] if reply_to else None,
+    )
+    message.attach_alternative(html_content, "text/html")
+    for attachment in attachments or ():
+        message.attach(*attachment)
+    return message
+
+
+def send_email(to_emails, subject, html_content, **kwargs):
+    """Send one email over the pooled connection; raises on failure."""
+    return mail_pool.send([build_email(to_emails, subject, html_content, **kwargs)])
+
+
+# =======================
+# SMS backends
+# =======================
+
+
+class BaseSMSBackend:
+    # Whether the constance Twilio switches must be on for this backend
+    requires_provider = False
+
+    def send(self, to_number, message):
+        """Deliver one SMS; return a provider message id (or None), raise on failure."""
+        raise NotImplementedError
+
+
+@lru_cache(maxsize=4)
+def _twilio_client(account_sid, auth_token):
+    from twilio.rest import Client
+
+    return Client(account_sid, auth_token)
+
+
+def get_twilio_client():
+    """Shared Twilio client for the configured credentials."""
+    from constance import config
+
+    return _twilio_client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
+
+
+class TwilioSMSBackend(BaseSMSBackend):
+    requires_provider = True
+
+    def send(self, to_number, message):
+        from constance import config
+
+        msg = get_twilio_client().messages.create(
+            body=message,
+            from_=config.TWILIO_PHONE_NUMBER,
+            to=to_number,
+        )
+        return msg.sid
+
+
+class ConsoleSMSBackend(BaseSMSBackend):
+    def send(self, to_number, message):
+        logger.info(f"[CONSOLE SMS] to {to_number}: {message}")
+        return None
+
+
+class FileSMSBackend(BaseSMSBackend):
+    """Appends one JSON line per message to SMS_FILE_PATH."""
+
+    _lock = threading.Lock()
+
+    def send(self, to_number, message):
+        from pathlib import Path
+
+        path = Path(messaging_settings()["SMS_FILE_PATH"])
+        if not path.is_absolute():
+            path = Path(settings.BASE_DIR) / path
+        line = json.dumps(
+            {
+                "to": to_number,
+                "message": message,
+                "sent_at": timezone.now().isoformat(),
+            },
+            ensure_ascii=False,
+        )
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        return None
+
+
+class LocMemSMSBackend(BaseSMSBackend):
+    """Keeps messages in LocMemSMSBackend.outbox (tests)."""
+
+    outbox = []
+
+    def send(self, to_number, message):
+        self.outbox.append({"to": to_number, "message": message})
+        return None
+
+
+@lru_cache(maxsize=8)
+def _sms_backend(path):
+    return import_string(path)()
+
+
+def get_sms_backend():
+    return _sms_backend(messaging_settings()["SMS_BACKEND"])
+
+
+def send_sms(to_number, message):
+    """Send one SMS through the configured backend; raises on failure."""
+    return get_sms_backend().send(to_number, message)
+
+
+# =======================
+# Retry queue (Django-Q)
+# =======================
+
+
+def _is_permanent(exc):
+    """Errors that a retry cannot fix: refused recipients, 4xx provider replies."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    status = getattr(exc, "status", None)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+def retry_delay(attempt):
+    """Seconds before retry number *attempt* (1-based): exponential with jitter."""
+    options = messaging_settings()
+    delay = min(
+        options["RETRY_BASE_DELAY"] * 2 ** (attempt - 1), options["RETRY_MAX_DELAY"]
+    )
+    return delay + random.uniform(0, delay * 0.1)
+
+
+def _enqueue(func, payload, attempt=0, delay=0):
+    """Queue *func(payload, attempt)* on Django-Q; run inline if the queue is unavailable."""
+    try:
+        if delay:
+            from django_q.tasks import schedule
+
+            schedule(
+                func,
+                payload,
+                attempt,
+                next_run=timezone.now() + timedelta(seconds=delay),
+            )
+        else:
+            from django_q.tasks import async_task
+
+            async_task(func, payload, attempt)
+    except Exception as e:
+        logger.error(f"Could not queue {func}, running inline: {e}")
+        import_string(func)(payload, attempt, retry=False)
+
+
+def _deliver(kind, func, send, payload, attempt, retry):
+    try:
+        send()
+        return {"success": True, "attempt": attempt}
+    except Exception as e:
+        max_retries = messaging_settings()["MAX_RETRIES"]
+        if retry and not _is_permanent(e) and attempt < max_retries:
+            delay = retry_delay(attempt + 1)
+            logger.warning(
+                f"{kind} delivery attempt {attempt + 1} failed ({e}); retrying in {delay:.0f}s"
+            )
+            _enqueue(func, payload, attempt + 1, delay=delay)
+            return {
+                "success": False,
+                "attempt": attempt,
+                "retry_in": delay,
+                "error": str(e),
+            }
+        logger.error(f"❌ {kind} delivery gave up after {attempt + 1} attempts: {e}")
+        return {"success": False, "attempt": attempt, "error": str(e)}
+
+
+def deliver_email_task(payload, attempt=0, retry=True):
+    """Django-Q task: send a queued email, rescheduling itself on failure."""
+    return _deliver(
+        "Email",
+        "main.services.messaging.deliver_email_task",
+        lambda: send_email(**payload),
+        payload,
+        attempt,
+        retry,
+    )
+
+
+def deliver_sms_task(payload, attempt=0, retry=True):
+    """Django-Q task: send a queued SMS, rescheduling itself on failure."""
+    return _deliver(
+        "SMS",
+        "main.services.messaging.deliver_sms_task",
+        lambda: send_sms(payload["to_number"], payload["message"]),
+        payload,
+        attempt,
+        retry,
+    )
+
+
+_delivery = threading.local()
+
+
+@contextmanager
+def queued_delivery():
+    """
+    Make EmailService.send_email and SMSService.send_sms in this thread queue
+    their messages (queue_email / queue_sms) instead of sending them; also
+    usable as a decorator.
+    """
+    previous = getattr(_delivery, "queued", False)
+    _delivery.queued = True
+    try:
+        yield
+    finally:
+        _delivery.queued = previous
+
+
+def delivery_is_queued():
+    return getattr(_delivery, "queued", False)
+
+
+def queue_email(
+    to_emails, subject, html_content, text_content=None, from_email=None, reply_to=None
+):
+    """Send an email in the background with retries (no attachments)."""
+    payload = {
+        "to_emails": list(to_emails),
+        "subject": str(subject),
+        "html_content": str(html_content),
+        "text_content": text_content,
+        "from_email": from_email,
+        "reply_to": reply_to,
+    }
+    transaction.on_commit(
+        lambda: _enqueue("main.services.messaging.deliver_email_task", payload)
+    )
+
+
+def queue_sms(to_number, message):
+    """Send an SMS in the background with retries."""
+    payload = {"to_number": to_number, "message": str(message)}
+    transaction.on_commit(
+        lambda: _enqueue("main.services.messaging.deliver_sms_task", payload)
+    )
+
+
+# =======================
+# asyncio variants
+# =======================
+
+
+async def asend_email(to_emails, subject, html_content, **kwargs):
+    """queue_email() for async code; the ORM broker write runs in a worker thread."""
+    await sync_to_async(queue_email)(to_emails, subject, html_content, **kwargs)
+
+
+async def asend_sms(to_number, message):
+    """queue_sms() for async code."""
+    await sync_to_async(queue_sms)(to_number, message)
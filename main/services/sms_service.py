@@ -1,6 +1,7 @@
 """
 SMS Service using Twilio
 Integrates with django-constance for dynamic configuration
+Delivery goes through the pluggable backends in main.services.messaging.
 """
 
 import logging
@@ -12,6 +13,8 @@ from django.conf import settings
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 
+from . import messaging
+
 logger = logging.getLogger(__name__)
 
 # Expected total digit count (after +) for known country codes
@@ -64,7 +67,8 @@ class SMSService:
             return None
 
         try:
-            return Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
+            # One client (and HTTP session) per credential set
+            return messaging.get_twilio_client()
         except Exception as e:
             logger.error(f"Failed to create Twilio client: {str(e)}")
             return None
@@ -91,16 +95,12 @@ class SMSService:
             print(f"{'='*50}\n")
             return True
 
-        if not SMSService.is_enabled():
+        backend = messaging.get_sms_backend()
+        if backend.requires_provider and not SMSService.is_enabled():
             logger.warning("Twilio SMS service is disabled")
             return False
 
         try:
-            client = SMSService.get_client()
-            if not client:
-                logger.error("Failed to get Twilio client")
-                return False
-
             # Format phone number
             if not to_number.startswith("+"):
                 # Assume Saudi Arabia if no country code
@@ -111,14 +111,16 @@ class SMSService:
                 logger.warning(f"SMS skipped: invalid phone number format: {to_number}")
                 return False
 
+            if messaging.delivery_is_queued():
+                # Sent by a Django-Q task after commit, retried on failure
+                messaging.queue_sms(to_number, message)
+                logger.info(f"SMS queued for {to_number}")
+                return True
+
             # Send SMS
-            msg = client.messages.create(
-                body=message,
-                from_=config.TWILIO_PHONE_NUMBER,
-                to=to_number,
-            )
+            sid = backend.send(to_number, message)
 
-            logger.info(f"SMS sent successfully to {to_number}. SID: {msg.sid}")
+            logger.info(f"SMS sent successfully to {to_number}. SID: {sid}")
             return True
 
         except TwilioRestException as e:
@@ -241,8 +243,7 @@ class SMSService:
         Returns fallback string if template is not found or inactive.
         """
         try:
-            from main.models import SMSTemplate
-            tmpl = SMSTemplate.get_template(key)
+            tmpl = messaging.compiled_sms_template(key)
             if tmpl:
                 return tmpl.render(context)
         except Exception as e:
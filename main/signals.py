@@ -1,6 +1,6 @@
 from constance import config
 from django.contrib.sites.models import Site
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.template.loader import render_to_string
 from django.urls import reverse
@@ -8,16 +8,33 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import logging
 
+from .banner_index import invalidate_banner_index
+from .chatbot_index import invalidate_knowledge_index
+from .moderation import invalidate_moderation_engine
+from .publisher_stats import invalidate_publisher_stats
+from .registries import category_tree, countries, custom_field_schemas
 from .models import (
     AdPackage,
+    BannerSlot,
+    BlockedWord,
+    Category,
+    CategoryCustomField,
     ClassifiedAd,
+    CustomField,
+    CustomFieldOption,
+    EmailTemplate,
     Notification,
     User,
     UserPackage,
     Order,
+    PaidBanner,
     Payment,
+    SMSTemplate,
 )
+from .chatbot_models import ChatbotKnowledgeBase, ChatbotQuickAction
+from content.models import Country
 from .services.email_service import EmailService
+from .services.messaging import get_sms_backend, invalidate_message_templates, queued_delivery
 from .services.sms_service import SMSService
 
 logger = logging.getLogger(__name__)
@@ -36,7 +53,7 @@ def _sms_enabled(user=None) -> bool:
     """Return True if SMS notifications are globally enabled (Twilio configured) and user hasn't opted out."""
     if not getattr(config, "ENABLE_SMS_NOTIFICATIONS", True):
         return False
-    if not SMSService.is_enabled():
+    if get_sms_backend().requires_provider and not SMSService.is_enabled():
         return False
     if user is not None and not getattr(user, "email_notifications", True):
         # Use email_notifications as the single notification preference flag
@@ -45,6 +62,7 @@ def _sms_enabled(user=None) -> bool:
 
 
 @receiver(post_save, sender=ClassifiedAd)
+@queued_delivery()
 def notify_admin_new_ad(sender, instance, created, **kwargs):
     """
     إرسال إشعار للإدارة عند إنشاء إعلان جديد
@@ -176,6 +194,7 @@ def auto_approve_verified_users(sender, instance, **kwargs):
 
 
 @receiver(pre_save, sender=ClassifiedAd)
+@queued_delivery()
 def send_ad_approval_notification(sender, instance, **kwargs):
     """
     Send a notification, email, and SMS to the user when their ad is approved or rejected.
@@ -285,6 +304,7 @@ def send_ad_approval_notification(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=User)
+@queued_delivery()
 def assign_default_package_to_new_user(sender, instance, created, **kwargs):
     """
     Assign default ad package to every newly registered non-admin user.
@@ -410,6 +430,7 @@ def assign_default_package_to_new_user(sender, instance, created, **kwargs):
 
 
 @receiver(pre_save, sender=User)
+@queued_delivery()
 def assign_package_after_verification(sender, instance, **kwargs):
     """
     Assign free package to user after they complete verification
@@ -544,6 +565,7 @@ def assign_package_after_verification(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=Order)
+@queued_delivery()
 def send_order_notifications(sender, instance, created, **kwargs):
     """
     Send email and SMS notifications when order is created or status changes
@@ -675,6 +697,7 @@ def track_order_status_changes(sender, instance, **kwargs):
 
 
 @receiver(post_save, sender=Order)
+@queued_delivery()
 def send_order_status_notifications(sender, instance, created, **kwargs):
     """
     Send notifications when order status or payment status changes
@@ -861,6 +884,7 @@ def send_order_status_notifications(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=Payment)
+@queued_delivery()
 def activate_package_on_payment_completion(sender, instance, created, **kwargs):
     """
     تفعيل الباقة تلقائياً عند اكتمال الدفع
@@ -975,3 +999,111 @@ def activate_package_on_payment_completion(sender, instance, created, **kwargs):
                     )
             else:
                 logger.warning(f"Payment #{instance.id} has no package_id in metadata")
+
+
+@receiver(post_save, sender=PaidBanner)
+@receiver(post_delete, sender=PaidBanner)
+@receiver(post_save, sender=BannerSlot)
+@receiver(post_delete, sender=BannerSlot)
+def refresh_banner_index_on_change(sender, **kwargs):
+    """
+    إعادة بناء فهرس البانرات عند تعديل بانر أو مساحة إعلانية
+    Rebuild the paid banner serving index when a banner or slot changes
+    """
+    invalidate_banner_index()
+
+
+@receiver(m2m_changed, sender=PaidBanner.extra_countries.through)
+@receiver(m2m_changed, sender=PaidBanner.categories.through)
+def refresh_banner_index_on_targeting_change(sender, action, **kwargs):
+    """Rebuild the banner index when country or category targeting changes"""
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_banner_index()
+
+
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_delete, sender=EmailTemplate)
+@receiver(post_save, sender=SMSTemplate)
+@receiver(post_delete, sender=SMSTemplate)
+def refresh_message_templates_on_change(sender, **kwargs):
+    """
+    تحديث قوالب الرسائل المخزنة مؤقتاً عند تعديل قالب
+    Drop cached compiled email / SMS templates when a template changes
+    """
+    invalidate_message_templates()
+
+
+@receiver(post_save, sender=BlockedWord)
+@receiver(post_delete, sender=BlockedWord)
+def refresh_moderation_engine_on_change(sender, **kwargs):
+    """
+    إعادة بناء محرك الكلمات المحظورة عند تعديل القائمة
+    Recompile the blocked word matcher when an admin edits the word list
+    """
+    invalidate_moderation_engine()
+
+
+@receiver(post_save, sender=ChatbotKnowledgeBase)
+@receiver(post_delete, sender=ChatbotKnowledgeBase)
+@receiver(post_save, sender=ChatbotQuickAction)
+@receiver(post_delete, sender=ChatbotQuickAction)
+def refresh_chatbot_index_on_change(sender, **kwargs):
+    """
+    إعادة بناء فهرس المساعد الذكي عند تعديل قاعدة المعرفة
+    Rebuild the chatbot's in-memory index when its knowledge base changes
+    """
+    invalidate_knowledge_index()
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def refresh_country_registry_on_change(sender, **kwargs):
+    """
+    تحديث قائمة الدول المخزنة في الذاكرة عند تعديل دولة
+    Rebuild the in-memory country registry when a country changes
+    """
+    countries.invalidate()
+    # Deleting a country clears Category.country with an UPDATE
+    category_tree.invalidate()
+
+
+@receiver(post_save, sender=CustomField)
+@receiver(post_delete, sender=CustomField)
+@receiver(post_save, sender=CustomFieldOption)
+@receiver(post_delete, sender=CustomFieldOption)
+@receiver(post_save, sender=CategoryCustomField)
+@receiver(post_delete, sender=CategoryCustomField)
+def refresh_custom_field_schemas_on_change(sender, **kwargs):
+    """
+    تحديث مخططات الحقول المخصصة عند تعديل حقل أو خيار أو ربطه بقسم
+    Rebuild the in-memory custom field schemas when a field, option or
+    category link changes
+    """
+    custom_field_schemas.invalidate()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_category_tree_on_change(sender, **kwargs):
+    """
+    إعادة بناء شجرة الأقسام في الذاكرة عند تعديل قسم
+    Rebuild the in-memory category tree when a category changes
+    """
+    category_tree.invalidate()
+
+
+@receiver(m2m_changed, sender=Category.countries.through)
+def refresh_category_tree_on_country_change(sender, action, **kwargs):
+    """Rebuild the category tree when a category's countries change"""
+    if action in ("post_add", "post_remove", "post_clear"):
+        category_tree.invalidate()
+
+
+@receiver(post_save, sender=ClassifiedAd)
+@receiver(post_delete, sender=ClassifiedAd)
+def refresh_publisher_stats_on_ad_change(sender, instance, **kwargs):
+    """
+    تحديث إحصائيات المعلن عند تعديل أحد إعلاناته
+    Drop the owner's cached dashboard statistics
+    """
+    invalidate_publisher_stats([instance.user_id])
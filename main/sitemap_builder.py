@@ -0,0 +1,474 @@
+"""
+Precomputed sitemap builder
+بناء خرائط الموقع مسبقاً
+
+Writes gzipped sitemap files of at most MAX_URLS_PER_FILE URLs, plus a
+sitemap index, to default storage under SITEMAP_DIR. Rows are streamed with
+.values_list().iterator() so memory stays flat regardless of table size.
+
+Each section is split into chunks by primary-key range. The manifest records
+the ranges, so an incremental run only rewrites chunks that contain rows
+changed since the previous run (or whose row count moved), while new rows
+are appended to the last chunk until it is full. A rewritten range that
+has grown past MAX_URLS_PER_FILE (ads activated inside an old range) is
+split, its overflow going to files numbered after the highest in use.
+
+Run via the build_sitemaps management command or the Django-Q schedule
+(main.scheduled_tasks.build_sitemaps_task). The files are served as-is by
+main.sitemaps.sitemap_index_view / sitemap_file_view.
+"""
+
+import bisect
+import gzip
+import io
+import itertools
+import json
+import logging
+from datetime import datetime
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone, translation
+from django.utils.http import RFC3986_SUBDELIMS
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_DIR = "sitemaps"
+INDEX_NAME = f"{SITEMAP_DIR}/sitemap.xml"
+MANIFEST_NAME = f"{SITEMAP_DIR}/manifest.json"
+
+# Sitemap protocol limit per file
+MAX_URLS_PER_FILE = 50000
+STREAM_CHUNK_SIZE = 2000
+
+_SLUG_PLACEHOLDER = "SLUGPLACEHOLDER"
+_SLUG_SAFE = RFC3986_SUBDELIMS + "/~:@"
+
+_XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+_URLSET_OPEN = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+_URLSET_CLOSE = "</urlset>\n"
+
+
+def _languages():
+    return [code for code, _name in settings.LANGUAGES]
+
+
+def _base_url():
+    """Absolute site root used in <loc> elements, without trailing slash."""
+    from constance import config
+
+    site_url = getattr(config, "SITE_URL", "") or getattr(settings, "SITE_URL", "")
+    if not site_url:
+        from django.contrib.sites.models import Site
+
+        site_url = f"https://{Site.objects.get_current().domain}"
+    return site_url.rstrip("/")
+
+
+def _slug_url_builder(url_name, kwarg):
+    """
+    Return {lang: callable(slug) -> path} resolving the URL pattern once per
+    language instead of calling reverse() for every row.
+    """
+    builders = {}
+    for lang in _languages():
+        with translation.override(lang):
+            pattern = reverse(url_name, kwargs={kwarg: _SLUG_PLACEHOLDER})
+        head, tail = pattern.split(_SLUG_PLACEHOLDER, 1)
+        builders[lang] = lambda slug, head=head, tail=tail: (
+            f"{head}{quote(slug, safe=_SLUG_SAFE)}{tail}"
+        )
+    return builders
+
+
+class SitemapSection:
+    """
+    One sitemap section (ads, categories, ...).
+
+    Subclasses define the streamed queryset, the values_list fields (primary
+    key first, slug second) and, optionally, the field used to detect rows
+    changed since the last build.
+    """
+
+    name = ""
+    changefreq = "weekly"
+    priority = 0.5
+    url_name = ""
+    url_kwarg = "slug"
+    fields = ("pk", "slug")
+    lastmod_field = None
+    changed_field = None
+
+    def queryset(self):
+        raise NotImplementedError
+
+    def base_queryset(self):
+        """Unfiltered queryset used to detect changes (including deactivations)."""
+        return self.queryset()
+
+    def rows(self, start_pk=None, end_pk=None):
+        qs = self.queryset()
+        if start_pk is not None:
+            qs = qs.filter(pk__gte=start_pk)
+        if end_pk is not None:
+            qs = qs.filter(pk__lt=end_pk)
+        fields = self.fields + ((self.lastmod_field,) if self.lastmod_field else ())
+        return (
+            qs.order_by("pk")
+            .values_list(*fields)
+            .iterator(chunk_size=STREAM_CHUNK_SIZE)
+        )
+
+    def objects_per_file(self):
+        return max(1, MAX_URLS_PER_FILE // len(_languages()))
+
+    def render_rows(self, rows, base_url, builders):
+        """Yield <url> entries (one per language) for streamed rows."""
+        for row in rows:
+            slug = row[1]
+            if not slug:
+                continue
+            lastmod = ""
+            if self.lastmod_field and row[-1]:
+                lastmod = f"<lastmod>{row[-1].date().isoformat()}</lastmod>"
+            for build in builders.values():
+                yield (
+                    f"<url><loc>{escape(base_url + build(slug))}</loc>{lastmod}"
+                    f"<changefreq>{self.changefreq}</changefreq>"
+                    f"<priority>{self.priority}</priority></url>\n"
+                )
+
+
+class StaticSection(SitemapSection):
+    name = "static"
+    changefreq = "daily"
+    priority = 1.0
+    url_names = ["home", "ad_list", "categories"]
+
+    def write_all(self, base_url):
+        lines = []
+        for url_name in self.url_names:
+            for lang in _languages():
+                with translation.override(lang):
+                    path = reverse(f"main:{url_name}")
+                lines.append(
+                    f"<url><loc>{escape(base_url + path)}</loc>"
+                    f"<changefreq>{self.changefreq}</changefreq>"
+                    f"<priority>{self.priority}</priority></url>\n"
+                )
+        return lines
+
+
+class CategorySection(SitemapSection):
+    name = "categories"
+    changefreq = "daily"
+    priority = 0.8
+    url_name = "main:categories_by_slug"
+    url_kwarg = "category_slug"
+    lastmod_field = "updated_at"
+    changed_field = "updated_at"
+
+    def queryset(self):
+        from main.models import Category
+
+        return Category.objects.filter(is_active=True)
+
+    def base_queryset(self):
+        from main.models import Category
+
+        return Category.objects.all()
+
+
+class ClassifiedAdSection(SitemapSection):
+    name = "ads"
+    changefreq = "weekly"
+    priority = 0.7
+    url_name = "main:ad_detail"
+    lastmod_field = "updated_at"
+    changed_field = "updated_at"
+
+    def queryset(self):
+        from main.models import ClassifiedAd
+
+        return self.base_queryset().filter(status=ClassifiedAd.AdStatus.ACTIVE)
+
+    def base_queryset(self):
+        from main.models import ClassifiedAd
+
+        # Drop the manager's select_related/prefetch_related; only columns are read
+        return ClassifiedAd.objects.select_related(None).prefetch_related(None)
+
+
+class BlogSection(SitemapSection):
+    name = "blog"
+    changefreq = "weekly"
+    priority = 0.6
+    url_name = "content:blog_detail"
+    lastmod_field = "published_date"
+
+    def queryset(self):
+        from content.models import Blog
+
+        return Blog.objects.filter(is_published=True)
+
+
+class BlogCategorySection(SitemapSection):
+    name = "blog_categories"
+    changefreq = "weekly"
+    priority = 0.5
+    url_name = "content:blog_list_by_category"
+    url_kwarg = "category_slug"
+
+    def queryset(self):
+        from content.models import BlogCategory
+
+        return BlogCategory.objects.filter(is_active=True)
+
+
+SECTIONS = [
+    StaticSection(),
+    CategorySection(),
+    ClassifiedAdSection(),
+    BlogSection(),
+    BlogCategorySection(),
+]
+
+
+def _chunk_name(section_name, number):
+    return f"{SITEMAP_DIR}/{section_name}-{number}.xml.gz"
+
+
+def _save(name, data):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    default_storage.save(name, ContentFile(data))
+
+
+def _gzip_urlset(lines):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) as gz:
+        gz.write(_XML_HEADER.encode())
+        gz.write(_URLSET_OPEN.encode())
+        for line in lines:
+            gz.write(line.encode())
+        gz.write(_URLSET_CLOSE.encode())
+    return buffer.getvalue()
+
+
+def load_manifest():
+    try:
+        with default_storage.open(MANIFEST_NAME) as fh:
+            return json.loads(fh.read())
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+
+
+class _ChunkWriter:
+    """
+    Stream rows into chunk files, the first numbered *first_number* and the
+    following ones taken from *numbers* (consecutive by default).
+    *range_start* keeps the first file's pk boundary stable across rebuilds.
+    """
+
+    def __init__(
+        self, section, base_url, builders, first_number, range_start=None, numbers=None
+    ):
+        self.section = section
+        self.base_url = base_url
+        self.builders = builders
+        self.number = first_number
+        self.numbers = numbers or itertools.count(first_number + 1)
+        self.range_start = range_start
+        self.capacity = section.objects_per_file()
+        self.chunks = []
+
+    def write(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.capacity:
+                self._flush(batch)
+                batch = []
+        if batch or not self.chunks:
+            self._flush(batch)
+        return self.chunks
+
+    def _flush(self, batch):
+        lines = self.section.render_rows(batch, self.base_url, self.builders)
+        _save(_chunk_name(self.section.name, self.number), _gzip_urlset(lines))
+        lastmod = None
+        if self.section.lastmod_field:
+            dates = [row[-1] for row in batch if row[-1]]
+            lastmod = max(dates).isoformat() if dates else None
+        first_pk = batch[0][0] if batch else None
+        if not self.chunks and self.range_start is not None:
+            first_pk = self.range_start
+        self.chunks.append(
+            {
+                "number": self.number,
+                "first_pk": first_pk,
+                "last_pk": batch[-1][0] if batch else None,
+                "count": len(batch),
+                "lastmod": lastmod,
+            }
+        )
+        self.number = next(self.numbers)
+
+
+def _build_section_full(section, base_url):
+    if isinstance(section, StaticSection):
+        _save(_chunk_name(section.name, 1), _gzip_urlset(section.write_all(base_url)))
+        return [
+            {
+                "number": 1,
+                "first_pk": None,
+                "last_pk": None,
+                "count": 0,
+                "lastmod": None,
+            }
+        ]
+    builders = _slug_url_builder(section.url_name, section.url_kwarg)
+    return _ChunkWriter(section, base_url, builders, 1).write(section.rows())
+
+
+def _dirty_chunks(section, chunks, since):
+    """Numbers of chunks whose pk range contains rows changed since *since*."""
+    starts = [c["first_pk"] if c["first_pk"] is not None else 0 for c in chunks]
+    dirty = set()
+    changed = (
+        section.base_queryset()
+        .filter(**{f"{section.changed_field}__gt": since})
+        .values_list("pk", flat=True)
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    for pk in changed:
+        position = max(0, bisect.bisect_right(starts, pk) - 1)
+        dirty.add(chunks[position]["number"])
+
+    # Bulk .update() calls skip auto_now, so also compare row counts per range
+    for i, chunk in enumerate(chunks[:-1]):
+        if chunk["number"] in dirty:
+            continue
+        count = (
+            section.queryset().filter(pk__gte=starts[i], pk__lt=starts[i + 1]).count()
+        )
+        if count != chunk["count"]:
+            dirty.add(chunk["number"])
+    return dirty
+
+
+def _build_section_incremental(section, base_url, previous, since):
+    chunks = previous.get("chunks") or []
+    if not chunks or not section.changed_field or isinstance(section, StaticSection):
+        return _build_section_full(section, base_url)
+
+    builders = _slug_url_builder(section.url_name, section.url_kwarg)
+    dirty = _dirty_chunks(section, chunks, since)
+    last = chunks[-1]
+    # Files split off a range get numbers no existing chunk uses
+    numbers = itertools.count(max(c["number"] for c in chunks) + 1)
+    result = []
+    for i, chunk in enumerate(chunks[:-1]):
+        if chunk["number"] not in dirty:
+            result.append(chunk)
+            continue
+        start = chunk["first_pk"] if i else None
+        end = chunks[i + 1]["first_pk"]
+        # Rows activated inside the range can take it past one file
+        writer = _ChunkWriter(
+            section, base_url, builders, chunk["number"], start, numbers
+        )
+        result.extend(writer.write(section.rows(start, end)))
+
+    # The last chunk is open-ended: it takes new rows and spills into new files
+    start = last["first_pk"] if len(chunks) > 1 else None
+    writer = _ChunkWriter(section, base_url, builders, last["number"], start, numbers)
+    result.extend(writer.write(section.rows(start)))
+    return result
+
+
+def _write_index(base_url, manifest):
+    entries = []
+    for section in SECTIONS:
+        for chunk in manifest["sections"].get(section.name, {}).get("chunks", []):
+            lastmod = (
+                f"<lastmod>{chunk['lastmod']}</lastmod>" if chunk.get("lastmod") else ""
+            )
+            loc = f"{base_url}/{_chunk_name(section.name, chunk['number'])}"
+            entries.append(f"<sitemap><loc>{escape(loc)}</loc>{lastmod}</sitemap>\n")
+    content = (
+        _XML_HEADER
+        + '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        + "".join(entries)
+        + "</sitemapindex>\n"
+    )
+    _save(INDEX_NAME, content.encode())
+
+
+def build_sitemaps(full=False):
+    """
+    Build (or incrementally refresh) all sitemap files and the index.
+    Returns a summary dict with per-section chunk counts.
+    """
+    started = timezone.now()
+    base_url = _base_url()
+    previous = None if full else load_manifest()
+    if previous and previous.get("base_url") != base_url:
+        previous = None
+
+    manifest = {
+        "base_url": base_url,
+        "generated_at": started.isoformat(),
+        "sections": {},
+    }
+    rebuilt = {}
+    for section in SECTIONS:
+        old = (previous or {}).get("sections", {}).get(section.name)
+        if old is None:
+            chunks = _build_section_full(section, base_url)
+            rebuilt[section.name] = len(chunks)
+        else:
+            since = datetime.fromisoformat(previous["generated_at"])
+            chunks = _build_section_incremental(section, base_url, old, since)
+            old_by_number = {c["number"]: c for c in old.get("chunks", [])}
+            rebuilt[section.name] = sum(
+                1 for c in chunks if c is not old_by_number.get(c["number"])
+            )
+            # Remove files for chunks that no longer exist
+            for number in set(old_by_number) - {c["number"] for c in chunks}:
+                default_storage.delete(_chunk_name(section.name, number))
+        manifest["sections"][section.name] = {"chunks": chunks}
+
+    if previous is None:
+        _remove_orphans(manifest)
+
+    _write_index(base_url, manifest)
+    _save(MANIFEST_NAME, json.dumps(manifest).encode())
+
+    summary = {
+        "full": previous is None,
+        "files": {name: len(s["chunks"]) for name, s in manifest["sections"].items()},
+        "rebuilt": rebuilt,
+    }
+    logger.info(f"Sitemaps built: {summary}")
+    return summary
+
+
+def _remove_orphans(manifest):
+    """Delete chunk files left over from a previous, larger build."""
+    try:
+        _dirs, files = default_storage.listdir(SITEMAP_DIR)
+    except (FileNotFoundError, OSError):
+        return
+    keep = {
+        _chunk_name(name, c["number"]).rsplit("/", 1)[-1]
+        for name, section in manifest["sections"].items()
+        for c in section["chunks"]
+    }
+    for filename in files:
+        if filename.endswith(".xml.gz") and filename not in keep:
+            default_storage.delete(f"{SITEMAP_DIR}/{filename}")
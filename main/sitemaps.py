@@ -1,5 +1,11 @@
+import re
+
 from django.contrib.sitemaps import Sitemap
+from django.contrib.sitemaps.views import sitemap
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
 from django.urls import reverse
+from django.views.decorators.http import require_GET
 
 from content.models import Blog, BlogCategory
 from main.models import Category, ClassifiedAd
@@ -83,3 +89,37 @@ sitemaps = {
     "blog": BlogSitemap,
     "blog_categories": BlogCategorySitemap,
 }
+
+
+# =======================
+# Precomputed sitemap serving
+# =======================
+# Files are produced by main.sitemap_builder on a Django-Q schedule; these
+# views only stream them from storage. Until the first build exists the
+# index falls back to the dynamic Django sitemap above.
+
+_SITEMAP_FILE_RE = re.compile(r"^[a-z_]+-\d+\.xml\.gz$")
+SITEMAP_CACHE_CONTROL = "public, max-age=3600"
+
+
+@require_GET
+def sitemap_index_view(request):
+    from main.sitemap_builder import INDEX_NAME
+
+    if not default_storage.exists(INDEX_NAME):
+        return sitemap(request, sitemaps=sitemaps)
+    response = FileResponse(default_storage.open(INDEX_NAME), content_type="application/xml")
+    response["Cache-Control"] = SITEMAP_CACHE_CONTROL
+    return response
+
+
+@require_GET
+def sitemap_file_view(request, filename):
+    from main.sitemap_builder import SITEMAP_DIR
+
+    name = f"{SITEMAP_DIR}/{filename}"
+    if not _SITEMAP_FILE_RE.match(filename) or not default_storage.exists(name):
+        raise Http404
+    response = FileResponse(default_storage.open(name), content_type="application/gzip")
+    response["Cache-Control"] = SITEMAP_CACHE_CONTROL
+    return response
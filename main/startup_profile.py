@@ -0,0 +1,183 @@
+"""
+Worker cold-start profiling
+قياس زمن بدء تشغيل العمليات واستهلاك الذاكرة
+
+Every web worker and Django-Q worker runs django.setup() and, on its first
+request, loads the URLconf. Both are measured here in fresh interpreters
+(subprocesses), so nothing this process has already imported skews them:
+
+  - measure_cold_start() times django.setup() and the URLconf load and reads
+    the peak RSS, over several runs;
+  - profile_imports() runs the same start-up under ``python -X importtime``
+    and returns the modules with the largest self / cumulative import time;
+  - check_budget() compares a measurement with STARTUP_BUDGET so CI can fail
+    the build when start-up gets slower or heavier, or when a URLconf starts
+    importing view modules eagerly again (see main.lazy_views).
+
+Settings (all optional):
+
+    STARTUP_BUDGET = {
+        "COLD_START_MS": 4000,  # median django.setup() + URLconf load
+        "RSS_MB": 300,          # peak resident memory after start-up
+        "RUNS": 3,              # subprocesses per measurement
+    }
+
+See the profile_startup management command.
+"""
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+
+BUDGET_DEFAULTS = {
+    "COLD_START_MS": 4000,
+    "RSS_MB": 300,
+    "RUNS": 3,
+}
+
+# Run in a fresh interpreter; prints one JSON line on stdout
+_PROBE = """
+import json, os, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+load_urls = {load_urls}
+if load_urls:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+done = time.perf_counter()
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == "darwin":
+    rss_kb //= 1024
+print(json.dumps({{
+    "setup_ms": (setup_done - start) * 1000,
+    "urls_ms": (done - setup_done) * 1000,
+    "total_ms": (done - start) * 1000,
+    "rss_mb": rss_kb / 1024,
+    "modules": len(sys.modules),
+    "view_modules": sorted(
+        m for m in sys.modules
+        if m == "main.views" or (m.startswith("main.") and m.endswith("_views") and m != "main.lazy_views")
+    ),
+}}))
+"""
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def budget_settings():
+    options = dict(BUDGET_DEFAULTS)
+    options.update(getattr(settings, "STARTUP_BUDGET", {}) or {})
+    return options
+
+
+def _run_probe(load_urls=True, importtime=False):
+    env = dict(os.environ)
+    env["DJANGO_SETTINGS_MODULE"] = settings.SETTINGS_MODULE or env.get(
+        "DJANGO_SETTINGS_MODULE", ""
+    )
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(settings.BASE_DIR), env.get("PYTHONPATH")])
+    )
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", _PROBE.format(load_urls=bool(load_urls))]
+    result = subprocess.run(
+        command,
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=settings.BASE_DIR,
+        timeout=300,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Start-up probe failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def measure_cold_start(runs=None, load_urls=True):
+    """Median timings and peak RSS of *runs* fresh start-ups."""
+    runs = runs or budget_settings()["RUNS"]
+    samples = [_run_probe(load_urls=load_urls)[0] for _ in range(runs)]
+    summary = {
+        key: round(statistics.median(sample[key] for sample in samples), 1)
+        for key in ("setup_ms", "urls_ms", "total_ms", "rss_mb")
+    }
+    summary["runs"] = runs
+    summary["modules"] = samples[-1]["modules"]
+    summary["view_modules"] = samples[-1]["view_modules"]
+    return summary
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth), ...] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def profile_imports(limit=20, load_urls=True):
+    """
+    The slowest imports of one start-up: {"by_self": [...], "by_cumulative":
+    [...], "packages": [...]}, times in milliseconds. "packages" sums self
+    time per top-level package (django, rest_framework, main, ...).
+    """
+    _, stderr = _run_probe(load_urls=load_urls, importtime=True)
+    rows = parse_importtime(stderr)
+
+    def top(key):
+        ranked = sorted(rows, key=key, reverse=True)[:limit]
+        return [
+            {
+                "module": module,
+                "self_ms": round(self_us / 1000, 1),
+                "cumulative_ms": round(cum_us / 1000, 1),
+            }
+            for module, self_us, cum_us, _depth in ranked
+        ]
+
+    packages = {}
+    for module, self_us, _cum, _depth in rows:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    return {
+        "by_self": top(lambda row: row[1]),
+        "by_cumulative": top(lambda row: row[2]),
+        "packages": [
+            {"package": package, "self_ms": round(us / 1000, 1)}
+            for package, us in sorted(packages.items(), key=lambda item: -item[1])[
+                :limit
+            ]
+        ],
+        "total_ms": round(sum(row[1] for row in rows) / 1000, 1),
+    }
+
+
+def check_budget(measurement, budget=None):
+    """Messages for every budget *measurement* exceeds; empty when within budget."""
+    budget = budget or budget_settings()
+    failures = []
+    if measurement["total_ms"] > budget["COLD_START_MS"]:
+        failures.append(
+            f"cold start {measurement['total_ms']:.0f} ms > budget {budget['COLD_START_MS']} ms"
+        )
+    if measurement["rss_mb"] > budget["RSS_MB"]:
+        failures.append(
+            f"RSS {measurement['rss_mb']:.0f} MB > budget {budget['RSS_MB']} MB"
+        )
+    if measurement.get("view_modules"):
+        failures.append(
+            f"view modules imported at start-up: {', '.join(measurement['view_modules'])}"
+        )
+    return failures
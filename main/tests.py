@@ -1,4 +1,6 @@
-from django.test import TestCase
+from unittest.mock import patch
+
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
 from django.utils import timezone
 
@@ -111,3 +113,2166 @@ class HomeViewTests(TestCase):
         self.assertFalse(
             any(c["category"] == self.cat_classified_sa for c in classified_categories)
         )
+
+
+class PaidBannerIndexTests(TestCase):
+    """
+    Tests for the in-memory paid banner serving index.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from main.models import PaidBanner
+
+        cls.advertiser = User.objects.create_user(
+            username="advertiser", email="advertiser@example.com", password="pass12345"
+        )
+        cls.country_eg, _ = Country.objects.get_or_create(code="EG", defaults={"name": "Egypt"})
+        cls.country_sa, _ = Country.objects.get_or_create(code="SA", defaults={"name": "Saudi Arabia"})
+
+        now = timezone.now()
+        defaults = {
+            "advertiser": cls.advertiser,
+            "image": "paid_ads/test.png",
+            "target_url": "https://example.com",
+            "price": 100,
+            "status": PaidBanner.Status.ACTIVE,
+            "start_date": now - timezone.timedelta(days=1),
+            "end_date": now + timezone.timedelta(days=1),
+        }
+        cls.everywhere = PaidBanner.objects.create(
+            title="Everywhere", country=cls.country_eg, priority=1, **defaults
+        )
+        cls.home_only = PaidBanner.objects.create(
+            title="Home only", country=cls.country_eg, priority=5, target_pages=["home"], **defaults
+        )
+        cls.saudi = PaidBanner.objects.create(title="Saudi", country=cls.country_sa, **defaults)
+        cls.saudi.extra_countries.add(cls.country_eg)
+        defaults["start_date"] = now + timezone.timedelta(days=1)
+        defaults["end_date"] = now + timezone.timedelta(days=2)
+        cls.scheduled = PaidBanner.objects.create(title="Scheduled", country=cls.country_eg, **defaults)
+
+    def setUp(self):
+        from main.banner_index import invalidate_banner_index
+
+        invalidate_banner_index()
+
+    def test_page_lookup_respects_targeting_and_dates(self):
+        from main.banner_index import get_banner_index
+
+        index = get_banner_index()
+        self.assertEqual(
+            index.for_page("EG", "home", "banner"),
+            [self.home_only, self.everywhere, self.saudi],
+        )
+        self.assertEqual(index.for_page("EG", "faq", "banner"), [self.everywhere, self.saudi])
+        self.assertEqual(index.for_page("SA", "faq", "banner"), [self.saudi])
+
+    def test_index_refreshes_on_banner_change(self):
+        from main.banner_index import get_banner_index
+
+        self.assertIn(self.everywhere, get_banner_index().for_page("EG", "home"))
+        self.everywhere.pause()
+        self.assertNotIn(self.everywhere, get_banner_index().for_page("EG", "home"))
+
+    def test_buffered_events_are_flushed(self):
+        from main import banner_index
+        from main.banner_index import (
+            flush_banner_events,
+            get_banner_index,
+            invalidate_banner_index,
+            pending_banner_counts,
+            record_banner_click,
+            record_banner_view,
+        )
+
+        invalidate_banner_index()
+        get_banner_index()
+        with patch.object(banner_index._flush_timer, "arm") as arm:
+            record_banner_view(self.everywhere.pk)
+            record_banner_view(self.everywhere.pk)
+            record_banner_click(self.everywhere.pk)
+        # An idle worker flushes from the timer
+        arm.assert_called()
+        banner_index._flush_timer.flush()
+        self.everywhere.refresh_from_db()
+        self.assertEqual(self.everywhere.views_count, 2)
+        self.assertEqual(self.everywhere.clicks_count, 1)
+
+        # The served snapshot predates the flush: the flushed counts are added
+        self.assertEqual(get_banner_index().banners_by_id[self.everywhere.pk].views_count, 0)
+        self.assertEqual(pending_banner_counts(self.everywhere.pk), (2, 1))
+        # ...until the index is rebuilt from the database
+        invalidate_banner_index()
+        self.assertEqual(get_banner_index().banners_by_id[self.everywhere.pk].views_count, 2)
+        self.assertEqual(pending_banner_counts(self.everywhere.pk), (0, 0))
+        flush_banner_events()
+
+
+class SitemapBuilderTests(TestCase):
+    """
+    Tests for the precomputed, chunked sitemap files.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username="sitemapuser", email="sitemap@example.com", password="pass12345"
+        )
+        country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "Egypt"})
+        category = Category.objects.create(
+            name="Sitemap Cat",
+            section_type=Category.SectionType.CLASSIFIED,
+            country=country,
+            slug="sitemap-cat",
+        )
+        cls.ads = [
+            ClassifiedAd.objects.create(
+                user=user,
+                category=category,
+                title=f"Sitemap ad {i}",
+                price=100,
+                country=country,
+                city="Cairo",
+                status=ClassifiedAd.AdStatus.ACTIVE,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        import tempfile
+        from unittest import mock
+
+        media = self.settings(MEDIA_ROOT=tempfile.mkdtemp())
+        media.enable()
+        self.addCleanup(media.disable)
+        # Two languages -> two ads per file
+        patcher = mock.patch("main.sitemap_builder.MAX_URLS_PER_FILE", 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _read_chunk(self, name):
+        import gzip
+
+        from django.core.files.storage import default_storage
+
+        with default_storage.open(f"sitemaps/{name}") as fh:
+            return gzip.decompress(fh.read()).decode()
+
+    def test_full_build_writes_chunks_and_index(self):
+        from main.sitemap_builder import build_sitemaps
+
+        summary = build_sitemaps(full=True)
+        self.assertEqual(summary["files"]["ads"], 2)
+        self.assertIn(f"/ar/classifieds/{self.ads[0].slug}/", self._read_chunk("ads-1.xml.gz"))
+        self.assertIn(self.ads[2].slug, self._read_chunk("ads-2.xml.gz"))
+
+        response = self.client.get("/sitemap.xml")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"/sitemaps/ads-2.xml.gz", b"".join(response.streaming_content))
+        self.assertEqual(self.client.get("/sitemaps/ads-1.xml.gz").status_code, 200)
+
+    def test_incremental_build_rewrites_only_touched_chunks(self):
+        from main.sitemap_builder import build_sitemaps
+
+        build_sitemaps(full=True)
+        self.ads[2].status = ClassifiedAd.AdStatus.SOLD
+        self.ads[2].save()
+
+        summary = build_sitemaps()
+        self.assertFalse(summary["full"])
+        self.assertEqual(summary["rebuilt"]["ads"], 1)
+        self.assertNotIn(self.ads[2].slug, self._read_chunk("ads-2.xml.gz"))
+        self.assertIn(self.ads[0].slug, self._read_chunk("ads-1.xml.gz"))
+
+    def test_grown_closed_range_is_split(self):
+        from main.sitemap_builder import build_sitemaps, load_manifest
+
+        ClassifiedAd.objects.filter(pk=self.ads[1].pk).update(status=ClassifiedAd.AdStatus.PENDING)
+        newest = ClassifiedAd.objects.create(
+            user=self.ads[0].user,
+            category=self.ads[0].category,
+            title="Sitemap ad 3",
+            price=100,
+            country=self.ads[0].country,
+            city="Cairo",
+            status=ClassifiedAd.AdStatus.ACTIVE,
+        )
+        build_sitemaps(full=True)
+
+        # Activated inside the first, full range: three ads for two slots
+        self.ads[1].status = ClassifiedAd.AdStatus.ACTIVE
+        self.ads[1].save()
+        build_sitemaps()
+
+        chunks = load_manifest()["sections"]["ads"]["chunks"]
+        self.assertEqual([c["number"] for c in chunks], [1, 3, 2])
+        self.assertTrue(all(c["count"] <= 2 for c in chunks))
+        self.assertIn(self.ads[1].slug, self._read_chunk("ads-1.xml.gz"))
+        self.assertIn(self.ads[2].slug, self._read_chunk("ads-3.xml.gz"))
+        self.assertIn(newest.slug, self._read_chunk("ads-2.xml.gz"))
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Query budgets for hot pages and the per-view performance samples.
+    Budgets have small headroom over the current counts; a failure here
+    usually means an N+1 crept into the view or a context processor.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(
+            username="budgetuser", email="budget@example.com", password="pass12345"
+        )
+        country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "Egypt"})
+        category = Category.objects.create(
+            name="Budget Cat",
+            section_type=Category.SectionType.CLASSIFIED,
+            country=country,
+            slug="budget-cat",
+        )
+        for i in range(5):
+            ClassifiedAd.objects.create(
+                user=user,
+                category=category,
+                title=f"Budget ad {i}",
+                price=100 + i,
+                country=country,
+                city="Cairo",
+                status=ClassifiedAd.AdStatus.ACTIVE,
+            )
+
+    def _get_within_budget(self, url_name, budget):
+        from main.instrumentation import query_budget
+
+        # First request warms per-process caches (site config, banner index…)
+        self.client.get(reverse(url_name))
+        with query_budget(budget, label=url_name):
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+
+    def test_home_query_budget(self):
+        self._get_within_budget("main:home", 110)
+
+    def test_ad_list_query_budget(self):
+        self._get_within_budget("main:ad_list", 95)
+
+    def test_query_budget_raises_when_exceeded(self):
+        from main.instrumentation import QueryBudgetExceeded, query_budget
+
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                list(Category.objects.all())
+                list(ClassifiedAd.objects.all())
+
+    def test_middleware_records_samples(self):
+
+        from main.instrumentation import prometheus_text, reset_samples, summarize
+
+        reset_samples()
+        with override_settings(PERF_INSTRUMENTATION={"SAMPLE_RATE": 1.0}):
+            self.client.get(reverse("main:ad_list"))
+        report = summarize()
+        self.assertIn("main:ad_list", report)
+        self.assertGreater(report["main:ad_list"]["queries"]["p50"], 0)
+        self.assertIn('idrissimart_view_queries{view="main:ad_list",quantile="0.9"}', prometheus_text(report))
+        reset_samples()
+
+    def test_publish_prunes_workers_whose_samples_expired(self):
+        import os
+
+        from django.core.cache import cache
+
+        from main.instrumentation import WORKER_CACHE_KEY, WORKERS_CACHE_KEY, MetricsBuffer, reset_samples
+
+        reset_samples()
+        self.addCleanup(reset_samples)
+        cache.set(WORKERS_CACHE_KEY, [1, 2], None)
+        cache.set(WORKER_CACHE_KEY.format(pid=1), [], 60)
+        # Worker 2's samples have expired
+        MetricsBuffer(10).publish()
+        self.assertEqual(cache.get(WORKERS_CACHE_KEY), sorted([1, os.getpid()]))
+
+
+class BenchmarkSuiteTests(TestCase):
+    """
+    Smoke tests for the benchmark dataset seeder, runner and comparison.
+    """
+
+    def test_seed_run_and_compare(self):
+        from main.benchmarks import compare_results, run_benchmarks, seed_benchmark_data
+
+        counts = seed_benchmark_data(ads=30, users=5, banners=0, batch_size=10)
+        self.assertEqual(counts["ads"], 30)
+        # Re-running only tops up what is missing
+        self.assertEqual(seed_benchmark_data(ads=30, users=5, banners=0)["ads"], 30)
+
+        results = run_benchmarks(names=["home", "ad_detail", "api_ad_list", "checkout"], repeat=2)
+        for name in ("home", "ad_detail", "api_ad_list", "checkout"):
+            self.assertEqual(results["scenarios"][name]["status_code"], 200, name)
+            self.assertGreater(results["scenarios"][name]["queries"], 0)
+
+        slower = {"scenarios": {"home": dict(results["scenarios"]["home"])}}
+        slower["scenarios"]["home"]["queries"] += 50
+        rows = compare_results(results, slower, threshold=10)
+        self.assertTrue(
+            any(r["regression"] for r in rows if r["scenario"] == "home" and r["metric"] == "queries")
+        )
+
+
+class AdBulkOperationTests(TestCase):
+    """
+    Tests for the set-based admin bulk actions on ads.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username="bulkadmin", email="bulkadmin@example.com", password="pass12345"
+        )
+        owner = User.objects.create_user(
+            username="bulkowner", email="bulkowner@example.com", password="pass12345"
+        )
+        country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "Egypt"})
+        category = Category.objects.create(
+            name="Bulk Cat",
+            section_type=Category.SectionType.CLASSIFIED,
+            country=country,
+            slug="bulk-cat",
+        )
+        ClassifiedAd.objects.bulk_create(
+            [
+                ClassifiedAd(
+                    user=owner,
+                    category=category,
+                    country=country,
+                    title=f"Bulk ad {i}",
+                    slug=f"bulk-ad-{i}",
+                    price=100,
+                    city="Cairo",
+                    status=ClassifiedAd.AdStatus.PENDING,
+                )
+                for i in range(40)
+            ]
+        )
+        cls.ad_ids = list(ClassifiedAd.objects.values_list("pk", flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_bulk_approve_is_set_based(self):
+        from main.ad_bulk_operations import process_bulk_side_effects
+        from main.instrumentation import query_budget
+        from main.models import AdBulkOperation, Notification
+
+        active_id = self.ad_ids[0]
+        ClassifiedAd.objects.filter(pk=active_id).update(status=ClassifiedAd.AdStatus.ACTIVE)
+
+        with patch(
+            "main.ad_bulk_operations.enqueue_bulk_side_effects"
+        ) as enqueue, self.captureOnCommitCallbacks(execute=True) as callbacks:
+            # Constant number of queries regardless of how many ads are selected
+            with query_budget(20):
+                response = self.client.post(
+                    reverse("main:admin_bulk_approve_ads"), {"ad_ids[]": self.ad_ids}
+                )
+        data = response.json()
+        self.assertEqual(data["count"], len(self.ad_ids) - 1)
+        # The side-effect job and the owners' publisher stats invalidation
+        self.assertEqual(len(callbacks), 2)
+        enqueue.assert_called_once_with(data["operation_id"])
+
+        self.assertFalse(
+            ClassifiedAd.objects.filter(status=ClassifiedAd.AdStatus.PENDING).exists()
+        )
+        self.assertEqual(
+            Notification.objects.filter(notification_type="ad_approved").count(),
+            len(self.ad_ids) - 1,
+        )
+
+        operation = AdBulkOperation.objects.get(pk=data["operation_id"])
+        self.assertEqual(operation.status, AdBulkOperation.Status.QUEUED)
+        self.assertNotIn(active_id, operation.ad_ids)
+
+        with patch("main.ad_bulk_operations._send_side_effects") as send:
+            process_bulk_side_effects(operation.pk)
+        self.assertEqual(send.call_count, operation.total)
+
+        status = self.client.get(
+            reverse("main:admin_bulk_operation_status", args=[operation.pk])
+        ).json()
+        self.assertEqual(status["status"], AdBulkOperation.Status.COMPLETED)
+        self.assertEqual(status["percent"], 100)
+
+    def test_bulk_flag_and_delete_actions(self):
+        url = reverse("main:admin_bulk_actions")
+        self.client.post(url, {"ad_ids[]": self.ad_ids[:5], "action": "pin"})
+        self.assertEqual(ClassifiedAd.objects.filter(is_pinned=True).count(), 5)
+        # Pinned ads are ranked above the others straight away
+        self.assertEqual(
+            set(ClassifiedAd.objects.order_by("-rank_score").values_list("pk", flat=True)[:5]),
+            set(self.ad_ids[:5]),
+        )
+        self.assertFalse(ClassifiedAd.objects.filter(is_pinned=True, rank_tier=0).exists())
+
+        response = self.client.post(url, {"ad_ids[]": self.ad_ids[:5], "action": "delete"})
+        self.assertEqual(response.json()["count"], 5)
+        self.assertEqual(ClassifiedAd.objects.count(), len(self.ad_ids) - 5)
+
+        response = self.client.post(url, {"ad_ids[]": self.ad_ids, "action": "bogus"})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ChatTransportTests(TransactionTestCase):
+    """
+    Tests for the write-behind chat transport and before_id history paging.
+    """
+
+    def setUp(self):
+        from main.models import ChatMessage, ChatRoom
+
+        self.publisher = User.objects.create_user(
+            username="chatpub",
+            email="chatpub@example.com",
+            password="pass12345",
+            profile_type=User.ProfileType.PUBLISHER,
+        )
+        self.room = ChatRoom.objects.create(
+            publisher=self.publisher, room_type="publisher_admin"
+        )
+        ChatMessage.objects.bulk_create(
+            [
+                ChatMessage(room=self.room, sender=self.publisher, message=f"old {i}")
+                for i in range(5)
+            ]
+        )
+
+    def test_broadcast_then_batched_save_and_history_cursor(self):
+        from asgiref.sync import async_to_sync
+        from channels.testing import WebsocketCommunicator
+
+        from main.chat_transport import get_message_writer
+        from main.consumers import PublisherAdminChatConsumer
+        from main.models import ChatMessage
+
+        async def scenario():
+            communicator = WebsocketCommunicator(
+                PublisherAdminChatConsumer.as_asgi(), f"/ws/chat/support/publisher_{self.publisher.pk}/"
+            )
+            communicator.scope["user"] = self.publisher
+            communicator.scope["url_route"] = {
+                "kwargs": {"room_name": f"publisher_{self.publisher.pk}"}
+            }
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            history = await communicator.receive_json_from()
+            self.assertEqual(history["type"], "history")
+            self.assertEqual([m["message"] for m in history["messages"]][-1], "old 4")
+
+            client_id = "0b7c3a4e-52a5-4a8e-9d8e-2f1c6f1d7a10"
+            await communicator.send_json_to({"type": "message", "message": "hello", "client_id": client_id})
+            broadcast = await communicator.receive_json_from()
+            self.assertEqual(broadcast["message"], "hello")
+            # The client's id is echoed back; the stored id is the server's
+            self.assertEqual(broadcast["client_id"], client_id)
+            self.assertNotEqual(broadcast["message_id"], client_id)
+
+            self.assertEqual(await get_message_writer().flush(), 1)
+
+            cursor = history["messages"][2]["id"]
+            await communicator.send_json_to({"type": "history", "before_id": cursor, "limit": 2})
+            page = await communicator.receive_json_from()
+            self.assertEqual([m["message"] for m in page["messages"]], ["old 0", "old 1"])
+            self.assertFalse(page["has_more"])
+
+            await communicator.disconnect()
+            return broadcast["message_id"]
+
+        message_id = async_to_sync(scenario)()
+        saved = ChatMessage.objects.get(message="hello")
+        self.assertEqual(str(saved.message_uuid), message_id)
+
+        # The batched save also advanced the room summary
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_id, saved.pk)
+        self.assertEqual(self.room.last_message_preview, "hello")
+        # setUp's bulk_create bypasses the summary; only "hello" is counted
+        self.assertEqual(self.room.unread_admin, 1)
+
+    def test_failing_row_is_retried_alone_then_dropped(self):
+        from asgiref.sync import async_to_sync
+
+        from main import chat_transport
+        from main.chat_transport import MAX_SAVE_ATTEMPTS, ChatMessageWriter, new_message_id
+        from main.models import ChatMessage
+
+        save_batch = chat_transport._save_batch
+
+        def failing_save(batch):
+            if any(item["message"] == "bad" for item in batch):
+                raise ValueError("bad row")
+            return save_batch(batch)
+
+        writer = ChatMessageWriter()
+
+        async def scenario():
+            for text in ("first", "bad", "last"):
+                writer.enqueue(self.room.pk, self.publisher.pk, text, new_message_id())
+            saved = [await writer.flush()]
+            for _ in range(MAX_SAVE_ATTEMPTS - 1):
+                saved.append(await writer.flush())
+            return saved
+
+        with patch("main.chat_transport._save_batch", side_effect=failing_save):
+            saved = async_to_sync(scenario)()
+
+        self.assertEqual(saved, [2] + [0] * (MAX_SAVE_ATTEMPTS - 1))
+        self.assertEqual(writer.pending_for_room(self.room.pk), [])
+        self.assertTrue(ChatMessage.objects.filter(message="last").exists())
+        self.assertFalse(ChatMessage.objects.filter(message="bad").exists())
+
+    def test_offline_ad_chat_participant_is_emailed_through_asend_email(self):
+        from asgiref.sync import async_to_sync
+        from channels.testing import WebsocketCommunicator
+        from django.core.cache import cache
+
+        from main.consumers import PublisherClientChatConsumer
+        from main.presence import MemoryPresenceStore
+
+        cache.clear()
+        country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "Egypt"})
+        category = Category.objects.create(
+            name="Chat Cat", slug="chat-cat", section_type=Category.SectionType.CLASSIFIED
+        )
+        ad = ClassifiedAd.objects.create(
+            user=self.publisher, category=category, country=country, title="Chat ad", price=10, city="Cairo"
+        )
+        client = User.objects.create_user(username="chatclient", email="chatclient@example.com", password="pass12345")
+
+        async def scenario():
+            communicator = WebsocketCommunicator(PublisherClientChatConsumer.as_asgi(), f"/ws/chat/ad/{ad.pk}/")
+            communicator.scope["user"] = client
+            communicator.scope["url_route"] = {"kwargs": {"ad_id": ad.pk}}
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()
+            for text in ("hi", "still there?"):
+                await communicator.send_json_to({"type": "message", "message": text})
+                await communicator.receive_json_from()
+            await communicator.disconnect()
+
+        with patch("main.presence._store", MemoryPresenceStore()), patch(
+            "main.services.messaging._enqueue"
+        ) as enqueue:
+            async_to_sync(scenario)()
+
+        # The publisher is offline: one email for the room, not one per message
+        enqueue.assert_called_once()
+        func, payload = enqueue.call_args.args
+        self.assertEqual(func, "main.services.messaging.deliver_email_task")
+        self.assertEqual(payload["to_emails"], ["chatpub@example.com"])
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class ChatPresenceTests(TransactionTestCase):
+    """
+    Tests for heartbeat presence, debounced typing and the presence snapshot.
+    """
+
+    def setUp(self):
+        from main.models import ChatRoom
+        from main.presence import MemoryPresenceStore
+
+        self.store = MemoryPresenceStore()
+        patcher = patch("main.presence._store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.publisher = User.objects.create_user(
+            username="presencepub",
+            email="presencepub@example.com",
+            password="pass12345",
+            profile_type=User.ProfileType.PUBLISHER,
+        )
+        self.admin = User.objects.create_user(
+            username="presenceadmin",
+            email="presenceadmin@example.com",
+            password="pass12345",
+            is_staff=True,
+        )
+        self.room = ChatRoom.objects.create(publisher=self.publisher, room_type="publisher_admin")
+
+    def _communicator(self, user):
+        from channels.testing import WebsocketCommunicator
+
+        from main.consumers import PublisherAdminChatConsumer
+
+        room_name = f"publisher_{self.publisher.pk}"
+        communicator = WebsocketCommunicator(
+            PublisherAdminChatConsumer.as_asgi(), f"/ws/chat/support/{room_name}/"
+        )
+        communicator.scope["user"] = user
+        communicator.scope["url_route"] = {"kwargs": {"room_name": room_name}}
+        return communicator
+
+    def test_presence_and_debounced_typing(self):
+        from asgiref.sync import async_to_sync
+
+        from main.chat_transport import get_message_writer
+
+        async def scenario():
+            publisher = self._communicator(self.publisher)
+            await publisher.connect()
+            await publisher.receive_json_from()  # history
+
+            admin = self._communicator(self.admin)
+            await admin.connect()
+            joined = await publisher.receive_json_from()
+            self.assertEqual(joined, {"type": "presence", "user_id": self.admin.pk, "status": "online"})
+            await admin.receive_json_from()  # history
+
+            # A burst of keystrokes produces a single typing event
+            for _ in range(5):
+                await admin.send_json_to({"type": "typing"})
+            typing = await publisher.receive_json_from()
+            self.assertTrue(typing["is_typing"])
+
+            # Sending the message clears the indicator
+            await admin.send_json_to({"type": "message", "message": "hi"})
+            self.assertEqual((await publisher.receive_json_from())["type"], "message")
+            self.assertEqual((await admin.receive_json_from())["type"], "message")
+            stopped = await publisher.receive_json_from()
+            self.assertEqual(stopped["type"], "typing")
+            self.assertFalse(stopped["is_typing"])
+            self.assertTrue(await publisher.receive_nothing())
+
+            await admin.send_json_to({"type": "heartbeat"})
+            self.assertEqual(await admin.receive_json_from(), {"type": "heartbeat_ack"})
+            self.assertEqual(
+                self.store.snapshot(room_ids=[self.room.pk])["rooms"][self.room.pk],
+                [self.publisher.pk, self.admin.pk],
+            )
+
+            await get_message_writer().flush()
+            await admin.disconnect()
+            left = await publisher.receive_json_from()
+            self.assertEqual(left["status"], "offline")
+            await publisher.disconnect()
+
+        async_to_sync(scenario)()
+
+    def test_presence_snapshot_endpoint(self):
+        from main.models import ChatRoom
+
+        other_room = ChatRoom.objects.create(
+            publisher=self.admin, room_type="publisher_admin"
+        )
+        self.store.touch(self.admin.pk, self.room.pk)
+
+        self.client.force_login(self.publisher)
+        response = self.client.get(
+            reverse("main:chat_presence"), {"rooms": f"{self.room.pk},{other_room.pk}"}
+        )
+        data = response.json()
+        # Rooms the user is not part of are left out
+        self.assertEqual(list(data["rooms"]), [str(self.room.pk)])
+        self.assertTrue(data["rooms"][str(self.room.pk)]["online"])
+        self.assertEqual(data["rooms"][str(self.room.pk)]["in_room"], [self.admin.pk])
+
+
+class ChatRoomSummaryTests(TestCase):
+    """
+    Tests for the denormalized chat room summaries and keyset inbox paging.
+    """
+
+    def setUp(self):
+        from main.models import ChatRoom
+
+        self.publisher = User.objects.create_user(
+            username="summarypub",
+            email="summarypub@example.com",
+            password="pass12345",
+            profile_type=User.ProfileType.PUBLISHER,
+        )
+        self.buyer = User.objects.create_user(
+            username="summarybuyer", email="summarybuyer@example.com", password="pass12345"
+        )
+        self.rooms = [
+            ChatRoom.objects.create(publisher=self.publisher, client=self.buyer)
+            for _ in range(5)
+        ]
+
+    def test_counters_follow_messages_and_reads(self):
+        from main.models import ChatMessage
+
+        room = self.rooms[0]
+        ChatMessage.objects.create(room=room, sender=self.buyer, message="is it available?")
+        ChatMessage.objects.create(room=room, sender=self.buyer, message="hello?")
+        reply = ChatMessage.objects.create(room=room, sender=self.publisher, message="yes")
+
+        room.refresh_from_db()
+        self.assertEqual((room.unread_publisher, room.unread_client), (2, 1))
+        self.assertEqual(room.last_message_id, reply.pk)
+        self.assertEqual(room.last_message_preview, "yes")
+        self.assertEqual(room.get_unread_count(self.publisher), 2)
+
+        self.assertEqual(room.mark_as_read(self.publisher), 2)
+        room.refresh_from_db()
+        self.assertEqual((room.unread_publisher, room.unread_client), (0, 1))
+        self.assertFalse(ChatMessage.objects.filter(sender=self.buyer, is_read=False).exists())
+
+    def test_inbox_is_one_query_per_page(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from main.chat_inbox import paginate_inbox
+        from main.models import ChatMessage, ChatRoom
+
+        for i, room in enumerate(self.rooms):
+            ChatMessage.objects.create(room=room, sender=self.buyer, message=f"message {i}")
+
+        queryset = ChatRoom.objects.filter(publisher=self.publisher)
+        with self.assertNumQueries(1):
+            first, cursor = paginate_inbox(queryset, limit=3)
+        with self.assertNumQueries(1):
+            second, end = paginate_inbox(queryset, cursor=cursor, limit=3)
+
+        # Newest activity first, no overlap between pages
+        self.assertEqual([r.pk for r in first + second], [r.pk for r in reversed(self.rooms)])
+        self.assertIsNone(end)
+        self.assertEqual(first[0].last_message_preview, "message 4")
+
+        # The inbox page costs the same number of queries however many rooms it lists
+        self.client.force_login(self.publisher)
+        url = reverse("main:chat_list")
+        self.client.get(url)  # warm site-wide caches
+        with CaptureQueriesContext(connection) as five_rooms:
+            response = self.client.get(url)
+        self.assertEqual([r.unread_count for r in response.context["chat_rooms"]], [1] * 5)
+
+        for i in range(5):
+            room = ChatRoom.objects.create(publisher=self.publisher, client=self.buyer)
+            ChatMessage.objects.create(room=room, sender=self.buyer, message=f"more {i}")
+        with CaptureQueriesContext(connection) as ten_rooms:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context["chat_rooms"]), 10)
+        self.assertEqual(len(ten_rooms), len(five_rooms))
+
+        response = self.client.get(reverse("main:publisher_chats"))
+        self.assertEqual(response.context["chat_stats"]["unread_messages"], 10)
+
+
+class MaintenanceJobTests(TestCase):
+    """
+    Tests for the keyset-paged, set-based maintenance jobs.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username="maintowner", email="maintowner@example.com", password="pass12345"
+        )
+        country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "Egypt"})
+        category = Category.objects.create(
+            name="Maint Cat",
+            section_type=Category.SectionType.CLASSIFIED,
+            country=country,
+            slug="maint-cat",
+        )
+        now = timezone.now()
+        expiries = [now - timezone.timedelta(hours=1)] * 5 + [now + timezone.timedelta(days=2)] * 4
+        ClassifiedAd.objects.bulk_create(
+            [
+                ClassifiedAd(
+                    user=cls.owner,
+                    category=category,
+                    country=country,
+                    title=f"Maint ad {i}",
+                    slug=f"maint-ad-{i}",
+                    price=100,
+                    city="Cairo",
+                    status=ClassifiedAd.AdStatus.ACTIVE,
+                    expires_at=expires_at,
+                )
+                for i, expires_at in enumerate(expiries)
+            ]
+        )
+
+    def test_expire_ads_notifies_once(self):
+        from django.core import mail
+
+        from main.models import MaintenanceRun, Notification
+        from main.scheduled_tasks import ExpireAdsJob, expire_ads_task
+
+        mail.outbox = []
+        with patch.object(ExpireAdsJob, "chunk_size", 2):
+            result = expire_ads_task()
+        self.assertTrue(result["success"])
+        self.assertEqual(result["count"], 5)
+        self.assertEqual(result["notifications_sent"], 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(
+            ClassifiedAd.objects.filter(status=ClassifiedAd.AdStatus.EXPIRED).count(), 5
+        )
+        run = MaintenanceRun.objects.get(pk=result["run_id"])
+        self.assertEqual((run.chunks, run.status), (3, MaintenanceRun.Status.COMPLETED))
+
+        # Re-running finds nothing and sends nothing
+        self.assertEqual(expire_ads_task()["count"], 0)
+        self.assertEqual(
+            Notification.objects.filter(
+                notification_type=Notification.NotificationType.AD_EXPIRED
+            ).count(),
+            5,
+        )
+
+    def test_expiring_notices_are_deduplicated_by_window(self):
+        from django.core import mail
+
+        from main.scheduled_tasks import send_expiration_notifications_task
+
+        mail.outbox = []
+        first = send_expiration_notifications_task(days=3)
+        self.assertEqual((first["count"], first["notifications_sent"]), (4, 4))
+        self.assertEqual(len(mail.outbox), 4)
+
+        again = send_expiration_notifications_task(days=3)
+        self.assertEqual((again["count"], again["notifications_sent"]), (4, 0))
+        self.assertEqual(len(mail.outbox), 4)
+
+        # The 7-day reminder is a separate notice kind
+        self.assertEqual(send_expiration_notifications_task(days=7)["notifications_sent"], 4)
+
+    def test_upgrade_expiry_clears_flags_set_based(self):
+        from main.instrumentation import query_budget
+        from main.models import AdUpgradeHistory
+        from main.scheduled_tasks import check_upgrade_expiry_task
+
+        ads = list(ClassifiedAd.objects.order_by("pk")[:3])
+        past = timezone.now() - timezone.timedelta(days=1)
+        for ad in ads:
+            AdUpgradeHistory.objects.create(
+                ad=ad, upgrade_type="highlighted", price_paid=10, duration_days=1, end_date=past
+            )
+        # The first ad still has a live highlight
+        AdUpgradeHistory.objects.create(
+            ad=ads[0],
+            upgrade_type="highlighted",
+            price_paid=10,
+            duration_days=5,
+            end_date=timezone.now() + timezone.timedelta(days=5),
+        )
+
+        # Upgrade and featured-section expiry jobs
+        with query_budget(15):
+            result = check_upgrade_expiry_task()
+        self.assertEqual((result["count"], result["featured_sections"]), (3, 0))
+        flags = dict(
+            ClassifiedAd.objects.filter(pk__in=[a.pk for a in ads]).values_list("pk", "is_highlighted")
+        )
+        self.assertEqual(flags, {ads[0].pk: True, ads[1].pk: False, ads[2].pk: False})
+
+
+class RequestClassifierTests(TestCase):
+    """
+    Tests for the compiled path / user-agent matchers shared by the middlewares.
+    """
+
+    def test_blocked_paths_and_queries(self):
+        from main.request_classifier import blocked_path_reason, blocked_query_reason
+
+        self.assertEqual(blocked_path_reason("/WP-Admin/setup"), "wp-admin")
+        self.assertEqual(blocked_path_reason("/a/b/.git/config"), ".git")
+        self.assertEqual(blocked_path_reason("/legacy/index.ASPX"), "extension")
+        self.assertIsNone(blocked_path_reason("/ar/ads/wp-con/"))
+        self.assertIsNone(blocked_path_reason("/ar/category/electronics/"))
+        self.assertEqual(blocked_query_reason("XDEBUG_SESSION_START=1"), "xdebug")
+        self.assertIsNone(blocked_query_reason("page=2&sort=price"))
+
+        self.assertEqual(self.client.get("/wp-login.php").status_code, 404)
+        self.assertEqual(self.client.get("/ar/", {"rest_route": "/wp/v2/users"}).status_code, 404)
+
+    def test_user_agent_classification(self):
+        from main.benchmarks import SAMPLE_USER_AGENTS, run_micro_benchmarks
+        from main.request_classifier import classify_user_agent
+
+        expected = [
+            (False, "desktop", "Chrome"),
+            (False, "desktop", "Edge"),
+            (False, "mobile", "Safari"),
+            (False, "mobile", "Chrome"),
+            (False, "tablet", "Safari"),
+            (False, "desktop", "Firefox"),
+            (True, "desktop", "Other"),
+            (True, "desktop", "Other"),
+            (True, "desktop", "Other"),
+            (True, "desktop", "Other"),
+        ]
+        self.assertEqual([tuple(classify_user_agent(ua)) for ua in SAMPLE_USER_AGENTS], expected)
+        self.assertEqual(tuple(classify_user_agent("")), (False, "desktop", "Other"))
+
+        results = run_micro_benchmarks(names=["request_classifier"], iterations=50)
+        self.assertIn("user_agent_cached", results["micro"]["request_classifier"])
+
+
+from django.core.mail.backends.locmem import EmailBackend as LocMemEmailBackend
+
+
+class CountingEmailBackend(LocMemEmailBackend):
+    """locmem backend that counts how often a connection is opened."""
+
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+
+@override_settings(
+    OUTBOUND_MESSAGING={
+        "EMAIL_BACKEND": "main.tests.CountingEmailBackend",
+        "SMS_BACKEND": "main.services.messaging.LocMemSMSBackend",
+        "MAX_RETRIES": 2,
+        "RETRY_BASE_DELAY": 10,
+    }
+)
+class OutboundMessagingTests(TestCase):
+    """
+    Tests for the pooled email / pluggable SMS layer under EmailService and SMSService.
+    """
+
+    def setUp(self):
+        from main.services import messaging
+
+        messaging.mail_pool.close()
+        messaging.invalidate_message_templates()
+        messaging.LocMemSMSBackend.outbox.clear()
+        CountingEmailBackend.opened = 0
+
+    def tearDown(self):
+        from main.services import messaging
+
+        messaging.mail_pool.close()
+
+    def test_emails_reuse_one_connection(self):
+        from django.core import mail
+
+        from main.services.email_service import EmailService
+
+        for i in range(3):
+            self.assertTrue(EmailService.send_email([f"u{i}@example.com"], "Hi", "<p>Hello</p>"))
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(mail.outbox[0].body, "Hello")
+
+    def test_db_templates_are_compiled_once_and_refreshed_on_save(self):
+        from main.models import EmailTemplate
+        from main.services.email_service import EmailService
+
+        tmpl = EmailTemplate.objects.create(
+            key="welcome", name="Welcome", subject_ar="أهلاً {{user_name}}", body_ar="<p>{{ user_name }} في {{site_name}}</p>"
+        )
+        context = {"user_name": "Sara", "site_name": "Idrissi"}
+        self.assertEqual(EmailService._render_db_template("welcome", context), ("أهلاً Sara", "<p>Sara في Idrissi</p>"))
+        self.assertIsNone(EmailService._render_db_template("ad_created", context))
+        with self.assertNumQueries(0):
+            EmailService._render_db_template("welcome", {"user_name": "Omar"})
+            # Missing templates are cached too
+            self.assertIsNone(EmailService._render_db_template("ad_created", context))
+
+        tmpl.body_ar = "<p>Updated {{missing}}</p>"
+        with self.captureOnCommitCallbacks(execute=True):
+            tmpl.save()
+        self.assertEqual(EmailService._render_db_template("welcome", context)[1], "<p>Updated {{missing}}</p>")
+
+    def test_sms_goes_through_configured_backend(self):
+        from constance.test import override_config
+
+        from main.services.messaging import LocMemSMSBackend
+        from main.services.sms_service import SMSService
+
+        with override_settings(TWILIO_DEVELOPMENT_MODE=False), override_config(
+            TWILIO_DEVELOPMENT_MODE=False, TWILIO_ENABLED=False
+        ):
+            self.assertTrue(SMSService.send_sms("+201001234567", "Hello"))
+        self.assertEqual(LocMemSMSBackend.outbox, [{"to": "+201001234567", "message": "Hello"}])
+
+    def test_failed_delivery_is_rescheduled_with_backoff(self):
+        import smtplib
+
+        from main.services import messaging
+
+        payload = {"to_number": "+201001234567", "message": "Hi"}
+        with patch.object(messaging.LocMemSMSBackend, "send", side_effect=ConnectionError("down")), patch.object(
+            messaging, "_enqueue"
+        ) as enqueue:
+            first = messaging.deliver_sms_task(payload, 0)
+            last = messaging.deliver_sms_task(payload, 2)
+
+        self.assertFalse(first["success"])
+        self.assertGreaterEqual(first["retry_in"], 10)
+        enqueue.assert_called_once()
+        self.assertEqual(enqueue.call_args.args[2], 1)
+        # Out of retries: give up without queueing again
+        self.assertNotIn("retry_in", last)
+
+        # Refused recipients are permanent and never retried
+        refused = smtplib.SMTPRecipientsRefused({"x@example.com": (550, b"no such user")})
+        with patch.object(messaging, "send_email", side_effect=refused), patch.object(messaging, "_enqueue") as enqueue:
+            result = messaging.deliver_email_task({"to_emails": ["x@example.com"], "subject": "s", "html_content": "h"})
+        self.assertFalse(result["success"])
+        enqueue.assert_not_called()
+
+    def test_notification_receivers_queue_delivery_until_commit(self):
+        from constance.test import override_config
+        from django.core import mail
+
+        from main.services.email_service import EmailService
+        from main.services.messaging import LocMemSMSBackend, queued_delivery
+        from main.services.sms_service import SMSService
+
+        with override_settings(TWILIO_DEVELOPMENT_MODE=False), override_config(
+            TWILIO_DEVELOPMENT_MODE=False, TWILIO_ENABLED=False
+        ), patch("django_q.tasks.async_task") as async_task:
+            with self.captureOnCommitCallbacks() as callbacks, queued_delivery():
+                self.assertTrue(EmailService.send_email(["queued@example.com"], "Queued", "<b>Hi</b>"))
+                self.assertTrue(SMSService.send_sms("+201001234567", "Queued SMS"))
+            # Nothing is sent inside the request
+            self.assertEqual((len(mail.outbox), LocMemSMSBackend.outbox), (0, []))
+            for callback in callbacks:
+                callback()
+
+        self.assertEqual(
+            [call.args[0] for call in async_task.call_args_list],
+            ["main.services.messaging.deliver_email_task", "main.services.messaging.deliver_sms_task"],
+        )
+        self.assertEqual(async_task.call_args_list[1].args[1], {"to_number": "+201001234567", "message": "Queued SMS"})
+
+
+class ModerationEngineTests(TestCase):
+    """
+    Tests for the compiled blocked-word matcher (main.moderation).
+    """
+
+    def test_usernames_are_normalised_before_matching(self):
+        from main.blocked_words import is_username_allowed
+
+        self.assertEqual(is_username_allowed("Super_Admin-2"), (False, "الاسم يحتوي على كلمة محجوزة: admin"))
+        self.assertFalse(is_username_allowed("أدمـــن")[0])  # hamza + tatweel
+        self.assertFalse(is_username_allowed("ادْمن")[0])  # diacritic
+        self.assertFalse(is_username_allowed("4dmin")[0])
+        self.assertEqual(is_username_allowed("p0rn.star"), (False, "الاسم يحتوي على كلمة غير لائقة"))
+        self.assertEqual(is_username_allowed("mohamed_2024"), (True, ""))
+
+    def test_content_matches_report_original_spans(self):
+        from main.blocked_words import clean_text_content, find_blocked_words
+        from main.moderation import highlight
+
+        text = "Selling  b!tch  cheap, model 53x"
+        matches = find_blocked_words(text)
+        self.assertEqual([(m.word, text[m.start:m.end]) for m in matches], [("bitch", "b!tch")])
+        self.assertEqual(highlight(text, matches), "Selling  [b!tch]  cheap, model 53x")
+        self.assertEqual(clean_text_content("سيارة بحالة ممتازة 2020"), (True, []))
+
+    def test_admin_words_reload_after_commit(self):
+        from main.blocked_words import find_blocked_words
+        from main.models import BlockedWord
+
+        self.assertEqual(find_blocked_words("هذا نصب واضح"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            word = BlockedWord.objects.create(word="نصب", category=BlockedWord.Category.OFFENSIVE)
+        self.assertEqual([m.word for m in find_blocked_words("هذا نَصب واضح")], ["نصب"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            word.delete()
+        self.assertEqual(find_blocked_words("هذا نصب واضح"), [])
+
+    def test_micro_benchmark(self):
+        from main.benchmarks import run_micro_benchmarks
+
+        results = run_micro_benchmarks(names=["moderation"], iterations=20)
+        self.assertEqual(
+            set(results["micro"]["moderation"]), {"blocked_words_legacy", "blocked_words_engine"}
+        )
+
+
+class PublisherStatsTests(TestCase):
+    """
+    Tests for the single-query, cached publisher statistics.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username="statsowner", email="statsowner@example.com", password="pass12345"
+        )
+        other = User.objects.create_user(
+            username="statsother", email="statsother@example.com", password="pass12345"
+        )
+        country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "Egypt"})
+        cls.category = Category.objects.create(
+            name="Stats Cat",
+            section_type=Category.SectionType.CLASSIFIED,
+            country=country,
+            slug="stats-cat",
+        )
+        Status = ClassifiedAd.AdStatus
+        rows = [
+            (cls.owner, Status.ACTIVE, 10, {"is_pinned": True}),
+            (cls.owner, Status.ACTIVE, 30, {"is_urgent": True, "is_highlighted": True}),
+            (cls.owner, Status.PENDING, 0, {"is_resubmitted": True}),
+            (cls.owner, Status.EXPIRED, 20, {}),
+            (cls.owner, Status.DRAFT, 0, {}),
+            (other, Status.ACTIVE, 500, {"is_pinned": True}),
+        ]
+        ClassifiedAd.objects.bulk_create(
+            [
+                ClassifiedAd(
+                    user=user,
+                    category=cls.category,
+                    country=country,
+                    title=f"Stats ad {i}",
+                    slug=f"stats-ad-{i}",
+                    price=100,
+                    city="Cairo",
+                    status=status,
+                    views_count=views,
+                    **flags,
+                )
+                for i, (user, status, views, flags) in enumerate(rows)
+            ]
+        )
+
+    def test_counters_come_from_one_query(self):
+        from main.publisher_stats import compute_publisher_stats, status_breakdown
+
+        with self.assertNumQueries(1):
+            stats = compute_publisher_stats(self.owner.pk)
+
+        self.assertEqual(
+            {key: stats[key] for key in (
+                "total_ads", "active_ads", "pending_ads", "resubmitted_ads", "expired_ads",
+                "draft_ads", "rejected_ads", "pinned_ads", "urgent_ads", "highlighted_ads",
+                "total_views", "month_new_ads", "week_new_ads", "month_views",
+            )},
+            {
+                "total_ads": 5, "active_ads": 2, "pending_ads": 1, "resubmitted_ads": 1,
+                "expired_ads": 1, "draft_ads": 1, "rejected_ads": 0, "pinned_ads": 1,
+                "urgent_ads": 1, "highlighted_ads": 1, "total_views": 60,
+                "month_new_ads": 5, "week_new_ads": 5, "month_views": 60,
+            },
+        )
+        self.assertEqual(stats["avg_views"], 12)
+        self.assertEqual(status_breakdown(stats)[0], {"status": "active", "count": 2})
+
+    def test_snapshot_is_cached_until_an_ad_changes(self):
+        from main.publisher_stats import get_publisher_stats
+
+        self.assertEqual(get_publisher_stats(self.owner)["draft_ads"], 1)
+        with patch("main.publisher_stats.compute_publisher_stats", side_effect=AssertionError):
+            self.assertEqual(get_publisher_stats(self.owner)["draft_ads"], 1)
+
+        ad = ClassifiedAd.objects.get(user=self.owner, status=ClassifiedAd.AdStatus.DRAFT)
+        with self.captureOnCommitCallbacks(execute=True):
+            ad.status = ClassifiedAd.AdStatus.ACTIVE
+            ad.save()
+        stats = get_publisher_stats(self.owner)
+        self.assertEqual((stats["draft_ads"], stats["active_ads"]), (0, 3))
+
+    def test_lapsed_upgrades_expire_before_counting(self):
+        from main.models import AdUpgradeHistory
+        from main.publisher_stats import get_publisher_stats
+        from main.scheduled_tasks import expire_user_upgrades
+
+        ad = ClassifiedAd.objects.get(user=self.owner, is_pinned=True)
+        AdUpgradeHistory.objects.create(
+            ad=ad,
+            upgrade_type="pinned",
+            duration_days=1,
+            price_paid=0,
+            end_date=timezone.now() - timezone.timedelta(days=1),
+            is_active=True,
+        )
+        self.assertEqual(get_publisher_stats(self.owner)["pinned_ads"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_user_upgrades(self.owner.pk), 1)
+        self.assertEqual(get_publisher_stats(self.owner)["pinned_ads"], 0)
+        with self.assertNumQueries(1):
+            self.assertEqual(expire_user_upgrades(self.owner.pk), 0)
+
+    def test_reports_page(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse("main:publisher_reports"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["stats"]["total_ads"], 5)
+        self.assertEqual(response.context["week_stats"], {"new_ads": 5, "views": 60})
+
+
+class PaymentRollupTests(TestCase):
+    """
+    Tests for the payment context column and the revenue rollups behind the
+    admin payments console.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from main.models import Payment
+
+        cls.payer = User.objects.create_user(
+            username="rollpayer", email="rollpayer@example.com", password="pass12345"
+        )
+        Status = Payment.PaymentStatus
+        rows = [
+            ("paymob", Status.COMPLETED, 100, {"ad_id": 1}),
+            ("paypal", Status.COMPLETED, 250, {"package_id": 2, "ad_id": 3}),
+            ("paymob", Status.PENDING, 40, {"order_id": 4}),
+            ("bank_transfer", Status.FAILED, 70, {}),
+        ]
+        cls.payments = []
+        for provider, status, amount, metadata in rows:
+            payment = Payment.objects.create(
+                user=cls.payer, provider=provider, status=status, amount=amount, metadata=metadata
+            )
+            if status == Status.COMPLETED:
+                payment.completed_at = payment.created_at
+                payment.save()
+            cls.payments.append(payment)
+
+    def test_context_is_derived_from_metadata(self):
+        from main.models import Payment
+
+        self.assertEqual(
+            [p.context_type for p in self.payments], ["ad", "ad", "order", "other"]
+        )
+        failed = self.payments[3]
+        failed.metadata["subscription_type"] = "gold"
+        failed.mark_failed("declined")
+        failed.refresh_from_db()
+        self.assertEqual(failed.context_type, Payment.PaymentContext.SUBSCRIPTION)
+
+    def test_job_rebuilds_touched_days(self):
+        from main.models import MaintenanceRun, Payment, PaymentRevenueRollup
+        from main.payment_rollups import console_stats, monthly_revenue
+        from main.scheduled_tasks import refresh_payment_rollups_task
+
+        first = refresh_payment_rollups_task()
+        self.assertTrue(first["success"])
+        self.assertEqual(first["count"], PaymentRevenueRollup.objects.count())
+        stats = console_stats()
+        self.assertEqual(
+            (stats["total_transactions"], stats["completed_transactions"], stats["pending_payments"]),
+            (4, 2, 1),
+        )
+        self.assertEqual(
+            (stats["total_revenue"], stats["today_revenue"], stats["paymob_payments"]), (350, 350, 1)
+        )
+        self.assertEqual(monthly_revenue()[-1]["revenue"], 350)
+
+        # Pretend the first run happened long ago, so only the payment
+        # completed below is rescanned
+        earlier = timezone.now() - timezone.timedelta(hours=1)
+        MaintenanceRun.objects.filter(pk=first["run_id"]).update(started_at=earlier)
+        Payment.objects.update(updated_at=earlier - timezone.timedelta(hours=1))
+        self.payments[2].mark_completed("TX-42")
+        second = refresh_payment_rollups_task()
+        self.assertEqual(second["scanned"], 1)
+        stats = console_stats()
+        self.assertEqual((stats["completed_transactions"], stats["pending_payments"]), (3, 0))
+        self.assertEqual(stats["total_revenue"], 390)
+
+    def test_console_reads_rollups(self):
+        from main.models import Payment
+        from main.scheduled_tasks import refresh_payment_rollups_task
+
+        refresh_payment_rollups_task()
+        admin = User.objects.create_superuser(
+            username="rolladmin", email="rolladmin@example.com", password="pass12345"
+        )
+        self.client.force_login(admin)
+        url = reverse("main:admin_payments")
+
+        response = self.client.get(url, {"ajax_stats": "1"})
+        self.assertEqual(response.json()["stats"]["total_revenue"], 350.0)
+
+        # Payments made since the last job run show up on the next run only
+        Payment.objects.create(
+            user=self.payer, provider="paypal", status="completed", amount=5, completed_at=timezone.now()
+        )
+        response = self.client.get(url, {"ajax_stats": "1"})
+        self.assertEqual(response.json()["stats"]["completed_transactions"], 2)
+
+        response = self.client.get(url, {"context": "order"})
+        self.assertEqual(
+            [p.pk for p in response.context["recent_transactions"]], [self.payments[2].pk]
+        )
+
+
+def _run_inline(func, *args, **kwargs):
+    from django.utils.module_loading import import_string
+
+    return import_string(func)(*args)
+
+
+@patch("django_q.tasks.async_task", _run_inline)
+class ChatbotIndexTests(TestCase):
+    """
+    Tests for the in-memory chatbot knowledge index and buffered conversation log.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from main.chatbot_service import initialize_knowledge_base
+
+        initialize_knowledge_base()
+
+    def setUp(self):
+        from main import chatbot_index
+
+        chatbot_index.invalidate_knowledge_index()
+        chatbot_index.flush_conversation_log()
+
+    def test_ranked_matches_without_queries(self):
+        from main.chatbot_index import get_knowledge_index
+
+        index = get_knowledge_index()
+        with self.assertNumQueries(0):
+            ads = index.best_match("كيف انشر الاعلان؟")
+            payment = index.best_match("ابغى اعرف طرق الدفع")
+            missing = index.best_match("طقس")
+        self.assertEqual(ads.category, "ads")
+        self.assertEqual(payment.category, "payment")
+        self.assertIsNone(missing)
+        # Prefixes of indexed words match too, as with the old substring search
+        self.assertEqual(index.best_match("التحق").category, "account")
+
+    def test_index_is_rebuilt_on_change(self):
+        from main.chatbot_index import get_knowledge_index
+        from main.chatbot_models import ChatbotKnowledgeBase
+
+        self.assertIsNone(get_knowledge_index().best_match("المرتجعات"))
+        with self.captureOnCommitCallbacks(execute=True):
+            ChatbotKnowledgeBase.objects.create(
+                question="ما سياسة المرتجعات؟", answer="خلال 14 يوماً", category="marketplace"
+            )
+        self.assertEqual(get_knowledge_index().best_match("المرتجعات").answer, "خلال 14 يوماً")
+
+    def test_conversations_are_logged_in_batches_and_rated(self):
+        from main import chatbot_index
+        from main.chatbot_models import ChatbotConversation
+        from main.chatbot_service import IdrissmartChatbot
+
+        bot = IdrissmartChatbot()
+        with patch.object(chatbot_index, "LOG_FLUSH_INTERVAL", 3600), patch.object(
+            chatbot_index, "LOG_FLUSH_THRESHOLD", 3
+        ):
+            first = bot.get_response("ما هي طرق الدفع المتاحة؟", session_id="s1")
+            self.assertTrue(bot.rate_response(first["conversation_id"], True))
+            bot.get_response("مرحبا", session_id="s1")
+            self.assertFalse(ChatbotConversation.objects.exists())
+            bot.get_response("شكرا", session_id="s1")
+
+        rows = ChatbotConversation.objects.filter(session_id="s1")
+        self.assertEqual(rows.count(), 3)
+        rated = rows.get(reference=first["conversation_id"])
+        self.assertTrue(rated.is_helpful)
+        self.assertEqual(rated.matched_knowledge.category, "payment")
+
+    def test_rating_for_another_process_is_applied_on_save(self):
+        import uuid
+
+        from main.chatbot_index import save_conversation_batch
+        from main.chatbot_models import ChatbotConversation
+        from main.chatbot_service import IdrissmartChatbot
+
+        from django.core.cache import cache
+
+        from main.chatbot_index import PENDING_RATING_KEY, UNRATED
+
+        # Unknown references are refused
+        self.assertFalse(IdrissmartChatbot().rate_response(str(uuid.uuid4()), True))
+
+        # Issued by another process, whose buffer is not written yet
+        reference = uuid.uuid4()
+        cache.set(PENDING_RATING_KEY.format(reference), UNRATED)
+        self.assertTrue(IdrissmartChatbot().rate_response(str(reference), False))
+        save_conversation_batch(
+            [{"reference": reference, "session_id": "s2", "user_id": None,
+              "user_message": "hi", "bot_response": "hello", "matched_knowledge_id": None}]
+        )
+        self.assertIs(ChatbotConversation.objects.get(reference=reference).is_helpful, False)
+
+    def test_idle_buffer_is_flushed_by_timer_and_history_uses_references(self):
+        from main import chatbot_index
+        from main.chatbot_models import ChatbotConversation
+        from main.chatbot_service import IdrissmartChatbot
+
+        with patch.object(chatbot_index._flush_timer, "arm") as arm:
+            reply = IdrissmartChatbot().get_response("مرحبا", session_id="s3")
+        arm.assert_called_once()
+        self.assertFalse(ChatbotConversation.objects.exists())
+
+        # What the timer thread runs once LOG_FLUSH_INTERVAL has passed
+        chatbot_index._flush_timer.flush()
+        response = self.client.get(reverse("main:chatbot_history"), {"session_id": "s3"})
+        self.assertEqual([row["id"] for row in response.json()["history"]], [reply["conversation_id"]])
+
+
+class StartupProfileTests(TestCase):
+    """
+    Tests for the lazily imported URLconf views and the cold-start budget.
+    """
+
+    def test_lazy_view_resolves_on_first_call(self):
+        from django.test import RequestFactory
+
+        from main.lazy_views import LazyView, lazy_module
+
+        view = lazy_module("django.views.generic").RedirectView.as_view(url="/elsewhere/")
+        self.assertIsInstance(view, LazyView)
+        self.assertIsNone(view._lazy_view)
+        response = view(RequestFactory().get("/"))
+        self.assertEqual(response["Location"], "/elsewhere/")
+        # Attributes middleware reads before calling come from the real view
+        self.assertTrue(lazy_module("main.chatbot_views").chatbot_message.csrf_exempt)
+        self.assertEqual(view.view_class.__name__, "RedirectView")
+
+    def test_every_lazy_view_in_urlconf_resolves(self):
+        from django.urls import path
+
+        from main.lazy_views import check_lazy_views, iter_lazy_views, lazy_module
+
+        self.assertEqual(check_lazy_views(), [])
+
+        # A misspelled view is reported by the system check, not on first request
+        views = lazy_module("main.chatbot_views")
+        patterns = [path("typo/", views.chatbot_mesage, name="typo")]
+        with patch("main.lazy_views.get_resolver") as get_resolver:
+            get_resolver.return_value.url_patterns = patterns
+            errors = check_lazy_views()
+        self.assertEqual([error.id for error in errors], ["main.E001"])
+        self.assertIn("chatbot_mesage", errors[0].msg)
+        self.assertEqual([route for route, _ in iter_lazy_views(patterns)], ["typo/"])
+
+    def test_budget_and_importtime_parsing(self):
+        from main.startup_profile import check_budget, parse_importtime
+
+        rows = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   main.lazy_views\n"
+            "import time:      5000 |       9000 | main.urls\n"
+        )
+        self.assertEqual(rows, [("main.lazy_views", 120, 120, 1), ("main.urls", 5000, 9000, 0)])
+
+        budget = {"COLD_START_MS": 1000, "RSS_MB": 100}
+        ok = {"total_ms": 900, "rss_mb": 90, "view_modules": []}
+        self.assertEqual(check_budget(ok, budget), [])
+        slow = {"total_ms": 1500, "rss_mb": 90, "view_modules": ["main.views"]}
+        self.assertEqual(len(check_budget(slow, budget)), 2)
+
+    def test_urlconf_loads_without_view_modules(self):
+        from main.startup_profile import measure_cold_start
+
+        measurement = measure_cold_start(runs=1)
+        self.assertEqual(measurement["view_modules"], [])
+        self.assertGreater(measurement["urls_ms"], 0)
+
+
+class WarmupTests(TestCase):
+    """
+    Tests for the read-only registries and the process warm-up run before forking.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        from main.models import CategoryCustomField, CustomField, CustomFieldOption
+
+        cls.country, _ = Country.objects.get_or_create(
+            code="EG", defaults={"name": "مصر", "currency": "EGP"}
+        )
+        cls.category = Category.objects.create(
+            name="Warm Cat",
+            slug="warm-cat",
+            slug_ar="warm-cat-ar",
+            section_type=Category.SectionType.CLASSIFIED,
+        )
+        cls.field = CustomField.objects.create(
+            name="condition", label_ar="الحالة", label_en="Condition", field_type="select"
+        )
+        CustomFieldOption.objects.create(custom_field=cls.field, label_ar="جديد", label_en="New", value="new")
+        CategoryCustomField.objects.create(
+            category=cls.category, custom_field=cls.field, show_on_card=True, show_in_filters=True
+        )
+
+    def setUp(self):
+        from main.registries import REGISTRIES
+
+        for registry in REGISTRIES:
+            registry._snapshot = None
+
+    def test_registries_serve_without_queries(self):
+        from main.registries import get_country, get_custom_field_schemas
+
+        user = User.objects.create_user(username="warmowner", email="warmowner@example.com", password="pass12345")
+        ad = ClassifiedAd.objects.create(
+            user=user,
+            category=self.category,
+            country=self.country,
+            title="Warm ad",
+            price=100,
+            city="Cairo",
+            custom_fields={"custom_condition": "new"},
+        )
+        get_country("EG")
+        get_custom_field_schemas()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_country("EG"), self.country)
+            self.assertIsNone(get_country("ZZ"))
+            self.assertEqual(len(get_custom_field_schemas().filter_fields(self.category.pk)), 1)
+            self.assertEqual(ad.get_custom_fields_for_card()[0]["value"], "جديد")
+
+    def test_registry_is_rebuilt_on_change(self):
+        from main.registries import get_country, get_custom_field_schemas
+
+        self.assertIsNone(get_country("JO"))
+        self.assertEqual(len(get_custom_field_schemas().card_fields(self.category.pk)), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Country.objects.create(code="JO", name="الأردن")
+            self.field.categorycustomfield_set.update(show_on_card=False)
+            self.field.save()
+        self.assertEqual(get_country("JO").name, "الأردن")
+        self.assertEqual(get_custom_field_schemas().card_fields(self.category.pk), ())
+
+    def test_warm_process_resolves_lazy_views(self):
+        from django.urls import resolve
+
+        from main.warmup import warm_process
+
+        report = warm_process()
+        self.assertEqual(
+            list(report), ["urls", "registries", "indexes", "translations", "templates"]
+        )
+        self.assertFalse([name for name, step in report.items() if "error" in step])
+        self.assertGreater(report["urls"]["lazy_views_resolved"], 100)
+        self.assertIsNotNone(resolve(reverse("main:home")).func._lazy_view)
+
+    def test_prime_shared_cache(self):
+        from main.registries import get_active_countries
+        from main.warmup import prime_shared_cache, warmup_settings
+
+        options = warmup_settings()
+        options["URLS"] = ["/api/countries/"]
+        results = prime_shared_cache(options)
+        # Once per language, without and with each active country
+        self.assertEqual(len(results), 2 * (1 + len(get_active_countries())))
+        self.assertEqual({status for _path, _language, status, _ms in results}, {200})
+
+
+class CategoryTreeTests(TestCase):
+    """
+    Tests for the in-memory category tree serving the header, sidebars and
+    subcategory endpoints.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.egypt, _ = Country.objects.get_or_create(code="EG", defaults={"name": "مصر", "currency": "EGP"})
+        cls.jordan, _ = Country.objects.get_or_create(code="JO", defaults={"name": "الأردن", "currency": "JOD"})
+        cls.root = Category.objects.create(
+            name="Tree Root",
+            slug="tree-root", slug_ar="tree-root-ar",
+            section_type=Category.SectionType.CLASSIFIED,
+            ad_creation_price=25,
+        )
+        cls.child = Category.objects.create(
+            name="Tree Child", slug="tree-child", slug_ar="tree-child-ar", parent=cls.root, section_type=Category.SectionType.CLASSIFIED
+        )
+        cls.jordan_only = Category.objects.create(
+            name="Tree Jordan",
+            slug="tree-jordan", slug_ar="tree-jordan-ar",
+            parent=cls.root,
+            section_type=Category.SectionType.CLASSIFIED,
+            order=1,
+        )
+        cls.jordan_only.countries.add(cls.jordan)
+        cls.leaf = Category.objects.create(
+            name="Tree Leaf", slug="tree-leaf", slug_ar="tree-leaf-ar", parent=cls.child, section_type=Category.SectionType.CLASSIFIED
+        )
+        cls.inactive = Category.objects.create(
+            name="Tree Hidden",
+            slug="tree-hidden", slug_ar="tree-hidden-ar",
+            parent=cls.root,
+            section_type=Category.SectionType.CLASSIFIED,
+            is_active=False,
+        )
+
+    def setUp(self):
+        from main.registries import category_tree
+
+        category_tree._snapshot = None
+
+    def test_tree_matches_mptt(self):
+        from main.registries import get_category_tree
+
+        expected = set(self.root.get_descendants(include_self=True).values_list("pk", flat=True))
+        tree = get_category_tree()
+        with self.assertNumQueries(0):
+            self.assertEqual(tree.descendant_ids(self.root.pk), expected)
+            self.assertEqual(tree.ancestors(self.leaf.pk), [self.root, self.child])
+            self.assertEqual(tree.get_by_slug("tree-leaf").effective_price, 25)
+            # Inactive children are counted but never listed
+            self.assertEqual(tree.child_count(self.root.pk), 3)
+            self.assertEqual([node.id for node in tree.children(self.root.pk)], [self.child.pk, self.jordan_only.pk])
+
+    def test_country_visibility(self):
+        from main.registries import get_category_tree
+
+        tree = get_category_tree()
+        self.assertEqual([node.id for node in tree.children(self.root.pk, self.egypt.pk)], [self.child.pk])
+        self.assertEqual(
+            [node.id for node in tree.children(self.root.pk, self.jordan.pk)], [self.child.pk, self.jordan_only.pk]
+        )
+
+    def test_tree_is_rebuilt_on_change(self):
+        from main.registries import get_category_tree
+
+        self.assertFalse(get_category_tree().has_children(self.leaf.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(
+                name="Tree Twig", slug="tree-twig", slug_ar="tree-twig-ar", parent=self.leaf, section_type=Category.SectionType.CLASSIFIED
+            )
+        self.assertTrue(get_category_tree().has_children(self.leaf.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jordan_only.countries.remove(self.jordan)
+        self.assertEqual(len(get_category_tree().children(self.root.pk, self.egypt.pk)), 2)
+
+    def test_subcategory_endpoint_uses_tree(self):
+        from main.registries import get_category_tree
+
+        get_category_tree()
+        response = self.client.get(reverse("main:ajax_get_subcategories", args=[self.root.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row["id"] for row in data["subcategories"]], [self.child.pk, self.jordan_only.pk])
+        self.assertTrue(data["subcategories"][0]["has_children"])
+        self.assertEqual(
+            self.client.get(reverse("main:ajax_get_subcategories", args=[999999])).status_code, 404
+        )
+
+
+class BulkSeedTests(TestCase):
+    """
+    Tests for the chunked bulk seeding used by the populate commands and the benchmark dataset.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "مصر", "currency": "EGP"})
+
+    def test_category_tree_mptt_fields_match_rebuild(self):
+        from main.bulk_seed import seed_category_tree
+
+        created = seed_category_tree(roots=2, fanout=3, depth=3, country=self.country, prefix="bulk-cat")
+        self.assertEqual(created, 2 * (1 + 3 + 9))
+
+        fields = ("pk", "parent_id", "tree_id", "lft", "rght", "level")
+        seeded = list(Category.objects.filter(slug__startswith="bulk-cat-").order_by("pk").values_list(*fields))
+        Category.objects.rebuild()
+        rebuilt = list(Category.objects.filter(slug__startswith="bulk-cat-").order_by("pk").values_list(*fields))
+        self.assertEqual(seeded, rebuilt)
+
+        leaf = Category.objects.filter(slug__startswith="bulk-cat-", level=2).first()
+        self.assertEqual(len(leaf.get_ancestors()), 2)
+
+    def test_seed_users_and_ads_are_deterministic_and_silent(self):
+        import tempfile
+
+        from django.core import mail
+
+        from main.bulk_seed import count_seeded_ads, seed_ads, seed_category_tree, seed_users
+        from main.models import AdImage, Notification, UserPackage
+
+        seed_category_tree(roots=1, fanout=2, depth=2, country=self.country, prefix="bulk-ad-cat")
+        category_ids = list(
+            Category.objects.filter(slug__startswith="bulk-ad-cat-", parent__isnull=False).values_list("pk", flat=True)
+        )
+        self.assertEqual(seed_users(12, prefix="bulk_user_", chunk_size=5), 12)
+        user_ids = list(User.objects.filter(username__startswith="bulk_user_").values_list("pk", flat=True))
+        self.assertEqual(UserPackage.objects.filter(user_id__in=user_ids).count(), 0)
+
+        def seed():
+            seed_ads(25, self.country, category_ids, user_ids, images_per_ad=2, image_pool_size=3, chunk_size=10)
+            return list(
+                ClassifiedAd.objects.filter(slug__contains="-seed-")
+                .order_by("slug")
+                .values_list("slug", "title", "price", "user_id", "category_id", "status")
+            )
+
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            first = seed()
+            self.assertEqual(count_seeded_ads(), 25)
+            images = AdImage.objects.filter(ad__slug__contains="-seed-")
+            self.assertGreaterEqual(images.count(), 25)
+            self.assertLessEqual(images.values("image").distinct().count(), 3)
+
+            ClassifiedAd.objects.filter(slug__contains="-seed-").delete()
+            self.assertEqual(seed(), first)
+
+        # Spread over the last 30 days, not all stamped "now"
+        created = ClassifiedAd.objects.filter(slug__contains="-seed-").values_list("created_at", flat=True)
+        self.assertGreater(len({stamp.date() for stamp in created}), 1)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(Notification.objects.filter(user_id__in=user_ids).exists())
+
+    def test_seed_reviews_refreshes_ratings(self):
+        from main.bulk_seed import seed_reviews, seed_users
+        from main.models import AdReview
+
+        seed_users(4, prefix="bulk_reviewer_")
+        user_ids = list(User.objects.filter(username__startswith="bulk_reviewer_").values_list("pk", flat=True))
+        category = Category.objects.create(
+            name="Bulk Reviews",
+            slug="bulk-reviews",
+            slug_ar="bulk-reviews-ar",
+            section_type=Category.SectionType.CLASSIFIED,
+        )
+        ad = ClassifiedAd(
+            user_id=user_ids[0], category=category, country=self.country, title="Reviewed", slug="reviewed", price=10
+        )
+        ClassifiedAd.objects.bulk_create([ad])
+        ad = ClassifiedAd.objects.get(slug="reviewed")
+
+        seed_reviews(10, [ad.pk], user_ids, chunk_size=3)
+        approved = AdReview.objects.filter(ad=ad, is_approved=True)
+        self.assertLessEqual(AdReview.objects.filter(ad=ad).count(), 4)
+        ad.refresh_from_db()
+        self.assertEqual(ad.rating_count, approved.count())
+
+
+class RecommendationTests(TestCase):
+    """
+    Tests for the precomputed similar ads of ad detail pages and the API.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "مصر", "currency": "EGP"})
+        cls.root = Category.objects.create(
+            name="Reco Root", slug="reco-root", slug_ar="reco-root-ar", section_type=Category.SectionType.CLASSIFIED
+        )
+        cls.cars = Category.objects.create(
+            name="Reco Cars", slug="reco-cars", slug_ar="reco-cars-ar", parent=cls.root,
+            section_type=Category.SectionType.CLASSIFIED,
+        )
+        cls.bikes = Category.objects.create(
+            name="Reco Bikes", slug="reco-bikes", slug_ar="reco-bikes-ar", parent=cls.root,
+            section_type=Category.SectionType.CLASSIFIED,
+        )
+        cls.other = Category.objects.create(
+            name="Reco Other", slug="reco-other", slug_ar="reco-other-ar", section_type=Category.SectionType.CLASSIFIED
+        )
+        cls.user = User.objects.create_user(username="recoowner", email="recoowner@example.com", password="pass12345")
+
+    def setUp(self):
+        from main.registries import category_tree
+
+        category_tree._snapshot = None
+
+    def make_ad(self, category, price, city="Cairo", **kwargs):
+        return ClassifiedAd.objects.create(
+            user=self.user,
+            category=category,
+            country=self.country,
+            title=f"Reco ad {price}",
+            price=price,
+            city=city,
+            status=ClassifiedAd.AdStatus.ACTIVE,
+            **kwargs,
+        )
+
+    def test_ranks_by_category_price_and_city(self):
+        from main.recommendations import refresh_recommendations
+
+        ad = self.make_ad(self.cars, 1000, custom_fields={"gear": "auto"})
+        same_all = self.make_ad(self.cars, 1100, custom_fields={"gear": "auto"})
+        other_city = self.make_ad(self.cars, 1100, city="Alexandria")
+        far_price = self.make_ad(self.cars, 3500)
+        sibling = self.make_ad(self.bikes, 1000)
+        unrelated = self.make_ad(self.other, 1000)
+
+        results = refresh_recommendations([ad.pk])
+        self.assertEqual(results[ad.pk], [same_all.pk, other_city.pk, far_price.pk, sibling.pk])
+        self.assertNotIn(unrelated.pk, results[ad.pk])
+        self.assertEqual(ad.recommendation.similar_ids, results[ad.pk])
+
+    def test_co_wishlisted_ads_are_boosted(self):
+        from main.models import Wishlist, WishlistItem
+        from main.recommendations import refresh_recommendations
+
+        ad = self.make_ad(self.cars, 1000)
+        close = self.make_ad(self.cars, 1000)
+        saved_together = self.make_ad(self.cars, 2000, city="Alexandria")
+        # Outside the category walk, reached through the wishlists only
+        saved_elsewhere = self.make_ad(self.other, 1000)
+        for index in range(3):
+            shopper = User.objects.create_user(
+                username=f"recoshopper{index}", email=f"recoshopper{index}@example.com", password="pass12345"
+            )
+            wishlist = Wishlist.objects.create(user=shopper)
+            WishlistItem.objects.create(wishlist=wishlist, ad=ad)
+            WishlistItem.objects.create(wishlist=wishlist, ad=saved_together)
+            WishlistItem.objects.create(wishlist=wishlist, ad=saved_elsewhere)
+
+        self.assertEqual(
+            refresh_recommendations([ad.pk])[ad.pk], [saved_together.pk, close.pk, saved_elsewhere.pk]
+        )
+
+    def test_job_refreshes_changed_ads_and_their_neighbours(self):
+        from main.models import AdRecommendation
+        from main.scheduled_tasks import refresh_ad_recommendations_task
+
+        first = self.make_ad(self.cars, 1000)
+        second = self.make_ad(self.cars, 1200)
+        result = refresh_ad_recommendations_task()
+        self.assertTrue(result["success"])
+        self.assertEqual(AdRecommendation.objects.get(ad=first).similar_ids, [second.pk])
+
+        newcomer = self.make_ad(self.cars, 1050)
+        ClassifiedAd.objects.filter(pk=second.pk).update(status=ClassifiedAd.AdStatus.EXPIRED)
+        result = refresh_ad_recommendations_task()
+        self.assertTrue(result["success"])
+        # The new ad shows up in its neighbour's list, the expired one is gone
+        self.assertEqual(AdRecommendation.objects.get(ad=first).similar_ids, [newcomer.pk])
+        self.assertFalse(AdRecommendation.objects.filter(ad=second).exists())
+
+    def test_detail_lookup_reads_precomputed_ids(self):
+        from main.models import AdRecommendation
+        from main.recommendations import get_similar_ads, refresh_recommendations_task
+
+        ad = self.make_ad(self.cars, 1000)
+        near = self.make_ad(self.cars, 1100)
+        hidden = self.make_ad(self.cars, 1000)
+
+        # Not computed yet: queued once, same-category fallback meanwhile
+        with patch("django_q.tasks.async_task") as async_task:
+            self.assertEqual([similar.pk for similar in get_similar_ads(ad, limit=5)], [hidden.pk, near.pk])
+            get_similar_ads(ad, limit=5)
+        async_task.assert_called_once_with("main.recommendations.refresh_recommendations_task", [ad.pk])
+        self.assertFalse(AdRecommendation.objects.filter(ad=ad).exists())
+
+        # Inactive ads are neither computed nor queued
+        sold = self.make_ad(self.cars, 1000)
+        ClassifiedAd.objects.filter(pk=sold.pk).update(status=ClassifiedAd.AdStatus.SOLD)
+        sold.refresh_from_db()
+        with patch("django_q.tasks.async_task") as async_task:
+            self.assertEqual(get_similar_ads(sold), [])
+        async_task.assert_not_called()
+
+        # Served from the stored row once the task has run
+        refresh_recommendations_task([ad.pk])
+        self.assertEqual([similar.pk for similar in get_similar_ads(ad, limit=5)], [hidden.pk, near.pk])
+        ClassifiedAd.objects.filter(pk=hidden.pk).update(is_hidden=True)
+        with self.assertNumQueries(4):
+            # ids, ads, then the images and features prefetches
+            self.assertEqual([similar.pk for similar in get_similar_ads(ad, limit=5)], [near.pk])
+
+
+class AdRankingTests(TestCase):
+    """
+    Tests for the persisted listing rank (rank_tier / rank_score).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.country, _ = Country.objects.get_or_create(code="EG", defaults={"name": "مصر", "currency": "EGP"})
+        cls.category = Category.objects.create(
+            name="Rank Cat", slug="rank-cat", slug_ar="rank-cat-ar", section_type=Category.SectionType.CLASSIFIED
+        )
+        cls.user = User.objects.create_user(username="rankowner", email="rankowner@example.com", password="pass12345")
+
+    def make_ad(self, title, hours_old=0, **kwargs):
+        ad = ClassifiedAd.objects.create(
+            user=self.user,
+            category=self.category,
+            country=self.country,
+            title=title,
+            price=500,
+            city="Cairo",
+            status=ClassifiedAd.AdStatus.ACTIVE,
+            **kwargs,
+        )
+        if hours_old:
+            ClassifiedAd.objects.filter(pk=ad.pk).update(
+                created_at=timezone.now() - timezone.timedelta(hours=hours_old)
+            )
+            ad.refresh_from_db()
+            ad.save()
+        return ad
+
+    def test_listing_and_featured_order(self):
+        plain_new = self.make_ad("Plain new")
+        plain_old = self.make_ad("Plain old", hours_old=24 * 30)
+        highlighted = self.make_ad("Highlighted", hours_old=24 * 10, is_highlighted=True)
+        urgent = self.make_ad("Urgent", hours_old=24 * 20, is_urgent=True)
+        pinned = self.make_ad("Pinned", hours_old=24 * 40, is_pinned=True, is_highlighted=True)
+
+        self.assertEqual((pinned.rank_tier, urgent.rank_tier, highlighted.rank_tier, plain_new.rank_tier), (5, 2, 1, 0))
+        listing = ClassifiedAd.objects.active_for_country("EG").filter(category=self.category)
+        self.assertEqual(
+            [ad.pk for ad in listing], [pinned.pk, urgent.pk, highlighted.pk, plain_new.pk, plain_old.pk]
+        )
+        featured = ClassifiedAd.objects.featured_for_country("EG").filter(category=self.category)
+        self.assertEqual([ad.pk for ad in featured], [pinned.pk, highlighted.pk])
+
+    def test_upgrade_expiry_lowers_rank(self):
+        from main.models import AdUpgradeHistory
+
+        ad = self.make_ad("Urgent ad")
+        upgrade = AdUpgradeHistory.objects.create(ad=ad, upgrade_type="urgent", price_paid=10, duration_days=3)
+        ad.refresh_from_db()
+        self.assertEqual(ad.rank_tier, 2)
+
+        AdUpgradeHistory.objects.filter(pk=upgrade.pk).update(end_date=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(ad.check_and_expire_upgrades(), 1)
+        self.assertEqual((ad.is_urgent, ad.rank_tier), (False, 0))
+        self.assertLess(ad.rank_score, 1_000_000)
+
+    def test_featured_section_feature_outlives_highlight_upgrade(self):
+        from main.models import AdFeature, AdUpgradeHistory
+
+        ad = self.make_ad("Featured ad")
+        AdFeature.objects.create(
+            ad=ad,
+            feature_type=AdFeature.FeatureType.FEATURED_SECTION,
+            end_date=timezone.now() + timezone.timedelta(days=7),
+            is_active=True,
+        )
+        upgrade = AdUpgradeHistory.objects.create(ad=ad, upgrade_type="highlighted", price_paid=10, duration_days=3)
+        AdUpgradeHistory.objects.filter(pk=upgrade.pk).update(end_date=timezone.now() - timezone.timedelta(hours=1))
+
+        self.assertEqual(ad.check_and_expire_upgrades(), 1)
+        self.assertTrue(ad.is_highlighted)
+        featured = ClassifiedAd.objects.featured_for_country("EG").filter(category=self.category)
+        self.assertEqual([row.pk for row in featured], [ad.pk])
+
+        # The feature lapses: the expiry job unhighlights the ad
+        AdFeature.objects.filter(ad=ad).update(end_date=timezone.now() - timezone.timedelta(hours=1))
+        self.assertEqual(ad.check_and_expire_upgrades(), 1)
+        self.assertEqual((ad.is_highlighted, ad.rank_tier), (False, 0))
+        self.assertFalse(featured.all().exists())
+
+    def test_deactivating_featured_section_feature_keeps_upgrade_highlight(self):
+        from main.models import AdFeature, AdUpgradeHistory
+
+        ad = self.make_ad("Upgraded ad")
+        feature = AdFeature.objects.create(
+            ad=ad,
+            feature_type=AdFeature.FeatureType.FEATURED_SECTION,
+            end_date=timezone.now() + timezone.timedelta(days=7),
+        )
+        self.assertTrue(ClassifiedAd.objects.get(pk=ad.pk).is_highlighted)
+        AdUpgradeHistory.objects.create(ad=ad, upgrade_type="highlighted", price_paid=10, duration_days=3)
+
+        feature.deactivate()
+        self.assertTrue(ClassifiedAd.objects.get(pk=ad.pk).is_highlighted)
+
+        AdUpgradeHistory.objects.filter(ad=ad).update(is_active=False)
+        feature.save()
+        ad.refresh_from_db()
+        self.assertEqual((ad.is_highlighted, ad.rank_tier), (False, 0))
+
+    def test_rank_job_refreshes_changed_ads_only(self):
+        from main.scheduled_tasks import refresh_ad_ranks_task
+
+        popular = self.make_ad("Popular")
+        quiet = self.make_ad("Quiet")
+        ClassifiedAd.objects.filter(pk=popular.pk).update(views_count=200)
+        self.assertEqual(refresh_ad_ranks_task()["count"], 1)
+        popular.refresh_from_db()
+        self.assertGreater(popular.rank_score, quiet.rank_score)
+
+        # Nothing changed since: nothing written
+        self.assertEqual(refresh_ad_ranks_task()["count"], 0)
+
+
+class TranslationWorkspaceTests(TestCase):
+    """Cached .po catalogs, debounced compilation and background auto-translation."""
+
+    PO = (
+        'msgid ""\nmsgstr ""\n"Content-Type: text/plain; charset=UTF-8\\n"\n\n'
+        'msgid "مرحبا"\nmsgstr ""\n\n'
+        'msgid "لديك %(count)s رسائل"\nmsgstr ""\n\n'
+        '#, fuzzy\nmsgid "حفظ"\nmsgstr "Sve"\n\n'
+        'msgid "إلغاء"\nmsgstr "Cancel"\n'
+    )
+
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+
+        from main.translation_workspace import catalogs
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.locale = Path(directory.name)
+        (self.locale / "en" / "LC_MESSAGES").mkdir(parents=True)
+        self.po = self.locale / "en" / "LC_MESSAGES" / "django.po"
+        self.po.write_text(self.PO, encoding="utf-8")
+
+        overrides = self.settings(
+            TRANSLATIONS={"LOCALE_PATH": self.locale, "SOURCE_LANGUAGE": "ar", "BATCH_SIZE": 2, "COMPILE_DELAY": 30}
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.catalogs = catalogs
+
+    def test_catalog_parsed_once_and_stats_updated_on_save(self):
+        from django_q.models import Schedule
+
+        with patch("main.translation_workspace.polib.pofile", wraps=__import__("polib").pofile) as parse:
+            first = self.catalogs.get("en")
+            self.assertIs(self.catalogs.get("en"), first)
+            self.assertEqual(parse.call_count, 1)
+
+            stats = first.stats("en")
+            self.assertEqual((stats["total"], stats["translated"], stats["fuzzy"]), (4, 1, 1))
+
+            self.catalogs.save("en", {"مرحبا": "Hello", "حفظ": "Save"})
+            self.catalogs.save("en", {"لديك %(count)s رسائل": "You have %(count)s messages"})
+            # Saved through the cache: counts adjusted, file not parsed again
+            self.assertEqual(parse.call_count, 1)
+            stats = self.catalogs.get("en").stats("en")
+            self.assertEqual((stats["translated"], stats["untranslated"], stats["fuzzy"]), (4, 0, 0))
+
+            # Edited outside the admin: parsed again
+            self.po.write_text(self.PO + '\nmsgid "جديد"\nmsgstr ""\n', encoding="utf-8")
+            self.assertEqual(self.catalogs.get("en").stats("en")["total"], 5)
+            self.assertEqual(parse.call_count, 2)
+
+        # Both saves debounced into one compilation
+        self.assertEqual(Schedule.objects.filter(name="Compile translations (en)").count(), 1)
+
+    def test_failed_save_does_not_keep_unsaved_edits(self):
+        with patch("main.translation_workspace.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.catalogs.save("en", {"مرحبا": "Hello"})
+        # The cache matches the file again
+        self.assertEqual(self.catalogs.get("en").by_msgid["مرحبا"].msgstr, "")
+        self.assertEqual(self.catalogs.get("en").stats("en")["translated"], 1)
+        self.assertFalse(self.po.with_name("django.po.tmp").exists())
+
+    def test_compile_writes_mo_and_bumps_registry(self):
+        from django.core.cache import cache
+
+        from main.translation_workspace import compile_translations_task, mo_path
+
+        self.catalogs.save("en", {"مرحبا": "Hello"})
+        self.assertFalse(mo_path("en").exists())
+
+        before = cache.get("registry_version:translations")
+        with self.captureOnCommitCallbacks(execute=True):
+            result = compile_translations_task("en")
+        self.assertTrue(result["success"])
+        self.assertTrue(mo_path("en").exists())
+        self.assertNotEqual(cache.get("registry_version:translations"), before)
+
+    def test_auto_translation_uses_memory_and_rejects_broken_placeholders(self):
+        from main.models import TranslationJob, TranslationMemory
+        from main.translation_workspace import start_auto_translation
+
+        answers = {"مرحبا": "Hello", "لديك %(count)s رسائل": "You have messages", "حفظ": "Save", "إلغاء": "Cancel"}
+        translator = patch("main.translation_workspace.get_translator").start()
+        self.addCleanup(patch.stopall)
+        translator.return_value.translate_batch.side_effect = lambda texts: [answers[text] for text in texts]
+
+        with patch("django_q.tasks.async_task", side_effect=RuntimeError("no cluster")):
+            job = start_auto_translation("en")
+        job.refresh_from_db()
+        self.assertEqual(job.status, TranslationJob.Status.COMPLETED)
+        self.assertEqual((job.total, job.translated, job.skipped, job.failed), (2, 1, 2, 1))
+
+        entries = self.catalogs.get("en").by_msgid
+        self.assertEqual(entries["مرحبا"].msgstr, "Hello")
+        # The placeholder was dropped: left untranslated
+        self.assertEqual(entries["لديك %(count)s رسائل"].msgstr, "")
+        self.assertEqual(TranslationMemory.objects.count(), 1)
+
+        # Overwriting: the remembered text is not sent again
+        translator.return_value.translate_batch.reset_mock()
+        with patch("django_q.tasks.async_task", side_effect=RuntimeError("no cluster")):
+            job = start_auto_translation("en", overwrite=True)
+        job.refresh_from_db()
+        self.assertEqual(job.from_memory, 1)
+        sent = [text for call in translator.return_value.translate_batch.call_args_list for text in call.args[0]]
+        self.assertNotIn("مرحبا", sent)
+        self.assertIn("حفظ", sent)
+        self.assertEqual(self.catalogs.get("en").by_msgid["حفظ"].msgstr, "Save")
+
+    def test_auto_translation_runs_one_task_per_batch_and_saves_as_it_goes(self):
+        import polib
+        from django.utils.module_loading import import_string
+
+        from main.models import TranslationJob
+        from main.translation_workspace import start_auto_translation
+
+        answers = {"مرحبا": "Hello", "لديك %(count)s رسائل": "You have %(count)s messages", "حفظ": "Save", "إلغاء": "Cancel"}
+        translator = patch("main.translation_workspace.get_translator").start()
+        self.addCleanup(patch.stopall)
+        translator.return_value.translate_batch.side_effect = lambda texts: [answers[text] for text in texts]
+
+        queued = []
+
+        def queue(func, job_id, **kwargs):
+            # What the .po file holds when the next step is queued
+            saved = {entry.msgid for entry in polib.pofile(str(self.po)) if entry.msgstr and entry.msgstr in answers.values()}
+            queued.append((kwargs["timeout"], saved))
+            return import_string(func)(job_id)
+
+        with patch("django_q.tasks.async_task", queue):
+            job = start_auto_translation("en", overwrite=True)
+        job.refresh_from_db()
+
+        self.assertEqual(job.status, TranslationJob.Status.COMPLETED)
+        self.assertEqual((job.total, job.translated, job.failed, job.pending), (4, 4, 0, []))
+        # Listing step, then two provider batches of two
+        self.assertEqual([timeout for timeout, _ in queued], [120, 120, 120])
+        self.assertEqual(translator.return_value.translate_batch.call_count, 2)
+        # The first batch was in the file before the second one was sent
+        self.assertEqual(queued[2][1], {"مرحبا", "لديك %(count)s رسائل", "إلغاء"})
+
+    def test_stalled_translation_job_is_marked_failed(self):
+        from datetime import timedelta
+
+        from main.models import TranslationJob
+        from main.scheduled_tasks import fail_stalled_translation_jobs_task
+
+        stalled = TranslationJob.objects.create(
+            language="en", status=TranslationJob.Status.RUNNING, progress_at=timezone.now() - timedelta(minutes=30)
+        )
+        fresh = TranslationJob.objects.create(language="en", status=TranslationJob.Status.RUNNING, progress_at=timezone.now())
+
+        self.assertEqual(fail_stalled_translation_jobs_task()["count"], 1)
+        stalled.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stalled.status, TranslationJob.Status.FAILED)
+        self.assertTrue(stalled.error)
+        self.assertEqual(fresh.status, TranslationJob.Status.RUNNING)
+
+    def test_job_status_view(self):
+        from main.models import TranslationJob
+
+        admin = User.objects.create_superuser(username="translator", password="pass12345", email="t@example.com")
+        self.client.force_login(admin)
+        job = TranslationJob.objects.create(language="en", status=TranslationJob.Status.RUNNING, total=4, translated=1)
+        response = self.client.get(reverse("main:admin_translations_job_status", args=[job.pk]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["percent"], data["finished"]), (25, False))
+
+        response = self.client.get(reverse("main:admin_translations_get", args=["..%2Fetc"]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,640 @@
+"""
+Translation workspace
+مساحة عمل الترجمات
+
+The translation admin (admin_translations_* in main.views) re-parsed every
+locale/<lang>/LC_MESSAGES/django.po with polib on each request, and
+auto-translation called Google Translate chunk by chunk inside the request
+before rewriting the .po and the .mo, holding a worker for minutes.
+
+  - catalogs are parsed once per process and kept with the file's mtime and
+    size, so a request only stats the file. The editor rows and per-state
+    counts are built at parse time; saves adjust the counts of the entries
+    they change instead of counting again;
+  - saves write the .po atomically (temporary file + rename, under a file
+    lock) and schedule the .mo compilation COMPILE_DELAY seconds later.
+    Every further save pushes it back, so a burst of edits compiles once;
+  - auto-translation is a chain of Django-Q tasks tracked by a TranslationJob
+    row. Texts are looked up in TranslationMemory first, only the rest are
+    sent to the provider, one batch of BATCH_SIZE per task (each with a
+    BATCH_TIMEOUT timeout, queuing the next), and every answer is stored and
+    saved into the catalog as its batch completes, so a msgid is never sent
+    twice and a stopped job keeps what it translated. Answers that lose or
+    alter a placeholder (%(name)s, %s, {count}) are rejected. A running job
+    that has not moved for STALL_AFTER seconds (its task was killed) is
+    marked failed by fail_stalled_translation_jobs;
+  - compiling bumps the "translations" registry (main.registries): every
+    process drops its gettext catalogs within a few seconds
+    (TranslationReloadMiddleware) and loads the new .mo on its next request.
+
+Settings (all optional):
+
+    TRANSLATIONS = {
+        "LOCALE_PATH": BASE_DIR / "locale",
+        "SOURCE_LANGUAGE": "ar",  # language of the msgids
+        "BATCH_SIZE": 50,         # texts per provider request
+        "BATCH_TIMEOUT": 120,     # seconds a batch task may run
+        "STALL_AFTER": 600,       # seconds without progress before a job fails
+        "COMPILE_DELAY": 30,      # seconds without saves before compiling
+    }
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+import polib
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_DEFAULTS = {
+    "LOCALE_PATH": None,  # BASE_DIR / "locale"
+    "SOURCE_LANGUAGE": "ar",
+    "BATCH_SIZE": 50,
+    "BATCH_TIMEOUT": 120,
+    "STALL_AFTER": 600,
+    "COMPILE_DELAY": 30,
+}
+
+PROVIDER = "google"
+
+LANGUAGE_RE = re.compile(r"^[A-Za-z]{2,3}([_-][A-Za-z0-9]{2,8})?$")
+PLACEHOLDER_RE = re.compile(r"%\(\w+\)[sdif]|%[sdif]|\{\w*\}")
+
+
+def translation_settings():
+    options = dict(TRANSLATION_DEFAULTS)
+    options.update(getattr(settings, "TRANSLATIONS", {}) or {})
+    options["LOCALE_PATH"] = Path(
+        options["LOCALE_PATH"] or Path(settings.BASE_DIR) / "locale"
+    )
+    return options
+
+
+def is_valid_language(lang):
+    return bool(lang and LANGUAGE_RE.match(lang))
+
+
+def po_path(lang):
+    return translation_settings()["LOCALE_PATH"] / lang / "LC_MESSAGES" / "django.po"
+
+
+def mo_path(lang):
+    return po_path(lang).with_suffix(".mo")
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on *path*.lock across processes (POSIX only)."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def entry_state(entry):
+    if entry.fuzzy:
+        return "fuzzy"
+    if entry.translated():
+        return "translated"
+    return "untranslated"
+
+
+def placeholders(text):
+    return Counter(PLACEHOLDER_RE.findall(text or ""))
+
+
+class Catalog:
+    """A parsed .po file, its editor rows and per-state counts."""
+
+    def __init__(self, path, po, stamp):
+        self.path = path
+        self.po = po
+        self.stamp = stamp
+        self.entries = [entry for entry in po if not entry.obsolete]
+        # First entry per msgid, as POFile.find()
+        self.by_msgid = {}
+        for entry in self.entries:
+            self.by_msgid.setdefault(entry.msgid, entry)
+        self.counts = Counter(entry_state(entry) for entry in self.entries)
+        self._rows = None
+
+    def rows(self):
+        """Entries for the editor: msgid, msgstr and fuzzy flag."""
+        if self._rows is None:
+            self._rows = [
+                {"msgid": entry.msgid, "msgstr": entry.msgstr, "fuzzy": entry.fuzzy}
+                for entry in self.entries
+            ]
+        return self._rows
+
+    def stats(self, code):
+        total = len(self.entries)
+        translated = self.counts["translated"]
+        return {
+            "code": code,
+            "total": total,
+            "translated": translated,
+            "untranslated": self.counts["untranslated"],
+            "fuzzy": self.counts["fuzzy"],
+            "percent": round(translated * 100 / total, 1) if total else 0,
+        }
+
+    def set_msgstr(self, entry, msgstr):
+        before = entry_state(entry)
+        entry.msgstr = msgstr
+        # A translation given by hand or by the provider is no longer fuzzy
+        if msgstr and "fuzzy" in entry.flags:
+            entry.flags.remove("fuzzy")
+        after = entry_state(entry)
+        if before != after:
+            self.counts[before] -= 1
+            self.counts[after] += 1
+        self._rows = None
+
+
+class CatalogCache:
+    """Parsed catalogs of this process, re-parsed only when the file changes."""
+
+    def __init__(self):
+        self._catalogs = {}
+        self._lock = threading.RLock()
+
+    def get(self, lang):
+        """The Catalog of *lang*, or None when it has no .po file."""
+        path = po_path(lang)
+        key = str(path)
+        try:
+            stamp = _stamp(path)
+        except FileNotFoundError:
+            self._catalogs.pop(key, None)
+            return None
+        catalog = self._catalogs.get(key)
+        if catalog is not None and catalog.stamp == stamp:
+            return catalog
+        with self._lock:
+            catalog = self._catalogs.get(key)
+            if catalog is None or catalog.stamp != stamp:
+                catalog = self._catalogs[key] = Catalog(path, polib.pofile(key), stamp)
+            return catalog
+
+    def languages(self):
+        """Codes of the languages with a .po file, sorted."""
+        root = translation_settings()["LOCALE_PATH"]
+        if not root.is_dir():
+            return []
+        return sorted(
+            entry.name
+            for entry in root.iterdir()
+            if entry.is_dir() and (entry / "LC_MESSAGES" / "django.po").exists()
+        )
+
+    def save(self, lang, translations):
+        """
+        Set the msgstr of the msgids in *translations* ({msgid: msgstr}) and
+        write the .po; the number of entries updated. The .mo is compiled
+        later (schedule_compile).
+        """
+        path = po_path(lang)
+        with self._lock, _file_lock(path):
+            catalog = self.get(lang)
+            if catalog is None:
+                raise FileNotFoundError(path)
+            updated = 0
+            temporary = f"{path}.tmp"
+            try:
+                for msgid, msgstr in translations.items():
+                    entry = catalog.by_msgid.get(msgid)
+                    if entry is not None:
+                        catalog.set_msgstr(entry, msgstr)
+                        updated += 1
+                if updated:
+                    catalog.po.save(temporary)
+                    os.replace(temporary, path)
+                    catalog.stamp = _stamp(path)
+            except Exception:
+                # The cached catalog holds edits the file does not: re-parse
+                # the file on the next get()
+                self._catalogs.pop(str(path), None)
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temporary)
+                raise
+        if updated:
+            schedule_compile(lang)
+        return updated
+
+    def compile(self, lang):
+        """Write the .mo of *lang*; the number of entries in the catalog."""
+        path = po_path(lang)
+        with self._lock, _file_lock(path):
+            catalog = self.get(lang)
+            if catalog is None:
+                raise FileNotFoundError(path)
+            target = mo_path(lang)
+            temporary = f"{target}.tmp"
+            catalog.po.save_as_mofile(temporary)
+            os.replace(temporary, target)
+            return len(catalog.entries)
+
+
+catalogs = CatalogCache()
+
+
+def translation_stats():
+    """Per-language counts and the totals shown on the translations page."""
+    languages = []
+    for code in catalogs.languages():
+        try:
+            catalog = catalogs.get(code)
+        except Exception as e:
+            logger.error(f"Error reading the {code} catalog: {e}")
+            continue
+        if catalog is not None:
+            languages.append(catalog.stats(code))
+
+    # All languages share the same source strings: totals from the first,
+    # translated strings averaged across languages
+    base_total = languages[0]["total"] if languages else 0
+    translated = (
+        sum(language["translated"] for language in languages) // len(languages)
+        if languages
+        else 0
+    )
+    return {
+        "languages": languages,
+        "total_strings": base_total,
+        "translated_strings": translated,
+        "completion_rate": round(translated / base_total * 100, 1) if base_total else 0,
+    }
+
+
+# =======================
+# .mo compilation
+# =======================
+
+
+def compile_schedule_name(lang):
+    return f"Compile translations ({lang})"
+
+
+def schedule_compile(lang):
+    """
+    Compile the .mo of *lang* COMPILE_DELAY seconds from now, replacing a
+    compilation already scheduled; compiles right away if the queue is
+    unavailable or the delay is 0.
+    """
+    delay = translation_settings()["COMPILE_DELAY"]
+    if delay:
+        try:
+            from django_q.models import Schedule
+
+            Schedule.objects.update_or_create(
+                name=compile_schedule_name(lang),
+                defaults={
+                    "func": "main.translation_workspace.compile_translations_task",
+                    "args": repr((lang,)),
+                    "schedule_type": Schedule.ONCE,
+                    "repeats": -1,
+                    "next_run": timezone.now() + timedelta(seconds=delay),
+                },
+            )
+            return
+        except Exception as e:
+            logger.error(
+                f"Could not schedule the {lang} .mo compilation, compiling now: {e}"
+            )
+    compile_translations_task(lang)
+
+
+def reload_translation_catalogs():
+    """
+    Drop this process's loaded gettext catalogs (registry builder of
+    main.registries.translations); requests load the .mo files again.
+    """
+    import gettext
+
+    from django.utils.translation import trans_real
+
+    gettext._translations = {}
+    trans_real._translations = {}
+    trans_real._default = None
+    return timezone.now()
+
+
+def compile_translations_task(lang):
+    """
+    Django-Q task: compile the .mo of *lang* and tell every process to
+    reload its catalogs.
+    """
+    from main.registries import translations
+
+    try:
+        count = catalogs.compile(lang)
+    except Exception as e:
+        logger.error(f"❌ Compiling the {lang} translations failed: {e}")
+        return {"success": False, "language": lang, "error": str(e)}
+    translations.invalidate()
+    logger.info(f"✅ Compiled {count} {lang} translations")
+    return {"success": True, "language": lang, "count": count}
+
+
+# =======================
+# Auto-translation
+# =======================
+
+
+def source_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def remembered(source_language, target_language, texts):
+    """{text: translation} of the *texts* already in the translation memory."""
+    from main.models import TranslationMemory
+
+    by_hash = {source_hash(text): text for text in texts}
+    found = {}
+    hashes = list(by_hash)
+    for start in range(0, len(hashes), 500):
+        for digest, translated in TranslationMemory.objects.filter(
+            source_language=source_language,
+            target_language=target_language,
+            source_hash__in=hashes[start : start + 500],
+        ).values_list("source_hash", "translated_text"):
+            found[by_hash[digest]] = translated
+    return found
+
+
+def remember(source_language, target_language, translations, provider=PROVIDER):
+    """Store {text: translation} in the translation memory."""
+    from main.models import TranslationMemory
+
+    TranslationMemory.objects.bulk_create(
+        [
+            TranslationMemory(
+                source_language=source_language,
+                target_language=target_language,
+                source_hash=source_hash(text),
+                source_text=text,
+                translated_text=translated,
+                provider=provider,
+            )
+            for text, translated in translations.items()
+        ],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+def get_translator(source_language, target_language):
+    """The provider client: an object with translate_batch(texts) -> list."""
+    from deep_translator import GoogleTranslator
+
+    return GoogleTranslator(source=source_language, target=target_language)
+
+
+def _queue_step(job_id):
+    """Queue the next step of a TranslationJob; False if the queue is unavailable."""
+    try:
+        from django_q.tasks import async_task
+
+        async_task(
+            "main.translation_workspace.run_auto_translation",
+            job_id,
+            task_name=f"translation_job_{job_id}",
+            timeout=translation_settings()["BATCH_TIMEOUT"],
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Could not queue translation job {job_id}, running inline: {e}")
+        return False
+
+
+def start_auto_translation(lang, overwrite=False, user=None):
+    """Record a TranslationJob and hand it to Django-Q; run inline if the queue is unavailable."""
+    from main.models import TranslationJob
+
+    job = TranslationJob.objects.create(
+        language=lang,
+        overwrite=overwrite,
+        requested_by=user if user and user.is_authenticated else None,
+    )
+    if not _queue_step(job.pk):
+        run_auto_translation(job.pk)
+    return job
+
+
+def run_auto_translation(job_id):
+    """
+    Django-Q task: move a TranslationJob one step on and queue the next step
+    (all the steps, here, if the queue is unavailable).
+    """
+    queue = True
+    while True:
+        result = _run_step(job_id)
+        if not result.pop("more", False):
+            return result
+        # Once the queue has failed, the remaining steps run here
+        queue = queue and _queue_step(job_id)
+        if queue:
+            return result
+
+
+def _run_step(job_id):
+    """
+    The first step lists the entries to translate and fills the ones found
+    in the translation memory; each following step sends one batch to the
+    provider. "more" is set in the result while batches remain.
+    """
+    from main.models import TranslationJob
+
+    try:
+        job = TranslationJob.objects.get(pk=job_id)
+    except TranslationJob.DoesNotExist:
+        return {"success": False, "error": "job not found"}
+    if job.status in (TranslationJob.Status.COMPLETED, TranslationJob.Status.FAILED):
+        return {
+            "success": job.status == TranslationJob.Status.COMPLETED,
+            "translated": job.translated,
+        }
+
+    jobs = TranslationJob.objects.filter(pk=job.pk)
+    # Claim the step: a second delivery of the same task finds progress_at
+    # moved on and leaves the step to the first one
+    if not jobs.filter(status=job.status, progress_at=job.progress_at).update(
+        status=TranslationJob.Status.RUNNING, progress_at=timezone.now()
+    ):
+        return {"success": True, "translated": job.translated, "skipped_step": True}
+
+    options = translation_settings()
+    try:
+        if job.status == TranslationJob.Status.QUEUED:
+            more = _prepare(job, jobs, options["SOURCE_LANGUAGE"])
+        else:
+            more = _translate_batch(
+                job, jobs, options["SOURCE_LANGUAGE"], options["BATCH_SIZE"]
+            )
+    except Exception as e:
+        logger.error(f"❌ Translation job {job.pk} ({job.language}) failed: {e}")
+        jobs.update(
+            status=TranslationJob.Status.FAILED,
+            error=str(e),
+            finished_at=timezone.now(),
+        )
+        return {"success": False, "error": str(e)}
+
+    job.refresh_from_db()
+    if more:
+        return {"success": True, "translated": job.translated, "more": True}
+
+    jobs.update(status=TranslationJob.Status.COMPLETED, finished_at=timezone.now())
+    logger.info(
+        f"✅ Translation job {job.pk} ({job.language}): {job.translated} translated "
+        f"({job.from_memory} from memory), {job.skipped} skipped, {job.failed} failed"
+    )
+    return {
+        "success": True,
+        "translated": job.translated,
+        "from_memory": job.from_memory,
+        "skipped": job.skipped,
+        "failed": job.failed,
+    }
+
+
+def _apply(job, results):
+    """
+    Save {msgid: translation} into the job's catalog as it is now: entries
+    filled by hand in the meantime are kept unless overwriting.
+    """
+    if not job.overwrite:
+        current = catalogs.get(job.language)
+        results = {
+            msgid: translated
+            for msgid, translated in results.items()
+            if msgid in current.by_msgid and not current.by_msgid[msgid].msgstr
+        }
+    if results:
+        catalogs.save(job.language, results)
+
+
+def _prepare(job, jobs, source_language):
+    """
+    List the entries of the job's catalog to translate and fill the ones the
+    translation memory knows; True if some are left for the provider.
+    """
+    lang = job.language
+    catalog = catalogs.get(lang)
+    if catalog is None:
+        raise FileNotFoundError(f"Translation file for {lang} not found")
+
+    pending = {}
+    skipped = 0
+    for entry in catalog.entries:
+        if not entry.msgid:
+            continue
+        if entry.msgstr and not job.overwrite:
+            skipped += 1
+            continue
+        pending.setdefault(entry.msgid, 0)
+        pending[entry.msgid] += 1
+    total = sum(pending.values())
+
+    if lang == source_language:
+        # The msgids are already in this language
+        _apply(job, {msgid: msgid for msgid in pending})
+        jobs.update(total=total, skipped=skipped, translated=total)
+        return False
+
+    results = remembered(source_language, lang, pending)
+    _apply(job, results)
+    from_memory = sum(pending[msgid] for msgid in results)
+    remaining = [
+        [msgid, count] for msgid, count in pending.items() if msgid not in results
+    ]
+    jobs.update(
+        total=total,
+        skipped=skipped,
+        translated=from_memory,
+        from_memory=from_memory,
+        pending=remaining,
+        progress_at=timezone.now(),
+    )
+    return bool(remaining)
+
+
+def _translate_batch(job, jobs, source_language, batch_size):
+    """
+    Send the next batch of the job's pending texts to the provider, store
+    and save the accepted answers and advance the job's counters; True if
+    texts remain.
+    """
+    from django.db.models import F
+
+    counts = dict(job.pending[:batch_size])
+    remaining = job.pending[batch_size:]
+    batch = list(counts)
+    try:
+        answers = get_translator(source_language, job.language).translate_batch(batch)
+        if len(answers) != len(batch):
+            raise ValueError(f"{len(answers)} answers")
+    except Exception as e:
+        logger.error(f"Translation batch of {len(batch)} texts failed: {e}")
+        answers = [None] * len(batch)
+
+    accepted = {
+        text: answer
+        for text, answer in zip(batch, answers, strict=True)
+        if answer and placeholders(answer) == placeholders(text)
+    }
+    remember(source_language, job.language, accepted)
+    _apply(job, accepted)
+    done = sum(counts[text] for text in accepted)
+    jobs.update(
+        translated=F("translated") + done,
+        failed=F("failed") + sum(counts.values()) - done,
+        pending=remaining,
+        progress_at=timezone.now(),
+    )
+    return bool(remaining)
+
+
+def fail_stalled_translation_jobs(now=None):
+    """
+    Mark failed the running jobs that have not moved for STALL_AFTER seconds
+    (their task was killed); the number marked. What they translated so far
+    is already saved.
+    """
+    from main.models import TranslationJob
+
+    now = now or timezone.now()
+    stalled_before = now - timedelta(seconds=translation_settings()["STALL_AFTER"])
+    return TranslationJob.objects.filter(
+        status=TranslationJob.Status.RUNNING, progress_at__lt=stalled_before
+    ).update(
+        status=TranslationJob.Status.FAILED,
+        error="The translation task stopped reporting progress",
+        finished_at=now,
+    )
@@ -1,34 +1,39 @@
 from django.urls import path, re_path, include
-
-from . import views
-from . import auth_views
-from . import classifieds_views
-from . import payment_views
-from . import chatbot_views
-from . import enhanced_views
-from . import cart_wishlist_views
-from . import chat_views
-from . import blog_views
-from . import admin_ad_views
-from . import admin_content_views
-from . import admin_orders_views, offline_payment_views
-from . import publisher_views
-from . import publisher_facebook_views
-from . import review_views
-from . import admin_review_views
-from . import publisher_review_views
-from . import report_views
-from . import ad_actions_views
-from . import user_orders_views
-from . import verification_views
-from . import ad_features_views
-from . import pricing_views
-from . import facebook_share_admin_views
-from . import safety_tip_admin_views
-from . import paid_ad_views
-from . import publisher_paid_ad_views
 from django.contrib.auth import views as dj_auth_views
 
+from .lazy_views import lazy_module
+
+# View modules are imported on first use (see main.lazy_views)
+views = lazy_module("main.views")
+auth_views = lazy_module("main.auth_views")
+classifieds_views = lazy_module("main.classifieds_views")
+payment_views = lazy_module("main.payment_views")
+chatbot_views = lazy_module("main.chatbot_views")
+enhanced_views = lazy_module("main.enhanced_views")
+cart_wishlist_views = lazy_module("main.cart_wishlist_views")
+chat_views = lazy_module("main.chat_views")
+blog_views = lazy_module("main.blog_views")
+admin_ad_views = lazy_module("main.admin_ad_views")
+admin_content_views = lazy_module("main.admin_content_views")
+admin_orders_views = lazy_module("main.admin_orders_views")
+offline_payment_views = lazy_module("main.offline_payment_views")
+publisher_views = lazy_module("main.publisher_views")
+publisher_facebook_views = lazy_module("main.publisher_facebook_views")
+review_views = lazy_module("main.review_views")
+admin_review_views = lazy_module("main.admin_review_views")
+publisher_review_views = lazy_module("main.publisher_review_views")
+report_views = lazy_module("main.report_views")
+ad_actions_views = lazy_module("main.ad_actions_views")
+user_orders_views = lazy_module("main.user_orders_views")
+verification_views = lazy_module("main.verification_views")
+ad_features_views = lazy_module("main.ad_features_views")
+pricing_views = lazy_module("main.pricing_views")
+facebook_share_admin_views = lazy_module("main.facebook_share_admin_views")
+safety_tip_admin_views = lazy_module("main.safety_tip_admin_views")
+paid_ad_views = lazy_module("main.paid_ad_views")
+publisher_paid_ad_views = lazy_module("main.publisher_paid_ad_views")
+performance_views = lazy_module("main.performance_views")
+
 
 app_name = "main"
 urlpatterns = [
@@ -414,6 +419,16 @@ urlpatterns = [
         views.AdminReportsView.as_view(),
         name="admin_reports",
     ),
+    path(
+        "admin/performance/",
+        performance_views.AdminPerformanceView.as_view(),
+        name="admin_performance",
+    ),
+    path(
+        "admin/performance/reset/",
+        performance_views.admin_performance_reset,
+        name="admin_performance_reset",
+    ),
     path(
         "admin/reports/visitor-analytics/",
         views.visitor_analytics_data,
@@ -1473,6 +1488,11 @@ urlpatterns = [
         views.admin_translations_auto_translate,
         name="admin_translations_auto_translate",
     ),
+    path(
+        "admin/translations/jobs/<int:job_id>/",
+        views.admin_translations_job_status,
+        name="admin_translations_job_status",
+    ),
     # Cart URLs
     path("api/cart/add/", cart_wishlist_views.add_to_cart, name="cart_add"),
     path("api/cart/remove/", cart_wishlist_views.remove_from_cart, name="cart_remove"),
@@ -1570,6 +1590,7 @@ urlpatterns = [
         chat_views.mark_read,
         name="chat_mark_read",
     ),
+    path("chat/presence/", chat_views.chat_presence, name="chat_presence"),
     path("chat/admin-panel/", chat_views.admin_chat_panel, name="admin_chat_panel"),
     # Chat URLs (Django Channels WebSocket endpoints - Legacy)
     path(
@@ -1726,6 +1747,11 @@ urlpatterns = [
         admin_ad_views.bulk_change_status,
         name="admin_bulk_change_status",
     ),
+    path(
+        "admin/ads/bulk-operations/<int:operation_id>/status/",
+        admin_ad_views.bulk_operation_status,
+        name="admin_bulk_operation_status",
+    ),
     # ============================================================================
     # ADMIN UPGRADE MANAGEMENT - FULL CRUD OPERATIONS
     # ============================================================================
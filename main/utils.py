@@ -6,7 +6,6 @@ from django.utils.translation import gettext as _
 
 from django.utils import timezone
 from django.utils.timesince import timesince
-from decimal import Decimal
 import re
 import random
 import string
@@ -155,15 +154,26 @@ def get_ad_image_url(ad, size="medium"):
 def calculate_ad_score(ad):
     """
     Calculate a relevance/quality score for ad ranking
-    """
-    score = 0
-
-    # Base score
-    score += 10
-
-    # Views boost
-    if hasattr(ad, "views_count"):
-        score += min(ad.views_count * 0.1, 20)
+    (main.ranking persists the same quality, without recency, in rank_score)
+    """
+    from .ranking import quality_score
+
+    # Features boost (from the prefetched features when the queryset has them)
+    has_features = False
+    if hasattr(ad, "features"):
+        if "features" in getattr(ad, "_prefetched_objects_cache", {}):
+            has_features = any(feature.is_active for feature in ad.features.all())
+        else:
+            has_features = ad.features.filter(is_active=True).exists()
+
+    user = getattr(ad, "user", None)
+    score = quality_score(
+        views_count=getattr(ad, "views_count", 0),
+        is_verified=bool(user and user.verification_status == "verified"),
+        has_profile_image=bool(user and user.profile_image),
+        price=getattr(ad, "price", None),
+        has_features=has_features,
+    )
 
     # Recent ads boost
     hours_since_creation = (timezone.now() - ad.created_at).total_seconds() / 3600
@@ -172,51 +182,17 @@ def calculate_ad_score(ad):
     elif hours_since_creation <= 168:  # 1 week
         score += 10
 
-    # Features boost
-    if hasattr(ad, "features") and ad.features.filter(is_active=True).exists():
-        score += 25
-
-    # Complete profile boost
-    if hasattr(ad, "user") and ad.user:
-        if ad.user.verification_status == "verified":
-            score += 15
-        if ad.user.profile_image:
-            score += 5
-
-    # Price reasonableness (basic check)
-    if hasattr(ad, "price") and ad.price:
-        if 100 <= ad.price <= 100000:  # Reasonable price range
-            score += 5
-
     return min(score, 100)  # Cap at 100
 
 
 def get_similar_ads(ad, limit=4):
     """
-    Get similar ads based on category, price range, and location
+    Get similar ads based on category, price, location, custom fields and
+    wishlists (precomputed, see main.recommendations)
     """
-    from .models import ClassifiedAd
-
-    if not ad:
-        return ClassifiedAd.objects.none()
-
-    # Price range (±50%)
-    price_min = ad.price * Decimal("0.5") if ad.price else 0
-    price_max = ad.price * Decimal("1.5") if ad.price else 999999999
-
-    similar = (
-        ClassifiedAd.objects.filter(category=ad.category, status="active")
-        .exclude(pk=ad.pk)
-        .filter(price__gte=price_min, price__lte=price_max)
-    )
-
-    # Boost same city
-    if ad.city:
-        same_city = similar.filter(city__iexact=ad.city)[: limit // 2]
-        other_city = similar.exclude(city__iexact=ad.city)[: limit // 2]
-        return list(same_city) + list(other_city)
+    from .recommendations import get_similar_ads as recommended_ads
 
-    return similar[:limit]
+    return recommended_ads(ad, limit=limit)
 
 
 def get_ad_contact_info(ad):
@@ -1,4 +1,5 @@
 import json
+import logging
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods, require_POST
@@ -32,6 +33,7 @@ from django.urls import reverse_lazy, reverse
 from django_filters.views import FilterView
 
 from content.models import Blog, Country
+from main.chat_inbox import paginate_inbox
 from main.filters import ClassifiedAdFilter
 from main.forms import AdImageFormSet, ClassifiedAdForm, ContactForm
 from main.models import (
@@ -50,6 +52,9 @@ from main.models import (
     ChatMessage,
     Order,
 )
+from main.presence import online_user_ids
+from main.recommendations import get_similar_ads
+from main.registries import country_id_for, get_category_tree, get_custom_field_schemas
 from main.templatetags.idrissimart_tags import phone_format
 from main.utils import get_selected_country_from_request
 
@@ -171,26 +176,21 @@ class HomeView(TemplateView):
 def _get_categories_with_subcategories(country_code=None):
     """
     Helper function to get categories with their subcategories
+    (from the in-memory category tree)
     """
-    # Get main categories (parent categories)
-    main_categories = Category.objects.filter(
-        parent__isnull=True, is_active=True
-    ).order_by("order", "name")
-
+    tree = get_category_tree()
     categories_by_section = {}
 
-    for category in main_categories:
-        section = category.section_type
+    for node in tree.roots:
+        section = node.category.section_type
         if section not in categories_by_section:
             categories_by_section[section] = []
 
-        # Get subcategories for this main category
-        subcategories = (
-            category.get_children().filter(is_active=True).order_by("order", "name")
-        )
-
         categories_by_section[section].append(
-            {"category": category, "subcategories": subcategories}
+            {
+                "category": node.category,
+                "subcategories": [child.category for child in node.children],
+            }
         )
 
     return categories_by_section
@@ -291,12 +291,14 @@ class CategoriesView(FilterView):
         if parent_id:
             try:
                 parent_id = int(parent_id)  # Validate integer input
-                parent_category = Category.objects.get(id=parent_id, is_active=True)
-                # Get all descendants (subcategories and sub-subcategories)
-                descendants = parent_category.get_descendants(include_self=True)
-                filter_field = config.get("category_field", "category")
-                queryset = queryset.filter(**{f"{filter_field}__in": descendants})
-            except (Category.DoesNotExist, ValueError):
+                parent_node = get_category_tree().get(parent_id)
+                if parent_node is not None and parent_node.is_active:
+                    # All descendants (subcategories and sub-subcategories)
+                    filter_field = config.get("category_field", "category")
+                    queryset = queryset.filter(
+                        **{f"{filter_field}_id__in": parent_node.descendant_ids}
+                    )
+            except ValueError:
                 pass
         else:
             # Apply category filtering by slug - supports main, sub, and sub-sub categories
@@ -305,19 +307,18 @@ class CategoriesView(FilterView):
                 "category"
             )
             if category_slug:
-                try:
-                    # Decode URL-encoded Arabic characters (in case it comes from query param)
-                    from urllib.parse import unquote
+                # Decode URL-encoded Arabic characters (in case it comes from query param)
+                from urllib.parse import unquote
 
-                    category_slug = unquote(category_slug)
+                category_slug = unquote(category_slug)
 
-                    category = Category.objects.get(slug=category_slug, is_active=True)
-                    # Get all descendants (subcategories and sub-subcategories)
-                    descendants = category.get_descendants(include_self=True)
+                node = get_category_tree().by_slug.get(category_slug)
+                if node is not None and node.is_active:
+                    # All descendants (subcategories and sub-subcategories)
                     filter_field = config.get("category_field", "category")
-                    queryset = queryset.filter(**{f"{filter_field}__in": descendants})
-                except Category.DoesNotExist:
-                    pass
+                    queryset = queryset.filter(
+                        **{f"{filter_field}_id__in": node.descendant_ids}
+                    )
 
         # Apply section filtering
         section = self.request.GET.get("section")
@@ -394,13 +395,13 @@ class CategoriesView(FilterView):
         parent_category = None
         current_category = None
 
+        tree = get_category_tree()
+
         # First check if we have a parent ID
         if parent_id:
-            try:
-                parent_id = int(parent_id)  # Validate integer input
-                parent_category = Category.objects.get(id=parent_id, is_active=True)
-            except (Category.DoesNotExist, ValueError):
-                parent_category = None
+            node = tree.get(parent_id)
+            if node is not None and node.is_active:
+                parent_category = node.category
 
         # If no parent_id, check if we have a category slug (from URL or query param)
         if not parent_category and not current_category:
@@ -408,24 +409,21 @@ class CategoriesView(FilterView):
                 "category"
             )
             if category_slug:
-                try:
-                    from urllib.parse import unquote
+                from urllib.parse import unquote
 
-                    category_slug = unquote(category_slug)
-                    current_category = Category.objects.get(
-                        slug=category_slug, is_active=True
-                    )
+                node = tree.by_slug.get(unquote(category_slug))
+                if node is not None and node.is_active:
+                    current_category = node.category
+                    parent_node = tree.get(node.parent_id)
 
-                    if current_category.get_children().filter(is_active=True).exists():
+                    if node.children:
                         # Main category page.
                         parent_category = current_category
-                    elif current_category.parent and current_category.parent.is_active:
+                    elif parent_node is not None and parent_node.is_active:
                         # Subcategory page: keep parent as strip source, current as active item.
-                        parent_category = current_category.parent
+                        parent_category = parent_node.category
                     else:
                         parent_category = current_category
-                except Category.DoesNotExist:
-                    pass
 
         # Get categories by section with content counts (generic approach)
         # If parent is specified, get subcategories of that parent
@@ -453,29 +451,18 @@ class CategoriesView(FilterView):
         custom_fields_for_filters = []
         category_slug = self.request.GET.get("category")
         if category_slug:
-            try:
-                from .models import CategoryCustomField
-
-                selected_category = Category.objects.get(
-                    slug=category_slug, is_active=True
-                )
-                # Get all custom fields that should be shown in filters for this category and its ancestors
-                categories_to_check = [selected_category] + list(
-                    selected_category.get_ancestors()
-                )
-                custom_fields_for_filters = (
-                    CategoryCustomField.objects.filter(
-                        category__in=categories_to_check,
-                        is_active=True,
-                        show_in_filters=True,
-                    )
-                    .select_related("custom_field")
-                    .prefetch_related("custom_field__field_options")
-                    .order_by("order")
-                    .distinct()
+            selected_node = tree.by_slug.get(category_slug)
+            if selected_node is not None and selected_node.is_active:
+                # All custom fields shown in filters for this category and its ancestors
+                schemas = get_custom_field_schemas()
+                custom_fields_for_filters = sorted(
+                    (
+                        link
+                        for category_id in (selected_node.id,) + selected_node.ancestor_ids
+                        for link in schemas.filter_fields(category_id)
+                    ),
+                    key=lambda link: (link.order, link.pk),
                 )
-            except Category.DoesNotExist:
-                pass
 
         # Calculate statistics based on content type
         total_items = self.get_queryset().count()
@@ -483,14 +470,14 @@ class CategoriesView(FilterView):
 
         # Calculate active categories based on parent filter
         if parent_category:
-            active_categories = (
-                parent_category.get_children().filter(is_active=True).count()
-            )
+            active_categories = len(tree.children(parent_category.pk))
         else:
-            active_categories = Category.objects.filter(
-                is_active=True,
-                section_type=section_type_value or Category.SectionType.CLASSIFIED,
-            ).count()
+            active_section = section_type_value or Category.SectionType.CLASSIFIED
+            active_categories = sum(
+                1
+                for node in tree.nodes.values()
+                if node.is_active and node.category.section_type == active_section
+            )
 
         # Dynamic context based on content type
         context_names = {
@@ -582,79 +569,17 @@ class CategoriesView(FilterView):
         if not section_type_value:
             section_type_value = Category.SectionType.CLASSIFIED
 
-        # Get main categories (root level)
-        main_categories = Category.objects.filter(
-            parent__isnull=True,
-            is_active=True,
-            section_type=section_type_value,
-        ).order_by("order", "name")
+        tree = get_category_tree()
+        counts = self._content_counts_by_category(section_type, country_code)
 
         categories_by_section = {}
-        content_type = section_type
-        config = self.content_type_config.get(
-            content_type, self.content_type_config["classified"]
-        )
-
-        for category in main_categories:
-            section = category.section_type
-            if section not in categories_by_section:
-                categories_by_section[section] = []
-
-            # Get all descendants (includes subcategories and sub-subcategories)
-            descendants = category.get_descendants(include_self=True)
-
-            # Count content items for this category tree
-            content_count = self._count_content_for_categories(
-                descendants, content_type, config, country_code
-            )
-
-            # Process subcategories with their own counts
-            subcategory_data = []
-            subcategories = (
-                category.get_children().filter(is_active=True).order_by("order", "name")
-            )
-
-            for subcat in subcategories:
-                subcat_descendants = subcat.get_descendants(include_self=True)
-                subcat_count = self._count_content_for_categories(
-                    subcat_descendants, content_type, config, country_code
-                )
-
-                # Process sub-subcategories
-                sub_subcategory_data = []
-                sub_subcategories = (
-                    subcat.get_children()
-                    .filter(is_active=True)
-                    .order_by("order", "name")
-                )
-
-                for sub_subcat in sub_subcategories:
-                    sub_subcat_descendants = sub_subcat.get_descendants(
-                        include_self=True
-                    )
-                    sub_subcat_count = self._count_content_for_categories(
-                        sub_subcat_descendants, content_type, config, country_code
-                    )
-                    sub_subcategory_data.append(
-                        {
-                            "category": sub_subcat,
-                            "content_count": sub_subcat_count,
-                        }
-                    )
-
-                subcategory_data.append(
-                    {
-                        "category": subcat,
-                        "content_count": subcat_count,
-                        "sub_subcategories": sub_subcategory_data,
-                    }
-                )
-
-            categories_by_section[section].append(
+        for node in tree.roots_for(section_type=section_type_value):
+            section = node.category.section_type
+            categories_by_section.setdefault(section, []).append(
                 {
-                    "category": category,
-                    "subcategories": subcategory_data,
-                    "content_count": content_count,
+                    "category": node.category,
+                    "subcategories": self._nodes_with_counts(node.children, counts),
+                    "content_count": self._subtree_count(node, counts),
                 }
             )
 
@@ -667,78 +592,72 @@ class CategoriesView(FilterView):
         Get subcategories of a parent category with their content counts
         Similar to _get_categories_with_content_counts but for subcategories
         """
-        categories_by_section = {}
-        config = self.content_type_config.get(
-            content_type, self.content_type_config["classified"]
-        )
-
-        section = parent_category.section_type
-        if section not in categories_by_section:
-            categories_by_section[section] = []
+        tree = get_category_tree()
+        counts = self._content_counts_by_category(content_type, country_code)
+        parent = tree.get(parent_category.pk)
 
-        # Get direct children (subcategories) of the parent
-        subcategories = (
-            parent_category.get_children()
-            .filter(is_active=True)
-            .order_by("order", "name")
-        )
-
-        for subcat in subcategories:
-            subcat_descendants = subcat.get_descendants(include_self=True)
-            subcat_count = self._count_content_for_categories(
-                subcat_descendants, content_type, config, country_code
+        categories_by_section = {parent_category.section_type: []}
+        for subcat in parent.children if parent else ():
+            categories_by_section[parent_category.section_type].append(
+                {
+                    "category": subcat.category,
+                    "subcategories": [
+                        {
+                            "category": child.category,
+                            "content_count": self._subtree_count(child, counts),
+                        }
+                        for child in subcat.children
+                    ],
+                    "content_count": self._subtree_count(subcat, counts),
+                }
             )
 
-            # Process sub-subcategories
-            sub_subcategory_data = []
-            sub_subcategories = (
-                subcat.get_children().filter(is_active=True).order_by("order", "name")
-            )
+        return categories_by_section
 
-            for sub_subcat in sub_subcategories:
-                sub_subcat_descendants = sub_subcat.get_descendants(include_self=True)
-                sub_subcat_count = self._count_content_for_categories(
-                    sub_subcat_descendants, content_type, config, country_code
-                )
-                sub_subcategory_data.append(
+    def _nodes_with_counts(self, nodes, counts):
+        """Subcategory entries (with their own children) for category nodes"""
+        return [
+            {
+                "category": node.category,
+                "content_count": self._subtree_count(node, counts),
+                "sub_subcategories": [
                     {
-                        "category": sub_subcat,
-                        "content_count": sub_subcat_count,
+                        "category": child.category,
+                        "content_count": self._subtree_count(child, counts),
                     }
-                )
-
-            categories_by_section[section].append(
-                {
-                    "category": subcat,
-                    "subcategories": sub_subcategory_data,
-                    "content_count": subcat_count,
-                }
-            )
+                    for child in node.children
+                ],
+            }
+            for node in nodes
+        ]
 
-        return categories_by_section
+    @staticmethod
+    def _subtree_count(node, counts):
+        return sum(counts.get(category_id, 0) for category_id in node.descendant_ids)
 
-    def _count_content_for_categories(
-        self, categories, content_type, config, country_code=None
-    ):
+    def _content_counts_by_category(self, content_type, country_code=None):
         """
-        Generic method to count content items for given categories
+        Content items per category id, in one grouped query; subtree totals
+        are summed from the category tree
         """
         if content_type == "classified":
             # Count classified ads
-            base_filters = {
-                "category__in": categories,
-                "status": ClassifiedAd.AdStatus.ACTIVE,
-            }
+            base_filters = {"status": ClassifiedAd.AdStatus.ACTIVE}
             if country_code:
                 base_filters["country__code"] = country_code
 
-            return ClassifiedAd.objects.filter(**base_filters).count()
+            return dict(
+                ClassifiedAd.objects.filter(**base_filters)
+                .select_related(None)
+                .prefetch_related(None)
+                .order_by()
+                .values("category_id")
+                .annotate(total=Count("pk"))
+                .values_list("category_id", "total")
+            )
 
         # Future content types can be handled here
-        # elif content_type == 'product':
-        #     return Product.objects.filter(category__in=categories, is_active=True).count()
-
-        return 0
+        return {}
 
 
 @require_POST
@@ -811,12 +730,10 @@ class CategoryDetailView(FilterView):
 
     def dispatch(self, request, *args, **kwargs):
         """Get the category object and add it to the instance"""
-        try:
-            self.category = get_object_or_404(
-                Category, slug=self.kwargs["slug"], is_active=True
-            )
-        except Http404:
-            self.category = None
+        self.category_node = get_category_tree().by_slug.get(self.kwargs["slug"])
+        if self.category_node is not None and not self.category_node.is_active:
+            self.category_node = None
+        self.category = self.category_node.category if self.category_node else None
 
         return super().dispatch(request, *args, **kwargs)
 
@@ -829,12 +746,11 @@ class CategoryDetailView(FilterView):
             return ClassifiedAd.objects.none()
 
         # self.category is set in dispatch()
-        descendants = self.category.get_descendants(include_self=True)
         selected_country = get_selected_country_from_request(self.request)
 
         queryset = (
             ClassifiedAd.objects.filter(
-                category__in=descendants,
+                category_id__in=self.category_node.descendant_ids,
                 status=ClassifiedAd.AdStatus.ACTIVE,
                 is_hidden=False,
                 country__code=selected_country,
@@ -874,9 +790,11 @@ class CategoryDetailView(FilterView):
         # Get selected country
         selected_country = get_selected_country_from_request(self.request)
 
+        tree = get_category_tree()
+
         # Build breadcrumbs
         breadcrumbs = []
-        ancestors = self.category.get_ancestors(ascending=True)
+        ancestors = reversed(tree.ancestors(self.category.pk))
         for ancestor in ancestors:
             breadcrumbs.append(
                 {
@@ -886,16 +804,13 @@ class CategoryDetailView(FilterView):
             )
 
         # Category statistics
-        descendants = self.category.get_descendants(include_self=True)
         total_ads = ClassifiedAd.objects.filter(
-            category__in=descendants,
+            category_id__in=self.category_node.descendant_ids,
             status=ClassifiedAd.AdStatus.ACTIVE,
             country__code=selected_country,
         ).count()
 
-        subcategories_count = (
-            self.category.get_children().filter(is_active=True).count()
-        )
+        subcategories_count = len(self.category_node.children)
 
         # Current filters for display
         current_filters = {
@@ -946,16 +861,14 @@ class CategoryDetailView(FilterView):
 
         # Get custom fields for filters from this category and descendants
         # Deduplicate by custom_field_id so each field appears only once
-        from main.models import CategoryCustomField
-
-        descendants = self.category.get_descendants(include_self=True)
-        all_category_fields = (
-            CategoryCustomField.objects.filter(
-                category__in=descendants, is_active=True, show_in_filters=True
-            )
-            .select_related("custom_field")
-            .prefetch_related("custom_field__field_options")
-            .order_by("order")
+        schemas = get_custom_field_schemas()
+        all_category_fields = sorted(
+            (
+                link
+                for category_id in self.category_node.descendant_ids
+                for link in schemas.filter_fields(category_id)
+            ),
+            key=lambda link: (link.order, link.pk),
         )
         seen_field_ids = set()
         custom_fields_for_filters = []
@@ -966,21 +879,11 @@ class CategoryDetailView(FilterView):
 
         # Get subcategories with their custom fields
         subcategories_list = []
-        subcategories = self.category.get_children().filter(is_active=True)
-        for subcat in subcategories:
-            # Get custom fields for this subcategory
-            subcat_custom_fields = (
-                CategoryCustomField.objects.filter(
-                    category=subcat, is_active=True, show_in_filters=True
-                )
-                .select_related("custom_field")
-                .prefetch_related("custom_field__field_options")
-                .order_by("order")
-            )
+        for subcat in self.category_node.children:
             subcategories_list.append({
-                'category': subcat,
-                'custom_fields': subcat_custom_fields,
-                'has_children': subcat.get_children().exists()
+                'category': subcat.category,
+                'custom_fields': schemas.filter_fields(subcat.id),
+                'has_children': tree.child_count(subcat.id) > 0
             })
 
         context.update(
@@ -1074,7 +977,7 @@ class CategoryDetailView(FilterView):
 
     def apply_sorting(self, queryset):
         """تطبيق الترتيب - إعلانات مميزة أولاً"""
-        sort_option = self.request.GET.get("sort", "-created_at")
+        sort_option = self.request.GET.get("sort")
 
         valid_sorts = [
             "-created_at",  # الأحدث
@@ -1087,14 +990,11 @@ class CategoryDetailView(FilterView):
         ]
 
         if sort_option not in valid_sorts:
-            sort_option = "-created_at"
+            # Default: persisted rank (paid tier, then freshness and quality)
+            return queryset.order_by("-rank_score")
 
         # Always prioritize featured ads (pinned, urgent, highlighted) first
-        queryset = queryset.order_by(
-            "-is_pinned", "-is_urgent", "-is_highlighted", sort_option
-        )
-
-        return queryset
+        return queryset.order_by("-rank_tier", sort_option)
 
 
 class SubcategoryDetailView(FilterView):
@@ -1111,12 +1011,10 @@ class SubcategoryDetailView(FilterView):
 
     def dispatch(self, request, *args, **kwargs):
         """Get the category object and add it to the instance"""
-        try:
-            self.category = get_object_or_404(
-                Category, slug=self.kwargs["slug"], is_active=True
-            )
-        except Http404:
-            self.category = None
+        self.category_node = get_category_tree().by_slug.get(self.kwargs["slug"])
+        if self.category_node is not None and not self.category_node.is_active:
+            self.category_node = None
+        self.category = self.category_node.category if self.category_node else None
 
         return super().dispatch(request, *args, **kwargs)
 
@@ -1160,9 +1058,11 @@ class SubcategoryDetailView(FilterView):
         # Get selected country
         selected_country = get_selected_country_from_request(self.request)
 
+        tree = get_category_tree()
+
         # Build breadcrumbs
         breadcrumbs = []
-        ancestors = self.category.get_ancestors(ascending=True)
+        ancestors = reversed(tree.ancestors(self.category.pk))
         for ancestor in ancestors:
             breadcrumbs.append(
                 {
@@ -1172,22 +1072,18 @@ class SubcategoryDetailView(FilterView):
             )
 
         # Category statistics — include all descendants so sub-sub-categories are counted
-        _descendants = self.category.get_descendants(include_self=True)
         total_ads = ClassifiedAd.objects.filter(
-            category__in=_descendants,
+            category_id__in=self.category_node.descendant_ids,
             status=ClassifiedAd.AdStatus.ACTIVE,
             country__code=selected_country,
         ).count()
 
         # For subcategory pages, keep the parent category as the strip source
         # so users can switch between sibling subcategories quickly.
-        parent_category = self.category.parent if self.category.parent else self.category
-        subcategories = (
-            parent_category.get_children()
-            .filter(is_active=True)
-            .order_by("order", "name")
-        )
-        total_subcategories = subcategories.count()
+        parent_node = tree.get(self.category.parent_id) or self.category_node
+        parent_category = parent_node.category
+        subcategories = [child.category for child in parent_node.children]
+        total_subcategories = len(subcategories)
 
         # Get paid banners for this subcategory
         from main.models import PaidBanner, BannerSlot
@@ -1298,7 +1194,7 @@ class SubcategoryDetailView(FilterView):
 
     def apply_sorting(self, queryset):
         """تطبيق الترتيب - إعلانات مميزة أولاً"""
-        sort_by = self.request.GET.get("sort", "-created_at")
+        sort_by = self.request.GET.get("sort")
         valid_sorts = [
             "price",
             "-price",
@@ -1311,14 +1207,11 @@ class SubcategoryDetailView(FilterView):
         ]
 
         if sort_by not in valid_sorts:
-            sort_by = "-created_at"
+            # Default: persisted rank (paid tier, then freshness and quality)
+            return queryset.order_by("-rank_score")
 
         # Always prioritize featured ads (pinned, urgent, highlighted) first
-        queryset = queryset.order_by(
-            "-is_pinned", "-is_urgent", "-is_highlighted", sort_by
-        )
-
-        return queryset
+        return queryset.order_by("-rank_tier", sort_by)
 
 
 class AboutView(TemplateView):
@@ -1746,15 +1639,8 @@ class AdDetailView(DetailView):
                     )
         context["custom_fields"] = custom_fields_with_labels
 
-        # Get related ads from the same category, excluding the current one
-        context["related_ads"] = (
-            ClassifiedAd.objects.filter(
-                category=ad.category, status=ClassifiedAd.AdStatus.ACTIVE
-            )
-            .exclude(pk=ad.pk)
-            .select_related("user", "country")
-            .prefetch_related("images")[:4]
-        )
+        # Precomputed similar ads (main.recommendations)
+        context["related_ads"] = get_similar_ads(ad, limit=4)
 
         category_name = ad.category.name
         if self.request.LANGUAGE_CODE == "ar" and ad.category.name_ar:
@@ -2133,56 +2019,41 @@ def get_subcategories(request):
         if not category_id:
             return JsonResponse({"error": _("معرف القسم مطلوب")}, status=400)
 
-        try:
-            category = Category.objects.get(id=category_id)
-            # Get direct children (subcategories) of this category
-            subcategories = (
-                category.get_children().filter(is_active=True).order_by("order", "name")
-            )
-
-            # Filter by country if applicable
-            if selected_country:
-                from content.models import Country
-
-                try:
-                    country = Country.objects.get(code=selected_country, is_active=True)
-                    subcategories = subcategories.filter(
-                        models.Q(country=country)
-                        | models.Q(countries=country)
-                        | models.Q(country__isnull=True, countries__isnull=True)
-                    ).distinct()
-                except Country.DoesNotExist:
-                    pass
+        tree = get_category_tree()
+        node = tree.get(category_id)
+        if node is None:
+            return JsonResponse({"error": _("القسم غير موجود")}, status=404)
+        category = node.category
 
-            # Serialize subcategories data
-            subcategories_data = []
-            for subcat in subcategories:
-                subcategories_data.append(
-                    {
-                        "id": subcat.id,
-                        "name": subcat.name_ar if subcat.name_ar else subcat.name,
-                        "slug": subcat.slug_ar if subcat.slug_ar else subcat.slug,
-                        "icon": subcat.icon,
-                        "url": f"/category/{subcat.slug}/",
-                        "has_children": subcat.get_children()
-                        .filter(is_active=True)
-                        .exists(),
-                    }
-                )
+        # Direct active children (subcategories), restricted to the selected
+        # country when it is known
+        subcategories = tree.children(node.id, country_id_for(selected_country))
 
-            return JsonResponse(
+        # Serialize subcategories data
+        subcategories_data = []
+        for subnode in subcategories:
+            subcat = subnode.category
+            subcategories_data.append(
                 {
-                    "subcategories": subcategories_data,
-                    "parent_category": {
-                        "id": category.id,
-                        "name": category.name_ar if category.name_ar else category.name,
-                        "slug": category.slug_ar if category.slug_ar else category.slug,
-                    },
+                    "id": subcat.id,
+                    "name": subcat.name_ar if subcat.name_ar else subcat.name,
+                    "slug": subcat.slug_ar if subcat.slug_ar else subcat.slug,
+                    "icon": subcat.icon,
+                    "url": f"/category/{subcat.slug}/",
+                    "has_children": bool(subnode.children),
                 }
             )
 
-        except Category.DoesNotExist:
-            return JsonResponse({"error": _("القسم غير موجود")}, status=404)
+        return JsonResponse(
+            {
+                "subcategories": subcategories_data,
+                "parent_category": {
+                    "id": category.id,
+                    "name": category.name_ar if category.name_ar else category.name,
+                    "slug": category.slug_ar if category.slug_ar else category.slug,
+                },
+            }
+        )
 
     return JsonResponse({"error": _("طريقة الطلب غير صالحة")}, status=405)
 
@@ -2203,23 +2074,23 @@ def get_category_stats(request):
             except (ValueError, TypeError):
                 return JsonResponse({"error": _("معرف القسم غير صالح")}, status=400)
 
-            category = Category.objects.get(id=category_id)
-
-            # Get all descendants including self for ads count
-            descendants = category.get_descendants(include_self=True)
+            node = get_category_tree().get(category_id)
+            if node is None:
+                raise Category.DoesNotExist
+            category = node.category
 
             # Get country from utility function for filtering
             selected_country = get_selected_country_from_request(request)
 
             # Count active ads in this category and its descendants
             ads_count = ClassifiedAd.objects.filter(
-                category__in=descendants,
+                category_id__in=node.descendant_ids,
                 status=ClassifiedAd.AdStatus.ACTIVE,
                 country__code=selected_country,
             ).count()
 
             # Count direct subcategories
-            subcategories_count = category.get_children().filter(is_active=True).count()
+            subcategories_count = len(node.children)
 
             return JsonResponse(
                 {
@@ -2316,32 +2187,32 @@ def ad_creation_success_view(request):
 def get_subcategories_ajax(request, category_id):
     """Get subcategories via AJAX with Arabic support and custom fields"""
     try:
-        from .models import CategoryCustomField
-
         # Validate category_id is a valid integer to prevent SQL injection attempts
         try:
             category_id = int(category_id)
         except (ValueError, TypeError):
             return JsonResponse({"error": _("معرف القسم غير صالح")}, status=400)
 
-        category = Category.objects.get(id=category_id)
-        subcategories = category.get_children().filter(is_active=True)
+        tree = get_category_tree()
+        node = tree.get(category_id)
+        if node is None:
+            raise Category.DoesNotExist
+        category = node.category
+        schemas = get_custom_field_schemas()
 
         subcategories_data = []
-        for subcat in subcategories:
-            # Get custom fields for this subcategory
-            custom_fields = (
-                CategoryCustomField.objects.filter(
-                    category=subcat, is_active=True, show_in_filters=True
-                )
-                .select_related("custom_field")
-                .values(
-                    "custom_field__name",
-                    "custom_field__label_ar",
-                    "custom_field__label_en",
-                    "custom_field__icon",
-                )
-            )
+        for subnode in node.children:
+            subcat = subnode.category
+            # Custom fields of this subcategory (CustomField has no icon)
+            custom_fields = [
+                {
+                    "custom_field__name": link.custom_field.name,
+                    "custom_field__label_ar": link.custom_field.label_ar,
+                    "custom_field__label_en": link.custom_field.label_en,
+                    "custom_field__icon": None,
+                }
+                for link in schemas.filter_fields(subcat.id)
+            ]
 
             subcategories_data.append({
                 "id": subcat.id,
@@ -2350,8 +2221,8 @@ def get_subcategories_ajax(request, category_id):
                 "icon": subcat.icon if subcat.icon else "fas fa-folder",
                 "slug": subcat.slug,
                 "url": f"/category/{subcat.slug}/",
-                "has_children": subcat.get_children().exists(),
-                "custom_fields": list(custom_fields),
+                "has_children": tree.child_count(subcat.id) > 0,
+                "custom_fields": custom_fields,
                 "custom_fields_count": len(custom_fields),
             })
 
@@ -2472,30 +2343,37 @@ def admin_category_api(request):
         return HttpResponseForbidden()
 
     section_type = request.GET.get("section_type", "").strip()
-    qs = Category.objects.filter(is_active=True)
-    if section_type:
-        qs = qs.filter(section_type=section_type)
+    tree = get_category_tree()
+
+    def selectable(node):
+        return node is not None and node.is_active and (
+            not section_type or node.category.section_type == section_type
+        )
 
     category_id = request.GET.get("category_id", "").strip()
     if category_id:
-        try:
-            cat = qs.get(id=int(category_id))
-            return JsonResponse({
-                "id": cat.id,
-                "name": cat.name_ar or cat.name,
-                "parent_id": cat.parent_id,
-            })
-        except (ValueError, Category.DoesNotExist):
+        node = tree.get(category_id)
+        if not selectable(node):
             return JsonResponse({"error": "not found"}, status=404)
+        cat = node.category
+        return JsonResponse({
+            "id": cat.id,
+            "name": cat.name_ar or cat.name,
+            "parent_id": cat.parent_id,
+        })
 
     parent_id = request.GET.get("parent_id", "").strip()
     if parent_id:
         try:
-            cats = qs.filter(parent_id=int(parent_id)).order_by("name_ar", "name")
+            nodes = tree.children(int(parent_id))
         except ValueError:
             return JsonResponse({"categories": []})
     else:
-        cats = qs.filter(parent__isnull=True).order_by("name_ar", "name")
+        nodes = tree.roots
+    cats = sorted(
+        (node.category for node in nodes if selectable(node)),
+        key=lambda c: (c.name_ar or "", c.name or ""),
+    )
 
     data = [{"id": c.id, "name": c.name_ar or c.name} for c in cats]
     return JsonResponse({"categories": data})
@@ -2560,8 +2438,11 @@ def enhanced_ad_creation_success_view(request, ad_id=None):
 def get_subcategories_path(request, category_id):
     """AJAX view to get subcategories via URL path param"""
     try:
-        category = get_object_or_404(Category, id=category_id)
-        subcategories = category.get_children().filter(is_active=True)
+        tree = get_category_tree()
+        node = tree.get(category_id)
+        if node is None:
+            raise Http404
+        category = node.category
 
         subcategories_data = [
             {
@@ -2571,9 +2452,9 @@ def get_subcategories_path(request, category_id):
                 "icon": subcat.icon if subcat.icon else "fas fa-folder",
                 "slug": subcat.slug,
                 "url": f"/category/{subcat.slug}/",
-                "has_children": subcat.get_children().exists(),
+                "has_children": tree.child_count(subcat.id) > 0,
             }
-            for subcat in subcategories
+            for subcat in (subnode.category for subnode in node.children)
         ]
 
         return JsonResponse(
@@ -2713,12 +2594,9 @@ def filter_categories_ajax(request):
 
             # Apply category filter to ads
             if category_slug:
-                try:
-                    category = Category.objects.get(slug=category_slug, is_active=True)
-                    descendants = category.get_descendants(include_self=True)
-                    ads_queryset = ads_queryset.filter(category__in=descendants)
-                except Category.DoesNotExist:
-                    pass
+                node = get_category_tree().by_slug.get(category_slug)
+                if node is not None and node.is_active:
+                    ads_queryset = ads_queryset.filter(category_id__in=node.descendant_ids)
 
             # Apply search filter to ads
             if search:
@@ -2757,21 +2635,20 @@ def filter_categories_ajax(request):
                 ads_queryset = ads_queryset.order_by(sort_by)
 
             # Build response data
+            tree = get_category_tree()
             filtered_categories = []
             for category in categories_queryset[:50]:  # Limit categories
                 # Get ad count for this category
-                descendants = category.get_descendants(include_self=True)
                 category_ads_count = ads_queryset.filter(
-                    category__in=descendants
+                    category_id__in=tree.descendant_ids(category.id)
                 ).count()
 
                 # Get subcategories with counts
                 subcategories_data = []
-                subcategories = category.get_children().filter(is_active=True)[:10]
-                for subcat in subcategories:
-                    subcat_descendants = subcat.get_descendants(include_self=True)
+                for subnode in tree.children(category.id)[:10]:
+                    subcat = subnode.category
                     subcat_ads_count = ads_queryset.filter(
-                        category__in=subcat_descendants
+                        category_id__in=subnode.descendant_ids
                     ).count()
                     subcategories_data.append(
                         {
@@ -3069,42 +2946,20 @@ class PublisherDashboardView(PublisherRequiredMixin, ListView):
             queryset = queryset.order_by(sort_by)
         else:
             # Default: Sort by priority (pinned > urgent > highlighted > newest)
-            queryset = queryset.order_by(
-                "-is_pinned", "-is_urgent", "-is_highlighted", "-created_at"
-            )
+            queryset = queryset.order_by("-rank_tier", "-created_at")
 
         return queryset
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Dashboard statistics
-        user_ads = ClassifiedAd.objects.filter(user=self.request.user)
+        # Dashboard statistics (one aggregate query, cached per publisher)
+        from main.publisher_stats import get_publisher_stats
+        from main.scheduled_tasks import expire_user_upgrades
 
-        # Check and expire old upgrades
-        for ad in user_ads:
-            ad.check_and_expire_upgrades()
-
-        context["dashboard_stats"] = {
-            "total_ads": user_ads.count(),
-            "active_ads": user_ads.filter(status=ClassifiedAd.AdStatus.ACTIVE).count(),
-            "pending_ads": user_ads.filter(
-                status=ClassifiedAd.AdStatus.PENDING
-            ).count(),
-            "resubmitted_ads": user_ads.filter(
-                status=ClassifiedAd.AdStatus.PENDING, is_resubmitted=True
-            ).count(),
-            "expired_ads": user_ads.filter(
-                status=ClassifiedAd.AdStatus.EXPIRED
-            ).count(),
-            "draft_ads": user_ads.filter(status=ClassifiedAd.AdStatus.DRAFT).count(),
-            "total_views": user_ads.aggregate(total=models.Sum("views_count"))["total"]
-            or 0,
-            # Upgrade statistics
-            "highlighted_ads": user_ads.filter(is_highlighted=True).count(),
-            "urgent_ads": user_ads.filter(is_urgent=True).count(),
-            "pinned_ads": user_ads.filter(is_pinned=True).count(),
-        }
+        # Deactivate lapsed upgrades before counting the upgrade flags
+        expire_user_upgrades(self.request.user.pk)
+        context["dashboard_stats"] = get_publisher_stats(self.request.user)
 
         # Ad Balance - الرصيد الإعلاني
         from main.models import UserPackage
@@ -4495,9 +4350,7 @@ class AdminPaymentsView(SuperadminRequiredMixin, TemplateView):
     template_name = "admin_dashboard/payments.html"
 
     def get_context_data(self, **kwargs):
-        from django.db.models import Sum, Count, Q
-        from django.utils import timezone
-        from datetime import datetime, timedelta
+        from django.db.models import Q
 
         context = super().get_context_data(**kwargs)
 
@@ -4508,117 +4361,12 @@ class AdminPaymentsView(SuperadminRequiredMixin, TemplateView):
             stats = self.get_payment_stats()
             return JsonResponse({"success": True, "stats": stats})
 
-        # Get all payment types
+        # Payment counters come from the daily revenue rollups
+        from main.payment_rollups import console_stats, monthly_revenue
+
         all_payments = Payment.objects.select_related("user").all()
         completed_payments = all_payments.filter(status=Payment.PaymentStatus.COMPLETED)
-        pending_payments_qs = all_payments.filter(status=Payment.PaymentStatus.PENDING)
-        failed_payments_qs = all_payments.filter(status=Payment.PaymentStatus.FAILED)
-        refunded_payments_qs = all_payments.filter(
-            status=Payment.PaymentStatus.REFUNDED
-        )
-        cancelled_payments_qs = all_payments.filter(
-            status=Payment.PaymentStatus.CANCELLED
-        )
-
-        # Payment statistics
-        total_payments = all_payments.count()
-        total_revenue = completed_payments.aggregate(total=Sum("amount"))["total"] or 0
-        pending_payments = pending_payments_qs.count()
-        failed_payments = failed_payments_qs.count()
-        refunded_payments = refunded_payments_qs.count()
-        cancelled_payments = cancelled_payments_qs.count()
-
-        # Calculate monthly revenue (current month)
-        current_month_start = timezone.now().replace(
-            day=1, hour=0, minute=0, second=0, microsecond=0
-        )
-        monthly_revenue = (
-            completed_payments.filter(completed_at__gte=current_month_start).aggregate(
-                total=Sum("amount")
-            )["total"]
-            or 0
-        )
-
-        # Weekly revenue (last 7 days)
-        week_ago = timezone.now() - timedelta(days=7)
-        weekly_revenue = (
-            completed_payments.filter(completed_at__gte=week_ago).aggregate(
-                total=Sum("amount")
-            )["total"]
-            or 0
-        )
-
-        # Today's revenue
-        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_revenue = (
-            completed_payments.filter(completed_at__gte=today_start).aggregate(
-                total=Sum("amount")
-            )["total"]
-            or 0
-        )
-
-        # Premium members statistics
-        total_premium_members = User.objects.filter(is_premium=True).count()
-        today = timezone.now().date()
-        active_premium_members = User.objects.filter(
-            is_premium=True, subscription_end__gte=today
-        ).count()
-        expired_premium_members = User.objects.filter(
-            is_premium=True, subscription_end__lt=today
-        ).count()
-
-        # Orders statistics
-        all_orders = Order.objects.select_related("user").all()
-        total_orders = all_orders.count()
-        completed_orders = all_orders.filter(
-            status="delivered", payment_status="paid"
-        ).count()
-        pending_orders = all_orders.filter(payment_status="pending").count()
-        orders_revenue = (
-            all_orders.filter(payment_status="paid").aggregate(
-                total=Sum("total_amount")
-            )["total"]
-            or 0
-        )
-
-        # User packages statistics
-        all_packages = UserPackage.objects.select_related("user", "package").all()
-        active_packages = all_packages.filter(expiry_date__gte=today).count()
-        expired_packages = all_packages.filter(expiry_date__lt=today).count()
-
-        # Payment by provider statistics
-        paypal_payments = completed_payments.filter(provider="paypal").count()
-        paymob_payments = completed_payments.filter(provider="paymob").count()
-        bank_transfer_payments = completed_payments.filter(
-            provider="bank_transfer"
-        ).count()
-        offline_payments = completed_payments.filter(provider="offline").count()
-
-        context["payment_stats"] = {
-            "total_transactions": total_payments,
-            "completed_transactions": completed_payments.count(),
-            "total_revenue": total_revenue,
-            "monthly_revenue": monthly_revenue,
-            "weekly_revenue": weekly_revenue,
-            "today_revenue": today_revenue,
-            "premium_members": total_premium_members,
-            "active_premium_members": active_premium_members,
-            "expired_premium_members": expired_premium_members,
-            "pending_payments": pending_payments,
-            "failed_payments": failed_payments,
-            "refunded_payments": refunded_payments,
-            "cancelled_payments": cancelled_payments,
-            "total_orders": total_orders,
-            "completed_orders": completed_orders,
-            "pending_orders": pending_orders,
-            "orders_revenue": orders_revenue,
-            "active_packages": active_packages,
-            "expired_packages": expired_packages,
-            "paypal_payments": paypal_payments,
-            "paymob_payments": paymob_payments,
-            "bank_transfer_payments": bank_transfer_payments,
-            "offline_payments": offline_payments,
-        }
+        context["payment_stats"] = console_stats()
 
         # Pending offline payments (need admin review)
         context["pending_offline_payments"] = all_payments.filter(
@@ -4641,21 +4389,21 @@ class AdminPaymentsView(SuperadminRequiredMixin, TemplateView):
             transactions = transactions.filter(status=status_filter)
         if provider_filter:
             transactions = transactions.filter(provider=provider_filter)
-        if context_filter == "ad":
-            transactions = transactions.filter(metadata__has_key="ad_id")
-        elif context_filter == "package":
-            transactions = transactions.filter(metadata__has_key="package_id")
-        elif context_filter == "order":
-            transactions = transactions.filter(metadata__has_key="order_id")
-        elif context_filter == "subscription":
-            transactions = transactions.filter(metadata__has_key="subscription_type")
+        if context_filter in Payment.PaymentContext.values:
+            transactions = transactions.filter(context_type=context_filter)
         if search_query:
-            transactions = transactions.filter(
-                Q(description__icontains=search_query)
-                | Q(user__username__icontains=search_query)
-                | Q(user__email__icontains=search_query)
-                | Q(provider_transaction_id__icontains=search_query)
-            )
+            # A pasted transaction ID is found through its index; anything
+            # else falls back to the substring search
+            exact = transactions.filter(provider_transaction_id=search_query)
+            if exact.exists():
+                transactions = exact
+            else:
+                transactions = transactions.filter(
+                    Q(description__icontains=search_query)
+                    | Q(user__username__icontains=search_query)
+                    | Q(user__email__icontains=search_query)
+                    | Q(provider_transaction_id__icontains=search_query)
+                )
         if date_from:
             try:
                 from datetime import datetime
@@ -4688,39 +4436,9 @@ class AdminPaymentsView(SuperadminRequiredMixin, TemplateView):
         }
 
         # Monthly revenue chart data (last 6 months)
-        monthly_data = []
-        for i in range(5, -1, -1):  # Reversed to show oldest to newest
-            month_date = timezone.now() - timedelta(days=30 * i)
-            month_start = month_date.replace(
-                day=1, hour=0, minute=0, second=0, microsecond=0
-            )
-
-            # Calculate next month start
-            if month_start.month == 12:
-                next_month_start = month_start.replace(
-                    year=month_start.year + 1, month=1
-                )
-            else:
-                next_month_start = month_start.replace(month=month_start.month + 1)
-
-            # Get revenue for this month
-            month_revenue = (
-                completed_payments.filter(
-                    completed_at__gte=month_start, completed_at__lt=next_month_start
-                ).aggregate(total=Sum("amount"))["total"]
-                or 0
-            )
-
-            monthly_data.append(
-                {
-                    "month": month_start.strftime("%Y-%m"),
-                    "revenue": float(month_revenue),
-                }
-            )
-
         import json
 
-        context["monthly_data"] = json.dumps(monthly_data)
+        context["monthly_data"] = json.dumps(monthly_revenue())
 
         # Premium membership packages - Get actual package counts
         gold_subscribers = (
@@ -4787,61 +4505,30 @@ class AdminPaymentsView(SuperadminRequiredMixin, TemplateView):
 
     def get_payment_stats(self):
         """Get payment statistics for AJAX requests"""
-        from django.db.models import Sum, Q
-        from django.utils import timezone
-
-        all_payments = Payment.objects.all()
-        completed_payments = all_payments.filter(status=Payment.PaymentStatus.COMPLETED)
-        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today = timezone.now().date()
-
-        # Calculate stats
-        total_revenue = completed_payments.aggregate(total=Sum("amount"))["total"] or 0
-        today_revenue = (
-            completed_payments.filter(completed_at__gte=today_start).aggregate(
-                total=Sum("amount")
-            )["total"]
-            or 0
-        )
-
-        # Orders stats
-        all_orders = Order.objects.all()
-
-        # Packages stats
-        all_packages = UserPackage.objects.all()
+        from main.payment_rollups import console_stats
 
+        stats = console_stats()
         return {
-            "total_transactions": all_payments.count(),
-            "completed_transactions": completed_payments.count(),
-            "total_revenue": float(total_revenue),
-            "today_revenue": float(today_revenue),
-            "active_premium_members": User.objects.filter(
-                is_premium=True, subscription_end__gte=today
-            ).count(),
-            "pending_payments": all_payments.filter(
-                status=Payment.PaymentStatus.PENDING
-            ).count(),
-            "failed_payments": all_payments.filter(
-                status=Payment.PaymentStatus.FAILED
-            ).count(),
-            "refunded_payments": all_payments.filter(
-                status=Payment.PaymentStatus.REFUNDED
-            ).count(),
-            "cancelled_payments": all_payments.filter(
-                status=Payment.PaymentStatus.CANCELLED
-            ).count(),
-            "total_orders": all_orders.count(),
-            "completed_orders": all_orders.filter(
-                status="delivered", payment_status="paid"
-            ).count(),
-            "active_packages": all_packages.filter(expiry_date__gte=today).count(),
-            "expired_packages": all_packages.filter(expiry_date__lt=today).count(),
-            "paypal_payments": completed_payments.filter(provider="paypal").count(),
-            "paymob_payments": completed_payments.filter(provider="paymob").count(),
-            "bank_transfer_payments": completed_payments.filter(
-                provider="bank_transfer"
-            ).count(),
-            "offline_payments": completed_payments.filter(provider="offline").count(),
+            key: float(stats[key]) if "revenue" in key else stats[key]
+            for key in (
+                "total_transactions",
+                "completed_transactions",
+                "total_revenue",
+                "today_revenue",
+                "active_premium_members",
+                "pending_payments",
+                "failed_payments",
+                "refunded_payments",
+                "cancelled_payments",
+                "total_orders",
+                "completed_orders",
+                "active_packages",
+                "expired_packages",
+                "paypal_payments",
+                "paymob_payments",
+                "bank_transfer_payments",
+                "offline_payments",
+            )
         }
 
     def render_to_response(self, context, **response_kwargs):
@@ -6633,177 +6320,57 @@ def admin_settings_constance_save(request):
         return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+def _translation_not_found(lang):
+    return JsonResponse(
+        {"success": False, "message": f"Translation file for {lang} not found"},
+        status=404,
+    )
+
+
 @superadmin_required
 def admin_translations_stats(request):
-    """Get translation statistics from .po files"""
+    """Get translation statistics from the cached .po catalogs"""
     try:
-        import os
-        from django.conf import settings
+        from main.translation_workspace import translation_stats
 
-        try:
-            import polib
-        except ImportError:
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": "polib is not installed. Please install it with: pip install polib",
-                },
-                status=500,
-            )
-
-        stats = {
-            "languages": [],
-            "total_strings": 0,
-            "translated_strings": 0,
-            "completion_rate": 0,
-        }
-
-        # Get locale directory
-        locale_path = os.path.join(settings.BASE_DIR, "locale")
-
-        if not os.path.exists(locale_path):
-            return JsonResponse({"success": True, "stats": stats})
-
-        language_stats = []
-        # Use the first language to get the total count (all languages have same source strings)
-        base_total = 0
-        total_translated = 0
-        lang_count = 0
-
-        # Iterate through language directories
-        for lang_code in os.listdir(locale_path):
-            lang_dir = os.path.join(locale_path, lang_code)
-            if not os.path.isdir(lang_dir):
-                continue
-
-            po_file = os.path.join(lang_dir, "LC_MESSAGES", "django.po")
-
-            if os.path.exists(po_file):
-                try:
-                    po = polib.pofile(po_file)
-                    total = len(po)
-                    translated = len(po.translated_entries())
-                    untranslated = len(po.untranslated_entries())
-                    fuzzy = len(po.fuzzy_entries())
-                    percent = po.percent_translated()
-
-                    language_stats.append(
-                        {
-                            "code": lang_code,
-                            "total": total,
-                            "translated": translated,
-                            "untranslated": untranslated,
-                            "fuzzy": fuzzy,
-                            "percent": round(percent, 1),
-                        }
-                    )
-
-                    # Use the first language's total as the base (all have same source strings)
-                    if base_total == 0:
-                        base_total = total
-
-                    total_translated += translated
-                    lang_count += 1
-
-                except Exception as e:
-                    print(f"Error reading {po_file}: {e}")
-                    import traceback
-
-                    print(traceback.format_exc())
-                    continue
-
-        stats["languages"] = language_stats
-        stats["total_strings"] = base_total  # Total unique strings (from one language)
-        stats["translated_strings"] = (
-            total_translated // lang_count if lang_count > 0 else 0
-        )  # Average across languages
-        stats["completion_rate"] = round(
-            (stats["translated_strings"] / base_total * 100) if base_total > 0 else 0,
-            1,
-        )
-
-        return JsonResponse({"success": True, "stats": stats})
+        return JsonResponse({"success": True, "stats": translation_stats()})
 
     except Exception as e:
-        import traceback
-
-        print(f"Translation stats error: {traceback.format_exc()}")
+        logging.getLogger(__name__).exception(f"Translation stats error: {e}")
         return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
 @superadmin_required
 def admin_translations_get(request, lang):
-    """Get translations from .po file for editing"""
+    """Get translations from the cached .po catalog for editing"""
     try:
-        import os
-        from django.conf import settings
+        from main.translation_workspace import catalogs, is_valid_language
 
-        try:
-            import polib
-        except ImportError:
-            return JsonResponse(
-                {"success": False, "message": "polib is not installed"}, status=500
-            )
-
-        locale_path = os.path.join(
-            settings.BASE_DIR, "locale", lang, "LC_MESSAGES", "django.po"
-        )
-
-        if not os.path.exists(locale_path):
-            return JsonResponse(
-                {"success": False, "message": f"Translation file for {lang} not found"},
-                status=404,
-            )
-
-        po = polib.pofile(locale_path)
-        translations = []
-
-        for entry in po:
-            if not entry.obsolete:  # Skip obsolete entries
-                translations.append(
-                    {
-                        "msgid": entry.msgid,
-                        "msgstr": entry.msgstr,
-                        "fuzzy": entry.fuzzy if hasattr(entry, "fuzzy") else False,
-                    }
-                )
+        catalog = catalogs.get(lang) if is_valid_language(lang) else None
+        if catalog is None:
+            return _translation_not_found(lang)
 
+        translations = catalog.rows()
         return JsonResponse(
             {"success": True, "translations": translations, "total": len(translations)}
         )
 
     except Exception as e:
-        import traceback
-
-        print(f"Translation get error: {traceback.format_exc()}")
+        logging.getLogger(__name__).exception(f"Translation get error: {e}")
         return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
 @superadmin_required
 @require_POST
 def admin_translations_save(request, lang):
-    """Save translations to .po file"""
+    """Save translations to the .po file; the .mo is compiled shortly after"""
     try:
-        import os
         import json
-        from django.conf import settings
-
-        try:
-            import polib
-        except ImportError:
-            return JsonResponse(
-                {"success": False, "message": "polib is not installed"}, status=500
-            )
 
-        locale_path = os.path.join(
-            settings.BASE_DIR, "locale", lang, "LC_MESSAGES", "django.po"
-        )
+        from main.translation_workspace import catalogs, is_valid_language
 
-        if not os.path.exists(locale_path):
-            return JsonResponse(
-                {"success": False, "message": f"Translation file for {lang} not found"},
-                status=404,
-            )
+        if not is_valid_language(lang) or catalogs.get(lang) is None:
+            return _translation_not_found(lang)
 
         data = json.loads(request.body)
         updates = data.get("updates", [])
@@ -6813,35 +6380,14 @@ def admin_translations_save(request, lang):
                 {"success": False, "message": "No updates provided"}, status=400
             )
 
-        # Load the .po file
-        po = polib.pofile(locale_path)
-        updated_count = 0
-
-        # Update translations
-        for update in updates:
-            msgid = update.get("msgid")
-            msgstr = update.get("msgstr")
-
-            if not msgid:
-                continue
-
-            # Find the entry in the .po file
-            entry = po.find(msgid)
-            if entry:
-                entry.msgstr = msgstr
-                # Remove fuzzy flag if translation is provided
-                if msgstr and "fuzzy" in entry.flags:
-                    entry.flags.remove("fuzzy")
-                updated_count += 1
-
-        # Save the .po file
-        po.save(locale_path)
-
-        # Compile to .mo file
-        mo_path = os.path.join(
-            settings.BASE_DIR, "locale", lang, "LC_MESSAGES", "django.mo"
+        updated_count = catalogs.save(
+            lang,
+            {
+                update["msgid"]: update.get("msgstr") or ""
+                for update in updates
+                if update.get("msgid")
+            },
         )
-        po.save_as_mofile(mo_path)
 
         return JsonResponse(
             {
@@ -6852,126 +6398,84 @@ def admin_translations_save(request, lang):
         )
 
     except Exception as e:
-        import traceback
-
-        print(f"Translation save error: {traceback.format_exc()}")
+        logging.getLogger(__name__).exception(f"Translation save error: {e}")
         return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
 @superadmin_required
 @require_POST
 def admin_translations_auto_translate(request, lang):
-    """Auto-translate untranslated entries using deep-translator (Google Translate)"""
+    """
+    Queue the auto-translation of untranslated entries (deep-translator,
+    Google Translate); poll admin_translations_job_status for progress
+    """
     try:
-        import os
         import json
-        from django.conf import settings
-
-        try:
-            import polib
-        except ImportError:
-            return JsonResponse(
-                {"success": False, "message": "polib is not installed"}, status=500
-            )
 
-        try:
-            from deep_translator import GoogleTranslator
-        except ImportError:
-            return JsonResponse(
-                {
-                    "success": False,
-                    "message": "deep-translator is not installed. Run: pip install deep-translator",
-                },
-                status=500,
-            )
-
-        locale_path = os.path.join(
-            settings.BASE_DIR, "locale", lang, "LC_MESSAGES", "django.po"
+        from main.translation_workspace import (
+            catalogs,
+            is_valid_language,
+            start_auto_translation,
         )
 
-        if not os.path.exists(locale_path):
-            return JsonResponse(
-                {"success": False, "message": f"Translation file for {lang} not found"},
-                status=404,
-            )
-
-        data = json.loads(request.body)
-        overwrite = data.get("overwrite", False)
-
-        po = polib.pofile(locale_path)
-        translated_count = 0
-        skipped_count = 0
-        error_count = 0
-
-        # Source language is Arabic (msgids are in Arabic)
-        source_lang = "ar"
+        if not is_valid_language(lang) or catalogs.get(lang) is None:
+            return _translation_not_found(lang)
 
-        if lang == source_lang:
-            # For Arabic locale, just copy msgid → msgstr for empty entries
-            for entry in po:
-                if entry.obsolete or not entry.msgid:
-                    continue
-                if entry.msgstr and not overwrite:
-                    skipped_count += 1
-                    continue
-                entry.msgstr = entry.msgid
-                if "fuzzy" in entry.flags:
-                    entry.flags.remove("fuzzy")
-                translated_count += 1
-        else:
-            translator = GoogleTranslator(source=source_lang, target=lang)
-
-            # Collect entries that need translation
-            entries_to_translate = []
-            for entry in po:
-                if entry.obsolete or not entry.msgid:
-                    continue
-                if entry.msgstr and not overwrite:
-                    skipped_count += 1
-                    continue
-                entries_to_translate.append(entry)
-
-            # Batch translate in chunks of 50 (API limit safety)
-            CHUNK_SIZE = 50
-            for i in range(0, len(entries_to_translate), CHUNK_SIZE):
-                chunk = entries_to_translate[i : i + CHUNK_SIZE]
-                texts = [e.msgid for e in chunk]
-                try:
-                    results = translator.translate_batch(texts)
-                    for entry, translated in zip(chunk, results):
-                        if translated:
-                            entry.msgstr = translated
-                            if "fuzzy" in entry.flags:
-                                entry.flags.remove("fuzzy")
-                            translated_count += 1
-                        else:
-                            error_count += 1
-                except Exception:
-                    error_count += len(chunk)
-
-        po.save(locale_path)
-        mo_path = os.path.join(
-            settings.BASE_DIR, "locale", lang, "LC_MESSAGES", "django.mo"
+        data = json.loads(request.body or "{}")
+        job = start_auto_translation(
+            lang, overwrite=bool(data.get("overwrite", False)), user=request.user
         )
-        po.save_as_mofile(mo_path)
 
         return JsonResponse(
             {
                 "success": True,
-                "message": f"Translated {translated_count} strings",
-                "translated_count": translated_count,
-                "skipped_count": skipped_count,
-                "error_count": error_count,
-            }
+                "message": f"Translation job {job.pk} started",
+                "job_id": job.pk,
+                "status_url": reverse(
+                    "main:admin_translations_job_status", args=[job.pk]
+                ),
+            },
+            status=202,
         )
 
     except Exception as e:
-        import traceback
-
-        print(f"Auto translate error: {traceback.format_exc()}")
+        logging.getLogger(__name__).exception(f"Auto translate error: {e}")
         return JsonResponse({"success": False, "message": str(e)}, status=500)
 
 
+@superadmin_required
+def admin_translations_job_status(request, job_id):
+    """Progress of an auto-translation job"""
+    from main.models import TranslationJob
+
+    job = get_object_or_404(TranslationJob, pk=job_id)
+    finished = job.status in (
+        TranslationJob.Status.COMPLETED,
+        TranslationJob.Status.FAILED,
+    )
+    return JsonResponse(
+        {
+            "success": job.status != TranslationJob.Status.FAILED,
+            "job_id": job.pk,
+            "language": job.language,
+            "status": job.status,
+            "total": job.total,
+            "translated": job.translated,
+            "from_memory": job.from_memory,
+            "skipped": job.skipped,
+            "failed": job.failed,
+            "percent": job.progress_percent,
+            "finished": finished,
+            "error": job.error,
+            # Counters under the names of the former synchronous response
+            "translated_count": job.translated,
+            "skipped_count": job.skipped,
+            "error_count": job.failed,
+            "message": job.error or f"Translated {job.translated} strings",
+        }
+    )
+
+
 # Settings AJAX Endpoints
 
 
@@ -7263,70 +6767,47 @@ class PublisherChatsView(LoginRequiredMixin, TemplateView):
     template_name = "chat/publisher_chats.html"
 
     def get_context_data(self, **kwargs):
-        from django.db.models import Count, Q
+        from django.db.models import Count, Prefetch, Q, Sum, prefetch_related_objects
 
         context = super().get_context_data(**kwargs)
         context["active_nav"] = "chats"
 
-        # Get all active chat rooms for the publisher
-        chat_rooms = (
-            ChatRoom.objects.filter(
-                publisher=self.request.user, room_type="publisher_client", is_active=True
-            )
-            .select_related("client", "ad")
-            .prefetch_related("messages")
-            .order_by("-updated_at")
+        # Active chat rooms for the publisher, newest activity first (keyset page)
+        publisher_rooms = ChatRoom.objects.filter(
+            publisher=self.request.user, room_type="publisher_client", is_active=True
+        )
+        chat_rooms, next_cursor = paginate_inbox(
+            publisher_rooms.select_related("client", "ad"),
+            cursor=self.request.GET.get("cursor"),
         )
 
-        # Add unread count for each room
-        rooms_with_unread = []
+        # Unread count from the room summary and online state (one presence lookup)
+        online = online_user_ids(room.client_id for room in chat_rooms)
         for room in chat_rooms:
-            room.unread_count = room.get_unread_count(self.request.user)
-            rooms_with_unread.append(room)
-
-        context["chat_rooms"] = rooms_with_unread
+            room.unread_count = room.unread_publisher
+            room.is_online = room.client_id in online
 
-        # Calculate statistics
-        total_chats = len(rooms_with_unread)
-        active_chats = (
-            ChatRoom.objects.filter(
-                publisher=self.request.user,
-                is_active=True,
-                room_type="publisher_client",
-                messages__created_at__gte=timezone.now() - timezone.timedelta(days=7),
-            )
-            .distinct()
-            .count()
+        # The first room is opened on load: fetch its messages with senders
+        prefetch_related_objects(
+            chat_rooms[:1],
+            Prefetch("messages", queryset=ChatMessage.objects.select_related("sender")),
         )
 
-        unread_messages = (
-            ChatMessage.objects.filter(
-                room__publisher=self.request.user,
-                room__is_active=True,
-                room__room_type="publisher_client",
-                is_read=False,
-            )
-            .exclude(sender=self.request.user)
-            .count()
-        )
+        context["chat_rooms"] = chat_rooms
+        context["next_cursor"] = next_cursor
 
-        active_ads = (
-            ChatRoom.objects.filter(
-                publisher=self.request.user,
-                room_type="publisher_client",
-                is_active=True,
-            )
-            .values("ad")
-            .distinct()
-            .count()
+        # Calculate statistics in one aggregate over the summaries
+        stats = publisher_rooms.aggregate(
+            total_chats=Count("id"),
+            active_chats=Count(
+                "id", filter=Q(last_activity_at__gte=timezone.now() - timezone.timedelta(days=7))
+            ),
+            unread_messages=Sum("unread_publisher"),
+            active_ads=Count("ad", distinct=True),
         )
+        stats["unread_messages"] = stats["unread_messages"] or 0
 
-        context["chat_stats"] = {
-            "total_chats": total_chats,
-            "active_chats": active_chats,
-            "unread_messages": unread_messages,
-            "active_ads": active_ads,
-        }
+        context["chat_stats"] = stats
 
         return context
 
@@ -7384,58 +6865,48 @@ class AdminSupportChatsView(SuperadminRequiredMixin, TemplateView):
     template_name = "chat/admin_support_chats.html"
 
     def get_context_data(self, **kwargs):
-        from main.models import ChatRoom, ChatMessage
-        from django.db.models import Count, Q
+        from main.models import ChatMessage, ChatRoom
+        from django.db.models import Count, Prefetch, Q, Sum, prefetch_related_objects
 
         context = super().get_context_data(**kwargs)
         context["active_nav"] = "support_chats"
 
-        # Get all support chat rooms (publisher-admin type)
-        chat_rooms = (
-            ChatRoom.objects.filter(room_type="publisher_admin")
-            .select_related("publisher")
-            .prefetch_related("messages")
-            .order_by("-updated_at")
+        # Support chat rooms (publisher-admin type), newest activity first (keyset page)
+        support_rooms = ChatRoom.objects.filter(room_type="publisher_admin")
+        chat_rooms, next_cursor = paginate_inbox(
+            support_rooms.select_related("publisher"),
+            cursor=self.request.GET.get("cursor"),
         )
 
-        # Annotate each room with unread count
+        # Unread count from the room summary and publisher online state
+        online = online_user_ids(room.publisher_id for room in chat_rooms)
         for room in chat_rooms:
-            room.unread_count = room.messages.filter(
-                is_read=False, sender__is_staff=False
-            ).count()
+            room.unread_count = room.unread_admin
             room.has_unread_messages = room.unread_count > 0
+            room.is_online = room.publisher_id in online
 
-        context["chat_rooms"] = chat_rooms
-
-        # Calculate statistics
-        total_chats = chat_rooms.count()
-        active_chats = chat_rooms.filter(is_active=True).count()
-
-        # Count unread messages (messages from publishers not read by admin)
-        unread_messages = ChatMessage.objects.filter(
-            room__room_type="publisher_admin",
-            is_read=False,
-            sender__is_staff=False,  # Messages from publishers
-        ).count()
+        # The first room is opened on load: fetch its messages with senders
+        prefetch_related_objects(
+            chat_rooms[:1],
+            Prefetch("messages", queryset=ChatMessage.objects.select_related("sender")),
+        )
 
-        # Count resolved chats today
-        from django.utils import timezone
+        context["chat_rooms"] = chat_rooms
+        context["next_cursor"] = next_cursor
 
+        # Calculate statistics in one aggregate over the summaries
         today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        resolved_today = chat_rooms.filter(
-            is_active=False, updated_at__gte=today_start
-        ).count()
-
-        # Count total resolved chats
-        resolved_chats = chat_rooms.filter(is_active=False).count()
+        stats = support_rooms.aggregate(
+            total_chats=Count("id"),
+            active_chats=Count("id", filter=Q(is_active=True)),
+            # Messages from publishers not read by admin
+            unread_messages=Sum("unread_admin"),
+            resolved_today=Count("id", filter=Q(is_active=False, updated_at__gte=today_start)),
+            resolved_chats=Count("id", filter=Q(is_active=False)),
+        )
+        stats["unread_messages"] = stats["unread_messages"] or 0
 
-        context["chat_stats"] = {
-            "total_chats": total_chats,
-            "active_chats": active_chats,
-            "unread_messages": unread_messages,
-            "resolved_today": resolved_today,
-            "resolved_chats": resolved_chats,
-        }
+        context["chat_stats"] = stats
 
         return context
 
@@ -7483,13 +6954,8 @@ def admin_chat_get_messages(request, room_id):
 
         logger.info(f"Chat room {room_id} found with {room.messages.count()} messages")
 
-        # Mark messages as read
-        unread_count = room.messages.filter(
-            is_read=False, sender__is_staff=False
-        ).count()
-        room.messages.filter(is_read=False, sender__is_staff=False).update(
-            is_read=True, read_at=timezone.now()
-        )
+        # Mark messages as read (also resets the room's admin unread counter)
+        unread_count = room.mark_as_read(request.user)
         logger.info(f"Marked {unread_count} messages as read in room {room_id}")
 
         # Render chat HTML
@@ -7606,14 +7072,15 @@ def admin_chat_notifications(request):
 
     try:
         from main.models import ChatRoom, ChatMessage
-        from django.db.models import Q
+        from django.db.models import Count, Q, Sum
 
-        # Support chat statistics
-        unread_support_messages = ChatMessage.objects.filter(
-            room__room_type="publisher_admin",
-            is_read=False,
-            sender__is_staff=False,  # Messages from publishers
-        ).count()
+        # Support chat statistics from the room summaries
+        support = ChatRoom.objects.filter(room_type="publisher_admin").aggregate(
+            unread=Sum("unread_admin"),  # Messages from publishers
+            total=Count("id"),
+            active=Count("id", filter=Q(is_active=True)),
+        )
+        unread_support_messages = support["unread"] or 0
 
         # Regular chat statistics
         total_user_chats = ChatRoom.objects.filter(
@@ -7621,12 +7088,8 @@ def admin_chat_notifications(request):
         ).count()
 
         # Support chat totals
-        total_support_chats = ChatRoom.objects.filter(
-            room_type="publisher_admin"
-        ).count()
-        active_support_chats = ChatRoom.objects.filter(
-            room_type="publisher_admin", is_active=True
-        ).count()
+        total_support_chats = support["total"]
+        active_support_chats = support["active"]
         resolved_support_chats = total_support_chats - active_support_chats
 
         # Recent activity (last 24 hours)
@@ -0,0 +1,264 @@
+"""
+Process warm-up
+تسخين العمليات قبل استقبال الطلبات
+
+Each web worker used to build its own application state lazily: the first
+requests after a deploy paid for importing view modules, compiling
+templates, loading translation catalogs and building the in-memory
+indexes, and every worker held a private copy of all of it.
+
+warm_process() builds that state up front:
+
+  - the URL resolver, resolving every lazily imported view (main.lazy_views);
+  - the read-only registries (main.registries), the moderation engine, the
+    paid banner index and the chatbot knowledge index;
+  - the translation catalogs of every language in LANGUAGES;
+  - the compiled templates listed in WARMUP["TEMPLATES"].
+
+gunicorn.conf.py loads the application in the master (preload_app), runs
+warm_process() there, then calls before_fork() so the workers it forks share
+the warmed memory copy-on-write instead of each building its own. Daphne
+does not fork; idrissimart.asgi warms its single process when DJANGO_WARMUP
+is set.
+
+prime_shared_cache() requests the cacheable catalog API endpoints once per
+language (and per country) so the shared cache is filled before clients
+arrive. Both are run by the warm_up management command after a deploy.
+
+Settings (all optional):
+
+    WARMUP = {
+        "RESOLVE_VIEWS": True,  # import every view module while warming
+        "TEMPLATES": [...],     # templates compiled while warming
+        "URLS": [...],          # paths requested by prime_shared_cache()
+        "PER_COUNTRY": True,    # also request each path with ?country=<code>
+    }
+"""
+
+import gc
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+WARMUP_DEFAULTS = {
+    "RESOLVE_VIEWS": True,
+    "TEMPLATES": [
+        "base.html",
+        "pages/home.html",
+        "pages/categories.html",
+        "pages/category_detail.html",
+        "classifieds/ad_list.html",
+        "classifieds/ad_detail.html",
+    ],
+    "URLS": [
+        "/api/countries/",
+        "/api/categories/",
+        "/api/categories/root_categories/",
+        "/api/ad-packages/",
+        "/api/ad-features/",
+        "/api/faq-categories/",
+        "/api/faqs/",
+        "/api/safety-tips/",
+        "/api/home-sliders/",
+    ],
+    "PER_COUNTRY": True,
+}
+
+
+def warmup_settings():
+    options = dict(WARMUP_DEFAULTS)
+    options.update(getattr(settings, "WARMUP", {}) or {})
+    return options
+
+
+# =======================
+# Warmers
+# =======================
+
+# (name, function(options)), run in order by warm_process()
+WARMERS = []
+
+
+def warmer(name):
+    """Register a function(options) run by warm_process()."""
+
+    def decorator(func):
+        WARMERS.append((name, func))
+        return func
+
+    return decorator
+
+
+def _iter_callbacks(patterns):
+    from django.urls import URLResolver
+
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _iter_callbacks(pattern.url_patterns)
+        else:
+            yield pattern.callback
+
+
+@warmer("urls")
+def warm_urlconf(options):
+    from django.urls import get_resolver
+
+    from main.lazy_views import LazyView
+
+    patterns = get_resolver().url_patterns
+    resolved = 0
+    if options["RESOLVE_VIEWS"]:
+        for callback in _iter_callbacks(patterns):
+            if isinstance(callback, LazyView):
+                callback.resolve()
+                resolved += 1
+    return {"lazy_views_resolved": resolved}
+
+
+@warmer("registries")
+def warm_registries(options):
+    from main.registries import REGISTRIES
+
+    for registry in REGISTRIES:
+        registry.get()
+    return {"registries": [registry.name for registry in REGISTRIES]}
+
+
+@warmer("indexes")
+def warm_indexes(options):
+    from main.banner_index import get_banner_index
+    from main.chatbot_index import get_knowledge_index
+    from main.moderation import get_moderation_engine
+
+    get_moderation_engine()
+    get_banner_index()
+    get_knowledge_index()
+    return {}
+
+
+@warmer("translations")
+def warm_translations(options):
+    from django.utils import translation
+
+    languages = [code for code, _name in settings.LANGUAGES]
+    for code in languages:
+        with translation.override(code):
+            translation.gettext("Home")
+    return {"languages": languages}
+
+
+@warmer("templates")
+def warm_templates(options):
+    from django.template import TemplateDoesNotExist
+    from django.template.loader import get_template
+
+    compiled = 0
+    for name in options["TEMPLATES"]:
+        try:
+            get_template(name)
+            compiled += 1
+        except TemplateDoesNotExist:
+            logger.warning(f"Warm-up template not found: {name}")
+    return {"templates": compiled}
+
+
+def warm_process(options=None):
+    """
+    Run every warmer; {name: {"ms": ..., ...}} with an "error" entry for
+    those that failed. A failing warmer never stops the others.
+    """
+    options = options or warmup_settings()
+    report = {}
+    for name, func in WARMERS:
+        started = time.perf_counter()
+        try:
+            result = func(options) or {}
+        except Exception as e:
+            logger.warning(f"Warm-up step {name} failed: {e}")
+            result = {"error": str(e)}
+        result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+        report[name] = result
+    return report
+
+
+# =======================
+# Preload and fork
+# =======================
+
+
+def before_fork():
+    """
+    Called in the master once warmed: close connections the workers must not
+    share and move every object allocated so far out of the garbage
+    collector's reach, so collections in a worker do not touch (and copy)
+    the pages they live on.
+    """
+    from django.core.cache import caches
+    from django.db import connections
+
+    connections.close_all()
+    for backend in caches.all(initialized_only=True):
+        backend.close()
+    gc.collect()
+    gc.freeze()
+
+
+def after_fork():
+    """Called in each worker right after the fork."""
+    from main import instrumentation
+
+    # Per-process buffers must not carry the master's samples
+    instrumentation._buffer = None
+
+
+# =======================
+# Shared cache
+# =======================
+
+
+def _warmup_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host and host != "*" and not host.startswith("."):
+            return host
+    return "localhost"
+
+
+def prime_shared_cache(options=None):
+    """
+    Request each WARMUP["URLS"] path once per language (and country) so its
+    response is cached; [(path, language, status, ms), ...].
+    """
+    from django.test import Client
+
+    from main.registries import get_active_countries
+
+    options = options or warmup_settings()
+    client = Client(HTTP_HOST=_warmup_host(), raise_request_exception=False)
+    country_codes = [""]
+    if options["PER_COUNTRY"]:
+        country_codes += [country.code for country in get_active_countries()]
+
+    results = []
+    for path in options["URLS"]:
+        for language, _name in settings.LANGUAGES:
+            for code in country_codes:
+                data = {"country": code} if code else {}
+                started = time.perf_counter()
+                response = client.get(
+                    path,
+                    data,
+                    HTTP_ACCEPT_LANGUAGE=language,
+                    HTTP_ACCEPT="application/json",
+                )
+                results.append(
+                    (
+                        f"{path}?country={code}" if code else path,
+                        language,
+                        response.status_code,
+                        round((time.perf_counter() - started) * 1000, 1),
+                    )
+                )
+    return results
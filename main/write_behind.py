@@ -0,0 +1,73 @@
+"""
+Write-behind flush timer
+مؤقت تفريغ المخازن المؤقتة
+
+The per-process buffers of main.banner_index (banner views and clicks) and
+main.chatbot_index (conversation rows) used to be written only when a later event
+arrived after their flush interval, or at process exit, so an idle worker
+kept the last events to itself. Each buffer now arms a FlushTimer when it
+receives an event: a daemon timer thread that calls the flush function once
+the interval has passed, unless a flush already emptied the buffer.
+
+The buffers live in the memory of each web worker, which a Django-Q schedule
+running on the cluster cannot reach; hence a timer in the worker itself.
+"""
+
+import logging
+import os
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class FlushTimer:
+    """Calls *flush* *interval* seconds after arm(), at most one pending call per process."""
+
+    def __init__(self, name, flush, interval):
+        self.name = name
+        self.flush = flush
+        self.interval = interval
+        self._timer = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def arm(self):
+        """Schedule a flush unless one is already pending in this process."""
+        with self._lock:
+            # Timer threads do not survive fork(); a forked worker arms its own
+            if (
+                self._timer is not None
+                and self._pid == os.getpid()
+                and self._timer.is_alive()
+            ):
+                return
+            self._pid = os.getpid()
+            self._timer = threading.Timer(self.interval, self._run)
+            self._timer.daemon = True
+            self._timer.name = f"{self.name}-flush"
+            self._timer.start()
+
+    def cancel(self):
+        """Drop the pending flush (the buffer is being flushed anyway)."""
+        with self._lock:
+            if (
+                self._timer is not None
+                and self._timer is not threading.current_thread()
+            ):
+                self._timer.cancel()
+                self._timer = None
+
+    def _run(self):
+        with self._lock:
+            # Events arriving during the flush arm a new timer
+            if self._timer is threading.current_thread():
+                self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Scheduled {self.name} flush failed: {e}")
+        finally:
+            # Database connections opened by this thread are not reused
+            connections.close_all()